@@ -0,0 +1,4 @@
+"""
+Benchmarks offline do assistente virtual
+Modelos falsos determinísticos, catálogos sintéticos e medições sem acesso à OpenAI
+"""
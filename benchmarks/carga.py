@@ -0,0 +1,470 @@
+"""
+Teste de carga da API
+Dispara /chat, /buscar, /buscar/embedding e endpoints administrativos em paralelo
+contra src.api:app (com a OpenAI falsa local) ou uma URL já no ar, e relata vazão,
+percentis de latência e taxa de erros por endpoint
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from .catalogo_sintetico import CATEGORIAS, gerar_consultas, gerar_mensagens, preparar_diretorio
+from .executar import resumir_latencias
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Operação -> peso padrão na mistura de requisições
+MISTURA_PADRAO = {"chat": 50, "stream": 0, "buscar": 20, "embedding": 15, "admin": 10, "estatisticas": 5}
+
+
+def interpretar_mistura(texto: str) -> Dict[str, float]:
+    """Lê a mistura no formato "chat=50,buscar=20" (operações omitidas ficam com peso 0)"""
+    mistura = dict.fromkeys(MISTURA_PADRAO, 0.0)
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in MISTURA_PADRAO:
+            raise ValueError(f"Operação desconhecida na mistura: {nome} (use {', '.join(MISTURA_PADRAO)})")
+        mistura[nome] = float(peso)
+    if not any(mistura.values()):
+        raise ValueError("A mistura precisa de ao menos uma operação com peso positivo")
+    return mistura
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Resultados:
+    """Latências e erros por endpoint, só das requisições iniciadas após o aquecimento"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.erros: Dict[str, Counter] = defaultdict(Counter)
+
+    def registrar(self, endpoint: str, duracao: float, erro: Optional[str] = None):
+        self.latencias[endpoint].append(duracao)
+        if erro:
+            self.erros[endpoint][erro] += 1
+
+    def resumo(self, duracao: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint in sorted(self.latencias):
+            latencias = self.latencias[endpoint]
+            erros = sum(self.erros[endpoint].values())
+            endpoints[endpoint] = {
+                **resumir_latencias(latencias, duracao),
+                "erros": erros,
+                "taxa_erros": round(erros / len(latencias), 4),
+                "tipos_erro": dict(self.erros[endpoint]),
+            }
+
+        total = sum(len(latencias) for latencias in self.latencias.values())
+        erros = sum(resumo["erros"] for resumo in endpoints.values())
+        return {
+            "endpoints": endpoints,
+            "total": {
+                "requisicoes": total,
+                "por_segundo": round(total / duracao, 1) if duracao else None,
+                "erros": erros,
+                "taxa_erros": round(erros / total, 4) if total else 0.0,
+            },
+        }
+
+
+class GeradorCarga:
+    """
+    Usuários virtuais em laço fechado: cada um sorteia uma operação pela mistura,
+    espera a resposta e passa para a próxima
+
+    As mensagens do /chat seguem em sessões de `mensagens_por_sessao` interações;
+    as operações administrativas criam, atualizam e removem produtos CARGA*.
+    """
+
+    def __init__(self, url: str, args: argparse.Namespace):
+        self.url = url.rstrip("/")
+        self.args = args
+        self.mistura = interpretar_mistura(args.mistura)
+        self.consultas = gerar_consultas(2_000, args.semente)
+        self.mensagens = gerar_mensagens(2_000, args.pedidos, args.semente)
+        self.resultados = Resultados()
+        self.inicio_medicao = float("inf")
+        self._produtos_criados: List[str] = []
+        self._sequencia_produtos = 0
+
+        self._operacoes: Dict[str, Callable] = {
+            "chat": self._chat,
+            "stream": self._chat_stream,
+            "buscar": self._buscar,
+            "embedding": self._buscar_embedding,
+            "admin": self._admin,
+            "estatisticas": self._estatisticas,
+        }
+
+    async def _requisicao(self, cliente: httpx.AsyncClient, endpoint: str, metodo: str, caminho: str,
+                          **kwargs) -> Optional[Dict[str, Any]]:
+        """Executa e cronometra uma requisição; erro = exceção, status >= 400 ou sucesso=false"""
+        inicio = time.perf_counter()
+        corpo, erro = None, None
+        try:
+            resposta = await cliente.request(metodo, caminho, **kwargs)
+            if resposta.status_code >= 400:
+                erro = f"HTTP {resposta.status_code}"
+            else:
+                corpo = resposta.json()
+                if isinstance(corpo, dict) and corpo.get("sucesso") is False:
+                    erro = "sucesso=false"
+        except httpx.HTTPError as e:
+            erro = type(e).__name__
+        except ValueError:
+            erro = "JSON inválido"
+
+        if inicio >= self.inicio_medicao:
+            self.resultados.registrar(endpoint, time.perf_counter() - inicio, erro)
+        return corpo
+
+    async def _chat(self, cliente: httpx.AsyncClient, aleatorio: random.Random, estado: Dict[str, Any]):
+        corpo = await self._requisicao(cliente, "POST /chat", "POST", "/chat", json={
+            "mensagem": aleatorio.choice(self.mensagens), "id_sessao": self._sessao(estado),
+        })
+        if corpo:
+            estado["id_sessao"] = corpo.get("id_sessao")
+
+    async def _chat_stream(self, cliente: httpx.AsyncClient, aleatorio: random.Random, estado: Dict[str, Any]):
+        """Tempo até o evento "fim", cujo resultado decide o sucesso"""
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            async with cliente.stream("POST", "/chat/stream", json={
+                "mensagem": aleatorio.choice(self.mensagens), "id_sessao": self._sessao(estado),
+            }) as resposta:
+                if resposta.status_code >= 400:
+                    erro = f"HTTP {resposta.status_code}"
+                else:
+                    evento, resultado = None, None
+                    async for linha in resposta.aiter_lines():
+                        if linha.startswith("event: "):
+                            evento = linha[len("event: "):]
+                        elif linha.startswith("data: ") and evento == "fim":
+                            resultado = json.loads(linha[len("data: "):])
+                    if resultado is None:
+                        erro = "sem evento fim"
+                    elif resultado.get("sucesso") is False:
+                        erro = "sucesso=false"
+        except httpx.HTTPError as e:
+            erro = type(e).__name__
+        except ValueError:
+            erro = "JSON inválido"
+
+        if inicio >= self.inicio_medicao:
+            self.resultados.registrar("POST /chat/stream", time.perf_counter() - inicio, erro)
+
+    def _sessao(self, estado: Dict[str, Any]) -> str:
+        """Sessão atual do usuário virtual, renovada a cada `mensagens_por_sessao` mensagens"""
+        estado["mensagens"] = estado.get("mensagens", 0) + 1
+        if estado.get("id_sessao") is None or estado["mensagens"] > self.args.mensagens_por_sessao:
+            estado["id_sessao"] = str(uuid.uuid4())
+            estado["mensagens"] = 1
+        return estado["id_sessao"]
+
+    async def _buscar(self, cliente: httpx.AsyncClient, aleatorio: random.Random, estado: Dict[str, Any]):
+        parametros = {"q": aleatorio.choice(self.consultas), "top_k": 5}
+        if aleatorio.random() < 0.3:
+            parametros["categoria"] = aleatorio.choice(CATEGORIAS)
+        if aleatorio.random() < 0.3:
+            parametros["preco_max"] = aleatorio.choice([200, 500, 1000, 3000])
+        await self._requisicao(cliente, "GET /buscar", "GET", "/buscar", params=parametros)
+
+    async def _buscar_embedding(self, cliente: httpx.AsyncClient, aleatorio: random.Random,
+                                estado: Dict[str, Any]):
+        await self._requisicao(cliente, "GET /buscar/embedding", "GET", "/buscar/embedding", params={
+            "q": aleatorio.choice(self.consultas), "threshold": 0.5, "top_k": 5,
+        })
+
+    def _produto(self, produto_id: str, aleatorio: random.Random) -> Dict[str, Any]:
+        categoria = aleatorio.choice(CATEGORIAS)
+        return {
+            "id": produto_id,
+            "nome": f"Produto de carga {produto_id}",
+            "categoria": categoria,
+            "preco": round(aleatorio.uniform(19.9, 4999.9), 2),
+            "descricao": f"Produto temporário do teste de carga na categoria {categoria}",
+            "especificacoes": {"origem": "teste de carga"},
+            "disponivel": True,
+        }
+
+    async def _admin(self, cliente: httpx.AsyncClient, aleatorio: random.Random, estado: Dict[str, Any]):
+        """Cria produtos e depois atualiza ou remove os já criados"""
+        sorteio = aleatorio.random()
+        if not self._produtos_criados or sorteio < 0.4:
+            self._sequencia_produtos += 1
+            produto_id = f"CARGA{self._sequencia_produtos:06d}"
+            corpo = await self._requisicao(
+                cliente, "POST /admin/produto", "POST", "/admin/produto",
+                json=self._produto(produto_id, aleatorio)
+            )
+            if corpo:
+                self._produtos_criados.append(produto_id)
+        elif sorteio < 0.8:
+            produto_id = aleatorio.choice(self._produtos_criados)
+            await self._requisicao(
+                cliente, "PUT /admin/produto/{produto_id}", "PUT", f"/admin/produto/{produto_id}",
+                json=self._produto(produto_id, aleatorio)
+            )
+        else:
+            produto_id = self._produtos_criados.pop(aleatorio.randrange(len(self._produtos_criados)))
+            await self._requisicao(
+                cliente, "DELETE /admin/produto/{produto_id}", "DELETE", f"/admin/produto/{produto_id}"
+            )
+
+    async def _estatisticas(self, cliente: httpx.AsyncClient, aleatorio: random.Random, estado: Dict[str, Any]):
+        await self._requisicao(cliente, "GET /estatisticas", "GET", "/estatisticas")
+
+    async def _usuario(self, cliente: httpx.AsyncClient, indice: int, fim: float):
+        aleatorio = random.Random(self.args.semente * 1_000 + indice)
+        nomes = list(self.mistura)
+        pesos = list(self.mistura.values())
+        estado: Dict[str, Any] = {}
+        while time.perf_counter() < fim:
+            operacao = aleatorio.choices(nomes, weights=pesos)[0]
+            await self._operacoes[operacao](cliente, aleatorio, estado)
+
+    async def executar(self) -> Dict[str, Any]:
+        limites = httpx.Limits(max_connections=self.args.concorrencia, max_keepalive_connections=self.args.concorrencia)
+        async with httpx.AsyncClient(base_url=self.url, timeout=self.args.timeout, limits=limites) as cliente:
+            inicio = time.perf_counter()
+            self.inicio_medicao = inicio + self.args.aquecimento
+            fim = self.inicio_medicao + self.args.duracao
+            await asyncio.gather(*(self._usuario(cliente, i, fim) for i in range(self.args.concorrencia)))
+            # Requisições em andamento no fim da janela também entram na duração
+            duracao = time.perf_counter() - self.inicio_medicao
+
+        return {
+            "parametros": {
+                "url": self.url,
+                "concorrencia": self.args.concorrencia,
+                "duracao_s": self.args.duracao,
+                "aquecimento_s": self.args.aquecimento,
+                "mistura": {nome: peso for nome, peso in self.mistura.items() if peso},
+            },
+            "duracao_medida_s": round(duracao, 3),
+            **self.resultados.resumo(duracao),
+        }
+
+
+class AmbienteLocal:
+    """
+    OpenAI falsa e src.api:app em subprocessos, em um diretório de trabalho temporário
+
+    A API roda com uvicorn (opcionalmente com vários workers) sobre um catálogo
+    sintético ou uma cópia de --dados, apontada para a OpenAI falsa por
+    OPENAI_BASE_URL; os logs dos dois processos ficam no diretório de trabalho.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.diretorio = tempfile.mkdtemp(prefix="carga-assistente-")
+        self.porta_mock = args.porta_mock or porta_livre()
+        self.porta_api = args.porta_api or porta_livre()
+        self.url_mock = f"http://127.0.0.1:{self.porta_mock}"
+        self.url_api = f"http://127.0.0.1:{self.porta_api}"
+        self._processos: List[subprocess.Popen] = []
+
+    def _iniciar(self, nome: str, comando: List[str], ambiente: Dict[str, str]) -> subprocess.Popen:
+        log = open(os.path.join(self.diretorio, f"{nome}.log"), "w")
+        processo = subprocess.Popen(comando, cwd=self.diretorio, env=ambiente, stdout=log, stderr=subprocess.STDOUT)
+        self._processos.append(processo)
+        return processo
+
+    def _aguardar(self, nome: str, processo: subprocess.Popen, url: str):
+        """Espera o processo responder 200 em `url`"""
+        limite = time.monotonic() + self.args.timeout_inicializacao
+        while time.monotonic() < limite:
+            if processo.poll() is not None:
+                break
+            try:
+                if httpx.get(url, timeout=5).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{nome} não ficou pronto; veja {os.path.join(self.diretorio, nome + '.log')}")
+
+    def __enter__(self) -> "AmbienteLocal":
+        args = self.args
+        dados = os.path.join(self.diretorio, "data")
+        if args.dados:
+            os.makedirs(dados)
+            for arquivo in ("produtos.json", "pedidos.json", "politicas.md"):
+                shutil.copy(os.path.join(args.dados, arquivo), dados)
+        else:
+            preparar_diretorio(dados, args.produtos, args.pedidos, args.semente)
+
+        ambiente = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [RAIZ_PROJETO, os.getenv("PYTHONPATH")]))}
+        try:
+            mock = self._iniciar("mock_openai", [
+                sys.executable, "-m", "benchmarks.mock_openai",
+                "--porta", str(self.porta_mock),
+                "--latencia-chat-ms", str(args.latencia_chat_ms),
+                "--latencia-trecho-ms", str(args.latencia_trecho_ms),
+                "--latencia-embeddings-ms", str(args.latencia_embeddings_ms),
+                "--latencia-por-texto-ms", str(args.latencia_por_texto_ms),
+                "--variacao", str(args.variacao),
+                "--limite-chat-rps", str(args.limite_chat_rps),
+                "--limite-embeddings-rps", str(args.limite_embeddings_rps),
+                "--taxa-erros", str(args.taxa_erros),
+                "--dimensao", str(args.dimensao),
+                "--semente", str(args.semente),
+            ], ambiente)
+            self._aguardar("mock_openai", mock, f"{self.url_mock}/estatisticas")
+
+            ambiente_api = {
+                **ambiente,
+                "OPENAI_API_KEY": "chave-falsa",
+                "OPENAI_BASE_URL": f"{self.url_mock}/v1",
+                # O tiktoken baixa o vocabulário no primeiro uso; a OpenAI falsa aceita texto
+                "EMBEDDINGS_VERIFICAR_TAMANHO": "true" if args.tokenizar_embeddings else "false",
+            }
+            ambiente_api.pop("PINECONE_API_KEY", None)
+            for variavel in args.env:
+                chave, _, valor = variavel.partition("=")
+                ambiente_api[chave] = valor
+
+            api = self._iniciar("api", [
+                sys.executable, "-m", "uvicorn", "src.api:app",
+                "--host", "127.0.0.1", "--port", str(self.porta_api),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ], ambiente_api)
+            self._aguardar("api", api, f"{self.url_api}/health")
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def estatisticas_mock(self) -> Dict[str, Any]:
+        return httpx.get(f"{self.url_mock}/estatisticas", timeout=10).json()
+
+    def __exit__(self, *excecao):
+        for processo in reversed(self._processos):
+            processo.terminate()
+            try:
+                processo.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+        if self.args.manter:
+            print(f"Diretório de trabalho mantido em {self.diretorio}", file=sys.stderr)
+        else:
+            shutil.rmtree(self.diretorio, ignore_errors=True)
+
+
+def imprimir_resultado(resultado: Dict[str, Any]):
+    """Relatório legível no terminal"""
+    parametros = resultado["parametros"]
+    print(f"\n🎯 {parametros['url']}: concorrência {parametros['concorrencia']}, "
+          f"{resultado['duracao_medida_s']} s medidos (aquecimento {parametros['aquecimento_s']} s)")
+    print(f"   mistura: {', '.join(f'{nome}={peso:g}' for nome, peso in parametros['mistura'].items())}")
+
+    print(f"\n   {'endpoint':<36}{'req':>7}{'por s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'erros':>8}")
+    for endpoint, resumo in resultado["endpoints"].items():
+        print(f"   {endpoint:<36}{resumo['total']:>7}{resumo['por_segundo']:>8}{resumo['p50_ms']:>9}"
+              f"{resumo['p95_ms']:>9}{resumo['p99_ms']:>9}{resumo['taxa_erros']:>8.1%}")
+        if resumo["tipos_erro"]:
+            print(f"   {'':<36}{', '.join(f'{tipo}: {n}' for tipo, n in resumo['tipos_erro'].items())}")
+
+    total = resultado["total"]
+    print(f"\n📈 Total: {total['requisicoes']} requisições, {total['por_segundo']} req/s, "
+          f"erros {total['taxa_erros']:.1%}")
+
+    if "openai_falsa" in resultado:
+        for rota, contadores in resultado["openai_falsa"].items():
+            print(f"🤖 OpenAI falsa /{rota}: {contadores.get('requisicoes', 0)} chamadas, "
+                  f"{contadores.get('limitadas', 0)} limitadas (429), {contadores.get('erros', 0)} falhas (500)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API do assistente")
+    parser.add_argument("--url", help="API já no ar (ex: homologação); se omitida, sobe a OpenAI falsa "
+                                      "e src.api:app localmente")
+    parser.add_argument("--concorrencia", type=int, default=16, help="Usuários virtuais simultâneos")
+    parser.add_argument("--duracao", type=float, default=30.0, help="Segundos de medição")
+    parser.add_argument("--aquecimento", type=float, default=5.0, help="Segundos iniciais descartados")
+    parser.add_argument("--mistura", default=",".join(f"{nome}={peso}" for nome, peso in MISTURA_PADRAO.items()),
+                        help=f"Pesos das operações ({', '.join(MISTURA_PADRAO)})")
+    parser.add_argument("--mensagens-por-sessao", type=int, default=5, help="Mensagens do /chat por sessão")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout de cada requisição (s)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--json", help="Grava o resultado completo neste arquivo")
+
+    local = parser.add_argument_group("ambiente local (sem --url)")
+    local.add_argument("--produtos", type=int, default=2_000, help="Produtos do catálogo sintético")
+    local.add_argument("--pedidos", type=int, default=1_000, help="Pedidos sintéticos")
+    local.add_argument("--dados", help="Copia produtos, pedidos e políticas deste diretório em vez de "
+                                       "gerar o catálogo sintético")
+    local.add_argument("--workers", type=int, default=1, help="Workers do uvicorn")
+    local.add_argument("--env", action="append", default=[], metavar="CHAVE=VALOR",
+                       help="Variável de ambiente extra da API (ex: INDICE_PRODUTOS=hnsw_sq); repetível")
+    local.add_argument("--porta-api", type=int, help="Porta da API (padrão: livre)")
+    local.add_argument("--porta-mock", type=int, help="Porta da OpenAI falsa (padrão: livre)")
+    local.add_argument("--timeout-inicializacao", type=float, default=300.0,
+                       help="Segundos para a API indexar o catálogo e responder /health")
+    local.add_argument("--manter", action="store_true", help="Não apaga o diretório de trabalho (e os logs)")
+    local.add_argument("--tokenizar-embeddings", action="store_true",
+                       help="Mantém a tokenização com tiktoken antes dos embeddings (requer o vocabulário)")
+
+    falsa = parser.add_argument_group("OpenAI falsa (sem --url)")
+    falsa.add_argument("--latencia-chat-ms", type=float, default=300.0)
+    falsa.add_argument("--latencia-trecho-ms", type=float, default=10.0)
+    falsa.add_argument("--latencia-embeddings-ms", type=float, default=80.0)
+    falsa.add_argument("--latencia-por-texto-ms", type=float, default=0.2)
+    falsa.add_argument("--variacao", type=float, default=0.2, help="Variação aleatória das latências (fração)")
+    falsa.add_argument("--limite-chat-rps", type=float, default=0.0, help="Limite antes de responder 429 (0 = sem)")
+    falsa.add_argument("--limite-embeddings-rps", type=float, default=0.0)
+    falsa.add_argument("--taxa-erros", type=float, default=0.0, help="Fração de respostas 500")
+    falsa.add_argument("--dimensao", type=int, default=1536, help="Dimensão dos embeddings")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        interpretar_mistura(args.mistura)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.url:
+        resultado = asyncio.run(GeradorCarga(args.url, args).executar())
+    else:
+        with AmbienteLocal(args) as ambiente:
+            inicial = ambiente.estatisticas_mock()
+            resultado = asyncio.run(GeradorCarga(ambiente.url_api, args).executar())
+            final = ambiente.estatisticas_mock()
+        # Só as chamadas feitas durante a carga (sem a indexação inicial)
+        resultado["openai_falsa"] = {
+            rota: {chave: valor - inicial.get(rota, {}).get(chave, 0) for chave, valor in contadores.items()}
+            for rota, contadores in final.items()
+        }
+
+    imprimir_resultado(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
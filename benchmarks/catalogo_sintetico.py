@@ -0,0 +1,211 @@
+"""
+Catálogo sintético para benchmarks
+Gera produtos, pedidos e mensagens no formato de data/ em qualquer escala
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List
+
+DIRETORIO_DADOS_ORIGINAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# categoria -> (tipos de produto, marcas, características)
+VOCABULARIO = {
+    "Eletrônicos": (
+        ["Notebook", "Smartphone", "Smart TV", "Fone de Ouvido", "Tablet", "Monitor", "Caixa de Som", "Smartwatch"],
+        ["Dell", "Samsung", "LG", "Apple", "Lenovo", "Xiaomi", "Sony", "Motorola", "Acer", "JBL"],
+        ["tela grande", "bateria duradoura", "leve", "para programar", "para jogos", "sem fio", "5g", "4k"],
+    ),
+    "Casa e Cozinha": (
+        ["Cafeteira", "Air Fryer", "Liquidificador", "Aspirador de Pó", "Panela Elétrica", "Micro-ondas"],
+        ["Philips", "Electrolux", "Mondial", "Britânia", "Oster", "Arno", "Tramontina"],
+        ["fácil de limpar", "compacto", "silencioso", "inox", "econômico", "programável"],
+    ),
+    "Esportes e Fitness": (
+        ["Tênis de Corrida", "Bicicleta", "Halteres", "Tapete de Yoga", "Esteira", "Bola de Futebol"],
+        ["Nike", "Adidas", "Asics", "Caloi", "Mizuno", "Puma", "Olympikus"],
+        ["amortecimento", "resistente", "ajustável", "para iniciantes", "profissional", "dobrável"],
+    ),
+    "Livros": (
+        ["Livro de Ficção", "Livro de Programação", "Livro de Receitas", "Biografia", "Livro Infantil"],
+        ["Companhia das Letras", "Rocco", "Intrínseca", "Novatec", "Sextante"],
+        ["capa dura", "edição de bolso", "best-seller", "ilustrado", "edição comentada"],
+    ),
+    "Roupas e Acessórios": (
+        ["Camiseta", "Jaqueta", "Calça Jeans", "Mochila", "Relógio", "Óculos de Sol", "Tênis Casual"],
+        ["Hering", "Levi's", "Reserva", "Oakley", "Casio", "Vans", "Colcci"],
+        ["algodão", "impermeável", "unissex", "slim", "casual", "confortável"],
+    ),
+}
+
+CATEGORIAS = list(VOCABULARIO)
+
+STATUS_PEDIDO = ["Processando", "Enviado", "Em trânsito", "Entregue", "Cancelado"]
+
+PERGUNTAS_POLITICAS = [
+    "Como faço para trocar um produto?", "Qual o prazo de entrega?", "Qual a política de devolução?",
+    "O frete é grátis?", "Quanto tempo tenho de garantia?", "Posso devolver um produto usado?",
+]
+
+SAUDACOES = ["Oi", "Olá, tudo bem?", "Bom dia", "Boa tarde, preciso de ajuda"]
+
+PEDIDOS_RECOMENDACAO = [
+    "O que vocês recomendam?", "Me sugere um presente", "Quais os produtos populares?",
+    "Recomenda algo de {categoria}?",
+]
+
+
+def gerar_produtos(quantidade: int, semente: int = 42) -> Iterator[Dict[str, Any]]:
+    """Produtos no formato de produtos.json, com IDs PROD0000001 em diante"""
+    aleatorio = random.Random(semente)
+    for i in range(quantidade):
+        categoria = aleatorio.choice(CATEGORIAS)
+        tipos, marcas, caracteristicas = VOCABULARIO[categoria]
+        tipo = aleatorio.choice(tipos)
+        marca = aleatorio.choice(marcas)
+        modelo = f"{aleatorio.choice('ABCDEGKMSXZ')}{aleatorio.randint(10, 9999)}"
+        escolhidas = aleatorio.sample(caracteristicas, k=min(3, len(caracteristicas)))
+
+        yield {
+            "id": f"PROD{i + 1:07d}",
+            "nome": f"{tipo} {marca} {modelo}",
+            "categoria": categoria,
+            "preco": round(aleatorio.uniform(19.9, 9999.9), 2),
+            "descricao": (
+                f"{tipo} da {marca} modelo {modelo}. Ideal para quem procura "
+                f"{', '.join(escolhidas)}, com ótimo custo-benefício."
+            ),
+            "especificacoes": {
+                "modelo": modelo,
+                "garantia": f"{aleatorio.choice([3, 6, 12, 24])} meses",
+                "peso": f"{aleatorio.uniform(0.1, 20):.2f}kg",
+            },
+            "caracteristicas": escolhidas,
+            "disponivel": aleatorio.random() > 0.1,
+            "avaliacao": round(aleatorio.uniform(3.0, 5.0), 1),
+            "marca": marca,
+        }
+
+
+def gerar_pedidos(quantidade: int, total_produtos: int, semente: int = 42) -> Iterator[Dict[str, Any]]:
+    """Pedidos no formato de pedidos.json, numerados a partir de 100000"""
+    aleatorio = random.Random(semente + 1)
+    for i in range(quantidade):
+        itens = []
+        for _ in range(aleatorio.randint(1, 3)):
+            numero = aleatorio.randint(1, max(total_produtos, 1))
+            itens.append({
+                "id": f"PROD{numero:07d}",
+                "nome": f"Produto {numero}",
+                "quantidade": aleatorio.randint(1, 2),
+                "preco_unitario": round(aleatorio.uniform(19.9, 9999.9), 2),
+            })
+        numero_pedido = str(100000 + i)
+        yield {
+            "pedido_id": numero_pedido,
+            "status": aleatorio.choice(STATUS_PEDIDO),
+            "produtos": itens,
+            "data_compra": "2024-01-15",
+            "data_envio": "2024-01-16",
+            "previsao_entrega": "2024-01-20",
+            "valor_total": round(sum(item["quantidade"] * item["preco_unitario"] for item in itens), 2),
+            "frete": 0.0,
+            "forma_pagamento": "Cartão de crédito",
+            "codigo_rastreamento": f"BR{i:09d}SP",
+            "transportadora": "Correios",
+            "cliente": {
+                "nome": f"Cliente {i}",
+                "email": f"cliente{i}@exemplo.com",
+                "telefone": "(11) 99999-9999",
+            },
+        }
+
+
+def gerar_consultas(quantidade: int, semente: int = 42) -> List[str]:
+    """Consultas de busca de produtos com o vocabulário do catálogo sintético"""
+    aleatorio = random.Random(semente + 2)
+    consultas = []
+    for _ in range(quantidade):
+        categoria = aleatorio.choice(CATEGORIAS)
+        tipos, marcas, caracteristicas = VOCABULARIO[categoria]
+        partes = [aleatorio.choice(["Quero", "Procuro", "Tem"]), aleatorio.choice(tipos).lower()]
+        if aleatorio.random() < 0.5:
+            partes.append(aleatorio.choice(marcas))
+        if aleatorio.random() < 0.5:
+            partes.append(aleatorio.choice(caracteristicas))
+        if aleatorio.random() < 0.3:
+            partes.append(f"até R$ {aleatorio.choice([200, 500, 1000, 3000, 5000])}")
+        consultas.append(" ".join(partes))
+    return consultas
+
+
+def gerar_mensagens(quantidade: int, total_pedidos: int, semente: int = 42) -> List[str]:
+    """Mensagens de chat misturando as intenções na proporção típica de um e-commerce"""
+    aleatorio = random.Random(semente + 3)
+    consultas = gerar_consultas(quantidade, semente)
+    mensagens = []
+    for i in range(quantidade):
+        sorteio = aleatorio.random()
+        if sorteio < 0.5:
+            mensagens.append(consultas[i])
+        elif sorteio < 0.65 and total_pedidos:
+            mensagens.append(f"Cadê meu pedido #{100000 + aleatorio.randrange(total_pedidos)}?")
+        elif sorteio < 0.8:
+            mensagens.append(aleatorio.choice(PERGUNTAS_POLITICAS))
+        elif sorteio < 0.92:
+            mensagens.append(aleatorio.choice(PEDIDOS_RECOMENDACAO).format(categoria=aleatorio.choice(CATEGORIAS)))
+        else:
+            mensagens.append(aleatorio.choice(SAUDACOES))
+    return mensagens
+
+
+def _gravar_lista_json(caminho: str, itens: Iterable[Dict[str, Any]]) -> int:
+    """Grava uma lista JSON item a item, sem montá-la inteira na memória"""
+    total = 0
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("[")
+        for item in itens:
+            f.write(",\n" if total else "\n")
+            json.dump(item, f, ensure_ascii=False)
+            total += 1
+        f.write("\n]\n")
+    return total
+
+
+def preparar_diretorio(destino: str, produtos: int, pedidos: int = 1_000, semente: int = 42) -> Dict[str, int]:
+    """
+    Cria um diretório de dados sintético (produtos.json, pedidos.json, politicas.md)
+
+    As políticas são as do projeto; índices e caches são criados pelo sistema
+    na primeira inicialização.
+
+    Returns:
+        Quantidade de produtos e pedidos gravados
+    """
+    os.makedirs(destino, exist_ok=True)
+    shutil.copy(os.path.join(DIRETORIO_DADOS_ORIGINAL, "politicas.md"), destino)
+    return {
+        "produtos": _gravar_lista_json(os.path.join(destino, "produtos.json"), gerar_produtos(produtos, semente)),
+        "pedidos": _gravar_lista_json(
+            os.path.join(destino, "pedidos.json"), gerar_pedidos(pedidos, produtos, semente)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um diretório de dados sintético para benchmarks")
+    parser.add_argument("destino", help="Diretório de saída")
+    parser.add_argument("--produtos", type=int, default=10_000, help="Produtos no catálogo")
+    parser.add_argument("--pedidos", type=int, default=1_000, help="Pedidos")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    totais = preparar_diretorio(args.destino, args.produtos, args.pedidos, args.semente)
+    print(f"{totais['produtos']} produtos e {totais['pedidos']} pedidos gravados em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
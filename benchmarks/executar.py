@@ -0,0 +1,300 @@
+"""
+Benchmark offline do assistente virtual
+Inicialização, construção dos índices, latência das buscas, vazão do /chat e memória
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from src import api
+from src.assistente import AssistenteVirtual
+from src.rag_system import MODOS_BUSCA, TIPOS_INDICE, RAGSystem
+
+from .catalogo_sintetico import CATEGORIAS, gerar_consultas, gerar_mensagens, preparar_diretorio
+from .modelos_falsos import ChatDeterministico, EmbeddingsDeterministicos
+
+logger = logging.getLogger(__name__)
+
+
+def resumir_latencias(latencias: List[float], duracao: Optional[float] = None) -> Dict[str, Any]:
+    """Percentis (em ms) de uma lista de latências em segundos e a vazão, se houver duração"""
+    if not latencias:
+        return {"total": 0}
+    ms = np.asarray(latencias) * 1000
+    resumo = {
+        "total": len(latencias),
+        "media_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+    if duracao:
+        resumo["por_segundo"] = round(len(latencias) / duracao, 1)
+    return resumo
+
+
+def memoria_mb() -> Dict[str, Optional[float]]:
+    """Memória residente atual e pico do processo (Linux)"""
+    atual = None
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    atual = round(int(linha.split()[1]) / 1024, 1)
+                    break
+    except OSError:
+        pass
+    return {"rss_mb": atual, "pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+class BenchmarkOffline:
+    """
+    Executa as etapas do benchmark sobre um diretório de dados (sintético ou não)
+
+    Usa EmbeddingsDeterministicos e ChatDeterministico no lugar da OpenAI, então
+    roda sem rede e sem chave; as latências artificiais dos modelos permitem
+    simular a API real.
+    """
+
+    def __init__(self, diretorio: str, args: argparse.Namespace):
+        self.diretorio = diretorio
+        self.args = args
+        self.resultado: Dict[str, Any] = {"parametros": vars(args).copy()}
+
+    def _embeddings(self) -> EmbeddingsDeterministicos:
+        return EmbeddingsDeterministicos(
+            dimensao=self.args.dimensao,
+            latencia_ms=self.args.latencia_embeddings_ms,
+            latencia_por_texto_ms=self.args.latencia_embeddings_texto_ms,
+        )
+
+    def _opcoes_rag(self, embeddings: EmbeddingsDeterministicos) -> Dict[str, Any]:
+        return {
+            "diretorio_dados": self.diretorio,
+            "embeddings": embeddings,
+            "tipo_indice": self.args.indice,
+            "janela_lote_consultas_ms": self.args.janela_lote_ms,
+        }
+
+    def medir_indexacao(self):
+        """Primeira inicialização: gera os embeddings de todo o catálogo e constrói os índices"""
+        embeddings = self._embeddings()
+        inicio = time.perf_counter()
+        rag = RAGSystem(openai_api_key="offline", reutilizar_indices=False, **self._opcoes_rag(embeddings))
+        duracao = time.perf_counter() - inicio
+        self.resultado["indexacao"] = {
+            "produtos": len(rag.catalogo),
+            "construcao_s": round(duracao, 3),
+            "textos_embeddings": embeddings.textos,
+            **memoria_mb(),
+        }
+        rag.fechar()
+
+    def iniciar_assistente(self) -> AssistenteVirtual:
+        """Inicialização com os índices já salvos (caso comum de um worker novo)"""
+        embeddings = self._embeddings()
+        llm = ChatDeterministico(
+            latencia_ms=self.args.latencia_llm_ms,
+            latencia_trecho_ms=self.args.latencia_llm_trecho_ms,
+            categorias=CATEGORIAS,
+        )
+        inicio = time.perf_counter()
+        assistente = AssistenteVirtual(
+            openai_api_key="offline",
+            llm=llm,
+            diretorio_dados=self.diretorio,
+            cache_respostas=not self.args.sem_cache_respostas,
+            opcoes_rag=self._opcoes_rag(embeddings),
+        )
+        duracao = time.perf_counter() - inicio
+        self.resultado["inicializacao"] = {
+            "duracao_s": round(duracao, 3),
+            # Deve ficar perto de zero: só os exemplos do classificador de intenção
+            "textos_embeddings": embeddings.textos,
+            **memoria_mb(),
+        }
+        return assistente
+
+    def medir_buscas(self, rag: RAGSystem):
+        """Latência das buscas de produtos por modo, com os embeddings das consultas já em cache"""
+        consultas = gerar_consultas(self.args.consultas, self.args.semente)
+
+        # Embedding de cada consulta (cache frio), medido à parte das buscas
+        latencias = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            rag.embed_consulta(consulta)
+            latencias.append(time.perf_counter() - inicio)
+        buscas = {"embedding_consulta": resumir_latencias(latencias)}
+
+        execucoes = {
+            **{modo: lambda consulta, modo=modo: rag.buscar_produtos(consulta, top_k=5, modo=modo)
+               for modo in MODOS_BUSCA},
+            "filtrada": lambda consulta: rag.buscar_produtos_avancada(
+                consulta, filtros={"categoria": CATEGORIAS[len(consulta) % len(CATEGORIAS)], "preco_max": 3000},
+                top_k=5
+            ),
+            "por_embedding": lambda consulta: rag.buscar_por_embedding(consulta, top_k=10, threshold=0.0),
+        }
+        for nome, buscar in execucoes.items():
+            latencias = []
+            inicio_total = time.perf_counter()
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                buscar(consulta)
+                latencias.append(time.perf_counter() - inicio)
+            buscas[nome] = resumir_latencias(latencias, time.perf_counter() - inicio_total)
+
+        self.resultado["buscas"] = buscas
+
+    async def medir_chat(self, assistente: AssistenteVirtual):
+        """Vazão e latência do POST /chat (aplicação FastAPI em processo, sem rede)"""
+        api.assistente = assistente
+        mensagens = gerar_mensagens(self.args.mensagens, assistente.pedidos.contar(), self.args.semente)
+        sessoes = [uuid.uuid4().hex for _ in range(max(self.args.mensagens // 5, 1))]
+        semaforo = asyncio.Semaphore(self.args.concorrencia)
+        latencias: List[float] = []
+        erros = 0
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app),
+                                     base_url="http://benchmark", timeout=None) as cliente:
+            async def enviar(i: int, mensagem: str):
+                nonlocal erros
+                async with semaforo:
+                    inicio = time.perf_counter()
+                    resposta = await cliente.post(
+                        "/chat", json={"mensagem": mensagem, "id_sessao": sessoes[i % len(sessoes)]}
+                    )
+                    latencias.append(time.perf_counter() - inicio)
+                    if resposta.status_code != 200 or not resposta.json().get("sucesso"):
+                        erros += 1
+
+            inicio_total = time.perf_counter()
+            await asyncio.gather(*(enviar(i, mensagem) for i, mensagem in enumerate(mensagens)))
+            duracao = time.perf_counter() - inicio_total
+
+        self.resultado["chat"] = {
+            "concorrencia": self.args.concorrencia,
+            "duracao_s": round(duracao, 3),
+            "erros": erros,
+            **resumir_latencias(latencias, duracao),
+            "intencoes": {
+                intencao: int(total) for intencao, total in assistente.metricas.contador("intencoes").items()
+            },
+            "chamadas_llm": int(sum(assistente.metricas.contador("chamadas_llm").values())),
+            **memoria_mb(),
+        }
+
+    def executar(self) -> Dict[str, Any]:
+        self.medir_indexacao()
+        assistente = self.iniciar_assistente()
+        try:
+            self.medir_buscas(assistente.rag_system)
+            asyncio.run(self.medir_chat(assistente))
+        finally:
+            api.assistente = None
+            assistente.rag_system.fechar()
+            assistente.sessoes.fechar()
+        self.resultado["memoria"] = memoria_mb()
+        return self.resultado
+
+
+def imprimir_resultado(resultado: Dict[str, Any]):
+    """Relatório legível no terminal"""
+    indexacao = resultado["indexacao"]
+    inicializacao = resultado["inicializacao"]
+    print(f"\n📦 Catálogo: {indexacao['produtos']} produtos ({resultado['parametros']['indice']}, "
+          f"dimensão {resultado['parametros']['dimensao']})")
+    if "catalogo" in resultado:
+        print(f"   Geração do catálogo sintético: {resultado['catalogo']['geracao_s']} s")
+    print(f"🏗️  Construção dos índices: {indexacao['construcao_s']} s (pico {indexacao['pico_mb']} MB)")
+    print(f"🚀 Inicialização com índices salvos: {inicializacao['duracao_s']} s "
+          f"(RSS {inicializacao['rss_mb']} MB)")
+
+    print("\n🔍 Buscas (ms)")
+    print(f"   {'etapa':<20}{'p50':>10}{'p95':>10}{'p99':>10}{'por s':>10}")
+    for nome, resumo in resultado["buscas"].items():
+        print(f"   {nome:<20}{resumo['p50_ms']:>10}{resumo['p95_ms']:>10}{resumo['p99_ms']:>10}"
+              f"{resumo.get('por_segundo', '-'):>10}")
+
+    chat = resultado["chat"]
+    print(f"\n💬 /chat: {chat['total']} mensagens, concorrência {chat['concorrencia']}, "
+          f"{chat['por_segundo']} msg/s, erros {chat['erros']}")
+    print(f"   p50 {chat['p50_ms']} ms | p95 {chat['p95_ms']} ms | p99 {chat['p99_ms']} ms | "
+          f"chamadas ao LLM {chat['chamadas_llm']}")
+    print(f"\n🧠 Memória: RSS {resultado['memoria']['rss_mb']} MB, pico {resultado['memoria']['pico_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do assistente (sem OpenAI)")
+    parser.add_argument("--produtos", type=int, default=10_000, help="Produtos do catálogo sintético")
+    parser.add_argument("--pedidos", type=int, default=1_000, help="Pedidos sintéticos")
+    parser.add_argument("--dados", help="Copia produtos, pedidos e políticas deste diretório (ex: data) "
+                                        "em vez de gerar o catálogo sintético")
+    parser.add_argument("--manter", action="store_true", help="Não apaga o diretório de trabalho ao final")
+    parser.add_argument("--dimensao", type=int, default=1536, help="Dimensão dos embeddings falsos")
+    parser.add_argument("--indice", choices=TIPOS_INDICE, default="flat", help="Tipo do índice de produtos")
+    parser.add_argument("--consultas", type=int, default=500, help="Consultas por modo de busca")
+    parser.add_argument("--mensagens", type=int, default=300, help="Mensagens enviadas ao /chat")
+    parser.add_argument("--concorrencia", type=int, default=16, help="Mensagens simultâneas no /chat")
+    parser.add_argument("--latencia-embeddings-ms", type=float, default=0.0, help="Latência por chamada de embeddings")
+    parser.add_argument("--latencia-embeddings-texto-ms", type=float, default=0.0,
+                        help="Latência adicional por texto embeddado")
+    parser.add_argument("--latencia-llm-ms", type=float, default=0.0, help="Latência por chamada ao LLM")
+    parser.add_argument("--latencia-llm-trecho-ms", type=float, default=0.0,
+                        help="Latência por trecho nas respostas transmitidas")
+    parser.add_argument("--janela-lote-ms", type=float, default=5.0,
+                        help="Janela de agrupamento dos embeddings de consultas (0 desativa)")
+    parser.add_argument("--sem-cache-respostas", action="store_true", help="Desativa o cache semântico de respostas")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--json", help="Grava o resultado completo neste arquivo")
+    parser.add_argument("--verboso", action="store_true", help="Mantém os logs INFO do sistema")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verboso else logging.WARNING)
+
+    # Sempre em um diretório de trabalho próprio: os índices gerados com os
+    # embeddings falsos nunca substituem os de um diretório real
+    diretorio = tempfile.mkdtemp(prefix="benchmark-assistente-")
+    catalogo = None
+    if args.dados:
+        for arquivo in ("produtos.json", "pedidos.json", "politicas.md"):
+            shutil.copy(os.path.join(args.dados, arquivo), diretorio)
+    else:
+        inicio = time.perf_counter()
+        totais = preparar_diretorio(diretorio, args.produtos, args.pedidos, args.semente)
+        catalogo = {**totais, "geracao_s": round(time.perf_counter() - inicio, 3)}
+
+    try:
+        benchmark = BenchmarkOffline(diretorio, args)
+        if catalogo:
+            benchmark.resultado["catalogo"] = catalogo
+        resultado = benchmark.executar()
+    finally:
+        if args.manter:
+            print(f"Diretório de trabalho mantido em {diretorio}", file=sys.stderr)
+        else:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    imprimir_resultado(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Servidor falso da API da OpenAI para testes de carga
+Emula /v1/chat/completions (com stream) e /v1/embeddings com os modelos
+determinísticos, latência artificial, limite de requisições (429) e falhas (500)
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from .catalogo_sintetico import CATEGORIAS
+from .modelos_falsos import ChatDeterministico, EmbeddingsDeterministicos
+
+_MENSAGENS = {"system": SystemMessage, "developer": SystemMessage, "assistant": AIMessage}
+
+
+class LimiteTaxa:
+    """
+    Balde de fichas: `por_segundo` requisições por segundo, com rajadas de até `rajada`
+
+    Usado apenas no event loop do servidor, por isso dispensa trava.
+    """
+
+    def __init__(self, por_segundo: float, rajada: Optional[float] = None):
+        self.por_segundo = por_segundo
+        self.capacidade = rajada or max(por_segundo, 1.0)
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+
+    def consumir(self) -> float:
+        """Consome uma ficha; devolve 0 se liberado ou os segundos até a próxima ficha"""
+        agora = time.monotonic()
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.por_segundo)
+        self._ultimo = agora
+        if self._fichas >= 1:
+            self._fichas -= 1
+            return 0.0
+        return (1 - self._fichas) / self.por_segundo
+
+
+def _erro(status: int, mensagem: str, tipo: str, codigo: str, espera: Optional[float] = None) -> JSONResponse:
+    """Erro no formato da API da OpenAI (o cliente oficial respeita retry-after-ms nos 429)"""
+    cabecalhos = {}
+    if espera is not None:
+        cabecalhos = {"retry-after-ms": str(int(espera * 1000) + 1), "retry-after": str(max(int(espera), 1))}
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": mensagem, "type": tipo, "param": None, "code": codigo}},
+        headers=cabecalhos
+    )
+
+
+def _conteudo(mensagem: Dict[str, Any]) -> str:
+    """Texto de uma mensagem do chat (string ou lista de partes)"""
+    conteudo = mensagem.get("content") or ""
+    if isinstance(conteudo, list):
+        return " ".join(parte.get("text", "") for parte in conteudo if isinstance(parte, dict))
+    return str(conteudo)
+
+
+def _converter_mensagens(mensagens: List[Dict[str, Any]]) -> List[BaseMessage]:
+    return [_MENSAGENS.get(mensagem.get("role"), HumanMessage)(content=_conteudo(mensagem)) for mensagem in mensagens]
+
+
+def _textos_embeddings(entrada: Any) -> List[str]:
+    """
+    Textos do campo `input`: string, lista de strings ou tokens (lista de inteiros
+    ou de listas de inteiros, como o OpenAIEmbeddings envia após o tiktoken)
+    """
+    if isinstance(entrada, str):
+        return [entrada]
+    if not entrada:
+        return []
+    if all(isinstance(item, int) for item in entrada):
+        entrada = [entrada]
+    # Cada token vira uma "palavra": tokens iguais continuam aproximando os textos
+    return [item if isinstance(item, str) else " ".join(f"t{token}" for token in item) for item in entrada]
+
+
+def criar_app(latencia_chat_ms: float = 0.0, latencia_trecho_ms: float = 0.0,
+              latencia_embeddings_ms: float = 0.0, latencia_por_texto_ms: float = 0.0,
+              variacao: float = 0.0, limite_chat_rps: float = 0.0, limite_embeddings_rps: float = 0.0,
+              taxa_erros: float = 0.0, palavras_resposta: int = 60, dimensao: int = 1536,
+              semente: int = 42) -> FastAPI:
+    """
+    Cria a aplicação que emula a API da OpenAI
+
+    Args:
+        latencia_chat_ms: Espera até a resposta do chat (ou até o primeiro trecho, com stream)
+        latencia_trecho_ms: Espera entre os trechos das respostas transmitidas
+        latencia_embeddings_ms: Espera fixa por chamada de embeddings
+        latencia_por_texto_ms: Espera adicional por texto da chamada de embeddings
+        variacao: Fração de variação aleatória das latências (0.2 = ±20%)
+        limite_chat_rps: Requisições por segundo aceitas no chat antes de responder 429 (0 = sem limite)
+        limite_embeddings_rps: Idem para embeddings
+        taxa_erros: Fração das requisições respondidas com 500
+        palavras_resposta: Palavras de cada resposta final do chat
+        dimensao: Dimensão dos embeddings
+        semente: Semente dos embeddings e das falhas sorteadas
+    """
+    app = FastAPI(title="OpenAI falsa")
+    chat = ChatDeterministico(palavras_resposta=palavras_resposta, categorias=CATEGORIAS)
+    embeddings = EmbeddingsDeterministicos(dimensao=dimensao, semente=semente)
+    aleatorio = random.Random(semente)
+    limites = {
+        "chat": LimiteTaxa(limite_chat_rps) if limite_chat_rps > 0 else None,
+        "embeddings": LimiteTaxa(limite_embeddings_rps) if limite_embeddings_rps > 0 else None,
+    }
+    estatisticas = {"chat": Counter(), "embeddings": Counter()}
+
+    def espera(milissegundos: float) -> float:
+        return milissegundos * (1 + aleatorio.uniform(-variacao, variacao)) / 1000
+
+    def admitir(rota: str) -> Optional[JSONResponse]:
+        """Aplica limite de taxa e falhas sorteadas; devolve a resposta de erro, se houver"""
+        estatisticas[rota]["requisicoes"] += 1
+        limite = limites[rota]
+        if limite is not None:
+            tempo_restante = limite.consumir()
+            if tempo_restante:
+                estatisticas[rota]["limitadas"] += 1
+                return _erro(429, "Rate limit reached (simulado)", "requests", "rate_limit_exceeded", tempo_restante)
+        if taxa_erros and aleatorio.random() < taxa_erros:
+            estatisticas[rota]["erros"] += 1
+            return _erro(500, "Falha simulada", "server_error", "server_error")
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        corpo = await request.json()
+        erro = admitir("chat")
+        if erro is not None:
+            return erro
+
+        mensagens = _converter_mensagens(corpo.get("messages", []))
+        resposta = chat._responder(mensagens)
+        uso = chat._uso(mensagens, resposta)
+        uso_openai = {
+            "prompt_tokens": uso["input_tokens"],
+            "completion_tokens": uso["output_tokens"],
+            "total_tokens": uso["total_tokens"],
+        }
+        estatisticas["chat"]["tokens_entrada"] += uso["input_tokens"]
+        estatisticas["chat"]["tokens_saida"] += uso["output_tokens"]
+        modelo = corpo.get("model", "gpt-3.5-turbo")
+        identificador = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        criado = int(time.time())
+
+        await asyncio.sleep(espera(latencia_chat_ms))
+
+        if not corpo.get("stream"):
+            return {
+                "id": identificador,
+                "object": "chat.completion",
+                "created": criado,
+                "model": modelo,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": resposta},
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }],
+                "usage": uso_openai,
+            }
+
+        incluir_uso = bool((corpo.get("stream_options") or {}).get("include_usage"))
+
+        def trecho(delta: Dict[str, Any], fim: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": identificador,
+                "object": "chat.completion.chunk",
+                "created": criado,
+                "model": modelo,
+                "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": fim}],
+            }, ensure_ascii=False) + "\n\n"
+
+        async def transmitir():
+            yield trecho({"role": "assistant", "content": ""})
+            for indice, palavra in enumerate(resposta.split(" ")):
+                if indice:
+                    await asyncio.sleep(espera(latencia_trecho_ms))
+                yield trecho({"content": palavra + " "})
+            yield trecho({}, "stop")
+            if incluir_uso:
+                yield "data: " + json.dumps({
+                    "id": identificador,
+                    "object": "chat.completion.chunk",
+                    "created": criado,
+                    "model": modelo,
+                    "choices": [],
+                    "usage": uso_openai,
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(transmitir(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def criar_embeddings(request: Request):
+        corpo = await request.json()
+        erro = admitir("embeddings")
+        if erro is not None:
+            return erro
+
+        textos = _textos_embeddings(corpo.get("input"))
+        estatisticas["embeddings"]["textos"] += len(textos)
+        await asyncio.sleep(espera(latencia_embeddings_ms + latencia_por_texto_ms * len(textos)))
+        vetores = await run_in_threadpool(embeddings.embed_documents, textos)
+
+        base64_solicitado = corpo.get("encoding_format") == "base64"
+        tokens = sum(len(texto) // 4 + 1 for texto in textos)
+        return {
+            "object": "list",
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": indice,
+                    "embedding": (
+                        base64.b64encode(np.asarray(vetor, dtype="<f4").tobytes()).decode()
+                        if base64_solicitado else vetor
+                    ),
+                }
+                for indice, vetor in enumerate(vetores)
+            ],
+            "model": corpo.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/estatisticas")
+    async def obter_estatisticas():
+        """Requisições, 429, falhas, textos e tokens atendidos desde a inicialização"""
+        return {rota: dict(contador) for rota, contador in estatisticas.items()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso da API da OpenAI (chat e embeddings)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8900)
+    parser.add_argument("--latencia-chat-ms", type=float, default=300.0)
+    parser.add_argument("--latencia-trecho-ms", type=float, default=10.0)
+    parser.add_argument("--latencia-embeddings-ms", type=float, default=80.0)
+    parser.add_argument("--latencia-por-texto-ms", type=float, default=0.2)
+    parser.add_argument("--variacao", type=float, default=0.2, help="Variação aleatória das latências (fração)")
+    parser.add_argument("--limite-chat-rps", type=float, default=0.0, help="0 = sem limite")
+    parser.add_argument("--limite-embeddings-rps", type=float, default=0.0, help="0 = sem limite")
+    parser.add_argument("--taxa-erros", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--palavras-resposta", type=int, default=60)
+    parser.add_argument("--dimensao", type=int, default=1536)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    app = criar_app(
+        latencia_chat_ms=args.latencia_chat_ms,
+        latencia_trecho_ms=args.latencia_trecho_ms,
+        latencia_embeddings_ms=args.latencia_embeddings_ms,
+        latencia_por_texto_ms=args.latencia_por_texto_ms,
+        variacao=args.variacao,
+        limite_chat_rps=args.limite_chat_rps,
+        limite_embeddings_rps=args.limite_embeddings_rps,
+        taxa_erros=args.taxa_erros,
+        palavras_resposta=args.palavras_resposta,
+        dimensao=args.dimensao,
+        semente=args.semente,
+    )
+    print(f"OpenAI falsa em http://{args.host}:{args.porta}/v1")
+    uvicorn.run(app, host=args.host, port=args.porta, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
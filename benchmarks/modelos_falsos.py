@@ -0,0 +1,191 @@
+"""
+Modelos falsos para benchmarks
+Embeddings e chat determinísticos, com latência artificial configurável
+"""
+
+import asyncio
+import json
+import re
+import time
+import zlib
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.texto import normalizar_texto, remover_acentos
+
+
+class EmbeddingsDeterministicos(Embeddings):
+    """
+    Embeddings sem rede: cada palavra cai em um de `buckets` vetores aleatórios fixos
+
+    O vetor de um texto é a soma dos vetores das suas palavras, normalizada, então
+    textos com palavras em comum ficam próximos (a busca e o classificador de
+    intenção se comportam de forma plausível) e o mesmo texto gera sempre o mesmo
+    vetor, em qualquer processo. A latência simula a chamada à API.
+    """
+
+    def __init__(self, dimensao: int = 1536, latencia_ms: float = 0.0,
+                 latencia_por_texto_ms: float = 0.0, buckets: int = 4096, semente: int = 42):
+        """
+        Args:
+            dimensao: Dimensão dos vetores (1536 = text-embedding-ada-002)
+            latencia_ms: Espera fixa por chamada
+            latencia_por_texto_ms: Espera adicional por texto da chamada
+            buckets: Vetores distintos de palavras (colisões aproximam textos sem relação)
+            semente: Semente da projeção aleatória
+        """
+        self.dimensao = dimensao
+        self.latencia_ms = latencia_ms
+        self.latencia_por_texto_ms = latencia_por_texto_ms
+        self.buckets = buckets
+        self._projecao = np.random.default_rng(semente).standard_normal((buckets, dimensao)).astype("float32")
+
+        self.chamadas = 0
+        self.textos = 0
+
+    @property
+    def model(self) -> str:
+        """Identifica o modelo nas chaves do cache e no manifesto dos índices"""
+        return f"deterministico-{self.dimensao}"
+
+    def _espera(self, quantidade: int) -> float:
+        return (self.latencia_ms + self.latencia_por_texto_ms * quantidade) / 1000
+
+    def _vetores(self, textos: List[str]) -> List[List[float]]:
+        """Projeta a contagem de palavras (hashing trick) nos vetores fixos"""
+        self.chamadas += 1
+        self.textos += len(textos)
+
+        contagens = np.zeros((len(textos), self.buckets), dtype="float32")
+        for linha, texto in enumerate(textos):
+            for palavra in normalizar_texto(texto).split():
+                contagens[linha, zlib.crc32(palavra.encode()) % self.buckets] += 1
+
+        vetores = contagens @ self._projecao
+        normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+        # Texto sem palavras: vetor fixo em vez de zeros (o FAISS normaliza por L2)
+        vetores[normas[:, 0] == 0] = self._projecao[0]
+        normas[normas == 0] = np.linalg.norm(self._projecao[0])
+        return (vetores / normas).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._espera(len(texts)))
+        return self._vetores(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._espera(len(texts)))
+        return self._vetores(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+# Palavras que decidem a intenção na ordem de prioridade (texto já normalizado)
+_PALAVRAS_INTENCAO = (
+    ("consulta_pedido", ("pedido", "rastreio", "rastreamento", "entrega do meu", "chega minha")),
+    ("politicas", ("troca", "trocar", "devolucao", "devolver", "garantia", "prazo", "frete", "politica")),
+    ("recomendacao", ("recomenda", "sugestao", "sugere", "presente", "populares")),
+    ("saudacao", ("oi", "ola", "bom dia", "boa tarde", "boa noite", "ajuda")),
+)
+
+_PRECO = re.compile(r"(?:ate|menos de|abaixo de)\s*(?:r\$\s*)?(\d[\d.]*(?:,\d+)?)")
+
+
+class ChatDeterministico(BaseChatModel):
+    """
+    Modelo de chat sem rede para benchmarks
+
+    Reconhece os prompts do assistente: devolve uma intenção por palavras-chave,
+    critérios de busca em JSON (categoria e preço máximo) ou uma resposta de
+    `palavras_resposta` palavras. Informa o uso de tokens (estimado em 4
+    caracteres por token) como a API da OpenAI.
+    """
+
+    latencia_ms: float = 0.0
+    latencia_trecho_ms: float = 0.0
+    palavras_resposta: int = 60
+    categorias: List[str] = []
+    chamadas: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "deterministico"
+
+    def _responder(self, mensagens: List[BaseMessage]) -> str:
+        sistema = str(mensagens[0].content)
+        usuario = normalizar_texto(str(mensagens[-1].content))
+
+        if "classificação de intenções" in sistema:
+            for intencao, palavras in _PALAVRAS_INTENCAO:
+                if any(re.search(rf"\b{palavra}\b", usuario) for palavra in palavras):
+                    return intencao
+            return "busca_produtos"
+
+        if "extração de critérios" in sistema:
+            categoria = next(
+                (categoria for categoria in self.categorias if normalizar_texto(categoria) in usuario), None
+            )
+            preco = _PRECO.search(remover_acentos(str(mensagens[-1].content).lower()))
+            return json.dumps({
+                "categoria": categoria,
+                "preco_max": float(preco.group(1).replace(".", "").replace(",", ".")) if preco else None,
+                "caracteristicas": [],
+                "marca": None,
+            }, ensure_ascii=False)
+
+        # Resposta final: tamanho fixo, começando pelo início da mensagem do usuário
+        palavras = usuario.split()[:self.palavras_resposta]
+        palavras += ["resposta"] * (self.palavras_resposta - len(palavras))
+        return " ".join(palavras)
+
+    @staticmethod
+    def _uso(mensagens: List[BaseMessage], resposta: str) -> Dict[str, int]:
+        entrada = sum(len(str(mensagem.content)) for mensagem in mensagens) // 4
+        saida = max(len(resposta) // 4, 1)
+        return {"input_tokens": entrada, "output_tokens": saida, "total_tokens": entrada + saida}
+
+    def _resultado(self, mensagens: List[BaseMessage]) -> ChatResult:
+        self.chamadas += 1
+        resposta = self._responder(mensagens)
+        mensagem = AIMessage(content=resposta, usage_metadata=self._uso(mensagens, resposta))
+        return ChatResult(generations=[ChatGeneration(message=mensagem)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latencia_ms / 1000)
+        return self._resultado(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latencia_ms / 1000)
+        return self._resultado(messages)
+
+    def _trechos(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        self.chamadas += 1
+        resposta = self._responder(messages)
+        for palavra in resposta.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=palavra + " "))
+        # Como a OpenAI com stream_usage: o uso chega em um trecho final vazio
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._uso(messages, resposta)))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latencia_ms / 1000)
+        for trecho in self._trechos(messages):
+            time.sleep(self.latencia_trecho_ms / 1000)
+            yield trecho
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latencia_ms / 1000)
+        for trecho in self._trechos(messages):
+            await asyncio.sleep(self.latencia_trecho_ms / 1000)
+            yield trecho
@@ -4,18 +4,25 @@ Endpoints REST para interação com o assistente
 """
 
 import os
+import json
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import uuid
+import time
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import uvicorn
 
 from .assistente import AssistenteVirtual
+from .rag_system import MODOS_BUSCA
+from .tarefas import GerenciadorTarefas, Tarefa
+from .sessoes import criar_armazenamento_sessoes
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -70,6 +77,28 @@ app.add_middleware(
 # Instância global do assistente
 assistente: Optional[AssistenteVirtual] = None
 
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    """Registra a latência de cada requisição nas métricas, pelo caminho da rota"""
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    rota = request.scope.get("route")
+    # Só rotas conhecidas (o molde, não o caminho com IDs) e sem contar a própria coleta
+    if assistente is not None and rota is not None and rota.path != "/metrics":
+        assistente.metricas.observar("latencia_http_segundos", time.perf_counter() - inicio, rota.path)
+    return response
+
+# Tarefa que recarrega índices publicados por outros workers
+tarefa_sincronizacao: Optional[asyncio.Task] = None
+
+# Tarefas administrativas em segundo plano (reindexação), compartilhadas entre workers
+tarefas: Optional[GerenciadorTarefas] = None
+
+def _env_int(nome: str) -> Optional[int]:
+    """Lê uma variável de ambiente inteira (None se ausente ou vazia)"""
+    valor = os.getenv(nome)
+    return int(valor) if valor else None
+
 def get_assistente() -> AssistenteVirtual:
     """Dependency para obter instância do assistente"""
     global assistente
@@ -84,27 +113,94 @@ def get_assistente() -> AssistenteVirtual:
         pinecone_api_key = os.getenv("PINECONE_API_KEY")
         pinecone_env = os.getenv("PINECONE_ENV", "gcp-starter")
         pinecone_index = os.getenv("PINECONE_INDEX", "assistente-ecommerce")
+        backend_pedidos = os.getenv("PEDIDOS_BACKEND", "json")
+        
+        # Índice local de produtos: flat (exato) ou comprimido para catálogos grandes
+        parametros_indice = {
+            "nprobe": _env_int("INDICE_NPROBE"),
+            "ef_search": _env_int("INDICE_EF_SEARCH"),
+            "fator_rerank": _env_int("INDICE_FATOR_RERANK"),
+        }
+        opcoes_rag = {
+            "tipo_indice": os.getenv("INDICE_PRODUTOS", "flat"),
+            "parametros_indice": {chave: valor for chave, valor in parametros_indice.items() if valor is not None},
+            # Índices salvos abertos mapeados em memória, compartilhados entre workers
+            "mapear_indices": os.getenv("INDICES_MMAP", "true").lower() != "false",
+            # Alterações individuais viajam pelo log do catálogo; o índice é republicado no máximo a cada N segundos
+            "intervalo_publicacao_indice": float(os.getenv("INDICES_INTERVALO_PUBLICACAO", "300")),
+            # Consultas simultâneas agrupadas em uma chamada de embeddings
+            "janela_lote_consultas_ms": float(os.getenv("EMBEDDINGS_JANELA_LOTE_MS", "5")),
+            "max_lote_consultas": _env_int("EMBEDDINGS_MAX_LOTE") or 64,
+            # Tokenização local (tiktoken) para dividir textos acima do limite do modelo
+            "verificar_tamanho_embeddings": os.getenv("EMBEDDINGS_VERIFICAR_TAMANHO", "true").lower() != "false",
+        }
+        
+        # Histórico de sessões: "memoria" (por worker), "sqlite" ou "redis" (compartilhados)
+        sessoes = criar_armazenamento_sessoes(
+            os.getenv("SESSOES_BACKEND", "memoria"),
+            timeout=float(os.getenv("SESSION_TIMEOUT", "3600")),
+            max_historico=_env_int("MAX_HISTORY") or 10,
+            max_sessoes=_env_int("SESSOES_MAX") or 10_000,
+            redis_url=os.getenv("REDIS_URL")
+        )
         
         assistente = AssistenteVirtual(
             openai_api_key=openai_api_key,
             pinecone_api_key=pinecone_api_key,
             pinecone_env=pinecone_env,
-            pinecone_index=pinecone_index
+            pinecone_index=pinecone_index,
+            backend_pedidos=backend_pedidos,
+            opcoes_rag=opcoes_rag,
+            sessoes=sessoes
         )
     
     return assistente
 
+def get_tarefas(assistant: AssistenteVirtual = Depends(get_assistente)) -> GerenciadorTarefas:
+    """Dependency para obter o gerenciador de tarefas (estado em SQLite no diretório de dados)"""
+    global tarefas
+    if tarefas is None:
+        tarefas = GerenciadorTarefas(os.path.join(assistant.rag_system.diretorio_dados, "tarefas.sqlite"))
+    return tarefas
+
+async def _sincronizar_indices_periodicamente(intervalo: float):
+    """Recarrega catálogo e índices quando outro worker publica uma nova geração"""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await run_in_threadpool(assistente.rag_system.sincronizar_indices)
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar índices: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Inicialização da aplicação"""
+    global tarefa_sincronizacao
     logger.info("Iniciando Assistente Virtual...")
     try:
         # Força inicialização do assistente
         get_assistente()
         logger.info("Assistente Virtual iniciado com sucesso!")
+        
+        intervalo = float(os.getenv("INDICES_INTERVALO_SINCRONIZACAO", "5"))
+        if intervalo > 0:
+            tarefa_sincronizacao = asyncio.create_task(_sincronizar_indices_periodicamente(intervalo))
     except Exception as e:
         logger.error(f"Erro ao iniciar assistente: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finalização da aplicação"""
+    if tarefa_sincronizacao is not None:
+        tarefa_sincronizacao.cancel()
+    if assistente is not None:
+        # Grava conversas ainda pendentes de indexação
+        assistente.rag_system.fechar()
+        assistente.sessoes.fechar()
+        assistente.pedidos.fechar()
+    if tarefas is not None:
+        tarefas.fechar()
+
 @app.get("/")
 async def root():
     """Endpoint raiz com informações da API"""
@@ -115,6 +211,7 @@ async def root():
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
             "historico": "/sessao/{id_sessao}/historico",
             "estatisticas": "/estatisticas",
             "saude": "/health"
@@ -158,8 +255,8 @@ async def chat(
         # Gera ID da sessão se não fornecido
         id_sessao = request.id_sessao or str(uuid.uuid4())
         
-        # Processa mensagem
-        resultado = assistant.processar_mensagem(
+        # Processa mensagem sem bloquear o event loop
+        resultado = await assistant.aprocessar_mensagem(
             mensagem=request.mensagem,
             id_sessao=id_sessao
         )
@@ -190,6 +287,51 @@ async def chat(
             detail=f"Erro interno no processamento: {str(e)}"
         )
 
+@app.post("/chat/stream")
+async def chat_stream(
+    request: MensagemRequest,
+    assistant: AssistenteVirtual = Depends(get_assistente)
+):
+    """
+    Chat com resposta transmitida via Server-Sent Events
+    
+    Emite a intenção e os dados estruturados assim que ficam prontos e depois
+    a resposta em linguagem natural token a token.
+    """
+    id_sessao = request.id_sessao or str(uuid.uuid4())
+    
+    async def gerar_eventos():
+        async for evento in assistant.aprocessar_mensagem_stream(
+            mensagem=request.mensagem,
+            id_sessao=id_sessao
+        ):
+            tipo = evento["evento"]
+            if tipo == "fim":
+                resultado = evento["resultado"]
+                payload = {
+                    **resultado,
+                    "id_sessao": id_sessao,
+                    "timestamp": datetime.now().isoformat()
+                }
+                await log_interacao(
+                    id_sessao=id_sessao,
+                    mensagem=request.mensagem,
+                    resposta=resultado,
+                    contexto=request.contexto
+                )
+            else:
+                payload = {k: v for k, v in evento.items() if k != "evento"}
+                if tipo == "intencao":
+                    payload["id_sessao"] = id_sessao
+            
+            yield f"event: {tipo}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+    
+    return StreamingResponse(
+        gerar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/sessao/{id_sessao}/historico")
 async def obter_historico(
     id_sessao: str,
@@ -197,7 +339,7 @@ async def obter_historico(
 ):
     """Obtém histórico de uma sessão específica"""
     try:
-        historico = assistant.obter_historico_sessao(id_sessao)
+        historico = await assistant.aobter_historico_sessao(id_sessao)
         return {
             "id_sessao": id_sessao,
             "total_interacoes": len(historico),
@@ -232,6 +374,23 @@ async def obter_estatisticas(
             detail=f"Erro ao obter estatísticas: {str(e)}"
         )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def obter_metricas(
+    assistant: AssistenteVirtual = Depends(get_assistente)
+):
+    """Métricas no formato de texto do Prometheus (por processo)"""
+    try:
+        return PlainTextResponse(
+            assistant.metricas.exportar_prometheus(),
+            media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+    except Exception as e:
+        logger.error(f"Erro ao exportar métricas: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao exportar métricas: {str(e)}"
+        )
+
 @app.post("/admin/produto")
 async def adicionar_produto(
     produto: ProdutoRequest,
@@ -240,7 +399,7 @@ async def adicionar_produto(
     """Adiciona novo produto ao sistema (endpoint administrativo)"""
     try:
         produto_dict = produto.dict()
-        assistant.rag_system.adicionar_produto(produto_dict)
+        await run_in_threadpool(assistant.rag_system.adicionar_produto, produto_dict)
         
         return {
             "sucesso": True,
@@ -263,7 +422,7 @@ async def atualizar_produto(
     """Atualiza produto existente"""
     try:
         produto_dict = produto.dict()
-        assistant.rag_system.atualizar_produto(produto_id, produto_dict)
+        await run_in_threadpool(assistant.rag_system.atualizar_produto, produto_id, produto_dict)
         
         return {
             "sucesso": True,
@@ -283,7 +442,7 @@ async def remover_produto(
 ):
     """Remove produto do sistema"""
     try:
-        assistant.rag_system.remover_produto(produto_id)
+        await run_in_threadpool(assistant.rag_system.remover_produto, produto_id)
         
         return {
             "sucesso": True,
@@ -296,26 +455,136 @@ async def remover_produto(
             detail=f"Erro ao remover produto: {str(e)}"
         )
 
-@app.post("/admin/reindexar")
-async def reindexar_sistema(
-    background_tasks: BackgroundTasks,
+@app.post("/admin/produtos/importar")
+async def importar_produtos(
+    request: Request,
+    tamanho_lote: int = Query(500, ge=1, le=2048, description="Textos por chamada de embeddings"),
+    max_concorrencia: int = Query(4, ge=1, le=32, description="Chamadas de embeddings em paralelo"),
     assistant: AssistenteVirtual = Depends(get_assistente)
 ):
-    """Reindexar todo o sistema RAG"""
+    """
+    Importa produtos em massa (endpoint administrativo)
+    
+    O corpo é JSON Lines (um produto por linha, mesmo formato de POST /admin/produto),
+    lido em streaming: cada lote completo segue para os embeddings enquanto o
+    restante ainda chega. Linhas inválidas são reportadas sem interromper a importação.
+    """
+    erros = []
+    numero_linha = 0
+    
+    def _processar_linha(linha: bytes) -> Optional[Dict[str, Any]]:
+        nonlocal numero_linha
+        numero_linha += 1
+        if not linha.strip():
+            return None
+        try:
+            return ProdutoRequest(**json.loads(linha)).dict()
+        except Exception as e:
+            erros.append({"linha": numero_linha, "erro": str(e)})
+            return None
+    
+    async def _ler_produtos():
+        pendente = b""
+        async for bloco in request.stream():
+            pendente += bloco
+            *linhas, pendente = pendente.split(b"\n")
+            for linha in linhas:
+                produto = _processar_linha(linha)
+                if produto is not None:
+                    yield produto
+        produto = _processar_linha(pendente)
+        if produto is not None:
+            yield produto
+    
     try:
-        background_tasks.add_task(assistant.rag_system.recriar_indices)
+        resultado = await assistant.rag_system.aimportar_produtos(
+            _ler_produtos(),
+            tamanho_lote=tamanho_lote,
+            max_concorrencia=max_concorrencia
+        )
+        erros.extend(resultado["erros"])
         
         return {
-            "sucesso": True,
-            "mensagem": "Reindexação iniciada em background"
+            "sucesso": not erros,
+            "importados": resultado["importados"],
+            "rejeitados": len(erros),
+            "erros": erros
         }
     except Exception as e:
-        logger.error(f"Erro ao iniciar reindexação: {e}")
+        logger.error(f"Erro ao importar produtos: {e}")
         raise HTTPException(
             status_code=500,
-            detail=f"Erro ao iniciar reindexação: {str(e)}"
+            detail=f"Erro ao importar produtos: {str(e)}"
         )
 
+@app.post("/admin/reindexar", status_code=202)
+async def reindexar_sistema(assistant: AssistenteVirtual = Depends(get_assistente),
+                            tarefas: GerenciadorTarefas = Depends(get_tarefas)):
+    """
+    Reindexar todo o sistema RAG
+    
+    Os índices novos são construídos em segundo plano sem afetar as buscas e
+    trocados de uma vez ao final. Só uma reindexação roda por vez entre todos
+    os workers. Retorna o ID da tarefa para acompanhar o progresso em
+    GET /admin/reindexar/{id_tarefa} (em qualquer worker).
+    """
+    def _executar(tarefa: Tarefa) -> Dict[str, Any]:
+        return assistant.rag_system.reindexar(
+            progresso=tarefa.reportar,
+            verificar_cancelamento=tarefa.verificar_cancelamento
+        )
+    
+    tarefa = await run_in_threadpool(tarefas.iniciar, "reindexacao", _executar)
+    if tarefa is None:
+        recentes = await run_in_threadpool(tarefas.listar, "reindexacao")
+        em_andamento = next((tarefa.id for tarefa in recentes if tarefa.ativa), None)
+        raise HTTPException(
+            status_code=409,
+            detail=f"Reindexação já em andamento: {em_andamento}"
+        )
+    
+    return {
+        "sucesso": True,
+        "mensagem": "Reindexação iniciada em background",
+        "id_tarefa": tarefa.id,
+        "tarefa": tarefa.para_dict()
+    }
+
+@app.get("/admin/reindexar")
+async def listar_reindexacoes(tarefas: GerenciadorTarefas = Depends(get_tarefas)):
+    """Lista as reindexações recentes, da mais nova para a mais antiga"""
+    recentes = await run_in_threadpool(tarefas.listar, "reindexacao")
+    return {"tarefas": [tarefa.para_dict() for tarefa in recentes]}
+
+@app.get("/admin/reindexar/{id_tarefa}")
+async def obter_reindexacao(id_tarefa: str, tarefas: GerenciadorTarefas = Depends(get_tarefas)):
+    """Status e progresso de uma reindexação"""
+    tarefa = await run_in_threadpool(tarefas.obter, id_tarefa)
+    if tarefa is None or tarefa.tipo != "reindexacao":
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return tarefa.para_dict()
+
+@app.delete("/admin/reindexar/{id_tarefa}")
+async def cancelar_reindexacao(id_tarefa: str, tarefas: GerenciadorTarefas = Depends(get_tarefas)):
+    """
+    Cancela uma reindexação em andamento
+    
+    O cancelamento acontece na próxima etapa, mesmo que a reindexação rode em
+    outro worker; os índices em uso não são alterados.
+    """
+    tarefa = await run_in_threadpool(tarefas.obter, id_tarefa)
+    if tarefa is None or tarefa.tipo != "reindexacao":
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    if not tarefa.ativa:
+        raise HTTPException(status_code=409, detail=f"Tarefa já finalizada ({tarefa.status})")
+    
+    tarefa = await run_in_threadpool(tarefas.cancelar, id_tarefa) or tarefa
+    return {
+        "sucesso": True,
+        "mensagem": "Cancelamento solicitado",
+        "tarefa": tarefa.para_dict()
+    }
+
 @app.get("/buscar")
 async def buscar_produtos(
     q: str,
@@ -323,9 +592,16 @@ async def buscar_produtos(
     preco_min: Optional[float] = None,
     preco_max: Optional[float] = None,
     top_k: int = 5,
+    modo: Optional[str] = None,
     assistant: AssistenteVirtual = Depends(get_assistente)
 ):
     """Endpoint direto para busca de produtos"""
+    if modo is not None and modo not in MODOS_BUSCA:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo de busca inválido: {modo} (use {', '.join(MODOS_BUSCA)})"
+        )
+    
     try:
         filtros = {}
         if categoria:
@@ -335,10 +611,11 @@ async def buscar_produtos(
         if preco_max:
             filtros["preco_max"] = preco_max
         
-        produtos = assistant.rag_system.buscar_produtos_avancada(
+        produtos = await assistant.rag_system.abuscar_produtos_avancada(
             consulta=q,
             filtros=filtros,
-            top_k=top_k
+            top_k=top_k,
+            modo=modo
         )
         
         return {
@@ -363,7 +640,7 @@ async def buscar_por_embedding(
 ):
     """Endpoint para busca usando embeddings com threshold de similaridade"""
     try:
-        produtos = assistant.rag_system.buscar_por_embedding(
+        produtos = await assistant.rag_system.abuscar_por_embedding(
             consulta=q,
             top_k=top_k,
             threshold=threshold
@@ -390,7 +667,8 @@ async def obter_produtos_similares(
 ):
     """Obtém produtos similares a um produto específico"""
     try:
-        produtos_similares = assistant.rag_system.obter_produtos_similares_por_categoria(
+        produtos_similares = await run_in_threadpool(
+            assistant.rag_system.obter_produtos_similares_por_categoria,
             produto_id=produto_id,
             top_k=top_k
         )
@@ -0,0 +1,274 @@
+"""
+Persistência do catálogo de produtos
+Snapshot JSON + log de alterações só de acréscimo, com compactação atômica
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ArmazenamentoCatalogo:
+    """
+    Catálogo persistido como snapshot + log de alterações
+
+    Cada alteração vira uma linha JSON anexada ao log (custo O(1), independente
+    do tamanho do catálogo). Na carga o log é reaplicado sobre o snapshot; de
+    tempos em tempos o catálogo é compactado em um novo snapshot, gravado em
+    arquivo temporário e trocado com os.replace, e o log é zerado. Como as
+    operações do log são idempotentes (upsert/remoção), uma queda entre a troca
+    do snapshot e a limpeza do log não perde nem duplica dados.
+
+    Outros processos que gravam no mesmo log são acompanhados pela posição (em
+    bytes) até onde ele já foi lido: ler_novas_operacoes devolve só o que foi
+    anexado depois dela.
+    """
+
+    def __init__(self, caminho_snapshot: str = "data/produtos.json",
+                 caminho_log: str = "data/produtos.log.jsonl",
+                 max_operacoes_log: int = 1_000, sincronizar: bool = True):
+        """
+        Args:
+            caminho_snapshot: Arquivo JSON com a lista completa de produtos
+            caminho_log: Arquivo JSON Lines com as alterações desde o último snapshot
+            max_operacoes_log: Operações no log a partir das quais compensa compactar
+            sincronizar: Chama fsync a cada gravação (durabilidade contra queda de energia)
+        """
+        self.caminho_snapshot = caminho_snapshot
+        self.caminho_log = caminho_log
+        self.max_operacoes_log = max_operacoes_log
+        self.sincronizar = sincronizar
+
+        self._lock = threading.Lock()
+        self._hash_snapshot = hashlib.sha256().hexdigest()
+        self._hash_log = hashlib.sha256()
+        self._operacoes_log = 0
+        # Até onde o log já foi lido/gravado e qual snapshot ele complementa
+        self._posicao_log = 0
+        self._identidade_snapshot: Optional[Tuple[int, int, int]] = None
+
+    def _identificar_snapshot(self) -> Optional[Tuple[int, int, int]]:
+        """(inode, mtime, tamanho) do snapshot: muda quando algum processo compacta"""
+        try:
+            info = os.stat(self.caminho_snapshot)
+        except FileNotFoundError:
+            return None
+        return info.st_ino, info.st_mtime_ns, info.st_size
+
+    def carregar(self) -> List[Dict[str, Any]]:
+        """
+        Lê o snapshot e reaplica o log
+
+        Uma última linha incompleta (gravação interrompida) é descartada e
+        removida do arquivo.
+
+        Raises:
+            FileNotFoundError: Se não houver snapshot nem log
+        """
+        with self._lock:
+            produtos: Dict[Any, Dict[str, Any]] = {}
+
+            snapshot_existe = os.path.exists(self.caminho_snapshot)
+            if snapshot_existe:
+                with open(self.caminho_snapshot, 'rb') as f:
+                    info = os.fstat(f.fileno())
+                    conteudo = f.read()
+                self._hash_snapshot = hashlib.sha256(conteudo).hexdigest()
+                self._identidade_snapshot = (info.st_ino, info.st_mtime_ns, info.st_size)
+                for produto in json.loads(conteudo):
+                    produtos[produto.get("id")] = produto
+            elif not os.path.exists(self.caminho_log):
+                raise FileNotFoundError(self.caminho_snapshot)
+            else:
+                self._hash_snapshot = hashlib.sha256().hexdigest()
+                self._identidade_snapshot = None
+
+            self._hash_log = hashlib.sha256()
+            self._operacoes_log = 0
+            self._posicao_log = 0
+            if os.path.exists(self.caminho_log):
+                self._reaplicar_log(produtos)
+
+            return list(produtos.values())
+
+    def _reaplicar_log(self, produtos: Dict[Any, Dict[str, Any]]):
+        """Aplica as operações do log sobre o snapshot (chamar com o lock adquirido)"""
+        for operacao in self._ler_log(0, descartar_incompleta=True):
+            if operacao["op"] == "salvar":
+                produto = operacao["produto"]
+                produtos.pop(produto.get("id"), None)
+                produtos[produto.get("id")] = produto
+            elif operacao["op"] == "remover":
+                produtos.pop(operacao["id"], None)
+
+    def _ler_log(self, inicio: int, descartar_incompleta: bool = False) -> List[Dict[str, Any]]:
+        """
+        Lê as operações do log a partir de `inicio` (em bytes), atualizando hash,
+        contagem e posição lida (chamar com o lock adquirido)
+
+        Args:
+            descartar_incompleta: Remove do arquivo uma última linha incompleta;
+                sem ele ela só deixa de ser lida (pode estar sendo gravada)
+        """
+        operacoes = []
+        valido_ate = inicio
+        with open(self.caminho_log, 'rb') as f:
+            f.seek(inicio)
+            for linha in f:
+                try:
+                    if not linha.endswith(b"\n"):
+                        raise ValueError("linha sem terminador")
+                    operacao = json.loads(linha)
+                except ValueError:
+                    if descartar_incompleta:
+                        logger.warning(f"Linha incompleta no fim de {self.caminho_log} descartada")
+                    break
+
+                operacoes.append(operacao)
+                valido_ate += len(linha)
+                self._hash_log.update(linha)
+                self._operacoes_log += 1
+
+        if descartar_incompleta and valido_ate < os.path.getsize(self.caminho_log):
+            with open(self.caminho_log, 'r+b') as f:
+                f.truncate(valido_ate)
+        self._posicao_log = valido_ate
+        return operacoes
+
+    def ler_novas_operacoes(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Operações anexadas ao log (por qualquer processo) depois da última
+        leitura ou gravação deste objeto
+
+        Returns:
+            Lista de operações (vazia se nada mudou) ou None se outro processo
+            compactou o catálogo desde então (é preciso carregar de novo)
+        """
+        with self._lock:
+            if self._identificar_snapshot() != self._identidade_snapshot:
+                return None
+            try:
+                tamanho = os.path.getsize(self.caminho_log)
+            except FileNotFoundError:
+                tamanho = 0
+            if tamanho < self._posicao_log:
+                return None
+            if tamanho == self._posicao_log:
+                return []
+            return self._ler_log(self._posicao_log)
+
+    def operacoes_desde(self, posicao: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Hash do estado na `posicao` do log e as operações gravadas depois dela
+
+        Não altera o estado acompanhado por este objeto.
+
+        Returns:
+            (hash como o de hash_estado naquela posição, operações seguintes)
+        """
+        with self._lock:
+            hash_log = hashlib.sha256()
+            operacoes = []
+            if not posicao and not os.path.exists(self.caminho_log):
+                return self._hash_snapshot, operacoes
+            with open(self.caminho_log, 'rb') as f:
+                prefixo = f.read(posicao)
+                if len(prefixo) < posicao:
+                    raise ValueError(f"Log com menos de {posicao} bytes")
+                hash_log.update(prefixo)
+                for linha in f:
+                    if not linha.endswith(b"\n"):
+                        break
+                    operacoes.append(json.loads(linha))
+            if not posicao:
+                return self._hash_snapshot, operacoes
+            return self._combinar_hashes(hash_log.hexdigest()), operacoes
+
+    @property
+    def posicao_log(self) -> int:
+        """Bytes do log já lidos ou gravados por este objeto"""
+        return self._posicao_log
+
+    def _anexar(self, operacoes: List[Dict[str, Any]]):
+        """Anexa operações ao log em uma única escrita"""
+        linhas = b"".join(
+            json.dumps(operacao, ensure_ascii=False).encode("utf-8") + b"\n"
+            for operacao in operacoes
+        )
+        with self._lock:
+            with open(self.caminho_log, 'ab') as f:
+                inicio = f.tell()
+                f.write(linhas)
+                f.flush()
+                if self.sincronizar:
+                    os.fsync(f.fileno())
+            # Se outro processo anexou algo que ainda não foi lido, hash e posição
+            # só avançam em ler_novas_operacoes, na ordem do arquivo
+            if inicio == self._posicao_log:
+                self._hash_log.update(linhas)
+                self._operacoes_log += len(operacoes)
+                self._posicao_log = inicio + len(linhas)
+
+    def registrar_salvos(self, produtos: Iterable[Dict[str, Any]]):
+        """Registra inclusões/alterações de produtos"""
+        operacoes = [{"op": "salvar", "produto": produto} for produto in produtos]
+        if operacoes:
+            self._anexar(operacoes)
+
+    def registrar_removido(self, produto_id: str):
+        """Registra a remoção de um produto"""
+        self._anexar([{"op": "remover", "id": produto_id}])
+
+    def precisa_compactar(self) -> bool:
+        """Indica se o log já cresceu o suficiente para compactar"""
+        return self._operacoes_log >= self.max_operacoes_log
+
+    def compactar(self, produtos: List[Dict[str, Any]]):
+        """Grava um novo snapshot atomicamente e zera o log"""
+        conteudo = json.dumps(produtos, ensure_ascii=False, indent=2).encode("utf-8")
+
+        with self._lock:
+            caminho_tmp = f"{self.caminho_snapshot}.tmp"
+            with open(caminho_tmp, 'wb') as f:
+                f.write(conteudo)
+                f.flush()
+                if self.sincronizar:
+                    os.fsync(f.fileno())
+            os.replace(caminho_tmp, self.caminho_snapshot)
+
+            # Só depois do snapshot trocado o log pode ser descartado
+            with open(self.caminho_log, 'wb') as f:
+                if self.sincronizar:
+                    os.fsync(f.fileno())
+
+            self._hash_snapshot = hashlib.sha256(conteudo).hexdigest()
+            self._hash_log = hashlib.sha256()
+            self._operacoes_log = 0
+            self._posicao_log = 0
+            self._identidade_snapshot = self._identificar_snapshot()
+
+        logger.info(f"Catálogo compactado: {len(produtos)} produtos em {self.caminho_snapshot}")
+
+    def hash_estado(self) -> str:
+        """
+        Hash do estado persistido (snapshot + log), mantido incrementalmente
+
+        Sem alterações no log é igual ao SHA-256 do próprio snapshot.
+        """
+        with self._lock:
+            if not self._operacoes_log:
+                return self._hash_snapshot
+            return self._combinar_hashes(self._hash_log.hexdigest())
+
+    def _combinar_hashes(self, hash_log: str) -> str:
+        return hashlib.sha256(f"{self._hash_snapshot}:{hash_log}".encode("utf-8")).hexdigest()
+
+    @property
+    def operacoes_pendentes(self) -> int:
+        """Operações no log ainda não compactadas"""
+        return self._operacoes_log
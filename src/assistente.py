@@ -4,17 +4,25 @@ Lógica principal do sistema
 """
 
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, AsyncIterator
 from datetime import datetime
 from dataclasses import dataclass
 
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from .rag_system import RAGSystem
 from .prompts import PromptTemplates
+from .classificador_intencao import ClassificadorIntencao
+from .cache_respostas import CacheRespostas
+from .pedidos import RepositorioPedidos, criar_repositorio_pedidos
+from .sessoes import ArmazenamentoSessoes, SessoesMemoria
+from .metricas import LIMITES_TOKENS, Metricas, razao_acertos
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +36,15 @@ class InteracaoUsuario:
     intencao: str
     contexto: Dict[str, Any]
     timestamp: datetime
+    
+    def para_dict(self) -> Dict[str, Any]:
+        """Forma serializável guardada no armazenamento de sessões"""
+        return {
+            "mensagem": self.mensagem,
+            "intencao": self.intencao,
+            "contexto": self.contexto,
+            "timestamp": self.timestamp.isoformat()
+        }
 
 class AssistenteVirtual:
     """
@@ -36,12 +53,42 @@ class AssistenteVirtual:
     """
     
     def __init__(self, openai_api_key: str, pinecone_api_key: Optional[str] = None,
-                 pinecone_env: str = "gcp-starter", pinecone_index: str = "assistente-ecommerce"):
-        """Inicializa o assistente com as configurações necessárias"""
-        self.llm = ChatOpenAI(
+                 pinecone_env: str = "gcp-starter", pinecone_index: str = "assistente-ecommerce",
+                 execucao_especulativa: bool = True, classificador_local: bool = True,
+                 cache_respostas: bool = True,
+                 repositorio_pedidos: Optional[RepositorioPedidos] = None,
+                 backend_pedidos: str = "json", opcoes_rag: Optional[Dict[str, Any]] = None,
+                 sessoes: Optional[ArmazenamentoSessoes] = None,
+                 llm: Optional[BaseChatModel] = None, diretorio_dados: str = "data"):
+        """
+        Inicializa o assistente com as configurações necessárias
+        
+        Args:
+            execucao_especulativa: No pipeline assíncrono, dispara a extração de critérios
+                e o embedding da mensagem junto com a detecção de intenção
+            classificador_local: Tenta classificar a intenção com regras e centroides
+                de embeddings antes de recorrer ao LLM
+            cache_respostas: Reutiliza respostas de mensagens semanticamente equivalentes
+            repositorio_pedidos: Repositório de pedidos já configurado (opcional)
+            backend_pedidos: Backend usado quando nenhum repositório é informado
+                ("json" em memória ou "sqlite")
+            opcoes_rag: Parâmetros extras do RAGSystem (ex: tipo_indice, parametros_indice)
+            sessoes: Armazenamento do histórico das sessões (padrão: em memória,
+                com expiração por inatividade; ver sessoes.criar_armazenamento_sessoes)
+            llm: Modelo de chat a usar no lugar do ChatOpenAI (ex: modelo falso nos benchmarks)
+            diretorio_dados: Diretório com produtos.json, pedidos.json e políticas
+        """
+        self.execucao_especulativa = execucao_especulativa
+        
+        # Contadores e latências, atualizados a cada evento (compartilhados com o RAG)
+        self.metricas = Metricas()
+        
+        self.llm = llm or ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.3,
-            openai_api_key=openai_api_key
+            openai_api_key=openai_api_key,
+            # Inclui o uso de tokens também nas respostas transmitidas
+            stream_usage=True
         )
         
         # Inicializa sistema RAG
@@ -49,32 +96,57 @@ class AssistenteVirtual:
             openai_api_key=openai_api_key,
             pinecone_api_key=pinecone_api_key,
             pinecone_env=pinecone_env,
-            pinecone_index=pinecone_index
+            pinecone_index=pinecone_index,
+            metricas=self.metricas,
+            **{"diretorio_dados": diretorio_dados, **(opcoes_rag or {})}
         )
         
         # Templates de prompt
         self.prompts = PromptTemplates()
         
+        # Classificador local de intenção (None = sempre usa o LLM)
+        self.classificador_intencao = None
+        if classificador_local:
+            self.classificador_intencao = ClassificadorIntencao(
+                self.rag_system.embeddings,
+                self.prompts.get_exemplos_intencao(),
+                termos_catalogo=lambda: self.rag_system.catalogo.categorias_e_marcas()
+            )
+        
+        # Cache semântico de respostas completas (None = desativado)
+        self.cache_respostas = CacheRespostas() if cache_respostas else None
+        
         # Carrega dados
-        self._carregar_dados()
+        self._carregar_dados(repositorio_pedidos, backend_pedidos, diretorio_dados)
         
         # Histórico de conversas por sessão
-        self.historico_sessoes: Dict[str, List[InteracaoUsuario]] = {}
+        self.sessoes = sessoes or SessoesMemoria()
+        
+        self._registrar_medidores()
     
-    def _carregar_dados(self):
-        """Carrega dados de produtos e pedidos"""
-        try:
-            with open('data/produtos.json', 'r', encoding='utf-8') as f:
-                self.produtos = json.load(f)
-            
-            with open('data/pedidos.json', 'r', encoding='utf-8') as f:
-                self.pedidos = json.load(f)
-                
-            logger.info(f"Dados carregados: {len(self.produtos)} produtos, {len(self.pedidos)} pedidos")
-        except FileNotFoundError as e:
-            logger.error(f"Erro ao carregar dados: {e}")
-            self.produtos = []
-            self.pedidos = []
+    def _registrar_medidores(self):
+        """Expõe nas métricas as sessões ativas e o uso do cache de respostas"""
+        self.metricas.registrar_medidor(
+            "sessoes_ativas", self.sessoes.total_sessoes, "Sessões com interação dentro do timeout"
+        )
+        if self.cache_respostas:
+            cache = self.cache_respostas
+            self.metricas.registrar_medidor(
+                "cache_respostas_consultas", lambda: {"acerto": cache.acertos, "falha": cache.falhas},
+                "Consultas ao cache semântico de respostas", rotulo="resultado", tipo="counter"
+            )
+            self.metricas.registrar_medidor(
+                "cache_respostas_razao_acertos", lambda: razao_acertos(cache.acertos, cache.falhas),
+                "Fração das mensagens respondidas pelo cache semântico"
+            )
+    
+    def _carregar_dados(self, repositorio_pedidos: Optional[RepositorioPedidos] = None,
+                        backend_pedidos: str = "json", diretorio_dados: str = "data"):
+        """Carrega dados de pedidos (produtos ficam no catálogo do sistema RAG)"""
+        # Pedidos ficam atrás de um repositório indexado (memória ou SQLite)
+        self.pedidos = repositorio_pedidos or criar_repositorio_pedidos(backend_pedidos, diretorio_dados)
+        
+        logger.info(f"Dados carregados: {len(self.rag_system.catalogo)} produtos, {self.pedidos.contar()} pedidos")
     
     def processar_mensagem(self, mensagem: str, id_sessao: str = "default") -> Dict[str, Any]:
         """
@@ -87,59 +159,264 @@ class AssistenteVirtual:
         Returns:
             Dict com resposta, intenção e dados adicionais
         """
+        inicio = time.perf_counter()
+        intencao = "erro"
         try:
             # 1. Detecta intenção
-            intencao = self._detectar_intencao(mensagem)
+            with self.metricas.cronometrar("latencia_etapa_segundos", "deteccao_intencao"):
+                intencao = self._detectar_intencao(mensagem)
             logger.info(f"Intenção detectada: {intencao}")
             
+            # Resposta equivalente já gerada para a mesma intenção?
+            vetor = None
+            versao_dados = None
+            if self.cache_respostas and self.cache_respostas.aceita(intencao):
+                versao_dados = self.rag_system.versao_dados_intencao(intencao)
+                vetor = self.rag_system.embed_consulta(mensagem)
+                with self.metricas.cronometrar("latencia_etapa_segundos", "cache_respostas"):
+                    em_cache = self.cache_respostas.buscar(intencao, vetor, versao_dados)
+                if em_cache:
+                    logger.info("Resposta obtida do cache semântico")
+                    return self._finalizar_interacao(
+                        mensagem, id_sessao, intencao, em_cache["dados"], em_cache["resposta"]
+                    )
+            
             # 2. Processa baseado na intenção
-            resposta_dados = self._processar_por_intencao(mensagem, intencao, id_sessao)
+            with self.metricas.cronometrar("latencia_etapa_segundos", f"dados_{intencao}"):
+                resposta_dados = self._processar_por_intencao(mensagem, intencao, id_sessao)
             
             # 3. Gera resposta natural
-            resposta_final = self._gerar_resposta_natural(mensagem, intencao, resposta_dados)
+            with self.metricas.cronometrar("latencia_etapa_segundos", "geracao_resposta"):
+                resposta_final = self._gerar_resposta_natural(mensagem, intencao, resposta_dados)
             
-            # 4. Armazena no histórico
-            self._adicionar_ao_historico(id_sessao, mensagem, intencao, resposta_dados)
+            self._guardar_no_cache(intencao, vetor, resposta_final, resposta_dados, versao_dados)
             
-            # 5. Adiciona conversa ao contexto RAG para aprendizado
-            produtos_mencionados = []
-            if resposta_dados.get("produtos"):
-                produtos_mencionados = [p.get("id") for p in resposta_dados["produtos"] if p.get("id")]
+            # 4 e 5. Histórico e contexto RAG
+            return self._finalizar_interacao(mensagem, id_sessao, intencao, resposta_dados, resposta_final)
             
-            self.rag_system.adicionar_conversa_ao_contexto(
-                mensagem_usuario=mensagem,
-                resposta_assistente=resposta_final,
-                produtos_mencionados=produtos_mencionados
-            )
+        except Exception as e:
+            logger.error(f"Erro ao processar mensagem: {e}")
+            intencao = "erro"
+            return self._resposta_erro(e)
+        finally:
+            self.metricas.observar("latencia_mensagem_segundos", time.perf_counter() - inicio, intencao)
+    
+    async def aprocessar_mensagem(self, mensagem: str, id_sessao: str = "default") -> Dict[str, Any]:
+        """
+        Versão assíncrona de processar_mensagem
+        
+        Usa as variantes assíncronas do LLM e dos embeddings para que chamadas
+        lentas à OpenAI não bloqueiem o event loop da API.
+        """
+        resultado = None
+        async for evento in self._aexecutar_pipeline(mensagem, id_sessao, transmitir=False):
+            if evento["evento"] == "fim":
+                resultado = evento["resultado"]
+        return resultado
+    
+    async def aprocessar_mensagem_stream(self, mensagem: str, id_sessao: str = "default") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Processa a mensagem emitindo eventos conforme cada etapa termina
+        
+        Eventos (campo "evento"):
+            intencao: intenção detectada
+            dados: dados estruturados (produtos, pedido, políticas)
+            token: trecho da resposta em linguagem natural
+            fim: resultado completo, no mesmo formato de aprocessar_mensagem
+        """
+        async for evento in self._aexecutar_pipeline(mensagem, id_sessao, transmitir=True):
+            yield evento
+    
+    async def _aexecutar_pipeline(self, mensagem: str, id_sessao: str,
+                                  transmitir: bool) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Pipeline assíncrono compartilhado pelas versões com e sem streaming
+        
+        Args:
+            transmitir: Gera a resposta final token a token em vez de uma única chamada
+        """
+        inicio = time.perf_counter()
+        
+        # Regras locais resolvem saudações e números de pedido em microssegundos
+        intencao = None
+        if self.classificador_intencao:
+            intencao = self.classificador_intencao.classificar_por_regras(mensagem)
+        
+        # Etapas que não dependem da intenção começam junto com a detecção
+        especulacao = {}
+        if self.execucao_especulativa and intencao is None:
+            especulacao = self._iniciar_especulacao(mensagem)
+        
+        try:
+            # 1. Detecta intenção
+            if intencao is None:
+                with self.metricas.cronometrar("latencia_etapa_segundos", "deteccao_intencao"):
+                    intencao = await self._adetectar_intencao(mensagem, especulacao)
+            logger.info(f"Intenção detectada: {intencao}")
+            yield {"evento": "intencao", "intencao": intencao}
             
-            return {
-                "resposta": resposta_final,
-                "intencao": intencao,
-                "dados": resposta_dados,
-                "sucesso": True
+            # Critérios só interessam à busca de produtos: libera a chamada ao LLM já
+            if intencao != "busca_produtos":
+                self._descartar_especulacao(especulacao, ["criterios"])
+            
+            # Resposta equivalente já gerada para a mesma intenção?
+            vetor = None
+            versao_dados = None
+            if self.cache_respostas and self.cache_respostas.aceita(intencao):
+                versao_dados = self.rag_system.versao_dados_intencao(intencao)
+                vetor = await self._aguardar_especulacao(especulacao, "vetor")
+                if vetor is None:
+                    vetor = await self.rag_system.aembed_consulta(mensagem)
+                with self.metricas.cronometrar("latencia_etapa_segundos", "cache_respostas"):
+                    em_cache = self.cache_respostas.buscar(intencao, vetor, versao_dados)
+                if em_cache:
+                    logger.info("Resposta obtida do cache semântico")
+                    yield {"evento": "dados", "intencao": intencao, "dados": em_cache["dados"]}
+                    if transmitir:
+                        yield {"evento": "token", "conteudo": em_cache["resposta"]}
+                    yield {
+                        "evento": "fim",
+                        "resultado": await self._afinalizar_interacao(
+                            mensagem, id_sessao, intencao, em_cache["dados"], em_cache["resposta"]
+                        )
+                    }
+                    return
+            
+            # 2. Processa baseado na intenção
+            with self.metricas.cronometrar("latencia_etapa_segundos", f"dados_{intencao}"):
+                resposta_dados = await self._aprocessar_por_intencao(mensagem, intencao, id_sessao, especulacao)
+            yield {"evento": "dados", "intencao": intencao, "dados": resposta_dados}
+            
+            # 3. Gera resposta natural (no streaming, inclui o tempo de envio dos trechos)
+            with self.metricas.cronometrar("latencia_etapa_segundos", "geracao_resposta"):
+                if transmitir:
+                    partes = []
+                    async for trecho in self._agerar_resposta_natural_stream(mensagem, intencao, resposta_dados):
+                        partes.append(trecho)
+                        yield {"evento": "token", "conteudo": trecho}
+                    resposta_final = "".join(partes).strip()
+                else:
+                    resposta_final = await self._agerar_resposta_natural(mensagem, intencao, resposta_dados)
+            
+            self._guardar_no_cache(intencao, vetor, resposta_final, resposta_dados, versao_dados)
+            
+            # 4 e 5. Histórico e contexto RAG
+            yield {
+                "evento": "fim",
+                "resultado": await self._afinalizar_interacao(
+                    mensagem, id_sessao, intencao, resposta_dados, resposta_final
+                )
             }
             
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
-            return {
-                "resposta": "Desculpe, ocorreu um erro interno. Tente novamente em alguns momentos.",
-                "intencao": "erro",
-                "dados": {},
-                "sucesso": False,
-                "erro": str(e)
-            }
+            intencao = "erro"
+            yield {"evento": "fim", "resultado": self._resposta_erro(e)}
+        finally:
+            self._descartar_especulacao(especulacao)
+            self.metricas.observar("latencia_mensagem_segundos", time.perf_counter() - inicio, intencao or "erro")
     
-    def _detectar_intencao(self, mensagem: str) -> str:
-        """Detecta a intenção do usuário usando LLM"""
+    def _iniciar_especulacao(self, mensagem: str) -> Dict[str, asyncio.Task]:
+        """
+        Dispara em paralelo as etapas que podem ser necessárias após a intenção
+        
+        O embedding da mensagem serve para busca de produtos, recomendações e
+        políticas; os critérios só são usados na busca de produtos.
+        """
+        return {
+            "criterios": asyncio.create_task(self._aextrair_criterios_busca(mensagem)),
+            "vetor": asyncio.create_task(self.rag_system.aembed_consulta(mensagem)),
+        }
+    
+    async def _aguardar_especulacao(self, especulacao: Dict[str, asyncio.Task], chave: str):
+        """Retorna o resultado de uma etapa especulativa ou None se indisponível"""
+        tarefa = especulacao.get(chave)
+        if tarefa is None:
+            return None
+        try:
+            return await tarefa
+        except Exception as e:
+            logger.warning(f"Etapa especulativa '{chave}' falhou, refazendo sob demanda: {e}")
+            return None
+    
+    def _descartar_especulacao(self, especulacao: Dict[str, asyncio.Task],
+                               chaves: Optional[List[str]] = None):
+        """Cancela etapas especulativas cujo resultado não foi usado"""
+        for chave, tarefa in especulacao.items():
+            if chaves is not None and chave not in chaves:
+                continue
+            if not tarefa.done():
+                tarefa.cancel()
+            elif not tarefa.cancelled():
+                # Consome a exceção para não gerar aviso de exceção não recuperada
+                tarefa.exception()
+    
+    def _finalizar_interacao(self, mensagem: str, id_sessao: str, intencao: str,
+                             resposta_dados: Dict[str, Any], resposta_final: str) -> Dict[str, Any]:
+        """Registra a interação no histórico e no contexto RAG e monta o retorno"""
+        # Armazena no histórico
+        self._adicionar_ao_historico(id_sessao, mensagem, intencao, resposta_dados)
+        return self._concluir_interacao(mensagem, intencao, resposta_dados, resposta_final)
+    
+    async def _afinalizar_interacao(self, mensagem: str, id_sessao: str, intencao: str,
+                                    resposta_dados: Dict[str, Any], resposta_final: str) -> Dict[str, Any]:
+        """Versão assíncrona de _finalizar_interacao (o histórico é gravado fora do event loop)"""
+        await self._aadicionar_ao_historico(id_sessao, mensagem, intencao, resposta_dados)
+        return self._concluir_interacao(mensagem, intencao, resposta_dados, resposta_final)
+    
+    def _concluir_interacao(self, mensagem: str, intencao: str,
+                            resposta_dados: Dict[str, Any], resposta_final: str) -> Dict[str, Any]:
+        """Adiciona a conversa ao contexto RAG e monta o retorno"""
+        # Adiciona conversa ao contexto RAG para aprendizado
+        produtos_mencionados = []
+        if resposta_dados.get("produtos"):
+            produtos_mencionados = [p.get("id") for p in resposta_dados["produtos"] if p.get("id")]
+        
+        self.rag_system.adicionar_conversa_ao_contexto(
+            mensagem_usuario=mensagem,
+            resposta_assistente=resposta_final,
+            produtos_mencionados=produtos_mencionados
+        )
+        
+        return {
+            "resposta": resposta_final,
+            "intencao": intencao,
+            "dados": resposta_dados,
+            "sucesso": True
+        }
+    
+    def _guardar_no_cache(self, intencao: str, vetor: Optional[List[float]], resposta_final: str,
+                          resposta_dados: Dict[str, Any], versao_dados):
+        """Guarda a resposta no cache semântico se ela for reutilizável"""
+        if vetor is None or not self.cache_respostas:
+            return
+        if resposta_dados.get("tipo") == "erro":
+            return
+        self.cache_respostas.guardar(intencao, vetor, resposta_final, resposta_dados, versao_dados)
+    
+    def _resposta_erro(self, erro: Exception) -> Dict[str, Any]:
+        """Resposta padrão para falhas no processamento"""
+        self.metricas.incrementar("erros")
+        return {
+            "resposta": "Desculpe, ocorreu um erro interno. Tente novamente em alguns momentos.",
+            "intencao": "erro",
+            "dados": {},
+            "sucesso": False,
+            "erro": str(erro)
+        }
+    
+    def _mensagens_deteccao_intencao(self, mensagem: str) -> list:
+        """Monta as mensagens do LLM para detecção de intenção"""
         prompt = self.prompts.get_prompt_deteccao_intencao()
         
-        messages = [
+        return [
             SystemMessage(content=prompt),
             HumanMessage(content=f"Mensagem do usuário: {mensagem}")
         ]
-        
-        response = self.llm.invoke(messages)
-        intencao = response.content.strip().lower()
+    
+    def _validar_intencao(self, resposta_llm: str) -> str:
+        """Normaliza a resposta do LLM para uma intenção conhecida"""
+        intencao = resposta_llm.strip().lower()
         
         # Valida intenções conhecidas
         intencoes_validas = ["busca_produtos", "consulta_pedido", "politicas", "recomendacao", "saudacao", "outro"]
@@ -148,6 +425,78 @@ class AssistenteVirtual:
             
         return intencao
     
+    def _detectar_intencao(self, mensagem: str) -> str:
+        """Detecta a intenção do usuário (classificador local e, se inconclusivo, LLM)"""
+        if self.classificador_intencao:
+            intencao = self.classificador_intencao.classificar_por_regras(mensagem)
+            if intencao:
+                return intencao
+            
+            try:
+                # O embedding fica no cache e é reaproveitado pela busca em seguida
+                vetor = self.rag_system.embed_consulta(mensagem)
+                intencao = self.classificador_intencao.classificar_por_vetor(vetor)
+                if intencao:
+                    return intencao
+            except Exception as e:
+                logger.warning(f"Classificador local indisponível: {e}")
+            
+            self.classificador_intencao.registrar_fallback_llm()
+        
+        response = self._invocar_llm("intencao", self._mensagens_deteccao_intencao(mensagem))
+        return self._validar_intencao(response.content)
+    
+    async def _adetectar_intencao(self, mensagem: str,
+                                  especulacao: Optional[Dict[str, asyncio.Task]] = None) -> str:
+        """
+        Versão assíncrona de _detectar_intencao
+        
+        As regras locais já foram aplicadas por aprocessar_mensagem; aqui entra o
+        nearest-centroid sobre o embedding (especulativo, se disponível) e o LLM.
+        """
+        if self.classificador_intencao:
+            try:
+                vetor = await self._aguardar_especulacao(especulacao or {}, "vetor")
+                if vetor is None:
+                    vetor = await self.rag_system.aembed_consulta(mensagem)
+                intencao = await self.classificador_intencao.aclassificar_por_vetor(vetor)
+                if intencao:
+                    return intencao
+            except Exception as e:
+                logger.warning(f"Classificador local indisponível: {e}")
+            
+            self.classificador_intencao.registrar_fallback_llm()
+        
+        response = await self._ainvocar_llm("intencao", self._mensagens_deteccao_intencao(mensagem))
+        return self._validar_intencao(response.content)
+    
+    async def _aprocessar_por_intencao(self, mensagem: str, intencao: str, id_sessao: str,
+                                       especulacao: Optional[Dict[str, asyncio.Task]] = None) -> Dict[str, Any]:
+        """Versão assíncrona de _processar_por_intencao (reaproveita etapas especulativas)"""
+        especulacao = especulacao or {}
+        
+        if intencao == "busca_produtos":
+            return await self._abuscar_produtos(
+                mensagem,
+                criterios=await self._aguardar_especulacao(especulacao, "criterios"),
+                vetor=await self._aguardar_especulacao(especulacao, "vetor")
+            )
+        elif intencao == "consulta_pedido":
+            # Backends em disco (SQLite) bloqueiam: consulta fora do event loop
+            return await asyncio.to_thread(self._consultar_pedido, mensagem)
+        elif intencao == "politicas":
+            return await self._aconsultar_politicas(
+                mensagem, vetor=await self._aguardar_especulacao(especulacao, "vetor")
+            )
+        elif intencao == "recomendacao":
+            return await self._agerar_recomendacao(
+                mensagem, id_sessao, vetor=await self._aguardar_especulacao(especulacao, "vetor")
+            )
+        elif intencao == "saudacao":
+            return {"tipo": "saudacao", "mensagem": mensagem}
+        else:
+            return {"tipo": "geral", "mensagem": mensagem}
+    
     def _processar_por_intencao(self, mensagem: str, intencao: str, id_sessao: str) -> Dict[str, Any]:
         """Processa mensagem baseado na intenção detectada"""
         
@@ -170,38 +519,79 @@ class AssistenteVirtual:
             # Extrai critérios de busca
             criterios = self._extrair_criterios_busca(consulta)
             
-            # Busca semântica usando embeddings com threshold
+            # Busca semântica restrita aos produtos que atendem aos critérios
             produtos_similares = self.rag_system.buscar_por_embedding(
-                consulta, top_k=10, threshold=0.6
+                consulta, top_k=10, threshold=0.6, filtros=self._filtros_dos_criterios(criterios)
             )
             
-            # Aplica filtros
-            produtos_filtrados = self._aplicar_filtros(produtos_similares, criterios)
+            return self._montar_resultado_busca(produtos_similares, criterios)
+        except Exception as e:
+            logger.error(f"Erro na busca de produtos: {e}")
+            return {"tipo": "erro", "mensagem": "Erro na busca de produtos"}
+    
+    async def _abuscar_produtos(self, consulta: str, criterios: Optional[Dict[str, Any]] = None,
+                                vetor: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Versão assíncrona de _buscar_produtos
+        
+        Args:
+            criterios: Critérios já extraídos da consulta, se disponíveis
+            vetor: Embedding já calculado da consulta, se disponível
+        """
+        try:
+            if criterios is None and vetor is None:
+                # Sem especulação: extração de critérios e embedding da consulta são independentes
+                criterios, vetor = await asyncio.gather(
+                    self._aextrair_criterios_busca(consulta),
+                    self.rag_system.aembed_consulta(consulta)
+                )
+            elif criterios is None:
+                criterios = await self._aextrair_criterios_busca(consulta)
+            
+            # Os critérios filtram os candidatos antes da busca vetorial
+            produtos_similares = await self.rag_system.abuscar_por_embedding(
+                consulta, top_k=10, threshold=0.6, vetor=vetor,
+                filtros=self._filtros_dos_criterios(criterios)
+            )
             
-            return {
-                "tipo": "busca_produtos",
-                "produtos": produtos_filtrados[:5],  # Top 5 resultados
-                "criterios": criterios,
-                "total_encontrados": len(produtos_filtrados)
-            }
+            return self._montar_resultado_busca(produtos_similares, criterios)
         except Exception as e:
             logger.error(f"Erro na busca de produtos: {e}")
             return {"tipo": "erro", "mensagem": "Erro na busca de produtos"}
     
-    def _extrair_criterios_busca(self, consulta: str) -> Dict[str, Any]:
-        """Extrai critérios de busca da consulta usando LLM"""
+    def _montar_resultado_busca(self, produtos_similares: List[Dict], criterios: Dict[str, Any]) -> Dict[str, Any]:
+        """Monta o resultado da busca de produtos (já filtrada pelos critérios)"""
+        return {
+            "tipo": "busca_produtos",
+            "produtos": produtos_similares[:5],  # Top 5 resultados
+            "criterios": criterios,
+            "total_encontrados": len(produtos_similares)
+        }
+    
+    def _mensagens_extracao_criterios(self, consulta: str) -> list:
+        """Monta as mensagens do LLM para extração de critérios"""
         prompt = self.prompts.get_prompt_extracao_criterios()
         
-        messages = [
+        return [
             SystemMessage(content=prompt),
             HumanMessage(content=f"Consulta: {consulta}")
         ]
-        
-        response = self.llm.invoke(messages)
-        
+    
+    def _extrair_criterios_busca(self, consulta: str) -> Dict[str, Any]:
+        """Extrai critérios de busca da consulta usando LLM"""
+        response = self._invocar_llm("criterios", self._mensagens_extracao_criterios(consulta))
+        return self._interpretar_criterios(response.content)
+    
+    async def _aextrair_criterios_busca(self, consulta: str) -> Dict[str, Any]:
+        """Versão assíncrona de _extrair_criterios_busca"""
+        response = await self._ainvocar_llm("criterios", self._mensagens_extracao_criterios(consulta))
+        return self._interpretar_criterios(response.content)
+    
+    def _interpretar_criterios(self, resposta_llm: str) -> Dict[str, Any]:
+        """Converte a resposta do LLM em dicionário de critérios"""
         try:
             # Tenta extrair JSON da resposta
-            criterios_str = response.content.strip()
+            criterios_str = resposta_llm.strip()
             if criterios_str.startswith("```json"):
                 criterios_str = criterios_str.split("```json")[1].split("```")[0]
             
@@ -211,36 +601,44 @@ class AssistenteVirtual:
             # Retorna critérios vazios se falhar
             return {"categoria": None, "preco_max": None, "características": []}
     
-    def _aplicar_filtros(self, produtos: List[Dict], criterios: Dict[str, Any]) -> List[Dict]:
-        """Aplica filtros aos produtos encontrados"""
-        produtos_filtrados = produtos.copy()
-        
-        # Filtro de preço
-        if criterios.get("preco_max"):
-            try:
-                preco_max = float(criterios["preco_max"])
-                produtos_filtrados = [
-                    p for p in produtos_filtrados 
-                    if p.get("preco", 0) <= preco_max
-                ]
-            except ValueError:
-                pass
-        
-        # Filtro de categoria
-        if criterios.get("categoria"):
-            categoria = criterios["categoria"].lower()
-            produtos_filtrados = [
-                p for p in produtos_filtrados 
-                if categoria in p.get("categoria", "").lower()
-            ]
-        
-        return produtos_filtrados
+    def _filtros_dos_criterios(self, criterios: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte os critérios extraídos pelo LLM em filtros da busca vetorial"""
+        return {
+            chave: criterios[chave]
+            for chave in ("categoria", "preco_min", "preco_max")
+            if criterios.get(chave)
+        }
     
     def _consultar_pedido(self, mensagem: str) -> Dict[str, Any]:
-        """Consulta status de pedido"""
-        # Extrai número do pedido
+        """
+        Consulta status de pedido por número ou código de rastreamento
+
+        O chat não é autenticado: um e-mail sozinho não lista pedidos. Se vier
+        junto com o número, o pedido só é retornado quando o e-mail confere.
+        """
         import re
-        numeros = re.findall(r'#?(\d+)', mensagem)
+        
+        # Código de rastreamento dos Correios (ex: BR123456789SP)
+        rastreio = re.search(r'\b[A-Za-z]{2}\d{9}[A-Za-z]{2}\b', mensagem)
+        if rastreio:
+            codigo = rastreio.group(0).upper()
+            pedido = self.pedidos.buscar_por_rastreio(codigo)
+            if not pedido:
+                return {
+                    "tipo": "consulta_pedido",
+                    "erro": "Pedido não encontrado",
+                    "codigo_rastreamento": codigo
+                }
+            return {
+                "tipo": "consulta_pedido",
+                "pedido": pedido,
+                "numero": pedido["pedido_id"]
+            }
+        
+        # Extrai número do pedido (ignorando dígitos que façam parte de um e-mail)
+        email = re.search(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+', mensagem)
+        texto_sem_email = mensagem.replace(email.group(0), " ") if email else mensagem
+        numeros = re.findall(r'#?(\d+)', texto_sem_email)
         
         if not numeros:
             return {
@@ -251,8 +649,12 @@ class AssistenteVirtual:
         
         numero_pedido = numeros[0]
         
-        # Busca pedido
-        pedido = next((p for p in self.pedidos if p["pedido_id"] == numero_pedido), None)
+        # Busca pedido pelo índice do repositório
+        pedido = self.pedidos.obter(numero_pedido)
+        
+        # E-mail informado que não é o do pedido: responde como inexistente
+        if pedido and email and RepositorioPedidos._email(pedido) != email.group(0).strip().lower():
+            pedido = None
         
         if not pedido:
             return {
@@ -283,28 +685,33 @@ class AssistenteVirtual:
                 "mensagem": "Erro ao consultar políticas"
             }
     
+    async def _aconsultar_politicas(self, mensagem: str, vetor: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Versão assíncrona de _consultar_politicas"""
+        try:
+            resultado = await self.rag_system.abuscar_politicas(mensagem, vetor=vetor)
+            return {
+                "tipo": "politicas",
+                "resposta": resultado,
+                "fonte": "base_conhecimento"
+            }
+        except Exception as e:
+            logger.error(f"Erro ao consultar políticas: {e}")
+            return {
+                "tipo": "erro",
+                "mensagem": "Erro ao consultar políticas"
+            }
+    
     def _gerar_recomendacao(self, mensagem: str, id_sessao: str) -> Dict[str, Any]:
         """Gera recomendações personalizadas"""
         try:
             # Busca produtos relevantes usando embeddings
+            vetor = self.rag_system.embed_consulta(mensagem)
             produtos_relevantes = self.rag_system.buscar_por_embedding(
                 mensagem, top_k=8, threshold=0.5
             )
+            citados = self.rag_system.produtos_de_conversas_similares(mensagem, vetor=vetor)
             
-            # Filtra por disponibilidade
-            produtos_disponiveis = [
-                p for p in produtos_relevantes 
-                if p.get("disponivel", True)
-            ]
-            
-            # Seleciona top 3
-            recomendacoes = produtos_disponiveis[:3]
-            
-            return {
-                "tipo": "recomendacao",
-                "produtos": recomendacoes,
-                "total": len(recomendacoes)
-            }
+            return self._montar_recomendacao(produtos_relevantes, citados)
         except Exception as e:
             logger.error(f"Erro ao gerar recomendações: {e}")
             return {
@@ -312,34 +719,151 @@ class AssistenteVirtual:
                 "mensagem": "Erro ao gerar recomendações"
             }
     
-    def _gerar_resposta_natural(self, mensagem: str, intencao: str, dados: Dict[str, Any]) -> str:
-        """Gera resposta natural usando LLM"""
+    async def _agerar_recomendacao(self, mensagem: str, id_sessao: str,
+                                   vetor: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Versão assíncrona de _gerar_recomendacao"""
         try:
-            prompt = self.prompts.get_prompt_resposta_natural(intencao)
+            if vetor is None:
+                vetor = await self.rag_system.aembed_consulta(mensagem)
+            produtos_relevantes, citados = await asyncio.gather(
+                self.rag_system.abuscar_por_embedding(mensagem, top_k=8, threshold=0.5, vetor=vetor),
+                self.rag_system.aprodutos_de_conversas_similares(mensagem, vetor=vetor)
+            )
             
-            context = f"""
+            return self._montar_recomendacao(produtos_relevantes, citados)
+        except Exception as e:
+            logger.error(f"Erro ao gerar recomendações: {e}")
+            return {
+                "tipo": "erro",
+                "mensagem": "Erro ao gerar recomendações"
+            }
+    
+    def _montar_recomendacao(self, produtos_relevantes: List[Dict],
+                             citados_em_conversas: List[str] = ()) -> Dict[str, Any]:
+        """
+        Seleciona as recomendações entre os produtos relevantes
+        
+        Produtos citados em conversas anteriores parecidas sobem na ordem
+        (aprendizado com as conversas), mantendo a ordem de relevância entre os demais.
+        """
+        # Filtra por disponibilidade
+        produtos_disponiveis = [
+            p for p in produtos_relevantes 
+            if p.get("disponivel", True)
+        ]
+        
+        posicao_citacao = {produto_id: i for i, produto_id in enumerate(citados_em_conversas)}
+        produtos_disponiveis.sort(key=lambda p: posicao_citacao.get(p.get("id"), len(posicao_citacao)))
+        
+        # Seleciona top 3
+        recomendacoes = produtos_disponiveis[:3]
+        
+        return {
+            "tipo": "recomendacao",
+            "produtos": recomendacoes,
+            "total": len(recomendacoes)
+        }
+    
+    def _mensagens_resposta_natural(self, mensagem: str, intencao: str, dados: Dict[str, Any]) -> list:
+        """Monta as mensagens do LLM para a resposta final"""
+        prompt = self.prompts.get_prompt_resposta_natural(intencao)
+        
+        context = f"""
             Mensagem do usuário: {mensagem}
             Intenção: {intencao}
             Dados encontrados: {json.dumps(dados, ensure_ascii=False, indent=2)}
             """
+        
+        return [
+            SystemMessage(content=prompt),
+            HumanMessage(content=context)
+        ]
+    
+    def _gerar_resposta_natural(self, mensagem: str, intencao: str, dados: Dict[str, Any]) -> str:
+        """Gera resposta natural usando LLM"""
+        try:
+            response = self._invocar_llm("resposta", self._mensagens_resposta_natural(mensagem, intencao, dados))
+            return response.content.strip()
             
-            messages = [
-                SystemMessage(content=prompt),
-                HumanMessage(content=context)
-            ]
+        except Exception as e:
+            logger.error(f"Erro ao gerar resposta natural: {e}")
+            return "Desculpe, não consegui processar sua solicitação no momento."
+    
+    async def _agerar_resposta_natural_stream(self, mensagem: str, intencao: str,
+                                              dados: Dict[str, Any]) -> AsyncIterator[str]:
+        """Gera a resposta natural em trechos, à medida que o LLM produz os tokens"""
+        produziu = False
+        uso = None
+        inicio = time.perf_counter()
+        try:
+            async for chunk in self.llm.astream(self._mensagens_resposta_natural(mensagem, intencao, dados)):
+                # O uso de tokens chega em um trecho próprio, ao final
+                if getattr(chunk, "usage_metadata", None):
+                    uso = chunk.usage_metadata
+                if chunk.content:
+                    if not produziu:
+                        self.metricas.observar(
+                            "latencia_primeiro_token_segundos", time.perf_counter() - inicio, "resposta"
+                        )
+                    produziu = True
+                    yield chunk.content
             
-            response = self.llm.invoke(messages)
+            self._registrar_uso_llm("resposta", uso)
+                    
+        except Exception as e:
+            self.metricas.incrementar("erros_llm", "resposta")
+            logger.error(f"Erro ao gerar resposta natural: {e}")
+            if not produziu:
+                yield "Desculpe, não consegui processar sua solicitação no momento."
+        finally:
+            self.metricas.observar("latencia_llm_segundos", time.perf_counter() - inicio, "resposta")
+    
+    async def _agerar_resposta_natural(self, mensagem: str, intencao: str, dados: Dict[str, Any]) -> str:
+        """Versão assíncrona de _gerar_resposta_natural"""
+        try:
+            response = await self._ainvocar_llm("resposta", self._mensagens_resposta_natural(mensagem, intencao, dados))
             return response.content.strip()
             
         except Exception as e:
             logger.error(f"Erro ao gerar resposta natural: {e}")
             return "Desculpe, não consegui processar sua solicitação no momento."
     
-    def _adicionar_ao_historico(self, id_sessao: str, mensagem: str, intencao: str, dados: Dict[str, Any]):
-        """Adiciona interação ao histórico da sessão"""
-        if id_sessao not in self.historico_sessoes:
-            self.historico_sessoes[id_sessao] = []
-        
+    def _invocar_llm(self, etapa: str, mensagens: list):
+        """Chama o LLM registrando latência, tokens e falhas da etapa"""
+        try:
+            with self.metricas.cronometrar("latencia_llm_segundos", etapa):
+                resposta = self.llm.invoke(mensagens)
+        except Exception:
+            self.metricas.incrementar("erros_llm", etapa)
+            raise
+        self._registrar_uso_llm(etapa, getattr(resposta, "usage_metadata", None))
+        return resposta
+    
+    async def _ainvocar_llm(self, etapa: str, mensagens: list):
+        """Versão assíncrona de _invocar_llm"""
+        try:
+            with self.metricas.cronometrar("latencia_llm_segundos", etapa):
+                resposta = await self.llm.ainvoke(mensagens)
+        except Exception:
+            self.metricas.incrementar("erros_llm", etapa)
+            raise
+        self._registrar_uso_llm(etapa, getattr(resposta, "usage_metadata", None))
+        return resposta
+    
+    def _registrar_uso_llm(self, etapa: str, uso: Optional[Dict[str, int]]):
+        """Conta a chamada e, se o modelo informou, os tokens de entrada e saída"""
+        self.metricas.incrementar("chamadas_llm", etapa)
+        if not uso:
+            return
+        entrada = uso.get("input_tokens", 0)
+        saida = uso.get("output_tokens", 0)
+        self.metricas.incrementar("tokens_entrada_llm", etapa, entrada)
+        self.metricas.incrementar("tokens_saida_llm", etapa, saida)
+        self.metricas.observar("tokens_por_chamada_llm", entrada + saida, etapa, limites=LIMITES_TOKENS)
+    
+    def _nova_interacao(self, id_sessao: str, mensagem: str, intencao: str,
+                        dados: Dict[str, Any]) -> Dict[str, Any]:
+        """Monta a interação a guardar no histórico e contabiliza nas métricas"""
         interacao = InteracaoUsuario(
             id_sessao=id_sessao,
             mensagem=mensagem,
@@ -348,42 +872,68 @@ class AssistenteVirtual:
             timestamp=datetime.now()
         )
         
-        self.historico_sessoes[id_sessao].append(interacao)
+        self.metricas.incrementar("interacoes")
+        self.metricas.incrementar("intencoes", intencao)
+        return interacao.para_dict()
+    
+    def _adicionar_ao_historico(self, id_sessao: str, mensagem: str, intencao: str, dados: Dict[str, Any]):
+        """Adiciona interação ao histórico da sessão"""
+        interacao = self._nova_interacao(id_sessao, mensagem, intencao, dados)
         
-        # Mantém apenas últimas 10 interações por sessão
-        if len(self.historico_sessoes[id_sessao]) > 10:
-            self.historico_sessoes[id_sessao] = self.historico_sessoes[id_sessao][-10:]
+        # O armazenamento mantém só as últimas interações e expira sessões inativas
+        try:
+            with self.metricas.cronometrar("latencia_etapa_segundos", "historico_sessao"):
+                self.sessoes.registrar(id_sessao, interacao)
+        except Exception as e:
+            logger.error(f"Erro ao registrar interação da sessão {id_sessao}: {e}")
     
-    def obter_historico_sessao(self, id_sessao: str) -> List[Dict]:
-        """Retorna histórico de uma sessão"""
-        if id_sessao not in self.historico_sessoes:
-            return []
+    async def _aadicionar_ao_historico(self, id_sessao: str, mensagem: str, intencao: str,
+                                       dados: Dict[str, Any]):
+        """Versão assíncrona de _adicionar_ao_historico: SQLite/Redis são consultados em uma thread"""
+        interacao = self._nova_interacao(id_sessao, mensagem, intencao, dados)
         
+        try:
+            with self.metricas.cronometrar("latencia_etapa_segundos", "historico_sessao"):
+                await asyncio.to_thread(self.sessoes.registrar, id_sessao, interacao)
+        except Exception as e:
+            logger.error(f"Erro ao registrar interação da sessão {id_sessao}: {e}")
+    
+    @staticmethod
+    def _resumir_historico(historico: List[Dict[str, Any]]) -> List[Dict]:
         return [
             {
-                "mensagem": i.mensagem,
-                "intencao": i.intencao,
-                "timestamp": i.timestamp.isoformat()
+                "mensagem": i["mensagem"],
+                "intencao": i["intencao"],
+                "timestamp": i["timestamp"]
             }
-            for i in self.historico_sessoes[id_sessao]
+            for i in historico
         ]
     
+    def obter_historico_sessao(self, id_sessao: str) -> List[Dict]:
+        """Retorna histórico de uma sessão"""
+        return self._resumir_historico(self.sessoes.historico(id_sessao))
+    
+    async def aobter_historico_sessao(self, id_sessao: str) -> List[Dict]:
+        """Versão assíncrona de obter_historico_sessao (leitura do backend em uma thread)"""
+        return self._resumir_historico(await asyncio.to_thread(self.sessoes.historico, id_sessao))
+    
     def obter_estatisticas(self) -> Dict[str, Any]:
         """Retorna estatísticas do assistente"""
-        total_sessoes = len(self.historico_sessoes)
-        total_interacoes = sum(len(sessao) for sessao in self.historico_sessoes.values())
+        # Contadores mantidos a cada interação: nada é percorrido aqui
+        estatisticas = {
+            "total_sessoes": self.sessoes.total_sessoes(),
+            "total_interacoes": int(self.metricas.valor("interacoes")),
+            "intencoes_populares": {
+                intencao: int(total) for intencao, total in self.metricas.contador("intencoes").items()
+            },
+            "produtos_cadastrados": len(self.rag_system.catalogo),
+            "pedidos_sistema": self.pedidos.total_pedidos()
+        }
         
-        # Conta intenções
-        contagem_intencoes = {}
-        for sessao in self.historico_sessoes.values():
-            for interacao in sessao:
-                intencao = interacao.intencao
-                contagem_intencoes[intencao] = contagem_intencoes.get(intencao, 0) + 1
+        if self.classificador_intencao:
+            estatisticas["classificacao_intencao"] = dict(self.classificador_intencao.contagem)
+        if self.cache_respostas:
+            estatisticas["cache_respostas"] = self.cache_respostas.obter_estatisticas()
+        estatisticas["metricas"] = self.metricas.instantaneo()
         
-        return {
-            "total_sessoes": total_sessoes,
-            "total_interacoes": total_interacoes,
-            "intencoes_populares": contagem_intencoes,
-            "produtos_cadastrados": len(self.produtos),
-            "pedidos_sistema": len(self.pedidos)
-        } 
\ No newline at end of file
+        return estatisticas 
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Busca lexical de produtos
+Índice invertido BM25 local e fusão com a busca vetorial
+"""
+
+import heapq
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .texto import normalizar_texto, tokenizar
+
+logger = logging.getLogger(__name__)
+
+
+def _chaves_exatas(texto: str) -> Set[str]:
+    """
+    Identificadores de modelo presentes em um texto
+
+    Termos que misturam letras e dígitos ("a54", "prod001") e pares de termos
+    consecutivos em que um deles tem dígitos ("inspiron 15", "15 3000").
+    Números isolados ("3000") não contam, para não confundir com preços.
+    """
+    tokens = normalizar_texto(texto).replace("#", " ").split()
+    chaves = {
+        token for token in tokens
+        if any(c.isdigit() for c in token) and any(c.isalpha() for c in token)
+    }
+    for anterior, atual in zip(tokens, tokens[1:]):
+        if any(c.isdigit() for c in anterior + atual):
+            chaves.add(f"{anterior} {atual}")
+    return chaves
+
+
+class IndiceBM25:
+    """
+    Índice invertido em memória com ranqueamento BM25
+
+    Os termos passam pela mesma normalização do restante do sistema (sem
+    acentos, minúsculas) e por stemming leve. Além do BM25 mantém um índice de
+    identificadores de modelo (nome e ID do produto) para reconhecer consultas
+    que apontam para um único produto.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._termos_por_doc: Dict[str, Counter] = {}
+        self._comprimentos: Dict[str, int] = {}
+        self._comprimento_total = 0
+
+        self._docs_por_chave: Dict[str, Set[str]] = defaultdict(set)
+        self._chaves_por_doc: Dict[str, Set[str]] = {}
+
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._termos_por_doc)
+
+    def adicionar(self, doc_id: str, texto: str, identificacao: str = ""):
+        """
+        Indexa (ou reindexa) um documento
+
+        Args:
+            doc_id: ID do produto
+            texto: Texto completo usado no BM25
+            identificacao: Texto curto (nome/ID) usado para reconhecer modelos exatos
+        """
+        termos = Counter(tokenizar(texto))
+        chaves = _chaves_exatas(identificacao)
+
+        with self._lock:
+            self._remover(doc_id)
+
+            for termo, frequencia in termos.items():
+                self._postings[termo][doc_id] = frequencia
+            self._termos_por_doc[doc_id] = termos
+            self._comprimentos[doc_id] = sum(termos.values())
+            self._comprimento_total += self._comprimentos[doc_id]
+
+            for chave in chaves:
+                self._docs_por_chave[chave].add(doc_id)
+            self._chaves_por_doc[doc_id] = chaves
+
+    def remover(self, doc_id: str):
+        """Remove um documento do índice"""
+        with self._lock:
+            self._remover(doc_id)
+
+    def _remover(self, doc_id: str):
+        """Remove um documento (chamar com o lock adquirido)"""
+        termos = self._termos_por_doc.pop(doc_id, None)
+        if termos is not None:
+            for termo in termos:
+                postings = self._postings.get(termo)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[termo]
+            self._comprimento_total -= self._comprimentos.pop(doc_id)
+
+        for chave in self._chaves_por_doc.pop(doc_id, ()):
+            docs = self._docs_por_chave.get(chave)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._docs_por_chave[chave]
+
+    def reconstruir(self, documentos: Iterable[Tuple[str, str, str]]):
+        """Descarta o índice atual e indexa (doc_id, texto, identificação) de novo"""
+        with self._lock:
+            self._postings.clear()
+            self._termos_por_doc.clear()
+            self._comprimentos.clear()
+            self._comprimento_total = 0
+            self._docs_por_chave.clear()
+            self._chaves_por_doc.clear()
+        for doc_id, texto, identificacao in documentos:
+            self.adicionar(doc_id, texto, identificacao)
+
+    def buscar(self, consulta: str, top_k: int = 10,
+               candidatos: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Ranqueia os documentos pela consulta
+
+        Returns:
+            Lista de (doc_id, score BM25), do mais para o menos relevante
+        """
+        termos = set(tokenizar(consulta))
+
+        with self._lock:
+            total_docs = len(self._termos_por_doc)
+            if not termos or not total_docs:
+                return []
+            comprimento_medio = self._comprimento_total / total_docs
+
+            scores: Dict[str, float] = defaultdict(float)
+            for termo in termos:
+                postings = self._postings.get(termo)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequencia in postings.items():
+                    if candidatos is not None and doc_id not in candidatos:
+                        continue
+                    comprimento = self._comprimentos[doc_id]
+                    normalizacao = self.k1 * (1 - self.b + self.b * comprimento / comprimento_medio)
+                    scores[doc_id] += idf * frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+
+        return heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+
+    def buscar_exato(self, consulta: str, candidatos: Optional[Set[str]] = None) -> Optional[str]:
+        """
+        Produto identificado sem ambiguidade pelos modelos citados na consulta
+
+        O vencedor é o produto que casa com mais identificadores da consulta,
+        desde que seja o único nessa posição e nenhum identificador aponte
+        exclusivamente para outro produto (ex: "iphone 13 ou galaxy a54").
+
+        Returns:
+            ID do produto ou None se a consulta não identificar um único produto
+        """
+        contagem: Counter = Counter()
+        exclusivos: Set[str] = set()
+
+        with self._lock:
+            for chave in _chaves_exatas(consulta):
+                docs = self._docs_por_chave.get(chave)
+                if not docs:
+                    continue
+                if candidatos is not None:
+                    docs = docs & candidatos
+                contagem.update(docs)
+                if len(docs) == 1:
+                    exclusivos |= docs
+
+        if not contagem:
+            return None
+
+        (melhor, total), *demais = contagem.most_common()
+        if demais and demais[0][1] == total:
+            return None
+        if exclusivos - {melhor}:
+            return None
+        return melhor
+
+
+def fundir_rrf(*rankings: List[str], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Reciprocal Rank Fusion de várias listas ordenadas de IDs
+
+    Returns:
+        Lista de (id, score) ordenada pelo score fundido (maior = mais relevante)
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for posicao, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + posicao)
+    return sorted(scores.items(), key=itemgetter(1), reverse=True)
@@ -0,0 +1,294 @@
+"""
+Cache persistente de embeddings
+Evita chamadas repetidas à API de embeddings para textos já vistos
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEmbeddings(Embeddings):
+    """
+    Envolve um objeto de embeddings com cache em disco endereçado por conteúdo
+
+    A chave é o hash de (modelo, texto normalizado) e o vetor é gravado como
+    float32 compacto em um arquivo SQLite. Uma camada LRU em memória atende os
+    textos mais quentes sem tocar o disco, e o arquivo é limitado a
+    `max_entradas`, descartando os vetores acessados há mais tempo. O horário
+    de acesso é gravado em lotes, e as variantes assíncronas consultam o disco
+    em uma thread para não bloquear o event loop.
+    """
+
+    def __init__(self, embeddings_base: Embeddings, caminho: str = "data/cache_embeddings.sqlite",
+                 max_entradas: int = 100_000, max_entradas_memoria: int = 2_048,
+                 lote_acessos: int = 256):
+        """
+        Args:
+            embeddings_base: Objeto de embeddings real (ex: OpenAIEmbeddings)
+            caminho: Arquivo SQLite do cache
+            max_entradas: Limite de vetores mantidos em disco
+            max_entradas_memoria: Limite de vetores mantidos na LRU em memória
+            lote_acessos: Acessos acumulados antes de gravar os horários no disco
+        """
+        self.embeddings_base = embeddings_base
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.max_entradas_memoria = max_entradas_memoria
+        self.lote_acessos = lote_acessos
+
+        self._memoria: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Último acesso ainda não gravado de cada chave (usado no descarte por antiguidade)
+        self._acessos_pendentes: Dict[str, float] = {}
+        # _lock protege a memória e os contadores; _lock_disco, a conexão SQLite (o event loop só usa o primeiro)
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        # Com WAL, NORMAL não corrompe o arquivo em uma queda; no máximo perde as últimas entradas
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " chave TEXT PRIMARY KEY,"
+            " vetor BLOB NOT NULL,"
+            " ultimo_acesso REAL NOT NULL)"
+        )
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_acesso ON embeddings (ultimo_acesso)"
+        )
+        self._conexao.commit()
+        self._total_disco = self._conexao.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @property
+    def model(self) -> Optional[str]:
+        """Modelo de embeddings do objeto envolvido"""
+        return getattr(self.embeddings_base, "model", None)
+
+    @staticmethod
+    def _normalizar(texto: str) -> str:
+        """Normaliza unicode e espaços para que variações triviais compartilhem a chave"""
+        return " ".join(unicodedata.normalize("NFC", texto).split())
+
+    def _chave(self, texto: str) -> str:
+        """Chave do cache para um texto"""
+        conteudo = f"{self.model}\x00{self._normalizar(texto)}"
+        return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+    def _buscar_memoria(self, chaves: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        """Busca vetores na LRU em memória; retorna (encontrados, chaves faltantes)"""
+        encontrados = {}
+        faltantes = []
+        agora = time.time()
+
+        with self._lock:
+            for chave in chaves:
+                vetor = self._memoria.get(chave)
+                if vetor is not None:
+                    self._memoria.move_to_end(chave)
+                    self._acessos_pendentes[chave] = agora
+                    encontrados[chave] = vetor
+                else:
+                    faltantes.append(chave)
+
+        return encontrados, faltantes
+
+    def _buscar_disco(self, chaves: List[str]) -> Dict[str, List[float]]:
+        """Busca vetores no SQLite e os coloca na LRU em memória"""
+        encontrados = {}
+        agora = time.time()
+
+        with self._lock_disco:
+            for inicio in range(0, len(chaves), 500):
+                lote = chaves[inicio:inicio + 500]
+                marcadores = ",".join("?" * len(lote))
+                linhas = self._conexao.execute(
+                    f"SELECT chave, vetor FROM embeddings WHERE chave IN ({marcadores})", lote
+                ).fetchall()
+                for chave, blob in linhas:
+                    encontrados[chave] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            with self._lock:
+                for chave, vetor in encontrados.items():
+                    self._guardar_memoria(chave, vetor)
+                    self._acessos_pendentes[chave] = agora
+
+            if len(self._acessos_pendentes) >= self.lote_acessos:
+                self._gravar_acessos()
+                self._conexao.commit()
+
+        return encontrados
+
+    def _buscar(self, chaves: List[str]) -> Dict[str, List[float]]:
+        """Busca vetores na memória e, em seguida, no disco"""
+        encontrados, faltantes = self._buscar_memoria(chaves)
+        if faltantes:
+            encontrados.update(self._buscar_disco(faltantes))
+        return encontrados
+
+    async def _abuscar(self, chaves: List[str]) -> Dict[str, List[float]]:
+        """Como _buscar, com a consulta ao disco fora do event loop"""
+        encontrados, faltantes = self._buscar_memoria(chaves)
+        if faltantes:
+            encontrados.update(await asyncio.to_thread(self._buscar_disco, faltantes))
+        return encontrados
+
+    def _gravar_acessos(self):
+        """Grava os horários de acesso acumulados (chamar com _lock_disco, sem commit)"""
+        with self._lock:
+            acessos, self._acessos_pendentes = self._acessos_pendentes, {}
+        if acessos:
+            self._conexao.executemany(
+                "UPDATE embeddings SET ultimo_acesso = ? WHERE chave = ?",
+                [(agora, chave) for chave, agora in acessos.items()]
+            )
+
+    def _guardar_memoria(self, chave: str, vetor: List[float]):
+        """Insere na LRU em memória (chamar com o lock adquirido)"""
+        self._memoria[chave] = vetor
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_entradas_memoria:
+            self._memoria.popitem(last=False)
+
+    def _guardar(self, novos: Dict[str, List[float]]):
+        """Persiste vetores novos e aplica o limite de tamanho do cache"""
+        if not novos:
+            return
+
+        agora = time.time()
+        with self._lock:
+            for chave, vetor in novos.items():
+                self._guardar_memoria(chave, vetor)
+
+        with self._lock_disco:
+            cursor = self._conexao.executemany(
+                "INSERT OR IGNORE INTO embeddings (chave, vetor, ultimo_acesso) VALUES (?, ?, ?)",
+                [
+                    (chave, np.asarray(vetor, dtype=np.float32).tobytes(), agora)
+                    for chave, vetor in novos.items()
+                ]
+            )
+            self._total_disco += max(cursor.rowcount, 0)
+
+            excesso = self._total_disco - self.max_entradas
+            if excesso > 0:
+                # Descarte pela antiguidade real: grava antes os acessos acumulados
+                self._gravar_acessos()
+                self._conexao.execute(
+                    "DELETE FROM embeddings WHERE chave IN ("
+                    " SELECT chave FROM embeddings ORDER BY ultimo_acesso LIMIT ?)",
+                    (excesso,)
+                )
+                self._total_disco -= excesso
+                logger.info(f"Cache de embeddings: {excesso} entradas antigas descartadas")
+
+            self._conexao.commit()
+
+    async def _aguardar_gravacao(self, novos: Dict[str, List[float]]):
+        """Como _guardar, com a gravação fora do event loop"""
+        if novos:
+            await asyncio.to_thread(self._guardar, novos)
+
+    def fechar(self):
+        """Grava os acessos pendentes e fecha a conexão com o SQLite"""
+        with self._lock_disco:
+            self._gravar_acessos()
+            self._conexao.commit()
+            self._conexao.close()
+
+    def _separar(self, textos: List[str]):
+        """Resolve o que já está em cache e lista os textos que ainda precisam de embedding"""
+        chaves = [self._chave(texto) for texto in textos]
+        return self._pendentes(textos, chaves, self._buscar(list(dict.fromkeys(chaves))))
+
+    async def _aseparar(self, textos: List[str]):
+        """Versão assíncrona de _separar"""
+        chaves = [self._chave(texto) for texto in textos]
+        return self._pendentes(textos, chaves, await self._abuscar(list(dict.fromkeys(chaves))))
+
+    def _pendentes(self, textos: List[str], chaves: List[str], encontrados: Dict[str, List[float]]):
+        """Separa os textos sem vetor em cache e contabiliza acertos e falhas"""
+        pendentes: Dict[str, str] = {}
+        for chave, texto in zip(chaves, textos):
+            if chave not in encontrados and chave not in pendentes:
+                pendentes[chave] = texto
+
+        faltando = sum(1 for chave in chaves if chave in pendentes)
+        with self._lock:
+            self.acertos += len(textos) - faltando
+            self.falhas += faltando
+        return chaves, encontrados, pendentes
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings de documentos consultando o cache primeiro"""
+        chaves, encontrados, pendentes = self._separar(texts)
+
+        if pendentes:
+            vetores = self.embeddings_base.embed_documents(list(pendentes.values()))
+            novos = dict(zip(pendentes.keys(), vetores))
+            self._guardar(novos)
+            encontrados.update(novos)
+
+        return [encontrados[chave] for chave in chaves]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera embedding de consulta consultando o cache primeiro"""
+        chaves, encontrados, pendentes = self._separar([text])
+
+        if pendentes:
+            vetor = self.embeddings_base.embed_query(text)
+            self._guardar({chaves[0]: vetor})
+            return vetor
+
+        return encontrados[chaves[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_documents"""
+        chaves, encontrados, pendentes = await self._aseparar(texts)
+
+        if pendentes:
+            vetores = await self.embeddings_base.aembed_documents(list(pendentes.values()))
+            novos = dict(zip(pendentes.keys(), vetores))
+            await self._aguardar_gravacao(novos)
+            encontrados.update(novos)
+
+        return [encontrados[chave] for chave in chaves]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versão assíncrona de embed_query"""
+        chaves, encontrados, pendentes = await self._aseparar([text])
+
+        if pendentes:
+            vetor = await self.embeddings_base.aembed_query(text)
+            await self._aguardar_gravacao({chaves[0]: vetor})
+            return vetor
+
+        return encontrados[chaves[0]]
+
+    def obter_estatisticas(self) -> Dict[str, int]:
+        """Retorna contadores de uso do cache"""
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "entradas_disco": self._total_disco,
+                "entradas_memoria": len(self._memoria),
+            }
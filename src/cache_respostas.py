@@ -0,0 +1,146 @@
+"""
+Cache semântico de respostas do assistente
+Reaproveita respostas de mensagens praticamente idênticas
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRespostas:
+    """
+    Cache de respostas completas indexado pelo embedding da mensagem
+
+    A busca compara a mensagem apenas com respostas anteriores da mesma
+    intenção. Entradas expiram após `ttl` segundos e as respostas de uma
+    intenção são descartadas quando muda a versão dos dados de que ela depende
+    (ex: políticas só pelo hash das políticas, produtos pelo do catálogo).
+    """
+
+    def __init__(self, limiar_similaridade: float = 0.95, ttl: float = 3600.0,
+                 max_entradas_por_intencao: int = 1_000,
+                 intencoes: Iterable[str] = ("politicas", "saudacao")):
+        """
+        Args:
+            limiar_similaridade: Similaridade de cosseno mínima para reutilizar uma resposta
+            ttl: Tempo de vida de cada resposta em segundos
+            max_entradas_por_intencao: Limite de respostas guardadas por intenção
+            intencoes: Intenções cujas respostas não dependem da sessão e podem ser reutilizadas
+                (buscas de produtos ficam de fora: mensagens quase idênticas podem pedir
+                faixas de preço ou categorias diferentes, que o embedding mal distingue)
+        """
+        self.limiar_similaridade = limiar_similaridade
+        self.ttl = ttl
+        self.max_entradas_por_intencao = max_entradas_por_intencao
+        self.intencoes = set(intencoes)
+
+        self._entradas: Dict[str, List[Dict[str, Any]]] = {}
+        self._matrizes: Dict[str, np.ndarray] = {}
+        self._versoes: Dict[str, Hashable] = {}
+        self._lock = threading.Lock()
+
+        self.acertos = 0
+        self.falhas = 0
+
+    def aceita(self, intencao: str) -> bool:
+        """Indica se respostas desta intenção podem ser cacheadas"""
+        return intencao in self.intencoes
+
+    @staticmethod
+    def _normalizar(vetor: List[float]) -> np.ndarray:
+        array = np.asarray(vetor, dtype=np.float32)
+        return array / max(float(np.linalg.norm(array)), 1e-12)
+
+    def _verificar_versao(self, intencao: str, versao_dados: Hashable):
+        """Descarta as respostas da intenção se os dados dela mudaram (chamar com o lock adquirido)"""
+        if intencao in self._versoes and versao_dados == self._versoes[intencao]:
+            return
+        if self._entradas.get(intencao):
+            logger.info(f"Dados alterados: cache de respostas de '{intencao}' invalidado")
+        self._entradas.pop(intencao, None)
+        self._matrizes.pop(intencao, None)
+        self._versoes[intencao] = versao_dados
+
+    def _remover_expiradas(self, intencao: str, agora: float):
+        """Remove respostas vencidas de uma intenção (chamar com o lock adquirido)"""
+        entradas = self._entradas.get(intencao, [])
+        validas = [e for e in entradas if agora - e["criado_em"] < self.ttl]
+        if len(validas) != len(entradas):
+            self._entradas[intencao] = validas
+            self._matrizes.pop(intencao, None)
+
+    def buscar(self, intencao: str, vetor: List[float], versao_dados: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Procura uma resposta anterior semanticamente equivalente
+
+        Returns:
+            Dict com "resposta" e "dados" ou None se não houver resposta reutilizável
+        """
+        if not self.aceita(intencao):
+            return None
+
+        with self._lock:
+            self._verificar_versao(intencao, versao_dados)
+            self._remover_expiradas(intencao, time.time())
+
+            entradas = self._entradas.get(intencao)
+            if not entradas:
+                self.falhas += 1
+                return None
+
+            matriz = self._matrizes.get(intencao)
+            if matriz is None:
+                matriz = np.stack([e["vetor"] for e in entradas])
+                self._matrizes[intencao] = matriz
+
+            similaridades = matriz @ self._normalizar(vetor)
+            melhor = int(np.argmax(similaridades))
+
+            if similaridades[melhor] < self.limiar_similaridade:
+                self.falhas += 1
+                return None
+
+            self.acertos += 1
+            entrada = entradas[melhor]
+            return {"resposta": entrada["resposta"], "dados": entrada["dados"]}
+
+    def guardar(self, intencao: str, vetor: List[float], resposta: str,
+                dados: Dict[str, Any], versao_dados: Hashable):
+        """Guarda a resposta gerada para reutilização futura"""
+        if not self.aceita(intencao):
+            return
+
+        with self._lock:
+            self._verificar_versao(intencao, versao_dados)
+
+            entradas = self._entradas.setdefault(intencao, [])
+            entradas.append({
+                "vetor": self._normalizar(vetor),
+                "resposta": resposta,
+                "dados": dados,
+                "criado_em": time.time(),
+            })
+            # Descarta as mais antigas ao atingir o limite
+            if len(entradas) > self.max_entradas_por_intencao:
+                del entradas[:len(entradas) - self.max_entradas_por_intencao]
+            self._matrizes.pop(intencao, None)
+
+    def invalidar(self):
+        """Remove todas as respostas do cache"""
+        with self._lock:
+            self._entradas.clear()
+            self._matrizes.clear()
+
+    def obter_estatisticas(self) -> Dict[str, Any]:
+        """Retorna contadores de uso do cache"""
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "entradas": {intencao: len(e) for intencao, e in self._entradas.items()},
+        }
@@ -0,0 +1,199 @@
+"""
+Catálogo de produtos em memória
+Índices por ID e secundários para consultas sem varrer a lista inteira
+"""
+
+import bisect
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogoProdutos:
+    """
+    Catálogo com mapa id -> produto e índices secundários
+
+    Mantém índices por categoria, marca e disponibilidade e um array de
+    preços ordenado, todos atualizados a cada inclusão, alteração ou remoção.
+    A ordem de inserção dos produtos é preservada para persistência.
+    """
+
+    def __init__(self, produtos: Iterable[Dict[str, Any]] = ()):
+        self._por_id: Dict[str, Dict[str, Any]] = {}
+        self._por_categoria: Dict[str, Set[str]] = defaultdict(set)
+        self._por_marca: Dict[str, Set[str]] = defaultdict(set)
+        self._disponiveis: Set[str] = set()
+        self._precos: List[Tuple[float, str]] = []
+
+        for produto in produtos:
+            produto_id = produto.get("id")
+            if produto_id is None:
+                logger.warning(f"Produto sem ID ignorado no catálogo: {produto.get('nome')}")
+                continue
+            # ID repetido: o último registro vence, na posição do primeiro (como em adicionar)
+            self._por_id[produto_id] = produto
+
+        # Carga em massa: índices montados em uma passada e preços ordenados uma vez
+        # (insort por produto seria O(N²)); adicionar/atualizar seguem com insort
+        for produto_id, produto in self._por_id.items():
+            self._indexar(produto_id, produto, ordenar=False)
+        self._precos.sort()
+
+    @staticmethod
+    def _chave_texto(valor: Any) -> str:
+        return str(valor or "").strip().lower()
+
+    @staticmethod
+    def _preco(produto: Dict[str, Any]) -> float:
+        try:
+            return float(produto.get("preco") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _indexar(self, produto_id: str, produto: Dict[str, Any], ordenar: bool = True):
+        self._por_categoria[self._chave_texto(produto.get("categoria"))].add(produto_id)
+        self._por_marca[self._chave_texto(produto.get("marca"))].add(produto_id)
+        if produto.get("disponivel", True):
+            self._disponiveis.add(produto_id)
+        if ordenar:
+            bisect.insort(self._precos, (self._preco(produto), produto_id))
+        else:
+            self._precos.append((self._preco(produto), produto_id))
+
+    def _desindexar(self, produto_id: str, produto: Dict[str, Any]):
+        for indice, chave in (
+            (self._por_categoria, self._chave_texto(produto.get("categoria"))),
+            (self._por_marca, self._chave_texto(produto.get("marca"))),
+        ):
+            ids = indice.get(chave)
+            if ids is not None:
+                ids.discard(produto_id)
+                if not ids:
+                    del indice[chave]
+        self._disponiveis.discard(produto_id)
+
+        posicao = bisect.bisect_left(self._precos, (self._preco(produto), produto_id))
+        if posicao < len(self._precos) and self._precos[posicao][1] == produto_id:
+            del self._precos[posicao]
+
+    def adicionar(self, produto: Dict[str, Any]):
+        """Inclui um produto (substitui se o ID já existir)"""
+        produto_id = produto.get("id")
+        if produto_id is None:
+            logger.warning(f"Produto sem ID ignorado no catálogo: {produto.get('nome')}")
+            return
+
+        anterior = self._por_id.get(produto_id)
+        if anterior is not None:
+            self._desindexar(produto_id, anterior)
+
+        self._por_id[produto_id] = produto
+        self._indexar(produto_id, produto)
+
+    def atualizar(self, produto_id: str, produto: Dict[str, Any]) -> bool:
+        """
+        Substitui um produto existente
+
+        Returns:
+            False se o produto não existir
+        """
+        anterior = self._por_id.get(produto_id)
+        if anterior is None:
+            return False
+
+        novo_id = produto.get("id", produto_id)
+        if novo_id != produto_id:
+            self.remover(produto_id)
+            self.adicionar(produto)
+            return True
+
+        self._desindexar(produto_id, anterior)
+        self._por_id[produto_id] = produto
+        self._indexar(produto_id, produto)
+        return True
+
+    def remover(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Remove um produto e retorna o registro removido (None se não existir)"""
+        produto = self._por_id.pop(produto_id, None)
+        if produto is not None:
+            self._desindexar(produto_id, produto)
+        return produto
+
+    def obter(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Busca um produto pelo ID em O(1)"""
+        return self._por_id.get(produto_id)
+
+    def __contains__(self, produto_id: str) -> bool:
+        return produto_id in self._por_id
+
+    def __len__(self) -> int:
+        return len(self._por_id)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._por_id.values())
+
+    def listar(self) -> List[Dict[str, Any]]:
+        """Lista os produtos na ordem de inserção"""
+        return list(self._por_id.values())
+
+    def categorias_e_marcas(self) -> List[str]:
+        """Nomes de categorias e marcas presentes no catálogo (em minúsculas)"""
+        return [chave for chave in [*self._por_categoria, *self._por_marca] if chave]
+
+    def ids_por_categoria(self, termo: str) -> Set[str]:
+        """IDs cuja categoria contém o termo (mesma semântica dos filtros existentes)"""
+        termo = self._chave_texto(termo)
+        ids: Set[str] = set()
+        for categoria, produtos in self._por_categoria.items():
+            if termo in categoria:
+                ids |= produtos
+        return ids
+
+    def ids_por_marca(self, marca: str) -> Set[str]:
+        """IDs de uma marca (comparação sem diferenciar maiúsculas)"""
+        return set(self._por_marca.get(self._chave_texto(marca), ()))
+
+    def ids_disponiveis(self) -> Set[str]:
+        """IDs de produtos disponíveis"""
+        return set(self._disponiveis)
+
+    def ids_por_faixa_preco(self, minimo: Optional[float] = None,
+                            maximo: Optional[float] = None) -> Set[str]:
+        """IDs com preço dentro da faixa (limites inclusivos), via busca binária"""
+        inicio = 0 if minimo is None else bisect.bisect_left(self._precos, (float(minimo), ""))
+        fim = len(self._precos)
+        if maximo is not None:
+            # Sufixo maior que qualquer ID para incluir todos os produtos com preço == maximo
+            fim = bisect.bisect_right(self._precos, (float(maximo), "\U0010ffff"))
+        return {produto_id for _, produto_id in self._precos[inicio:fim]}
+
+    def filtrar(self, categoria: Optional[str] = None, marca: Optional[str] = None,
+                preco_min: Optional[float] = None, preco_max: Optional[float] = None,
+                apenas_disponiveis: bool = False) -> Optional[Set[str]]:
+        """
+        Interseção dos índices secundários
+
+        Returns:
+            Conjunto de IDs que atendem a todos os filtros, ou None se nenhum
+            filtro foi informado (todo o catálogo é candidato)
+        """
+        conjuntos = []
+        if categoria:
+            conjuntos.append(self.ids_por_categoria(categoria))
+        if marca:
+            conjuntos.append(self.ids_por_marca(marca))
+        if preco_min is not None or preco_max is not None:
+            conjuntos.append(self.ids_por_faixa_preco(preco_min, preco_max))
+        if apenas_disponiveis:
+            conjuntos.append(self._disponiveis)
+
+        if not conjuntos:
+            return None
+
+        conjuntos.sort(key=len)
+        resultado = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            resultado &= conjunto
+        return resultado
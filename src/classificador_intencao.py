@@ -0,0 +1,185 @@
+"""
+Classificador local de intenções
+Resolve mensagens óbvias sem precisar de uma chamada ao LLM
+"""
+
+import logging
+import re
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .texto import normalizar_texto, tokenizar
+
+logger = logging.getLogger(__name__)
+
+# Número de pedido no formato usado pela loja (ex: "#12345", "pedido 12345")
+# ou código de rastreamento dos Correios (ex: "BR123456789SP", já normalizado)
+_PADRAO_PEDIDO = re.compile(r"#\s?\d{4,}|\bpedido\b\D{0,20}\d{4,}|\b[a-z]{2}\d{9}[a-z]{2}\b")
+
+_PADRAO_SAUDACAO = re.compile(
+    r"^(oi+|ola|opa|hey|hello|e ai|bom dia|boa tarde|boa noite|preciso de ajuda|ajuda)"
+    r"( tudo bem| tudo bom)?( preciso de ajuda)?$"
+)
+
+# Palavras-chave no mesmo espírito de RAGSystem._classificar_conversa (já sem acentos)
+_PALAVRAS_CHAVE = {
+    "politicas": [
+        "trocar", "troca", "devolver", "devolucao", "reembolso", "garantia",
+        "prazo de entrega", "frete", "politica", "formas de pagamento", "parcelar", "arrependimento",
+    ],
+    "recomendacao": ["recomenda", "recomendacao", "sugestao", "sugere", "sugira", "indica", "presente"],
+    "consulta_pedido": ["meu pedido", "status do pedido", "rastreamento", "rastrear", "minha compra"],
+}
+
+# Sinais de que a mensagem fala de produtos (ex: "garantia do notebook até R$ 3000"):
+# com eles as palavras-chave deixam de ser conclusivas
+_PADRAO_PRODUTO = re.compile(
+    r"\b(precos?|custa|custam|comprar|compro|barat\w*|car[oa]s?|estoque|modelos?|marcas?|reais|r \d+)\b"
+)
+
+
+class ClassificadorIntencao:
+    """
+    Classificador de intenção que roda antes do LLM
+
+    Primeiro aplica regras (número de pedido, saudações e palavras-chave); se
+    nenhuma regra decidir e houver embedding da mensagem, compara com os
+    centroides dos exemplos de cada intenção. Palavras-chave só decidem quando
+    apontam para uma única intenção e a mensagem não cita produto, categoria ou
+    marca. Só devolve uma intenção quando a confiança passa dos limiares; caso
+    contrário retorna None e o chamador recorre ao LLM.
+    """
+
+    def __init__(self, embeddings: Embeddings, exemplos: Dict[str, List[str]],
+                 limiar_similaridade: float = 0.85, margem_minima: float = 0.03,
+                 termos_catalogo: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Args:
+            embeddings: Objeto de embeddings (de preferência com cache)
+            exemplos: Mensagens de exemplo por intenção
+            limiar_similaridade: Similaridade de cosseno mínima com o centroide vencedor
+            margem_minima: Diferença mínima para o segundo centroide mais próximo
+            termos_catalogo: Devolve os nomes de categorias e marcas do catálogo atual
+        """
+        self.embeddings = embeddings
+        self.exemplos = exemplos
+        self.limiar_similaridade = limiar_similaridade
+        self.margem_minima = margem_minima
+        self.termos_catalogo = termos_catalogo
+        # (termos do catálogo, radicais correspondentes): refeito só quando o catálogo muda
+        self._radicais_catalogo: Tuple[FrozenSet[str], Set[str]] = (frozenset(), set())
+
+        self._intencoes: List[str] = []
+        self._centroides: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+        # Quantas mensagens cada etapa resolveu
+        self.contagem = {"regras": 0, "centroides": 0, "llm": 0}
+
+    def classificar_por_regras(self, mensagem: str) -> Optional[str]:
+        """Aplica as regras locais; retorna None se nenhuma for conclusiva"""
+        texto = normalizar_texto(mensagem)
+
+        if _PADRAO_PEDIDO.search(texto):
+            intencao = "consulta_pedido"
+        elif _PADRAO_SAUDACAO.match(texto):
+            intencao = "saudacao"
+        else:
+            candidatas = [
+                intencao for intencao, palavras in _PALAVRAS_CHAVE.items()
+                if any(re.search(rf"\b{palavra}", texto) for palavra in palavras)
+            ]
+            # Palavras de mais de uma intenção ou menção a produtos: deixa a
+            # decisão para as próximas etapas
+            intencao = None
+            if len(candidatas) == 1 and not self._menciona_produto(texto):
+                intencao = candidatas[0]
+
+        if intencao:
+            self.contagem["regras"] += 1
+        return intencao
+
+    def _menciona_produto(self, texto: str) -> bool:
+        """Indica se o texto (já normalizado) cita preço, compra, categoria ou marca do catálogo"""
+        if _PADRAO_PRODUTO.search(texto):
+            return True
+        if self.termos_catalogo is None:
+            return False
+
+        termos = frozenset(self.termos_catalogo())
+        chave, radicais = self._radicais_catalogo
+        if termos != chave:
+            radicais = {radical for termo in termos for radical in tokenizar(termo)}
+            self._radicais_catalogo = (termos, radicais)
+        return not radicais.isdisjoint(tokenizar(texto))
+
+    def _montar_centroides(self, vetores: List[List[float]], rotulos: List[str]):
+        """Calcula o centroide normalizado dos exemplos de cada intenção"""
+        matriz = self._normalizar(np.asarray(vetores, dtype=np.float32))
+
+        intencoes = list(dict.fromkeys(rotulos))
+        centroides = np.stack([
+            matriz[[i for i, rotulo in enumerate(rotulos) if rotulo == intencao]].mean(axis=0)
+            for intencao in intencoes
+        ])
+
+        self._intencoes = intencoes
+        self._centroides = self._normalizar(centroides)
+
+    def _exemplos_achatados(self) -> Tuple[List[str], List[str]]:
+        textos, rotulos = [], []
+        for intencao, lista in self.exemplos.items():
+            textos.extend(lista)
+            rotulos.extend([intencao] * len(lista))
+        return textos, rotulos
+
+    def _garantir_centroides(self):
+        with self._lock:
+            if self._centroides is None:
+                textos, rotulos = self._exemplos_achatados()
+                self._montar_centroides(self.embeddings.embed_documents(textos), rotulos)
+
+    async def _agarantir_centroides(self):
+        if self._centroides is None:
+            textos, rotulos = self._exemplos_achatados()
+            vetores = await self.embeddings.aembed_documents(textos)
+            with self._lock:
+                if self._centroides is None:
+                    self._montar_centroides(vetores, rotulos)
+
+    @staticmethod
+    def _normalizar(matriz: np.ndarray) -> np.ndarray:
+        normas = np.linalg.norm(matriz, axis=-1, keepdims=True)
+        return matriz / np.maximum(normas, 1e-12)
+
+    def _classificar_vetor(self, vetor: List[float]) -> Optional[str]:
+        """Nearest-centroid com limiar de similaridade e margem"""
+        consulta = self._normalizar(np.asarray(vetor, dtype=np.float32))
+        similaridades = self._centroides @ consulta
+
+        ordem = np.argsort(similaridades)[::-1]
+        melhor = float(similaridades[ordem[0]])
+        segunda = float(similaridades[ordem[1]]) if len(ordem) > 1 else -1.0
+
+        if melhor < self.limiar_similaridade or melhor - segunda < self.margem_minima:
+            return None
+
+        self.contagem["centroides"] += 1
+        return self._intencoes[ordem[0]]
+
+    def classificar_por_vetor(self, vetor: List[float]) -> Optional[str]:
+        """Classifica pelo embedding da mensagem; None se a confiança for baixa"""
+        self._garantir_centroides()
+        return self._classificar_vetor(vetor)
+
+    async def aclassificar_por_vetor(self, vetor: List[float]) -> Optional[str]:
+        """Versão assíncrona de classificar_por_vetor"""
+        await self._agarantir_centroides()
+        return self._classificar_vetor(vetor)
+
+    def registrar_fallback_llm(self):
+        """Contabiliza uma mensagem que precisou do LLM"""
+        self.contagem["llm"] += 1
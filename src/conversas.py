@@ -0,0 +1,266 @@
+"""
+Armazenamento de conversas para o contexto RAG
+Indexa as trocas usuário/assistente fora do caminho da requisição
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+from .geracoes import DiretorioGeracoes, TravaProcessos
+from .indice_vetorial import PARAMETROS_FAISS
+
+logger = logging.getLogger(__name__)
+
+
+class ConversaStore:
+    """
+    Store vetorial dedicado às conversas
+
+    `registrar` apenas enfileira o documento; uma thread em segundo plano agrupa
+    as conversas em lotes, gera os embeddings de uma vez e grava o índice FAISS
+    em disco periodicamente (no Pinecone usa o namespace "conversas"; se o
+    Pinecone não puder ser aberto, as conversas passam para o FAISS local).
+    O índice local usa a mesma métrica dos produtos (cosseno, PARAMETROS_FAISS).
+
+    Cada gravação local parte da última geração publicada (por qualquer worker),
+    acrescenta as conversas indexadas por este processo desde a gravação
+    anterior e publica uma nova geração (ver DiretorioGeracoes), sob uma trava
+    entre processos: workers não sobrescrevem as conversas uns dos outros.
+    Cada geração é o índice completo; a publicação apaga as antigas e mantém
+    só as `manter_geracoes` mais recentes, e só há gravação a cada
+    `intervalo_flush` segundos e quando houver ao menos `min_novas_flush`
+    conversas novas (o fechamento grava o que restar).
+    Como os textos são únicos, `embeddings` deve ser o objeto sem cache.
+    """
+
+    def __init__(self, embeddings: Embeddings, caminho_indice: str = "data/faiss_conversas",
+                 pinecone_index_name: Optional[str] = None, tamanho_lote: int = 32,
+                 intervalo_flush: float = 30.0, max_fila: int = 10_000,
+                 min_novas_flush: int = 1, manter_geracoes: int = 3):
+        """
+        Args:
+            embeddings: Objeto de embeddings usado para indexar as conversas (sem cache)
+            caminho_indice: Caminho publicado do índice FAISS local
+            pinecone_index_name: Se informado, grava no Pinecone em vez do FAISS
+            tamanho_lote: Máximo de conversas por chamada de embeddings
+            intervalo_flush: Segundos entre gravações do índice local em disco
+            max_fila: Conversas pendentes aceitas antes de começar a descartar
+            min_novas_flush: Conversas novas necessárias para uma gravação periódica
+            manter_geracoes: Gerações do índice local preservadas em disco
+        """
+        self.embeddings = embeddings
+        self.caminho_indice = caminho_indice
+        self.pinecone_index_name = pinecone_index_name
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_flush = intervalo_flush
+        self.min_novas_flush = min_novas_flush
+
+        self.vector_store = None
+        self.descartadas = 0
+        self.indexadas = 0
+
+        self._fila: "queue.Queue[Document]" = queue.Queue(maxsize=max_fila)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._ultimo_flush = time.monotonic()
+
+        # Conversas indexadas por este processo ainda não gravadas: (texto, vetor, metadados)
+        self._novas: List[Tuple[str, List[float], Dict[str, Any]]] = []
+        self._geracoes = DiretorioGeracoes(caminho_indice, manter=manter_geracoes)
+        self._trava_processos = TravaProcessos(f"{caminho_indice}.lock")
+        self._geracao_carregada: Optional[str] = None
+
+        self._carregar_indice()
+
+        self._thread = threading.Thread(target=self._executar, name="conversa-store", daemon=True)
+        self._thread.start()
+
+    def _carregar_indice(self):
+        """Abre o índice de conversas já existente"""
+        try:
+            if self.pinecone_index_name:
+                from langchain_pinecone import PineconeVectorStore
+                self.vector_store = PineconeVectorStore(
+                    index_name=self.pinecone_index_name,
+                    embedding=self.embeddings,
+                    namespace="conversas"
+                )
+            elif os.path.exists(os.path.join(self.caminho_indice, "index.faiss")):
+                with self._trava_processos.adquirir():
+                    self.vector_store = self._abrir_publicado()
+                logger.info(f"Índice de conversas carregado: {self.vector_store.index.ntotal} conversas")
+        except Exception as e:
+            logger.error(f"Erro ao carregar índice de conversas: {e}")
+
+    def _garantir_pinecone(self):
+        """Reabre o store do Pinecone; se continuar indisponível, passa a usar o FAISS local"""
+        if self.vector_store is not None:
+            return
+        self._carregar_indice()
+        if self.vector_store is None:
+            logger.warning("Pinecone indisponível para conversas: usando o índice FAISS local")
+            with self._lock:
+                self.pinecone_index_name = None
+            self._carregar_indice()
+
+    def _abrir_publicado(self):
+        """Abre a geração publicada (chamar com a trava entre processos adquirida)"""
+        vector_store = FAISS.load_local(
+            self.caminho_indice,
+            self.embeddings,
+            allow_dangerous_deserialization=True,
+            **PARAMETROS_FAISS
+        )
+        if vector_store.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            vector_store.index = self._converter_para_cosseno(vector_store.index)
+        self._geracao_carregada = self._geracoes.geracao_atual()
+        return vector_store
+
+    @staticmethod
+    def _converter_para_cosseno(indice):
+        """Recria um índice L2 gravado por versões anteriores com vetores normalizados e produto interno"""
+        vetores = indice.reconstruct_n(0, indice.ntotal)
+        faiss.normalize_L2(vetores)
+        convertido = faiss.IndexFlatIP(indice.d)
+        convertido.add(vetores)
+        logger.info(f"Índice de conversas convertido para cosseno: {indice.ntotal} conversas")
+        return convertido
+
+    def registrar(self, documento: Document) -> bool:
+        """
+        Enfileira uma conversa para indexação sem bloquear o chamador
+
+        Returns:
+            False se a fila estiver cheia e a conversa tiver sido descartada
+        """
+        try:
+            self._fila.put_nowait(documento)
+            return True
+        except queue.Full:
+            self.descartadas += 1
+            logger.warning("Fila de conversas cheia, conversa descartada")
+            return False
+
+    def _proximo_lote(self, espera: Optional[float] = None) -> List[Document]:
+        """Aguarda a primeira conversa (se `espera` for informada) e drena o que mais estiver na fila"""
+        try:
+            if espera is None:
+                lote = [self._fila.get_nowait()]
+            else:
+                lote = [self._fila.get(timeout=espera)]
+        except queue.Empty:
+            return []
+
+        while len(lote) < self.tamanho_lote:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _indexar(self, lote: List[Document]):
+        """Gera os embeddings do lote em uma única chamada e adiciona ao índice"""
+        textos = [doc.page_content for doc in lote]
+        metadados = [doc.metadata for doc in lote]
+
+        if self.pinecone_index_name:
+            self._garantir_pinecone()
+
+        if self.pinecone_index_name:
+            self.vector_store.add_texts(textos, metadatas=metadados)
+        else:
+            # Chamada à API fora da trava: buscas nas conversas não esperam por ela
+            vetores = self.embeddings.embed_documents(textos)
+            with self._lock:
+                if self.vector_store is None:
+                    self.vector_store = FAISS.from_embeddings(
+                        list(zip(textos, vetores)), self.embeddings, metadatas=metadados, **PARAMETROS_FAISS
+                    )
+                else:
+                    self.vector_store.add_embeddings(list(zip(textos, vetores)), metadatas=metadados)
+                self._novas.extend(zip(textos, vetores, metadados))
+
+        self.indexadas += len(lote)
+        logger.info(f"{len(lote)} conversas indexadas no contexto RAG")
+
+    def _salvar(self, minimo: int = 1):
+        """Publica uma nova geração do índice local se houver ao menos `minimo` conversas novas"""
+        self._ultimo_flush = time.monotonic()
+        with self._lock:
+            if len(self._novas) < max(minimo, 1):
+                return
+
+        with self._trava_processos.adquirir():
+            # Outro worker publicou depois da nossa última leitura: parte da versão dele
+            publicado = None
+            atual = self._geracoes.geracao_atual()
+            if atual is not None and atual != self._geracao_carregada:
+                publicado = self._abrir_publicado()
+
+            destino = self._geracoes.nova_geracao()
+            with self._lock:
+                if publicado is not None:
+                    publicado.add_embeddings(
+                        [(texto, vetor) for texto, vetor, _ in self._novas],
+                        metadatas=[metadados for _, _, metadados in self._novas]
+                    )
+                    self.vector_store = publicado
+                self.vector_store.save_local(destino)
+                self._novas = []
+            self._geracoes.publicar(destino)
+            self._geracao_carregada = self._geracoes.geracao_atual()
+
+    def _executar(self):
+        """Laço da thread de indexação"""
+        while not self._parar.is_set():
+            lote = self._proximo_lote(espera=min(1.0, self.intervalo_flush))
+            try:
+                if lote:
+                    self._indexar(lote)
+                if time.monotonic() - self._ultimo_flush >= self.intervalo_flush:
+                    self._salvar(self.min_novas_flush)
+            except Exception as e:
+                logger.error(f"Erro ao indexar conversas: {e}")
+
+    def flush(self):
+        """Indexa tudo o que estiver pendente e grava o índice imediatamente"""
+        while True:
+            lote = self._proximo_lote()
+            if not lote:
+                break
+            try:
+                self._indexar(lote)
+            except Exception as e:
+                logger.error(f"Erro ao indexar conversas: {e}")
+        try:
+            self._salvar()
+        except Exception as e:
+            logger.error(f"Erro ao salvar índice de conversas: {e}")
+
+    def fechar(self):
+        """Encerra a thread de indexação gravando o que estiver pendente"""
+        self._parar.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def buscar_por_vetor(self, vetor: List[float], top_k: int = 5) -> List[Document]:
+        """Busca conversas anteriores semelhantes pelo embedding da consulta"""
+        if self.pinecone_index_name:
+            return self.vector_store.similarity_search_by_vector(vetor, k=top_k) if self.vector_store else []
+        with self._lock:
+            if self.vector_store is None:
+                return []
+            return self.vector_store.similarity_search_by_vector(vetor, k=top_k)
+
+    def total_pendentes(self) -> int:
+        """Número de conversas aguardando indexação"""
+        return self._fila.qsize()
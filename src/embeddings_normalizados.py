@@ -0,0 +1,54 @@
+"""
+Embeddings com norma unitária
+Com vetores normalizados, o produto interno dos índices é a similaridade de cosseno
+"""
+
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingsNormalizados(Embeddings):
+    """
+    Envolve um objeto de embeddings devolvendo vetores com norma L2 igual a 1
+
+    Os stores FAISS usam produto interno (MAX_INNER_PRODUCT); normalizar aqui,
+    antes de qualquer inserção ou consulta, é o que faz o score ser o cosseno,
+    sem depender da opção normalize_L2 do LangChain (que só se aplica à
+    distância L2). Vetores nulos são devolvidos como vieram.
+    """
+
+    def __init__(self, embeddings_base: Embeddings):
+        """
+        Args:
+            embeddings_base: Objeto de embeddings envolvido (com ou sem cache/lote)
+        """
+        self.embeddings_base = embeddings_base
+
+    @property
+    def model(self) -> Optional[str]:
+        """Modelo de embeddings do objeto envolvido"""
+        return getattr(self.embeddings_base, "model", None)
+
+    @staticmethod
+    def normalizar(vetores: List[List[float]]) -> List[List[float]]:
+        """Divide cada vetor pela sua norma L2"""
+        if not vetores:
+            return []
+        matriz = np.asarray(vetores, dtype=np.float32)
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return (matriz / normas).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.normalizar(self.embeddings_base.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.normalizar([self.embeddings_base.embed_query(text)])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.normalizar(await self.embeddings_base.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.normalizar([await self.embeddings_base.aembed_query(text)])[0]
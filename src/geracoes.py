@@ -0,0 +1,211 @@
+"""
+Índices compartilhados entre processos
+Diretórios de geração imutáveis publicados por troca atômica de symlink
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    logger.warning("fcntl não está disponível. Escritas de índices não serão coordenadas entre processos.")
+
+
+class DiretorioGeracoes:
+    """
+    Versões de um índice salvas em diretórios imutáveis
+
+    Cada gravação vai para um diretório novo em
+    `<dados>/geracoes/<nome>/<geração>`; só depois de completo ele é publicado
+    trocando atomicamente o symlink `<dados>/<nome>` (os.replace). Leitores
+    sempre enxergam uma geração inteira, e os que ainda usam (ou mapeiam em
+    memória) uma geração anterior não são afetados pela troca.
+    """
+
+    def __init__(self, caminho_publicado: str, manter: int = 3):
+        """
+        Args:
+            caminho_publicado: Caminho estável do índice (vira um symlink)
+            manter: Gerações mais recentes preservadas na limpeza
+        """
+        self.caminho_publicado = caminho_publicado
+        diretorio, nome = os.path.split(os.path.abspath(caminho_publicado))
+        self.raiz = os.path.join(diretorio, "geracoes", nome)
+        self.manter = manter
+
+    def geracao_atual(self) -> Optional[str]:
+        """Caminho real da geração publicada (None se nada foi publicado)"""
+        if not os.path.exists(self.caminho_publicado):
+            return None
+        return os.path.realpath(self.caminho_publicado)
+
+    def nova_geracao(self) -> str:
+        """Cria um diretório vazio para a próxima geração"""
+        os.makedirs(self.raiz, exist_ok=True)
+        caminho = os.path.join(self.raiz, f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(caminho)
+        return caminho
+
+    def publicar(self, caminho_geracao: str):
+        """Aponta o caminho publicado para a geração e remove as antigas"""
+        if os.path.isdir(self.caminho_publicado) and not os.path.islink(self.caminho_publicado):
+            # Layout anterior (diretório comum): vira a geração mais antiga
+            os.makedirs(self.raiz, exist_ok=True)
+            os.rename(self.caminho_publicado, os.path.join(self.raiz, f"{0:020d}-legado"))
+
+        alvo = os.path.relpath(caminho_geracao, os.path.dirname(os.path.abspath(self.caminho_publicado)))
+        caminho_tmp = f"{self.caminho_publicado}.{uuid.uuid4().hex[:8]}.tmp"
+        os.symlink(alvo, caminho_tmp)
+        os.replace(caminho_tmp, self.caminho_publicado)
+        logger.info(f"Geração publicada: {self.caminho_publicado} -> {alvo}")
+
+        self._limpar()
+
+    def _limpar(self):
+        """Apaga gerações antigas (a publicada e as `manter` mais recentes ficam)"""
+        atual = self.geracao_atual()
+        geracoes = sorted(os.listdir(self.raiz))
+        for nome in geracoes[:-self.manter]:
+            caminho = os.path.join(self.raiz, nome)
+            if os.path.realpath(caminho) != atual:
+                # Processos que ainda mapeiam arquivos dela continuam lendo normalmente
+                shutil.rmtree(caminho, ignore_errors=True)
+
+
+class TravaProcessos:
+    """
+    Trava reentrante válida entre threads e entre processos (flock)
+
+    Usada para que só um worker por vez gere embeddings ou publique índices;
+    os demais esperam e reaproveitam o que foi publicado.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._profundidade = 0
+        self._arquivo = None
+
+    @contextmanager
+    def adquirir(self) -> Iterator[bool]:
+        """
+        Context manager da trava
+
+        Yields:
+            True na aquisição mais externa (a que de fato obteve a trava do arquivo)
+        """
+        with self._lock:
+            externa = self._entrar(bloquear=True)
+            try:
+                yield externa
+            finally:
+                self._sair(externa)
+
+    @contextmanager
+    def tentar_adquirir(self) -> Iterator[bool]:
+        """
+        Como adquirir, mas sem esperar
+
+        Yields:
+            False se outra thread ou processo detém a trava (nada foi adquirido)
+        """
+        if not self._lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            try:
+                externa = self._entrar(bloquear=False)
+            except BlockingIOError:
+                externa = None
+            if externa is None:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                self._sair(externa)
+        finally:
+            self._lock.release()
+
+    def _entrar(self, bloquear: bool) -> bool:
+        """Obtém a trava do arquivo na aquisição mais externa (chamar com o RLock)"""
+        externa = self._profundidade == 0
+        if externa and FCNTL_AVAILABLE:
+            diretorio = os.path.dirname(self.caminho)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            arquivo = open(self.caminho, 'a')
+            try:
+                fcntl.flock(arquivo, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                arquivo.close()
+                raise
+            self._arquivo = arquivo
+        self._profundidade += 1
+        return externa
+
+    def _sair(self, externa: bool):
+        self._profundidade -= 1
+        if externa and self._arquivo is not None:
+            fcntl.flock(self._arquivo, fcntl.LOCK_UN)
+            self._arquivo.close()
+            self._arquivo = None
+
+
+class TravaLeituraEscrita:
+    """
+    Trava de leitores e escritor entre as threads de um processo
+
+    Buscas leem catálogo e índices ao mesmo tempo; uma alteração espera as
+    leituras em andamento e bloqueia as novas até terminar. Escritores têm
+    preferência, para não esperarem indefinidamente sob carga de buscas.
+    Não é reentrante: quem lê não pode pedir a escrita (nem ler de novo).
+    """
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._leitores = 0
+        self._escrevendo = False
+        self._escritores_esperando = 0
+
+    @contextmanager
+    def leitura(self) -> Iterator[None]:
+        with self._condicao:
+            while self._escrevendo or self._escritores_esperando:
+                self._condicao.wait()
+            self._leitores += 1
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._leitores -= 1
+                if not self._leitores:
+                    self._condicao.notify_all()
+
+    @contextmanager
+    def escrita(self) -> Iterator[None]:
+        with self._condicao:
+            self._escritores_esperando += 1
+            try:
+                while self._escrevendo or self._leitores:
+                    self._condicao.wait()
+            finally:
+                self._escritores_esperando -= 1
+            self._escrevendo = True
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._escrevendo = False
+                self._condicao.notify_all()
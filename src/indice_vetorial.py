@@ -0,0 +1,573 @@
+"""
+Índices vetoriais comprimidos para catálogos grandes
+IVF-PQ e HNSW com quantização escalar, com re-ranqueamento exato dos candidatos
+"""
+
+import json
+import logging
+import math
+import os
+import pickle
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Índices FAISS locais: com vetores normalizados o produto interno é o cosseno,
+# a mesma métrica do índice Pinecone, então scores e thresholds valem nos dois.
+# A normalização é feita pelos embeddings (EmbeddingsNormalizados), não pelo
+# normalize_L2 do LangChain, que só se aplica à distância L2
+PARAMETROS_FAISS = {"distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT}
+
+# "flat": vetores float32 completos, busca exaustiva (padrão)
+# "ivfpq": listas invertidas + product quantization (~m bytes por vetor)
+# "hnsw_sq": grafo HNSW sobre vetores quantizados em 8 bits (~1 byte por dimensão)
+TIPOS_INDICE = ("flat", "ivfpq", "hnsw_sq")
+
+PARAMETROS_PADRAO: Dict[str, Any] = {
+    "nlist": None,            # listas do IVF (None = 4 * sqrt(n))
+    "m": 64,                  # subvetores do PQ (precisa dividir a dimensão)
+    "nbits": 8,               # bits por código do PQ
+    "hnsw_m": 32,             # vizinhos por nó no grafo HNSW
+    "ef_construction": 80,
+    "amostra_treino": 100_000,
+    "nprobe": 16,             # listas do IVF visitadas por consulta
+    "ef_search": 64,          # largura da busca no grafo HNSW
+    "fator_rerank": 4,        # candidatos aproximados por resultado, re-ranqueados com o vetor exato
+}
+
+# Ajustáveis sem reconstruir o índice (não entram na assinatura do manifesto)
+PARAMETROS_BUSCA = ("nprobe", "ef_search", "fator_rerank")
+
+ARQUIVO_META = "quantizado.json"
+
+# Fração de posições removidas a partir da qual o índice é reconstruído
+FRACAO_MAX_REMOVIDOS = 0.2
+
+# Vetores adicionados ao índice por chamada durante a construção
+BLOCO_ADICAO = 65_536
+
+# Busca restrita a posições: até este número o cosseno exato é calculado
+# direto sobre os vetores delas (lidos do arquivo mapeado), sem o índice
+LIMITE_SCORE_EXATO = 2_048
+
+
+def parametros_construcao(tipo: str, parametros: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parâmetros que mudam o conteúdo do índice (vão para a assinatura do manifesto)"""
+    if tipo == "flat":
+        return {}
+    configurados = {**PARAMETROS_PADRAO, **(parametros or {})}
+    chaves = ("nlist", "m", "nbits", "amostra_treino") if tipo == "ivfpq" else ("hnsw_m", "ef_construction")
+    return {"tipo_indice": tipo, **{chave: configurados[chave] for chave in chaves}}
+
+
+def _fabrica(tipo: str, dimensao: int, total: int, parametros: Dict[str, Any]) -> Optional[str]:
+    """
+    String do faiss.index_factory para o tipo de índice
+
+    Returns:
+        None se não houver vetores suficientes para treinar o índice
+    """
+    if tipo == "hnsw_sq":
+        return f"HNSW{parametros['hnsw_m']},SQ8"
+
+    if dimensao % parametros["m"]:
+        raise ValueError(f"m={parametros['m']} não divide a dimensão dos embeddings ({dimensao})")
+    nlist = parametros["nlist"] or max(1, min(65_536, int(4 * math.sqrt(total))))
+    # k-means do IVF e de cada subquantizador precisam de ao menos um ponto por centroide
+    if total < max(nlist, 2 ** parametros["nbits"]):
+        return None
+    return f"IVF{nlist},PQ{parametros['m']}x{parametros['nbits']}"
+
+
+def criar_store_vetorial(textos: List[str], vetores: Sequence[Sequence[float]], metadados: List[Dict[str, Any]],
+                         ids: List[str], embeddings, pasta: str, tipo: str = "flat",
+                         parametros: Optional[Dict[str, Any]] = None, **kwargs) -> FAISS:
+    """
+    Cria o vector store FAISS do tipo configurado a partir de embeddings já calculados
+
+    Catálogos pequenos demais para treinar IVF-PQ ficam em um índice flat.
+
+    Args:
+        pasta: Pasta onde o índice será salvo (recebe também os vetores exatos)
+        tipo: Um de TIPOS_INDICE
+        parametros: Sobrescreve PARAMETROS_PADRAO
+        **kwargs: Repassados ao FAISS do LangChain (distance_strategy, normalize_L2)
+    """
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice inválido: {tipo} (use {', '.join(TIPOS_INDICE)})")
+
+    if tipo != "flat" and len(vetores):
+        configurados = {**PARAMETROS_PADRAO, **(parametros or {})}
+        fabrica = _fabrica(tipo, len(vetores[0]), len(vetores), configurados)
+        if fabrica is not None:
+            return FAISSQuantizado.construir(
+                textos, vetores, metadados, ids, embeddings, pasta, tipo, fabrica, configurados, **kwargs
+            )
+        logger.info(f"Apenas {len(vetores)} vetores, poucos para treinar {tipo}; usando índice flat")
+
+    return FAISS.from_embeddings(
+        list(zip(textos, vetores)), embeddings, metadatas=metadados, ids=ids, **kwargs
+    )
+
+
+def promover_store(vector_store: FAISS, pasta: str, tipo: str,
+                   parametros: Optional[Dict[str, Any]] = None, **kwargs) -> FAISS:
+    """
+    Converte um índice flat no tipo configurado quando já houver vetores para treiná-lo
+
+    Catálogos que começaram pequenos (e por isso flat) passam a usar o índice
+    comprimido assim que crescem, reaproveitando os vetores já indexados.
+
+    Returns:
+        O store comprimido ou o próprio `vector_store` se nada mudou
+    """
+    if tipo == "flat" or isinstance(vector_store, FAISSQuantizado):
+        return vector_store
+    indice = vector_store.index
+    configurados = {**PARAMETROS_PADRAO, **(parametros or {})}
+    if not indice.ntotal or _fabrica(tipo, indice.d, indice.ntotal, configurados) is None:
+        return vector_store
+
+    posicoes = sorted(vector_store.index_to_docstore_id)
+    ids = [vector_store.index_to_docstore_id[posicao] for posicao in posicoes]
+    documentos = [vector_store.docstore.search(id_) for id_ in ids]
+    vetores = indice.reconstruct_batch(np.asarray(posicoes, dtype=np.int64))
+    logger.info(f"Catálogo chegou a {len(ids)} vetores: convertendo índice flat em {tipo}")
+    return criar_store_vetorial(
+        [doc.page_content for doc in documentos], vetores, [doc.metadata for doc in documentos],
+        ids, vector_store.embedding_function, pasta, tipo, parametros, **kwargs
+    )
+
+
+def eh_indice_quantizado(pasta: str) -> bool:
+    """Indica se a pasta guarda um FAISSQuantizado"""
+    return os.path.exists(os.path.join(pasta, ARQUIVO_META))
+
+
+def carregar_store(pasta: str, embeddings, mapear: bool = False,
+                   parametros_busca: Optional[Dict[str, Any]] = None, **kwargs) -> FAISS:
+    """
+    Carrega um índice salvo (FAISS flat ou FAISSQuantizado)
+
+    O pickle do docstore precisa ter sido gravado por este próprio sistema.
+
+    Args:
+        mapear: Mapeia o índice em memória somente leitura em vez de copiá-lo
+            para a RAM; as páginas ficam no page cache, compartilhadas por
+            todos os processos que abrirem o mesmo arquivo. Um índice mapeado
+            não aceita inserções até passar por materializar_store.
+        parametros_busca: Sobrescreve nprobe / ef_search / fator_rerank salvos
+        **kwargs: Repassados ao FAISS do LangChain (distance_strategy, normalize_L2)
+    """
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mapear else 0
+    indice = faiss.read_index(os.path.join(pasta, "index.faiss"), flags)
+    with open(os.path.join(pasta, "index.pkl"), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    if not eh_indice_quantizado(pasta):
+        return FAISS(embeddings, indice, docstore, index_to_docstore_id, **kwargs)
+
+    with open(os.path.join(pasta, ARQUIVO_META), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    ajustes = {
+        chave: valor for chave, valor in (parametros_busca or {}).items()
+        if chave in PARAMETROS_BUSCA and valor is not None
+    }
+    return FAISSQuantizado(
+        embeddings, indice, docstore, index_to_docstore_id,
+        pasta=pasta, tipo=meta["tipo"], parametros={**meta["parametros"], **ajustes},
+        arquivo_vetores=meta["arquivo_vetores"], somente_leitura=mapear, **kwargs
+    )
+
+
+def materializar_store(vector_store: FAISS):
+    """
+    Copia para a RAM um índice carregado com mapear=True, liberando inserções e remoções
+
+    Buscas em andamento continuam usando o índice mapeado anterior.
+    """
+    vector_store.index = faiss.deserialize_index(faiss.serialize_index(vector_store.index))
+    if isinstance(vector_store, FAISSQuantizado):
+        vector_store.somente_leitura = False
+
+
+class FAISSQuantizado(FAISS):
+    """
+    Vector store FAISS com índice comprimido e re-ranqueamento exato
+
+    Em memória fica só o índice comprimido (IVF-PQ ou HNSW-SQ8); os vetores
+    float32 completos ficam em um arquivo mapeado em memória, lido apenas nas
+    linhas dos candidatos re-ranqueados. Cada busca pede ao índice
+    k * fator_rerank candidatos e devolve os k de maior cosseno exato.
+
+    As posições no índice nunca mudam: remoções viram tombstones (o IVF não
+    renumera IDs e o HNSW não suporta remoção) e o índice é reconstruído a
+    partir dos vetores exatos quando elas passam de FRACAO_MAX_REMOVIDOS.
+
+    O arquivo de vetores é compartilhado entre gerações e processos, por isso
+    inclusões ficam na RAM (`_vetores_novos`) e só vão para ele em save_local,
+    feito por um processo de cada vez.
+    """
+
+    def __init__(self, embedding_function, index, docstore, index_to_docstore_id: Dict[int, str],
+                 pasta: str, tipo: str, parametros: Dict[str, Any],
+                 arquivo_vetores: Optional[str] = None, somente_leitura: bool = False, **kwargs):
+        super().__init__(embedding_function, index, docstore, index_to_docstore_id, **kwargs)
+        self.pasta = pasta
+        self.tipo = tipo
+        self.parametros = {**PARAMETROS_PADRAO, **parametros}
+        # Carregado por outro processo que não grava: nunca altera os arquivos
+        self.somente_leitura = somente_leitura
+
+        self._lock = threading.Lock()
+        self._caminho_vetores = os.path.join(pasta, arquivo_vetores or f"vetores-{uuid.uuid4().hex}.f32")
+        # Linhas do arquivo mapeado; as posições seguintes estão em _vetores_novos
+        self._linhas_arquivo = index.ntotal
+        self._vetores = self._mapear_vetores()
+        self._vetores_novos = np.empty((0, index.d), dtype=np.float32)
+        self._posicao_por_id = {id_: posicao for posicao, id_ in index_to_docstore_id.items()}
+        self._removidos = set(range(index.ntotal)) - set(index_to_docstore_id)
+        self._seletor_ativos: Optional[Tuple[Any, Any]] = None
+
+    @classmethod
+    def construir(cls, textos: List[str], vetores: Sequence[Sequence[float]], metadados: List[Dict[str, Any]],
+                  ids: List[str], embeddings, pasta: str, tipo: str, fabrica: str,
+                  parametros: Dict[str, Any], **kwargs) -> "FAISSQuantizado":
+        """Treina o índice com os próprios vetores e adiciona todos eles"""
+        matriz = np.asarray(vetores, dtype=np.float32)
+        faiss.normalize_L2(matriz)
+        total, dimensao = matriz.shape
+
+        # Cada construção grava um arquivo novo: stores antigos continuam lendo o deles
+        os.makedirs(pasta, exist_ok=True)
+        arquivo_vetores = f"vetores-{uuid.uuid4().hex}.f32"
+        matriz.tofile(os.path.join(pasta, arquivo_vetores))
+
+        indice = faiss.index_factory(dimensao, fabrica, faiss.METRIC_INNER_PRODUCT)
+        if tipo == "hnsw_sq":
+            indice.hnsw.efConstruction = parametros["ef_construction"]
+
+        amostra = matriz
+        if total > parametros["amostra_treino"]:
+            sorteados = np.random.default_rng(0).choice(total, parametros["amostra_treino"], replace=False)
+            amostra = matriz[np.sort(sorteados)]
+        indice.train(amostra)
+        for inicio in range(0, total, BLOCO_ADICAO):
+            indice.add(matriz[inicio:inicio + BLOCO_ADICAO])
+
+        docstore = InMemoryDocstore({
+            id_: Document(id=id_, page_content=texto, metadata=meta)
+            for id_, texto, meta in zip(ids, textos, metadados)
+        })
+        logger.info(f"Índice {fabrica} treinado com {len(amostra)} de {total} vetores")
+        return cls(embeddings, indice, docstore, dict(enumerate(ids)), pasta=pasta, tipo=tipo,
+                   parametros=parametros, arquivo_vetores=arquivo_vetores, **kwargs)
+
+    def _mapear_vetores(self) -> np.ndarray:
+        """
+        Mapeia o arquivo de vetores exatos (uma linha por posição do índice)
+
+        Linhas além das do índice (de outra geração ou de uma gravação
+        interrompida) são ignoradas, nunca truncadas: outros processos podem
+        estar lendo o mesmo arquivo.
+        """
+        linhas, dimensao = self._linhas_arquivo, self.index.d
+        if not linhas:
+            return np.empty((0, dimensao), dtype=np.float32)
+        return np.memmap(self._caminho_vetores, dtype=np.float32, mode='r', shape=(linhas, dimensao))
+
+    def _ler_vetores(self, posicoes: np.ndarray) -> np.ndarray:
+        """Vetores exatos das posições (ordenadas), do arquivo mapeado ou da RAM"""
+        no_arquivo = posicoes < self._linhas_arquivo
+        if no_arquivo.all():
+            return np.asarray(self._vetores[posicoes])
+        resultado = np.empty((len(posicoes), self.index.d), dtype=np.float32)
+        resultado[no_arquivo] = self._vetores[posicoes[no_arquivo]]
+        resultado[~no_arquivo] = self._vetores_novos[posicoes[~no_arquivo] - self._linhas_arquivo]
+        return resultado
+
+    def ajustar_busca(self, **parametros):
+        """Altera nprobe, ef_search ou fator_rerank sem reconstruir o índice"""
+        invalidos = set(parametros) - set(PARAMETROS_BUSCA)
+        if invalidos:
+            raise ValueError(f"Parâmetros de busca inválidos: {', '.join(sorted(invalidos))}")
+        self.parametros.update({chave: valor for chave, valor in parametros.items() if valor is not None})
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self._adicionar(texts, self._embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                       **kwargs) -> List[str]:
+        pares = list(text_embeddings)
+        return self._adicionar([texto for texto, _ in pares], [vetor for _, vetor in pares], metadatas, ids)
+
+    def _adicionar(self, textos: List[str], vetores: List[List[float]],
+                   metadados: Optional[List[dict]], ids: Optional[List[str]]) -> List[str]:
+        """Acrescenta vetores no fim do índice e dos vetores exatos em RAM"""
+        if not textos:
+            return []
+        ids = ids or [str(uuid.uuid4()) for _ in textos]
+        metadados = metadados or [{} for _ in textos]
+        if len(set(ids)) != len(ids):
+            raise ValueError("IDs repetidos na mesma inserção")
+
+        matriz = np.asarray(vetores, dtype=np.float32)
+        faiss.normalize_L2(matriz)
+
+        with self._lock:
+            if self.somente_leitura:
+                raise RuntimeError("Índice mapeado somente leitura; use materializar_store antes de alterar")
+            duplicados = [id_ for id_ in ids if id_ in self._posicao_por_id]
+            if duplicados:
+                raise ValueError(f"IDs já existem no índice: {duplicados}")
+
+            inicio = self.index.ntotal
+            # Vetores exatos primeiro: uma posição nunca existe no índice sem o vetor dela
+            self._vetores_novos = np.concatenate([self._vetores_novos, matriz])
+            self.index.add(matriz)
+
+            self.docstore.add({
+                id_: Document(id=id_, page_content=texto, metadata=meta)
+                for id_, texto, meta in zip(ids, textos, metadados)
+            })
+            for deslocamento, id_ in enumerate(ids):
+                self.index_to_docstore_id[inicio + deslocamento] = id_
+                self._posicao_por_id[id_] = inicio + deslocamento
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        """Marca os vetores como removidos (tombstones); as demais posições não mudam"""
+        if ids is None:
+            raise ValueError("Nenhum ID informado para remoção")
+        with self._lock:
+            faltando = set(ids) - set(self._posicao_por_id)
+            if faltando:
+                raise ValueError(f"IDs não encontrados no índice: {faltando}")
+            for id_ in ids:
+                posicao = self._posicao_por_id.pop(id_)
+                del self.index_to_docstore_id[posicao]
+                self._removidos.add(posicao)
+            self.docstore.delete(ids)
+            self._seletor_ativos = None
+        return True
+
+    @property
+    def total_removidos(self) -> int:
+        """Posições marcadas como removidas ainda presentes no índice"""
+        return len(self._removidos)
+
+    def precisa_compactar(self) -> bool:
+        """Indica se os tombstones já ocupam uma fração relevante do índice"""
+        return self.total_removidos > FRACAO_MAX_REMOVIDOS * max(self.index.ntotal, 1)
+
+    def compactar(self, pasta: Optional[str] = None) -> FAISS:
+        """
+        Reconstrói o índice só com os vetores ativos, sem gerar embeddings
+
+        Args:
+            pasta: Onde gravar os vetores exatos do novo índice (padrão: a pasta atual)
+
+        Returns:
+            Novo vector store (flat, se restarem poucos vetores para treinar)
+        """
+        with self._lock:
+            posicoes = sorted(self.index_to_docstore_id)
+            ids = [self.index_to_docstore_id[posicao] for posicao in posicoes]
+            documentos = [self.docstore.search(id_) for id_ in ids]
+            vetores = (
+                self._ler_vetores(np.asarray(posicoes, dtype=np.int64)) if posicoes
+                else np.empty((0, self.index.d))
+            )
+
+        logger.info(f"Reconstruindo índice {self.tipo}: {len(ids)} vetores ativos, {self.total_removidos} removidos")
+        return criar_store_vetorial(
+            [doc.page_content for doc in documentos], vetores, [doc.metadata for doc in documentos],
+            ids, self.embedding_function, pasta or self.pasta, self.tipo, self.parametros,
+            distance_strategy=self.distance_strategy, normalize_L2=self._normalize_L2
+        )
+
+    def _seletor(self) -> Optional[Any]:
+        """IDSelector que exclui as posições removidas (None se não houver nenhuma)"""
+        if not self._removidos:
+            return None
+        if self._seletor_ativos is None:
+            removidos = faiss.IDSelectorBatch(np.fromiter(self._removidos, dtype=np.int64))
+            # O IDSelectorNot não mantém referência ao seletor interno
+            self._seletor_ativos = (removidos, faiss.IDSelectorNot(removidos))
+        return self._seletor_ativos[1]
+
+    def _parametros_faiss(self, seletor, esforco: int) -> Any:
+        """SearchParameters com nprobe (IVF) ou efSearch (HNSW) igual a `esforco`"""
+        extras = {"sel": seletor} if seletor is not None else {}
+        if self.tipo == "ivfpq":
+            return faiss.SearchParametersIVF(nprobe=min(esforco, self.index.nlist), **extras)
+        return faiss.SearchParametersHNSW(efSearch=esforco, **extras)
+
+    def _buscar_candidatas(self, consulta: np.ndarray, k: int, posicoes: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Candidatas do índice aproximado para o re-ranqueamento
+
+        As listas/vizinhos visitados podem ter menos de k posições aceitas
+        (seletor de filtro ou tombstones, ou listas do IVF pequenas para um k
+        grande, como o fetch_k de uma busca com `filter`); nesse caso a busca é
+        refeita dobrando nprobe/ef_search até achar k ou esgotar o índice.
+        """
+        k_busca = min(self.index.ntotal, max(k, k * int(self.parametros["fator_rerank"])))
+        if not k_busca:
+            return np.empty(0, dtype=np.int64)
+        seletor = faiss.IDSelectorBatch(posicoes) if posicoes is not None else self._seletor()
+        disponiveis = len(posicoes) if posicoes is not None else len(self.index_to_docstore_id)
+        if self.tipo == "ivfpq":
+            esforco, maximo = self.parametros["nprobe"], self.index.nlist
+        else:
+            esforco, maximo = self.parametros["ef_search"], max(self.index.ntotal, k_busca)
+
+        while True:
+            _, indices = self.index.search(consulta, k_busca, params=self._parametros_faiss(seletor, esforco))
+            candidatas = indices[0][indices[0] != -1]
+            if len(candidatas) >= min(k, disponiveis) or esforco >= maximo:
+                return np.sort(candidatas)
+            esforco = min(esforco * 2, maximo)
+
+    def buscar_posicoes(self, consulta: np.ndarray, k: int, posicoes: Optional[np.ndarray] = None,
+                        limite_forca_bruta: int = LIMITE_SCORE_EXATO) -> List[Tuple[int, float]]:
+        """
+        Busca aproximada seguida de re-ranqueamento pelo cosseno exato
+
+        Args:
+            consulta: Matriz (1, d) já normalizada
+            posicoes: Restringe a busca a estas posições (None = índice inteiro)
+            limite_forca_bruta: Até este número de posições o cosseno exato é
+                calculado direto sobre elas, sem passar pelo índice
+
+        Returns:
+            Lista de (posição, similaridade de cosseno), da maior para a menor
+        """
+        if posicoes is not None and len(posicoes) <= limite_forca_bruta:
+            candidatas = np.sort(posicoes)
+        else:
+            candidatas = self._buscar_candidatas(consulta, k, posicoes)
+
+        # Descarta posições removidas entre a busca e a leitura
+        total = self._linhas_arquivo + len(self._vetores_novos)
+        candidatas = np.asarray([
+            posicao for posicao in candidatas.tolist()
+            if posicao in self.index_to_docstore_id and posicao < total
+        ], dtype=np.int64)
+        if not len(candidatas):
+            return []
+
+        scores = self._ler_vetores(candidatas) @ consulta[0]
+        ordem = np.argsort(-scores)[:k]
+        return [(int(candidatas[i]), float(scores[i])) for i in ordem]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter=None, fetch_k: int = 20,
+                                               **kwargs) -> List[Tuple[Document, float]]:
+        """
+        Como no FAISS do LangChain, mas o score é o cosseno exato (maior = mais parecido)
+
+        Com `filter` (dict ou função sobre os metadados) são re-ranqueados
+        max(fetch_k, k) candidatos e o filtro é aplicado sobre eles; para
+        filtros muito seletivos prefira restringir por posições (buscar_posicoes).
+        """
+        consulta = np.asarray([embedding], dtype=np.float32)
+        faiss.normalize_L2(consulta)
+        filtro = self._create_filter_func(filter) if filter is not None else None
+
+        resultados = []
+        for posicao, score in self.buscar_posicoes(consulta, k if filtro is None else max(fetch_k, k)):
+            doc = self.docstore.search(self.index_to_docstore_id.get(posicao, ""))
+            if isinstance(doc, Document) and (filtro is None or filtro(doc.metadata)):
+                resultados.append((doc, score))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            resultados = [(doc, score) for doc, score in resultados if score >= score_threshold]
+        return resultados[:k]
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        """
+        Salva índice, docstore e metadados
+
+        Os vetores exatos não são copiados: o arquivo ganha um hard link na
+        pasta de destino (cópia só se ela estiver em outro sistema de arquivos).
+        Como ele só cresce, gerações anteriores continuam lendo as próprias linhas.
+        Chamar com a trava entre processos: é quando as inclusões em RAM são
+        acrescentadas ao arquivo.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        with self._lock:
+            self._gravar_vetores_novos(folder_path)
+            destino_vetores = os.path.join(folder_path, os.path.basename(self._caminho_vetores))
+            if not os.path.exists(destino_vetores):
+                try:
+                    os.link(self._caminho_vetores, destino_vetores)
+                except OSError:
+                    shutil.copyfile(self._caminho_vetores, destino_vetores)
+                self._caminho_vetores = destino_vetores
+                self.pasta = folder_path
+
+            super().save_local(folder_path, index_name)
+            meta = {
+                "tipo": self.tipo,
+                "parametros": self.parametros,
+                "arquivo_vetores": os.path.basename(self._caminho_vetores),
+            }
+            caminho_meta = os.path.join(folder_path, ARQUIVO_META)
+            with open(f"{caminho_meta}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            os.replace(f"{caminho_meta}.tmp", caminho_meta)
+
+    def _gravar_vetores_novos(self, pasta: str):
+        """
+        Acrescenta ao arquivo de vetores as linhas incluídas em RAM (chamar com o lock)
+
+        Se outro processo já acrescentou linhas ao mesmo arquivo a partir da
+        mesma geração, elas não são sobrescritas: os vetores vão para um
+        arquivo novo em `pasta`.
+        """
+        if not len(self._vetores_novos):
+            return
+        tamanho_esperado = self._linhas_arquivo * self.index.d * 4
+        try:
+            tamanho = os.path.getsize(self._caminho_vetores)
+        except FileNotFoundError:
+            tamanho = 0
+
+        if tamanho == tamanho_esperado:
+            with open(self._caminho_vetores, 'ab') as f:
+                f.write(self._vetores_novos.tobytes())
+        else:
+            caminho = os.path.join(pasta, f"vetores-{uuid.uuid4().hex}.f32")
+            with open(caminho, 'wb') as f:
+                for inicio in range(0, self._linhas_arquivo, BLOCO_ADICAO):
+                    f.write(np.asarray(self._vetores[inicio:inicio + BLOCO_ADICAO]).tobytes())
+                f.write(self._vetores_novos.tobytes())
+            self._caminho_vetores = caminho
+
+        self._linhas_arquivo += len(self._vetores_novos)
+        self._vetores_novos = np.empty((0, self.index.d), dtype=np.float32)
+        self._vetores = self._mapear_vetores()
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings, index_name: str = "index", *,
+                   allow_dangerous_deserialization: bool = False,
+                   parametros_busca: Optional[Dict[str, Any]] = None, **kwargs) -> "FAISSQuantizado":
+        """Carrega um índice salvo por save_local (ver carregar_store)"""
+        if not allow_dangerous_deserialization:
+            raise ValueError("Carregar o índice desserializa um pickle; informe allow_dangerous_deserialization=True")
+        return carregar_store(folder_path, embeddings, parametros_busca=parametros_busca, **kwargs)
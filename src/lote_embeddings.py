@@ -0,0 +1,165 @@
+"""
+Agrupamento de embeddings de consultas
+Junta consultas simultâneas em uma única chamada à API de embeddings
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class LoteEmbeddings(Embeddings):
+    """
+    Envolve um objeto de embeddings agrupando as consultas em lotes
+
+    `embed_query` e `aembed_query` apenas enfileiram o texto; uma thread em
+    segundo plano espera até `janela_ms` por outras consultas (ou até juntar
+    `max_lote`) e envia todas em uma única chamada `embed_documents`,
+    devolvendo cada vetor a quem o pediu. Textos repetidos no mesmo lote são
+    enviados uma vez só. Embeddings de documentos já chegam em lote e passam
+    direto.
+    """
+
+    def __init__(self, embeddings_base: Embeddings, janela_ms: float = 5.0,
+                 max_lote: int = 64, max_concorrencia: int = 4):
+        """
+        Args:
+            embeddings_base: Objeto de embeddings real (ex: OpenAIEmbeddings)
+            janela_ms: Tempo máximo que a primeira consulta do lote espera por outras
+            max_lote: Consultas por chamada de embeddings
+            max_concorrencia: Lotes enviados em paralelo
+        """
+        self.embeddings_base = embeddings_base
+        self.janela = janela_ms / 1000
+        self.max_lote = max_lote
+
+        self.consultas = 0
+        self.chamadas = 0
+
+        self._fila: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        # Protege os contadores e a ordem entre enfileirar e o sentinela de fechar()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix="lote-embeddings")
+        self._ativo = True
+        self._thread = threading.Thread(target=self._executar, name="lote-embeddings", daemon=True)
+        self._thread.start()
+
+    @property
+    def model(self) -> Optional[str]:
+        """Modelo de embeddings do objeto envolvido"""
+        return getattr(self.embeddings_base, "model", None)
+
+    def _enfileirar(self, texto: str) -> Optional[Future]:
+        """Coloca uma consulta na fila do próximo lote (None se o agrupamento já foi encerrado)"""
+        futuro: Future = Future()
+        with self._lock:
+            if not self._ativo:
+                return None
+            self._fila.put((texto, futuro))
+        return futuro
+
+    def _executar(self):
+        """Loop da thread: monta os lotes e os despacha para o executor"""
+        while True:
+            item = self._fila.get()
+            if item is None:
+                break
+
+            lote = [item]
+            parar = False
+            prazo = time.monotonic() + self.janela
+            while len(lote) < self.max_lote:
+                restante = prazo - time.monotonic()
+                try:
+                    item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    parar = True
+                    break
+                lote.append(item)
+
+            self._executor.submit(self._processar, lote)
+            if parar:
+                break
+
+        # Consultas que chegaram junto com o encerramento
+        restantes = []
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                restantes.append(item)
+        if restantes:
+            self._processar(restantes)
+
+    def _processar(self, lote: List[Tuple[str, Future]]):
+        """Gera os embeddings de um lote e entrega cada vetor à consulta correspondente"""
+        textos = list(dict.fromkeys(texto for texto, _ in lote))
+        try:
+            vetores: Dict[str, List[float]] = dict(zip(textos, self.embeddings_base.embed_documents(textos)))
+        except Exception as e:
+            logger.error(f"Erro ao gerar embeddings de {len(textos)} consultas: {e}")
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self.consultas += len(lote)
+                self.chamadas += 1
+
+        for texto, futuro in lote:
+            futuro.set_result(vetores[texto])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings de documentos diretamente (sem agrupar)"""
+        return self.embeddings_base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera embedding de consulta no próximo lote"""
+        futuro = self._enfileirar(text)
+        if futuro is None:
+            return self.embeddings_base.embed_query(text)
+        return futuro.result()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_documents"""
+        return await self.embeddings_base.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versão assíncrona de embed_query (aguarda o lote sem bloquear o event loop)"""
+        futuro = self._enfileirar(text)
+        if futuro is None:
+            return await self.embeddings_base.aembed_query(text)
+        return await asyncio.wrap_future(futuro)
+
+    def fechar(self):
+        """Envia as consultas já enfileiradas e encerra a thread"""
+        with self._lock:
+            if not self._ativo:
+                return
+            # Nenhuma consulta entra na fila depois do sentinela
+            self._ativo = False
+            self._fila.put(None)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+
+    def obter_estatisticas(self) -> Dict[str, float]:
+        """Retorna contadores de consultas e chamadas à API"""
+        with self._lock:
+            consultas, chamadas = self.consultas, self.chamadas
+        return {
+            "consultas": consultas,
+            "chamadas": chamadas,
+            "consultas_por_chamada": round(consultas / chamadas, 2) if chamadas else 0.0,
+        }
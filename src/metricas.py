@@ -0,0 +1,309 @@
+"""
+Métricas do sistema
+Contadores e histogramas atualizados no momento de cada evento e lidos em O(1),
+exportáveis no formato de texto do Prometheus
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets de latência
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Limites dos buckets de tokens por chamada ao LLM
+LIMITES_TOKENS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# Descrição e nome do rótulo de cada métrica conhecida (usados na exportação)
+DESCRICOES: Dict[str, Tuple[str, str]] = {
+    "interacoes": ("Interações concluídas", ""),
+    "intencoes": ("Interações por intenção detectada", "intencao"),
+    "erros": ("Mensagens que terminaram em erro", ""),
+    "latencia_mensagem_segundos": ("Duração do processamento completo de uma mensagem", "intencao"),
+    "latencia_etapa_segundos": ("Duração de cada etapa do pipeline", "etapa"),
+    "latencia_busca_produtos_segundos": ("Duração das buscas de produtos", "modo"),
+    "latencia_llm_segundos": ("Duração das chamadas ao LLM", "etapa"),
+    "latencia_primeiro_token_segundos": ("Tempo até o primeiro trecho da resposta transmitida", "etapa"),
+    "chamadas_llm": ("Chamadas ao LLM", "etapa"),
+    "erros_llm": ("Chamadas ao LLM que falharam", "etapa"),
+    "tokens_entrada_llm": ("Tokens de entrada (prompt) enviados ao LLM", "etapa"),
+    "tokens_saida_llm": ("Tokens de saída gerados pelo LLM", "etapa"),
+    "tokens_por_chamada_llm": ("Tokens (entrada + saída) por chamada ao LLM", "etapa"),
+    "latencia_http_segundos": ("Duração das requisições HTTP por rota", "rota"),
+}
+
+Valor = Union[float, Dict[str, float]]
+
+
+class Histograma:
+    """
+    Distribuição de valores em buckets de limites fixos
+
+    Guarda só a contagem por bucket, a soma e o total, então observar e ler
+    custam o mesmo independente do número de observações. Os percentis são
+    estimados por interpolação dentro do bucket.
+    """
+
+    def __init__(self, limites: Sequence[float] = LIMITES_LATENCIA):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def percentil(self, fracao: float) -> Optional[float]:
+        """Valor estimado abaixo do qual ficam `fracao` das observações"""
+        if not self.total:
+            return None
+        alvo = fracao * self.total
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            if contagem and acumulado + contagem >= alvo:
+                if i == len(self.limites):
+                    # Acima do último limite não há como interpolar
+                    return self.limites[-1]
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.limites[-1]
+
+    def buckets(self) -> List[tuple]:
+        """(limite superior, contagem acumulada), terminando em (inf, total)"""
+        acumulado = 0
+        resultado = []
+        for limite, contagem in zip((*self.limites, float("inf")), self.contagens):
+            acumulado += contagem
+            resultado.append((limite, acumulado))
+        return resultado
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "soma": round(self.soma, 6),
+            "media": round(self.soma / self.total, 6) if self.total else None,
+            "p50": self.percentil(0.5),
+            "p95": self.percentil(0.95),
+            "p99": self.percentil(0.99),
+        }
+
+
+class Metricas:
+    """
+    Registro de contadores e histogramas com rótulo opcional
+
+    Os valores são atualizados por quem gera o evento (ex: uma interação
+    registrada, uma busca concluída); ler as métricas não percorre dados.
+    Valores mantidos por outros objetos (tamanho dos índices, acertos dos
+    caches) entram como medidores, lidos só na exportação. Cada processo tem
+    os próprios valores, acumulados desde o início.
+    """
+
+    def __init__(self, limites_latencia: Sequence[float] = LIMITES_LATENCIA):
+        self.limites_latencia = tuple(limites_latencia)
+        self._contadores: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._histogramas: Dict[str, Dict[str, Histograma]] = defaultdict(dict)
+        # nome -> (função, tipo, descrição, nome do rótulo), lidos só na exportação
+        self._medidores: Dict[str, Tuple[Callable[[], Valor], str, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nome: str, rotulo: str = "", valor: float = 1):
+        """Soma `valor` ao contador (e rótulo) informado"""
+        with self._lock:
+            self._contadores[nome][rotulo] += valor
+
+    def observar(self, nome: str, valor: float, rotulo: str = "",
+                 limites: Optional[Sequence[float]] = None):
+        """
+        Registra uma observação no histograma (e rótulo) informado
+
+        Args:
+            limites: Buckets usados se o histograma ainda não existir (padrão: latência)
+        """
+        with self._lock:
+            histograma = self._histogramas[nome].get(rotulo)
+            if histograma is None:
+                histograma = self._histogramas[nome][rotulo] = Histograma(limites or self.limites_latencia)
+            histograma.observar(valor)
+
+    @contextmanager
+    def cronometrar(self, nome: str, rotulo: str = "") -> Iterator[None]:
+        """Observa no histograma a duração do bloco, em segundos"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, rotulo)
+
+    def valor(self, nome: str, rotulo: str = "") -> float:
+        """Valor atual de um contador"""
+        with self._lock:
+            return self._contadores.get(nome, {}).get(rotulo, 0)
+
+    def contador(self, nome: str) -> Dict[str, float]:
+        """Valores de um contador por rótulo"""
+        with self._lock:
+            return dict(self._contadores.get(nome, {}))
+
+    def instantaneo(self) -> Dict[str, Any]:
+        """Todos os contadores e os resumos dos histogramas"""
+        with self._lock:
+            return {
+                "contadores": {nome: dict(valores) for nome, valores in self._contadores.items()},
+                "histogramas": {
+                    nome: {rotulo: histograma.para_dict() for rotulo, histograma in por_rotulo.items()}
+                    for nome, por_rotulo in self._histogramas.items()
+                },
+            }
+
+    def registrar_medidor(self, nome: str, funcao: Callable[[], Valor], ajuda: str = "",
+                          rotulo: str = "", tipo: str = "gauge"):
+        """
+        Registra um valor lido no momento da exportação (ex: tamanho de um índice)
+
+        Args:
+            funcao: Devolve um número ou um dict {valor do rótulo: número}; deve ser barata
+            ajuda: Descrição da métrica
+            rotulo: Nome do rótulo quando a função devolve um dict
+            tipo: "gauge" ou "counter" (para contadores mantidos por outro objeto)
+        """
+        with self._lock:
+            self._medidores[nome] = (funcao, tipo, ajuda, rotulo)
+
+    def exportar_prometheus(self, prefixo: str = "assistente_") -> str:
+        """Todas as métricas no formato de texto do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            contadores = {nome: dict(valores) for nome, valores in self._contadores.items()}
+            histogramas = {
+                nome: {rotulo: (histograma.buckets(), histograma.soma, histograma.total)
+                       for rotulo, histograma in por_rotulo.items()}
+                for nome, por_rotulo in self._histogramas.items()
+            }
+            medidores = dict(self._medidores)
+
+        linhas: List[str] = []
+        for nome, valores in sorted(contadores.items()):
+            ajuda, chave = DESCRICOES.get(nome, ("", ""))
+            metrica = f"{prefixo}{nome}_total"
+            linhas += _cabecalho(metrica, ajuda, "counter")
+            for rotulo, valor in sorted(valores.items()):
+                linhas.append(f"{metrica}{_rotulos(chave, rotulo)} {_numero(valor)}")
+
+        for nome, por_rotulo in sorted(histogramas.items()):
+            ajuda, chave = DESCRICOES.get(nome, ("", ""))
+            metrica = f"{prefixo}{nome}"
+            linhas += _cabecalho(metrica, ajuda, "histogram")
+            for rotulo, (buckets, soma, total) in sorted(por_rotulo.items()):
+                for limite, acumulado in buckets:
+                    le = "+Inf" if limite == float("inf") else _numero(limite)
+                    linhas.append(f"{metrica}_bucket{_rotulos(chave, rotulo, le=le)} {acumulado}")
+                linhas.append(f"{metrica}_sum{_rotulos(chave, rotulo)} {_numero(soma)}")
+                linhas.append(f"{metrica}_count{_rotulos(chave, rotulo)} {total}")
+
+        for nome, (funcao, tipo, ajuda, chave) in sorted(medidores.items()):
+            try:
+                valor = funcao()
+            except Exception as e:
+                logger.warning(f"Erro ao ler a métrica {nome}: {e}")
+                continue
+            if valor is None:
+                continue
+            metrica = f"{prefixo}{nome}" + ("_total" if tipo == "counter" else "")
+            linhas += _cabecalho(metrica, ajuda, tipo)
+            valores = valor if isinstance(valor, dict) else {"": valor}
+            for rotulo, numero in sorted(valores.items()):
+                linhas.append(f"{metrica}{_rotulos(chave, rotulo)} {_numero(numero)}")
+
+        return "\n".join(linhas) + "\n"
+
+
+def razao_acertos(acertos: float, falhas: float) -> Optional[float]:
+    """Fração de acertos de um cache (None enquanto não houver consultas)"""
+    total = acertos + falhas
+    return round(acertos / total, 4) if total else None
+
+
+def _cabecalho(metrica: str, ajuda: str, tipo: str) -> List[str]:
+    """Linhas HELP/TYPE de uma métrica"""
+    linhas = [f"# HELP {metrica} {ajuda}"] if ajuda else []
+    return linhas + [f"# TYPE {metrica} {tipo}"]
+
+
+def _rotulos(chave: str, rotulo: str, **extras: str) -> str:
+    """Bloco de rótulos `{chave="valor",...}` (vazio se não houver nenhum)"""
+    pares = [(chave, rotulo)] if chave and rotulo else []
+    pares += list(extras.items())
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _escapar(texto: str) -> str:
+    """Escapa o valor de um rótulo"""
+    return str(texto).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor: float) -> str:
+    """Número no formato do Prometheus (inteiros sem casa decimal)"""
+    valor = float(valor)
+    if valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor)
+
+
+class ValorAtualizado:
+    """
+    Valor caro de obter (ex: estatísticas de um serviço remoto) mantido em cache
+
+    Uma thread em segundo plano recalcula o valor a cada `intervalo` segundos;
+    `obter` devolve sempre o último valor calculado, sem esperar. Falhas são
+    registradas no log e mantêm o valor anterior.
+    """
+
+    def __init__(self, funcao: Callable[[], Any], intervalo: float = 30.0, nome: str = "valor"):
+        """
+        Args:
+            funcao: Calcula o valor (chamada só pela thread de atualização)
+            intervalo: Segundos entre atualizações
+            nome: Identificação usada na thread e no log
+        """
+        self.funcao = funcao
+        self.intervalo = intervalo
+        self.nome = nome
+        self.valor: Any = None
+        self.atualizado_em: Optional[float] = None
+
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name=f"atualizacao-{nome}", daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        while True:
+            self.atualizar()
+            if self._parar.wait(self.intervalo):
+                break
+
+    def atualizar(self):
+        """Recalcula o valor imediatamente"""
+        try:
+            self.valor = self.funcao()
+            self.atualizado_em = time.time()
+        except Exception as e:
+            logger.warning(f"Erro ao atualizar {self.nome}: {e}")
+
+    def obter(self, padrao: Any = None) -> Any:
+        """Último valor calculado (`padrao` se ainda não houver)"""
+        return padrao if self.atualizado_em is None else self.valor
+
+    def fechar(self):
+        """Encerra a thread de atualização"""
+        self._parar.set()
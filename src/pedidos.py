@@ -0,0 +1,251 @@
+"""
+Repositórios de pedidos
+Consulta de pedidos por número, e-mail do cliente ou código de rastreamento
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .metricas import ValorAtualizado
+
+logger = logging.getLogger(__name__)
+
+
+class RepositorioPedidos(ABC):
+    """Interface comum dos backends de pedidos"""
+
+    @abstractmethod
+    def obter(self, pedido_id: str) -> Optional[Dict[str, Any]]:
+        """Busca um pedido pelo número"""
+
+    @abstractmethod
+    def buscar_por_email(self, email: str, limite: int = 20) -> List[Dict[str, Any]]:
+        """Lista os pedidos mais recentes de um cliente pelo e-mail (uso interno, não exposto no chat)"""
+
+    @abstractmethod
+    def buscar_por_rastreio(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Busca um pedido pelo código de rastreamento"""
+
+    @abstractmethod
+    def salvar(self, pedido: Dict[str, Any]):
+        """Inclui ou substitui um pedido"""
+
+    @abstractmethod
+    def contar(self) -> int:
+        """Número total de pedidos"""
+
+    def total_pedidos(self) -> int:
+        """Número de pedidos para estatísticas (nos backends em disco, contado em segundo plano)"""
+        return self.contar()
+
+    def fechar(self):
+        """Libera conexões do backend"""
+
+    @staticmethod
+    def _email(pedido: Dict[str, Any]) -> Optional[str]:
+        email = (pedido.get("cliente") or {}).get("email")
+        return email.strip().lower() if email else None
+
+    @staticmethod
+    def _rastreio(pedido: Dict[str, Any]) -> Optional[str]:
+        codigo = pedido.get("codigo_rastreamento")
+        return codigo.strip().upper() if codigo else None
+
+
+class RepositorioPedidosMemoria(RepositorioPedidos):
+    """
+    Pedidos em memória com índices hash
+
+    Adequado para volumes pequenos (ex: data/pedidos.json de demonstração).
+    """
+
+    def __init__(self, pedidos: Iterable[Dict[str, Any]] = ()):
+        self._por_id: Dict[str, Dict[str, Any]] = {}
+        self._por_email: Dict[str, List[str]] = defaultdict(list)
+        self._por_rastreio: Dict[str, str] = {}
+
+        for pedido in pedidos:
+            self.salvar(pedido)
+
+    @classmethod
+    def de_arquivo_json(cls, caminho: str) -> "RepositorioPedidosMemoria":
+        """Carrega os pedidos de um arquivo JSON (lista de pedidos)"""
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def obter(self, pedido_id: str) -> Optional[Dict[str, Any]]:
+        return self._por_id.get(str(pedido_id))
+
+    def buscar_por_email(self, email: str, limite: int = 20) -> List[Dict[str, Any]]:
+        ids = self._por_email.get(email.strip().lower(), [])
+        pedidos = [self._por_id[pedido_id] for pedido_id in ids if pedido_id in self._por_id]
+        # Mais recentes primeiro; empates mantêm a ordem de inclusão mais recente
+        pedidos.reverse()
+        pedidos.sort(key=lambda pedido: pedido.get("data_compra") or "", reverse=True)
+        return pedidos[:limite]
+
+    def buscar_por_rastreio(self, codigo: str) -> Optional[Dict[str, Any]]:
+        pedido_id = self._por_rastreio.get(codigo.strip().upper())
+        return self._por_id.get(pedido_id) if pedido_id else None
+
+    def salvar(self, pedido: Dict[str, Any]):
+        pedido_id = str(pedido["pedido_id"])
+        anterior = self._por_id.get(pedido_id)
+        if anterior is not None:
+            email_anterior = self._email(anterior)
+            if email_anterior and pedido_id in self._por_email.get(email_anterior, []):
+                self._por_email[email_anterior].remove(pedido_id)
+            self._por_rastreio.pop(self._rastreio(anterior), None)
+
+        self._por_id[pedido_id] = pedido
+        email = self._email(pedido)
+        if email:
+            self._por_email[email].append(pedido_id)
+        rastreio = self._rastreio(pedido)
+        if rastreio:
+            self._por_rastreio[rastreio] = pedido_id
+
+    def contar(self) -> int:
+        return len(self._por_id)
+
+
+class RepositorioPedidosSQLite(RepositorioPedidos):
+    """
+    Pedidos em SQLite, consultados sob demanda
+
+    Só as colunas de busca ficam indexadas; o pedido completo é guardado como
+    JSON. Nada é mantido em memória, então o volume de pedidos não pesa na RAM
+    do processo.
+    """
+
+    def __init__(self, caminho: str = "data/pedidos.sqlite", intervalo_contagem: float = 30.0):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS pedidos ("
+            " pedido_id TEXT PRIMARY KEY,"
+            " email TEXT,"
+            " codigo_rastreamento TEXT,"
+            " dados TEXT NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_email ON pedidos (email)")
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pedidos_rastreio ON pedidos (codigo_rastreamento)"
+        )
+        self._conexao.commit()
+
+        # COUNT(*) percorre a tabela: as estatísticas leem o último valor contado
+        self._total_pedidos = ValorAtualizado(self.contar, intervalo_contagem, nome="pedidos-sqlite")
+
+    def _consultar(self, sql: str, parametros: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            linhas = self._conexao.execute(sql, parametros).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+
+    def obter(self, pedido_id: str) -> Optional[Dict[str, Any]]:
+        pedidos = self._consultar("SELECT dados FROM pedidos WHERE pedido_id = ?", (str(pedido_id),))
+        return pedidos[0] if pedidos else None
+
+    def buscar_por_email(self, email: str, limite: int = 20) -> List[Dict[str, Any]]:
+        return self._consultar(
+            "SELECT dados FROM pedidos WHERE email = ?"
+            " ORDER BY json_extract(dados, '$.data_compra') DESC, rowid DESC LIMIT ?",
+            (email.strip().lower(), limite)
+        )
+
+    def buscar_por_rastreio(self, codigo: str) -> Optional[Dict[str, Any]]:
+        pedidos = self._consultar(
+            "SELECT dados FROM pedidos WHERE codigo_rastreamento = ?", (codigo.strip().upper(),)
+        )
+        return pedidos[0] if pedidos else None
+
+    def salvar(self, pedido: Dict[str, Any]):
+        self.importar([pedido])
+
+    def importar(self, pedidos: Iterable[Dict[str, Any]], tamanho_lote: int = 1_000) -> int:
+        """Insere ou substitui pedidos em lotes; retorna quantos foram gravados"""
+        total = 0
+        lote = []
+        for pedido in pedidos:
+            lote.append((
+                str(pedido["pedido_id"]),
+                self._email(pedido),
+                self._rastreio(pedido),
+                json.dumps(pedido, ensure_ascii=False),
+            ))
+            if len(lote) >= tamanho_lote:
+                total += self._gravar_lote(lote)
+                lote = []
+        if lote:
+            total += self._gravar_lote(lote)
+        return total
+
+    def _gravar_lote(self, lote: List[tuple]) -> int:
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO pedidos (pedido_id, email, codigo_rastreamento, dados)"
+                " VALUES (?, ?, ?, ?)",
+                lote
+            )
+            self._conexao.commit()
+        return len(lote)
+
+    def importar_json(self, caminho: str) -> int:
+        """Importa um arquivo JSON no formato de data/pedidos.json"""
+        with open(caminho, 'r', encoding='utf-8') as f:
+            total = self.importar(json.load(f))
+        self._total_pedidos.atualizar()
+        return total
+
+    def contar(self) -> int:
+        with self._lock:
+            return self._conexao.execute("SELECT COUNT(*) FROM pedidos").fetchone()[0]
+
+    def total_pedidos(self) -> int:
+        return self._total_pedidos.obter(0)
+
+    def fechar(self):
+        self._total_pedidos.fechar()
+        with self._lock:
+            self._conexao.close()
+
+
+def criar_repositorio_pedidos(backend: str = "json", diretorio_dados: str = "data") -> RepositorioPedidos:
+    """
+    Cria o repositório de pedidos configurado
+
+    Args:
+        backend: "json" (memória, a partir de pedidos.json) ou "sqlite"
+        diretorio_dados: Diretório com pedidos.json / pedidos.sqlite
+    """
+    caminho_json = os.path.join(diretorio_dados, "pedidos.json")
+
+    if backend == "sqlite":
+        repositorio = RepositorioPedidosSQLite(os.path.join(diretorio_dados, "pedidos.sqlite"))
+        # Primeira execução: importa o JSON existente
+        if repositorio.contar() == 0 and os.path.exists(caminho_json):
+            total = repositorio.importar_json(caminho_json)
+            logger.info(f"{total} pedidos importados de {caminho_json} para SQLite")
+        return repositorio
+
+    if backend != "json":
+        raise ValueError(f"Backend de pedidos desconhecido: {backend}")
+
+    try:
+        return RepositorioPedidosMemoria.de_arquivo_json(caminho_json)
+    except FileNotFoundError:
+        logger.warning(f"Arquivo {caminho_json} não encontrado")
+        return RepositorioPedidosMemoria()
@@ -3,34 +3,49 @@ Templates de Prompts para o Assistente Virtual
 Centraliza todos os prompts usados no sistema
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 class PromptTemplates:
     """
     Classe que centraliza todos os templates de prompt
     """
     
+    def get_exemplos_intencao(self) -> Dict[str, List[str]]:
+        """Mensagens de exemplo de cada intenção (usadas no prompt e no classificador local)"""
+        return {
+            "busca_produtos": ["Quero um notebook", "Procuro tênis de corrida", "Tem smartphone barato?"],
+            "consulta_pedido": ["Cadê meu pedido #12345?", "Status do pedido", "Quando chega minha compra?"],
+            "politicas": ["Como trocar um produto?", "Qual o prazo de entrega?", "Política de devolução"],
+            "recomendacao": ["O que vocês recomendam?", "Sugestão de presente", "Produtos populares"],
+            "saudacao": ["Oi", "Olá", "Bom dia", "Preciso de ajuda"],
+        }
+    
     def get_prompt_deteccao_intencao(self) -> str:
         """Prompt para detectar intenção do usuário"""
-        return """
+        exemplos = {
+            intencao: ", ".join(f'"{exemplo}"' for exemplo in lista)
+            for intencao, lista in self.get_exemplos_intencao().items()
+        }
+        
+        return f"""
 Você é um especialista em classificação de intenções para um assistente de e-commerce.
 
 Analise a mensagem do usuário e classifique em uma das seguintes intenções:
 
 1. "busca_produtos" - Usuário quer encontrar/buscar produtos específicos
-   Exemplos: "Quero um notebook", "Procuro tênis de corrida", "Tem smartphone barato?"
+   Exemplos: {exemplos["busca_produtos"]}
 
 2. "consulta_pedido" - Usuário quer saber sobre status de pedido
-   Exemplos: "Cadê meu pedido #12345?", "Status do pedido", "Quando chega minha compra?"
+   Exemplos: {exemplos["consulta_pedido"]}
 
 3. "politicas" - Usuário pergunta sobre políticas, prazos, trocas, devoluções
-   Exemplos: "Como trocar um produto?", "Qual o prazo de entrega?", "Política de devolução"
+   Exemplos: {exemplos["politicas"]}
 
 4. "recomendacao" - Usuário quer sugestões/recomendações personalizadas
-   Exemplos: "O que vocês recomendam?", "Sugestão de presente", "Produtos populares"
+   Exemplos: {exemplos["recomendacao"]}
 
 5. "saudacao" - Cumprimentos, saudações, conversas iniciais
-   Exemplos: "Oi", "Olá", "Bom dia", "Preciso de ajuda"
+   Exemplos: {exemplos["saudacao"]}
 
 6. "outro" - Qualquer coisa que não se encaixe nas categorias acima
 
@@ -4,9 +4,18 @@ Para busca vetorial de produtos e políticas
 """
 
 import json
+import math
 import os
+import random
+import shutil
+import tempfile
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import functools
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from typing import AsyncIterable, Callable, Iterable, List, Dict, Any, Optional, Set, Tuple, Union
 import numpy as np
 from datetime import datetime
 
@@ -14,8 +23,25 @@ import faiss
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 
+from .cache_embeddings import CacheEmbeddings
+from .embeddings_normalizados import EmbeddingsNormalizados
+from .lote_embeddings import LoteEmbeddings
+from .metricas import Metricas, ValorAtualizado, razao_acertos
+from .conversas import ConversaStore
+from .catalogo import CatalogoProdutos
+from .armazenamento import ArmazenamentoCatalogo
+from .busca_lexical import IndiceBM25, fundir_rrf
+from .indice_vetorial import (
+    PARAMETROS_FAISS, TIPOS_INDICE, FAISSQuantizado, carregar_store, criar_store_vetorial,
+    materializar_store, parametros_construcao, promover_store
+)
+from .geracoes import DiretorioGeracoes, TravaLeituraEscrita, TravaProcessos
+
+logger = logging.getLogger(__name__)
+
 try:
     from pinecone import Pinecone as PineconeClient
     PINECONE_AVAILABLE = True
@@ -23,7 +49,35 @@ except ImportError:
     PINECONE_AVAILABLE = False
     logger.warning("Pinecone não está disponível. Usando apenas FAISS local.")
 
-logger = logging.getLogger(__name__)
+# Versão do formato dos índices salvos; alterar força reindexação no próximo boot
+# 2: conversas deixaram de ser gravadas no índice de produtos
+# 3: documentos de produtos usam o ID do produto como ID no docstore
+# 4: vetores normalizados e produto interno (score = similaridade de cosseno)
+VERSAO_FORMATO_INDICE = 4
+
+# Busca com filtros: até este número de candidatos o score é calculado
+# diretamente sobre os vetores deles, sem percorrer o índice
+LIMITE_FORCA_BRUTA = 512
+
+# Maior lista de IDs enviada como filtro de metadados ao Pinecone
+LIMITE_FILTRO_IDS_PINECONE = 1_000
+
+# Modos de busca de produtos e quantos resultados de cada lista entram na fusão
+MODOS_BUSCA = ("vetorial", "hibrido", "lexical")
+PROFUNDIDADE_FUSAO = 20
+
+# Validação do índice sombra da reindexação: produtos da amostra buscados pelo
+# próprio vetor e fração mínima encontrada entre os 10 primeiros
+AMOSTRA_VALIDACAO_INDICE = 50
+RECALL_MINIMO_VALIDACAO = 0.9
+
+def _alteracao_de_indice(metodo):
+    """Executa o método sob a trava de escrita dos índices (ver RAGSystem._trava_escrita)"""
+    @functools.wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        with self._trava_escrita():
+            return metodo(self, *args, **kwargs)
+    return envoltorio
 
 class RAGSystem:
     """
@@ -32,9 +86,92 @@ class RAGSystem:
     """
     
     def __init__(self, openai_api_key: str, pinecone_api_key: Optional[str] = None, 
-                 pinecone_env: str = "gcp-starter", pinecone_index: str = "assistente-ecommerce"):
-        """Inicializa o sistema RAG"""
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+                 pinecone_env: str = "gcp-starter", pinecone_index: str = "assistente-ecommerce",
+                 diretorio_dados: str = "data", reutilizar_indices: bool = True,
+                 usar_cache_embeddings: bool = True, max_cache_embeddings: int = 100_000,
+                 max_operacoes_log: int = 1_000, modo_busca: str = "hibrido",
+                 tipo_indice: str = "flat", parametros_indice: Optional[Dict[str, Any]] = None,
+                 mapear_indices: bool = True, janela_lote_consultas_ms: float = 5.0,
+                 max_lote_consultas: int = 64, metricas: Optional[Metricas] = None,
+                 intervalo_estatisticas_pinecone: float = 30.0,
+                 embeddings: Optional[Embeddings] = None,
+                 verificar_tamanho_embeddings: bool = True,
+                 intervalo_publicacao_indice: float = 300.0):
+        """
+        Inicializa o sistema RAG
+        
+        Args:
+            diretorio_dados: Diretório com produtos.json, politicas.md e índices salvos
+            reutilizar_indices: Carrega índices já persistidos quando os dados de origem
+                não mudaram, evitando gerar todos os embeddings novamente
+            usar_cache_embeddings: Mantém cache em disco dos embeddings já calculados
+            max_cache_embeddings: Número máximo de vetores no cache em disco
+            max_operacoes_log: Alterações de produtos acumuladas no log antes de
+                compactar o catálogo em um novo produtos.json
+            modo_busca: Modo padrão da busca de produtos: "vetorial", "hibrido"
+                (BM25 local + vetores, fundidos por RRF) ou "lexical" (sem embeddings)
+            tipo_indice: Índice FAISS de produtos: "flat" (exato), "ivfpq" ou "hnsw_sq"
+                (comprimidos, com re-ranqueamento exato; para catálogos grandes)
+            parametros_indice: Ajustes do índice comprimido (nlist, m, nbits, hnsw_m,
+                ef_construction, nprobe, ef_search, fator_rerank; ver indice_vetorial)
+            mapear_indices: Abre os índices FAISS salvos mapeados em memória (somente
+                leitura), compartilhando as páginas entre todos os workers do nó
+            janela_lote_consultas_ms: Espera máxima para juntar consultas simultâneas em
+                uma única chamada de embeddings (0 desativa o agrupamento)
+            max_lote_consultas: Consultas por chamada de embeddings
+            metricas: Registro de métricas compartilhado (latência das buscas)
+            intervalo_estatisticas_pinecone: Segundos entre atualizações, em segundo
+                plano, das estatísticas do índice Pinecone
+            embeddings: Modelo de embeddings a usar no lugar do OpenAIEmbeddings
+                (ex: embeddings determinísticos nos benchmarks); recebe o mesmo
+                cache e agrupamento de consultas
+            verificar_tamanho_embeddings: Tokeniza os textos com tiktoken antes de enviá-los
+                à API para dividir os que passam do limite do modelo; desativar evita
+                o download do vocabulário e a tokenização local (textos curtos)
+            intervalo_publicacao_indice: Segundos mínimos entre publicações de uma nova
+                geração do índice de produtos com alterações individuais acumuladas
+                (também publicada ao compactar o catálogo); até lá os demais workers
+                aplicam as alterações lendo o log do catálogo
+        """
+        if tipo_indice not in TIPOS_INDICE:
+            raise ValueError(f"Tipo de índice inválido: {tipo_indice} (use {', '.join(TIPOS_INDICE)})")
+        
+        self.diretorio_dados = diretorio_dados
+        self.reutilizar_indices = reutilizar_indices
+        self.modo_busca = self._resolver_modo(modo_busca)
+        self.tipo_indice = tipo_indice
+        self.parametros_indice = parametros_indice or {}
+        self.mapear_indices = mapear_indices
+        self.metricas = metricas or Metricas()
+        self.intervalo_estatisticas_pinecone = intervalo_estatisticas_pinecone
+        self.intervalo_publicacao_indice = intervalo_publicacao_indice
+        
+        self.embeddings = embeddings or OpenAIEmbeddings(
+            openai_api_key=openai_api_key,
+            check_embedding_ctx_length=verificar_tamanho_embeddings
+        )
+        # Cache por fora: consultas já vistas não esperam pela janela do lote
+        self._lote_consultas = None
+        if janela_lote_consultas_ms > 0:
+            self._lote_consultas = LoteEmbeddings(
+                self.embeddings,
+                janela_ms=janela_lote_consultas_ms,
+                max_lote=max_lote_consultas
+            )
+            self.embeddings = self._lote_consultas
+        # Textos que não se repetem (conversas) não passam pelo cache
+        self._embeddings_sem_cache = EmbeddingsNormalizados(self.embeddings)
+        self._cache_embeddings = None
+        if usar_cache_embeddings:
+            self._cache_embeddings = CacheEmbeddings(
+                self.embeddings,
+                caminho=self._caminho_dados("cache_embeddings.sqlite"),
+                max_entradas=max_cache_embeddings
+            )
+            self.embeddings = self._cache_embeddings
+        # Por fora de tudo: o cache guarda os vetores do modelo e os stores recebem norma 1
+        self.embeddings = EmbeddingsNormalizados(self.embeddings)
+        
         self.pinecone_api_key = pinecone_api_key
         self.pinecone_env = pinecone_env
         self.pinecone_index_name = pinecone_index
@@ -45,17 +182,144 @@ class RAGSystem:
         self.vector_store_politicas = None
         self.pinecone_index = None
         self.pinecone_client = None
+        # describe_index_stats é uma chamada de rede: atualizado em segundo plano
+        self._estatisticas_pinecone: Optional[ValorAtualizado] = None
+        
+        # Buscas leem catálogo, BM25 e índice vetorial sob a trava de leitura;
+        # alterações em memória (nunca chamadas de rede) sob a de escrita
+        self._trava_buscas = TravaLeituraEscrita()
         
         # Dados carregados
-        self.produtos_dados = []
+        self.catalogo = CatalogoProdutos()
+        self.indice_lexical = IndiceBM25()
+        self.armazenamento = ArmazenamentoCatalogo(
+            caminho_snapshot=self._caminho_dados("produtos.json"),
+            caminho_log=self._caminho_dados("produtos.log.jsonl"),
+            max_operacoes_log=max_operacoes_log
+        )
         self.politicas_dados = []
         
+        # Hash de politicas.md do índice de políticas em uso (compõe versao_dados)
+        self._hash_politicas: Optional[str] = None
+        
+        # (vector store, ntotal, {id do produto: posições no índice FAISS})
+        self._mapa_posicoes: Optional[Tuple[Any, int, Dict[str, List[int]]]] = None
+        
+        # Índices FAISS locais são publicados em gerações (data/geracoes/faiss_*),
+        # compartilhadas entre workers; só um processo por vez grava
+        self._geracoes = {
+            nome: DiretorioGeracoes(self._caminho_dados(f"faiss_{nome}"))
+            for nome in ("produtos", "politicas")
+        }
+        self._geracoes_carregadas: Dict[str, Optional[str]] = {}
+        self._indice_produtos_mapeado = False
+        # Produtos alterados por outro processo cujo embedding falhou (vetor desatualizado)
+        self._produtos_sem_vetor: Set[str] = set()
+        self._trava = TravaProcessos(self._caminho_dados("indices.lock"))
+        
         # Inicializa Pinecone se disponível
         if self.use_pinecone:
             self._inicializar_pinecone()
         
         # Inicializa sistema
         self._inicializar_stores()
+        
+        # Conversas ficam em um store próprio, indexado em segundo plano
+        self.conversas = ConversaStore(
+            self._embeddings_sem_cache,
+            caminho_indice=self._caminho_dados("faiss_conversas"),
+            pinecone_index_name=self.pinecone_index_name if self.use_pinecone else None
+        )
+        
+        self._registrar_medidores()
+    
+    def _registrar_medidores(self):
+        """Expõe nas métricas o tamanho dos índices e o uso dos caches de embeddings"""
+        self.metricas.registrar_medidor(
+            "vetores_indice", self._tamanho_indices, "Vetores em cada índice", rotulo="indice"
+        )
+        self.metricas.registrar_medidor(
+            "produtos_catalogo", lambda: len(self.catalogo), "Produtos no catálogo"
+        )
+        self.metricas.registrar_medidor(
+            "conversas_indexadas", lambda: self.conversas.indexadas,
+            "Conversas indexadas no contexto RAG", tipo="counter"
+        )
+        self.metricas.registrar_medidor(
+            "conversas_pendentes", self.conversas.total_pendentes, "Conversas aguardando indexação"
+        )
+        if self._cache_embeddings is not None:
+            cache = self._cache_embeddings
+            self.metricas.registrar_medidor(
+                "cache_embeddings_consultas", lambda: {"acerto": cache.acertos, "falha": cache.falhas},
+                "Consultas ao cache de embeddings", rotulo="resultado", tipo="counter"
+            )
+            self.metricas.registrar_medidor(
+                "cache_embeddings_razao_acertos", lambda: razao_acertos(cache.acertos, cache.falhas),
+                "Fração das consultas ao cache de embeddings atendidas sem a API"
+            )
+        if self._lote_consultas is not None:
+            lote = self._lote_consultas
+            self.metricas.registrar_medidor(
+                "lote_embeddings_consultas", lambda: lote.consultas,
+                "Consultas enviadas pelo agrupador de embeddings", tipo="counter"
+            )
+            self.metricas.registrar_medidor(
+                "lote_embeddings_chamadas", lambda: lote.chamadas,
+                "Chamadas à API de embeddings feitas pelo agrupador", tipo="counter"
+            )
+    
+    def _tamanho_indices(self) -> Dict[str, int]:
+        """Vetores em cada índice (no Pinecone, a última contagem lida em segundo plano)"""
+        tamanhos = {}
+        if self.use_pinecone:
+            index_stats = self._estatisticas_pinecone.obter() if self._estatisticas_pinecone else None
+            if index_stats is not None:
+                tamanhos["pinecone"] = index_stats.get("total_vector_count", 0)
+            return tamanhos
+        
+        for nome, vector_store in (("produtos", self.vector_store_produtos),
+                                   ("politicas", self.vector_store_politicas)):
+            if vector_store is not None:
+                tamanhos[nome] = len(vector_store.index_to_docstore_id)
+        return tamanhos
+    
+    @property
+    def produtos_dados(self) -> List[Dict[str, Any]]:
+        """Lista de produtos do catálogo (cópia, na ordem de inserção)"""
+        return self.catalogo.listar()
+    
+    @produtos_dados.setter
+    def produtos_dados(self, produtos: List[Dict[str, Any]]):
+        catalogo, indice_lexical = self._montar_catalogo(produtos)
+        # Montados à parte: buscas em andamento terminam nas estruturas anteriores
+        with self._trava_buscas.escrita():
+            self.catalogo = catalogo
+            self.indice_lexical = indice_lexical
+    
+    def _montar_catalogo(self, produtos: List[Dict[str, Any]]) -> Tuple[CatalogoProdutos, IndiceBM25]:
+        """Catálogo e índice BM25 novos, ainda fora de uso"""
+        catalogo = CatalogoProdutos(produtos)
+        indice_lexical = IndiceBM25()
+        indice_lexical.reconstruir(self._documento_lexical(produto) for produto in catalogo)
+        return catalogo, indice_lexical
+    
+    def _documento_lexical(self, produto: Dict[str, Any]) -> Tuple[str, str, str]:
+        """
+        (id, texto para o BM25, identificação para modelos exatos) de um produto
+        
+        O texto leva só os valores dos campos: rótulos como "Nome:" ou
+        "Status:" (e preço/disponibilidade) estariam em todos os documentos e
+        só somariam ruído ao BM25.
+        """
+        produto_id = produto.get("id")
+        valores = [produto_id, produto.get("nome"), produto.get("categoria"), produto.get("marca"),
+                   produto.get("descricao")]
+        valores.extend((produto.get("especificacoes") or {}).values())
+        caracteristicas = produto.get("caracteristicas")
+        valores.extend(caracteristicas if isinstance(caracteristicas, list) else [caracteristicas])
+        texto = " | ".join(str(valor) for valor in valores if valor)
+        return produto_id, texto, f"{produto_id} {produto.get('nome', '')}"
     
     def _inicializar_pinecone(self):
         """Inicializa a conexão com Pinecone"""
@@ -84,6 +348,11 @@ class RAGSystem:
                 )
                 
             self.pinecone_index = self.pinecone_client.Index(self.pinecone_index_name)
+            self._estatisticas_pinecone = ValorAtualizado(
+                self.pinecone_index.describe_index_stats,
+                self.intervalo_estatisticas_pinecone,
+                nome="estatisticas-pinecone"
+            )
             logger.info(f"Pinecone inicializado: índice '{self.pinecone_index_name}'")
             
         except Exception as e:
@@ -93,11 +362,13 @@ class RAGSystem:
     def _inicializar_stores(self):
         """Inicializa os stores vetoriais"""
         try:
-            # Carrega produtos
-            self._carregar_produtos()
-            
-            # Carrega políticas
-            self._carregar_politicas()
+            # Outros workers iniciando ao mesmo tempo esperam e reaproveitam o índice
+            with self._trava.adquirir():
+                # Carrega produtos
+                self._carregar_produtos()
+                
+                # Carrega políticas
+                self._carregar_politicas()
             
             if self.use_pinecone:
                 logger.info("Sistema RAG inicializado com Pinecone")
@@ -107,97 +378,542 @@ class RAGSystem:
         except Exception as e:
             logger.error(f"Erro ao inicializar RAG: {e}")
     
-    def _salvar_produtos_json(self):
-        """Salva produtos no arquivo JSON"""
+    def _caminho_dados(self, *partes: str) -> str:
+        """Monta caminho dentro do diretório de dados"""
+        return os.path.join(self.diretorio_dados, *partes)
+    
+    def _registrar_salvos(self, produtos: List[Dict[str, Any]]):
+        """Anota inclusões/alterações de produtos no log do catálogo"""
+        self.armazenamento.registrar_salvos(produtos)
+    
+    def _registrar_removido(self, produto_id: str):
+        """Anota a remoção de um produto no log do catálogo"""
+        self.armazenamento.registrar_removido(produto_id)
+    
+    def _hash_produtos(self) -> str:
+        """Hash do catálogo persistido (snapshot + log), usado na assinatura do índice"""
+        return self.armazenamento.hash_estado()
+    
+    @contextmanager
+    def _trava_escrita(self):
+        """
+        Serializa alterações de catálogo e índices entre threads e processos
+        
+        Ao obter a trava, recarrega o que outro worker tenha publicado, para que
+        a alteração parta sempre do estado mais recente.
+        """
+        with self._trava.adquirir() as externa:
+            if externa:
+                self._sincronizar_indices()
+            yield
+    
+    def sincronizar_indices(self) -> bool:
+        """
+        Aplica as alterações feitas por outros processos e publica as pendentes
+        
+        Lê só o trecho novo do log do catálogo e troca de índice quando outro
+        processo publicou uma geração; vencido o intervalo de publicação, grava
+        uma nova geração com as alterações individuais acumuladas. Barato quando
+        nada mudou (stat do snapshot e do log, symlinks); chamado
+        periodicamente pelos workers da API.
+        
+        Returns:
+            True se catálogo ou índices mudaram
+        """
+        with self._trava.adquirir():
+            alterou = self._sincronizar_indices()
+            self._publicar_alteracoes_produtos()
+            return alterou
+    
+    def _sincronizar_indices(self) -> bool:
+        """Implementação de sincronizar_indices (chamar com a trava adquirida)"""
+        alterou = self._sincronizar_produtos()
+        if self.use_pinecone:
+            return alterou
+        
+        atual = self._geracoes["politicas"].geracao_atual()
+        if atual is not None and atual != self._geracoes_carregadas.get("politicas"):
+            logger.info("Nova geração do índice de politicas publicada por outro processo: recarregando")
+            self._carregar_politicas(somente_reutilizar=True)
+            # Mesmo que não tenha sido reaproveitável, não tenta de novo a mesma geração
+            self._geracoes_carregadas["politicas"] = atual
+            alterou = True
+        return alterou
+    
+    def _sincronizar_produtos(self) -> bool:
+        """
+        Aplica as alterações de produtos gravadas no log por outros processos
+        
+        Só as operações anexadas depois da última leitura são lidas; se outro
+        processo compactou o catálogo, o snapshot novo é comparado com o
+        catálogo em memória. Nenhum dos casos reconstrói o BM25. Uma geração do
+        índice publicada exatamente para este estado substitui o índice em
+        memória; sem ela, os vetores dos produtos alterados são aplicados no lugar.
+        """
         try:
-            with open('data/produtos.json', 'w', encoding='utf-8') as f:
-                json.dump(self.produtos_dados, f, ensure_ascii=False, indent=2)
-            logger.info(f"Produtos salvos no arquivo JSON: {len(self.produtos_dados)} itens")
+            operacoes = self.armazenamento.ler_novas_operacoes()
+            if operacoes is None:
+                logger.info("Catálogo compactado por outro processo: comparando com o snapshot novo")
+                produtos = self.armazenamento.carregar()
+                ids = {produto.get("id") for produto in produtos}
+                operacoes = [{"op": "salvar", "produto": produto} for produto in produtos]
+                operacoes.extend(
+                    {"op": "remover", "id": produto["id"]} for produto in self.catalogo if produto["id"] not in ids
+                )
+        except (OSError, ValueError) as e:
+            logger.error(f"Erro ao ler alterações do catálogo: {e}")
+            return False
+        
+        alterados = {
+            produto_id: produto for produto_id, produto in self._produtos_por_operacoes(operacoes).items()
+            if self.catalogo.obter(produto_id) != produto
+        }
+        
+        vector_store = None
+        if not self.use_pinecone:
+            atual = self._geracoes["produtos"].geracao_atual()
+            if atual is not None and atual != self._geracoes_carregadas.get("produtos"):
+                vector_store = self._carregar_indice_salvo("produtos", self._assinatura_produtos())
+                # Mesmo que não confira com o catálogo, não tenta de novo a mesma geração
+                self._geracoes_carregadas["produtos"] = atual
+        
+        if not alterados and vector_store is None and not self._produtos_sem_vetor:
+            return False
+        self._aplicar_produtos_alterados(alterados, vector_store)
+        logger.info(
+            f"{len(alterados)} produtos alterados por outro processo aplicados"
+            + (" (nova geração do índice carregada)" if vector_store is not None else "")
+        )
+        return True
+    
+    @staticmethod
+    def _produtos_por_operacoes(operacoes: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Estado final de cada produto citado nas operações do log (None = removido)"""
+        produtos: Dict[str, Optional[Dict[str, Any]]] = {}
+        for operacao in operacoes:
+            if operacao["op"] == "salvar":
+                produtos[operacao["produto"].get("id")] = operacao["produto"]
+            elif operacao["op"] == "remover":
+                produtos[operacao["id"]] = None
+        return produtos
+    
+    def _vetores_produtos(self, produtos: List[Dict[str, Any]]) -> Tuple[List[Document], List[List[float]]]:
+        """Documentos e embeddings de alguns produtos (fora de qualquer trava das buscas)"""
+        documentos = [self._documento_produto(produto) for produto in produtos]
+        if not documentos:
+            return [], []
+        return documentos, self.embeddings.embed_documents([doc.page_content for doc in documentos])
+    
+    @staticmethod
+    def _trocar_vetores(vector_store, ids: Set[str], documentos: List[Document], vetores: List[List[float]]):
+        """Remove do índice FAISS os vetores de `ids` e insere os dos documentos (sem gerar embeddings)"""
+        existentes = [produto_id for produto_id in ids if isinstance(vector_store.docstore.search(produto_id), Document)]
+        if existentes:
+            vector_store.delete(ids=existentes)
+        if documentos:
+            vector_store.add_embeddings(
+                [(doc.page_content, vetor) for doc, vetor in zip(documentos, vetores)],
+                metadatas=[doc.metadata for doc in documentos],
+                ids=[doc.metadata["id"] for doc in documentos]
+            )
+    
+    def _aplicar_produtos_alterados(self, alterados: Dict[str, Optional[Dict[str, Any]]], vector_store=None):
+        """
+        Leva ao catálogo, ao BM25 e ao índice vetorial produtos alterados por outro processo
+        
+        Args:
+            alterados: {id: produto ou None se removido}
+            vector_store: Geração publicada já com as alterações, que substitui o
+                índice atual; sem ela só os produtos alterados têm o embedding
+                gerado (em geral acertos no cache compartilhado)
+        """
+        indexar = vector_store is None and self.vector_store_produtos is not None and not self.use_pinecone
+        ids = (set(alterados) | self._produtos_sem_vetor) if indexar else set()
+        documentos, vetores = [], None
+        if indexar:
+            atualizados = [
+                alterados[produto_id] if produto_id in alterados else self.catalogo.obter(produto_id)
+                for produto_id in ids
+            ]
+            try:
+                documentos, vetores = self._vetores_produtos([produto for produto in atualizados if produto])
+            except Exception as e:
+                logger.error(f"Erro ao gerar embeddings de produtos alterados por outro processo: {e}")
+            self._garantir_indice_gravavel()
+        
+        with self._trava_buscas.escrita():
+            for produto_id, produto in alterados.items():
+                if produto is None:
+                    self.catalogo.remover(produto_id)
+                    self.indice_lexical.remover(produto_id)
+                else:
+                    self.catalogo.adicionar(produto)
+                    self.indice_lexical.adicionar(*self._documento_lexical(produto))
+            
+            if vector_store is not None:
+                self.vector_store_produtos = vector_store
+                self._indice_produtos_mapeado = self.mapear_indices
+                self._produtos_sem_vetor = set()
+            elif indexar and vetores is None:
+                # Vetores antigos ficam até a próxima sincronização (a hidratação usa o catálogo)
+                self._produtos_sem_vetor = ids
+            elif indexar:
+                self._trocar_vetores(self.vector_store_produtos, ids, documentos, vetores)
+                self._produtos_sem_vetor = set()
+            self._mapa_posicoes = None
+    
+    def _publicar_alteracoes_produtos(self, forcar: bool = False):
+        """
+        Publica o índice de produtos com as alterações acumuladas desde a última geração
+        
+        Nada acontece se a geração publicada já corresponde ao catálogo ou se,
+        sem `forcar`, ela tem menos de intervalo_publicacao_indice segundos.
+        Chamar com a trava entre processos adquirida.
+        """
+        if self.vector_store_produtos is None or self._produtos_sem_vetor:
+            return
+        if self._manifesto_confere("produtos", self._assinatura_produtos()):
+            return
+        registro = self._ler_manifesto().get("produtos") or {}
+        if not forcar and registro.get("atualizado_em"):
+            decorrido = (datetime.now() - datetime.fromisoformat(registro["atualizado_em"])).total_seconds()
+            if decorrido < self.intervalo_publicacao_indice:
+                return
+        try:
+            self._salvar_indice_produtos()
+            logger.info("Nova geração do índice de produtos publicada com as alterações acumuladas")
         except Exception as e:
-            logger.error(f"Erro ao salvar produtos no JSON: {e}")
+            logger.error(f"Erro ao publicar índice de produtos: {e}")
     
-    def _carregar_produtos(self):
-        """Carrega e indexa produtos"""
+    def _publicar_indice(self, nome_indice: str, vector_store, destino: Optional[str] = None):
+        """Grava o índice FAISS em uma nova geração e a publica para todos os processos"""
+        geracoes = self._geracoes[nome_indice]
+        destino = destino or geracoes.nova_geracao()
+        vector_store.save_local(destino)
+        geracoes.publicar(destino)
+        self._geracoes_carregadas[nome_indice] = geracoes.geracao_atual()
+    
+    def _garantir_indice_gravavel(self):
+        """Copia para a RAM o índice de produtos mapeado antes de alterá-lo"""
+        if self._indice_produtos_mapeado and self.vector_store_produtos is not None:
+            materializar_store(self.vector_store_produtos)
+            self._indice_produtos_mapeado = False
+    
+    @_alteracao_de_indice
+    def _compactar_catalogo(self, forcar: bool = False):
+        """
+        Grava o catálogo em um novo produtos.json e zera o log de alterações
+        
+        O conteúdo não muda, só o hash; se o índice publicado estava
+        sincronizado com o catálogo, o manifesto é atualizado para continuar
+        reaproveitável, senão uma nova geração é publicada (os demais workers
+        não têm mais o log para acompanhar as alterações).
+        """
+        if not forcar and not self.armazenamento.precisa_compactar():
+            return
+        if not self.armazenamento.operacoes_pendentes:
+            return
         try:
-            # Carrega dados dos produtos
-            with open('data/produtos.json', 'r', encoding='utf-8') as f:
-                produtos = json.load(f)
-            
-            self.produtos_dados = produtos
+            indice_em_dia = self._manifesto_confere("produtos", self._assinatura_produtos())
+            self.armazenamento.compactar(self.catalogo.listar())
+            if indice_em_dia:
+                self._registrar_manifesto_produtos()
+            else:
+                self._publicar_alteracoes_produtos(forcar=True)
+        except Exception as e:
+            logger.error(f"Erro ao compactar catálogo: {e}")
+    
+    def versao_dados(self) -> Tuple[str, Optional[str]]:
+        """
+        Identifica o estado atual do catálogo e das políticas
+        
+        Usa o hash do snapshot mais o trecho do log já aplicado (o mesmo que a
+        sincronização acompanha) e o hash das políticas indexadas: muda quando
+        qualquer worker altera o catálogo, assim que a alteração chega a este.
+        """
+        return (self.armazenamento.hash_estado(), self._hash_politicas)
+    
+    def versao_dados_intencao(self, intencao: str) -> Optional[str]:
+        """
+        Versão só dos dados de que as respostas de uma intenção dependem
+        
+        Chave do cache de respostas: alterar o catálogo não invalida respostas
+        sobre políticas, e vice-versa. Intenções que não consultam catálogo nem
+        políticas (ex: saudação) têm versão fixa.
+        """
+        if intencao == "politicas":
+            return self._hash_politicas
+        if intencao in ("busca_produtos", "recomendacao"):
+            return self.armazenamento.hash_estado()
+        return None
+    
+    def _calcular_hash_arquivo(self, caminho: str) -> str:
+        """Calcula o hash SHA-256 do conteúdo de um arquivo"""
+        sha = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(bloco)
+        return sha.hexdigest()
+    
+    def _assinatura_indice(self, hash_fonte: str, **parametros) -> Dict[str, Any]:
+        """
+        Monta a assinatura que identifica o conteúdo de um índice
+        
+        Se qualquer campo mudar (dados de origem, modelo de embeddings, backend
+        ou parâmetros de chunking) o índice salvo deixa de ser reaproveitável.
+        """
+        return {
+            "hash_fonte": hash_fonte,
+            "modelo_embeddings": getattr(self.embeddings, "model", None),
+            "backend": f"pinecone:{self.pinecone_index_name}" if self.use_pinecone else "faiss",
+            "versao_formato": VERSAO_FORMATO_INDICE,
+            "parametros": parametros,
+        }
+    
+    def _assinatura_produtos(self) -> Dict[str, Any]:
+        """Assinatura do índice de produtos para o catálogo atual"""
+        parametros = {} if self.use_pinecone else parametros_construcao(self.tipo_indice, self.parametros_indice)
+        return self._assinatura_indice(self._hash_produtos(), **parametros)
+    
+    def _ler_manifesto(self) -> Dict[str, Any]:
+        """Lê o manifesto dos índices persistidos"""
+        try:
+            with open(self._caminho_dados("indices_manifest.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Manifesto de índices inválido, ignorando: {e}")
+            return {}
+    
+    def _registrar_manifesto(self, nome_indice: str, assinatura: Dict[str, Any], **extras):
+        """Registra a assinatura de um índice recém-salvo (escrita atômica)"""
+        try:
+            manifesto = self._ler_manifesto()
+            manifesto[nome_indice] = {**assinatura, **extras, "atualizado_em": datetime.now().isoformat()}
             
-            # Cria documentos para indexação
-            documents = []
-            for produto in produtos:
-                # Cria texto para embedding
-                texto_produto = self._produto_para_texto(produto)
-                
-                doc = Document(
-                    page_content=texto_produto,
-                    metadata={
-                        "id": produto.get("id"),
-                        "nome": produto.get("nome"),
-                        "categoria": produto.get("categoria"),
-                        "preco": produto.get("preco"),
-                        "disponivel": produto.get("disponivel", True),
-                        "tipo": "produto"
-                    }
+            caminho = self._caminho_dados("indices_manifest.json")
+            caminho_tmp = f"{caminho}.tmp"
+            with open(caminho_tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, ensure_ascii=False, indent=2)
+            os.replace(caminho_tmp, caminho)
+        except Exception as e:
+            logger.error(f"Erro ao registrar manifesto do índice {nome_indice}: {e}")
+    
+    def _registrar_manifesto_produtos(self):
+        """
+        Registra o índice de produtos para o catálogo atual
+        
+        Guarda também até onde o log do catálogo tinha sido lido: no boot, um
+        índice publicado antes das últimas alterações é carregado e só elas são
+        reaplicadas (ver _carregar_indice_defasado).
+        """
+        self._registrar_manifesto("produtos", self._assinatura_produtos(), posicao_log=self.armazenamento.posicao_log)
+    
+    def _manifesto_confere(self, nome_indice: str, assinatura: Dict[str, Any]) -> bool:
+        """Indica se o índice salvo foi gerado com exatamente esta assinatura"""
+        registro = self._ler_manifesto().get(nome_indice)
+        return bool(registro) and all(registro.get(chave) == valor for chave, valor in assinatura.items())
+    
+    def _carregar_indice_salvo(self, nome_indice: str, assinatura: Dict[str, Any],
+                               namespace: Optional[str] = None):
+        """
+        Carrega um índice persistido se a assinatura do manifesto coincidir
+        
+        Returns:
+            Vector store pronto para uso ou None se for preciso reindexar
+        """
+        if not self.reutilizar_indices:
+            return None
+        
+        if not self._manifesto_confere(nome_indice, assinatura):
+            return None
+        
+        try:
+            if self.use_pinecone:
+                from langchain_pinecone import PineconeVectorStore
+                return PineconeVectorStore(
+                    index_name=self.pinecone_index_name,
+                    embedding=self.embeddings,
+                    namespace=namespace
                 )
-                documents.append(doc)
+            
+            # Resolve a geração uma única vez: uma publicação durante a carga não mistura arquivos
+            caminho = self._geracoes[nome_indice].geracao_atual()
+            if caminho is None or not os.path.exists(os.path.join(caminho, "index.faiss")):
+                return None
+            
+            # O índice foi gerado por este próprio sistema, então o pickle é confiável
+            vector_store = carregar_store(
+                caminho,
+                self.embeddings,
+                mapear=self.mapear_indices,
+                parametros_busca=self.parametros_indice,
+                **PARAMETROS_FAISS
+            )
+            self._geracoes_carregadas[nome_indice] = caminho
+            return vector_store
+        except Exception as e:
+            logger.warning(f"Não foi possível reutilizar o índice {nome_indice}: {e}")
+            return None
+    
+    def _carregar_produtos(self, forcar_reindexacao: bool = False) -> bool:
+        """
+        Carrega e indexa produtos
+        
+        Args:
+            forcar_reindexacao: Ignora o índice salvo e gera todos os embeddings novamente
+            
+        Returns:
+            False se a indexação falhou (o erro é registrado no log)
+        """
+        try:
+            # Carrega dados dos produtos (snapshot + alterações do log); catálogo
+            # e BM25 novos só entram em uso junto com o índice vetorial correspondente
+            produtos = self.armazenamento.carregar()
+            catalogo, indice_lexical = self._montar_catalogo(produtos)
+            
+            # Reaproveita o índice salvo se o catálogo não mudou desde a última indexação
+            assinatura = self._assinatura_produtos()
+            if not forcar_reindexacao:
+                vector_store = self._carregar_indice_salvo("produtos", assinatura)
+                mapeado = vector_store is not None and self.mapear_indices and not self.use_pinecone
+                if vector_store is None:
+                    vector_store = self._carregar_indice_defasado(assinatura, catalogo)
+                if vector_store is not None:
+                    with self._trava_buscas.escrita():
+                        self.catalogo = catalogo
+                        self.indice_lexical = indice_lexical
+                        self.vector_store_produtos = vector_store
+                        self._indice_produtos_mapeado = mapeado
+                        self._mapa_posicoes = None
+                    logger.info(f"Índice de produtos reutilizado sem reindexar ({len(produtos)} produtos)")
+                    return True
+            
+            # Cria documentos para indexação (o ID do produto identifica o vetor)
+            documents = [self._documento_produto(produto) for produto in catalogo]
+            ids = [doc.metadata["id"] for doc in documents]
             
             # Cria vector store
-            if documents:
+            destino = None
+            if not documents:
+                with self._trava_buscas.escrita():
+                    self.catalogo = catalogo
+                    self.indice_lexical = indice_lexical
+            else:
                 if self.use_pinecone:
                     # Usa Pinecone com a nova API
                     from langchain_pinecone import PineconeVectorStore
-                    self.vector_store_produtos = PineconeVectorStore.from_documents(
+                    vector_store = PineconeVectorStore.from_documents(
                         documents,
                         self.embeddings,
+                        ids=ids,
                         index_name=self.pinecone_index_name
                     )
+                    with self._trava_buscas.escrita():
+                        self.catalogo = catalogo
+                        self.indice_lexical = indice_lexical
+                        self.vector_store_produtos = vector_store
                     logger.info(f"Indexados {len(documents)} produtos no Pinecone")
                 else:
-                    # Usa FAISS local
-                    self.vector_store_produtos = FAISS.from_documents(
-                        documents, 
-                        self.embeddings
+                    # Usa FAISS local (flat ou comprimido, conforme tipo_indice)
+                    textos = [doc.page_content for doc in documents]
+                    destino = self._geracoes["produtos"].nova_geracao()
+                    vector_store = criar_store_vetorial(
+                        textos,
+                        self.embeddings.embed_documents(textos),
+                        [doc.metadata for doc in documents],
+                        ids,
+                        self.embeddings,
+                        destino,
+                        self.tipo_indice,
+                        self.parametros_indice,
+                        **PARAMETROS_FAISS
                     )
-                    # Salva índice local
-                    self.vector_store_produtos.save_local("data/faiss_produtos")
-                    logger.info(f"Indexados {len(documents)} produtos no FAISS local")
+                    with self._trava_buscas.escrita():
+                        self.catalogo = catalogo
+                        self.indice_lexical = indice_lexical
+                        self.vector_store_produtos = vector_store
+                        self._indice_produtos_mapeado = False
+                        self._mapa_posicoes = None
+                    logger.info(f"Indexados {len(documents)} produtos no FAISS local ({self.tipo_indice})")
+                
+                self._salvar_indice_produtos(destino)
+            return True
             
         except FileNotFoundError:
             logger.warning("Arquivo produtos.json não encontrado")
+            return True
         except Exception as e:
             logger.error(f"Erro ao carregar produtos: {e}")
+            return False
     
-    def _carregar_politicas(self):
-        """Carrega e indexa políticas"""
+    def _carregar_indice_defasado(self, assinatura: Dict[str, Any], catalogo: CatalogoProdutos):
+        """
+        Carrega o índice publicado antes das últimas alterações do log do catálogo
+        
+        O manifesto guarda até onde o log tinha sido lido na publicação; se o
+        estado naquela posição confere, só os produtos alterados depois dela têm
+        o embedding gerado e trocado no índice (ainda fora de uso).
+        
+        Returns:
+            Vector store atualizado ou None se for preciso reindexar
+        """
+        posicao = (self._ler_manifesto().get("produtos") or {}).get("posicao_log")
+        if posicao is None or self.use_pinecone:
+            return None
+        try:
+            hash_publicado, operacoes = self.armazenamento.operacoes_desde(posicao)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Log do catálogo não corresponde ao índice publicado: {e}")
+            return None
+        if not operacoes:
+            return None
+        
+        vector_store = self._carregar_indice_salvo("produtos", {**assinatura, "hash_fonte": hash_publicado})
+        if vector_store is None:
+            return None
+        
+        ids = set(self._produtos_por_operacoes(operacoes))
         try:
-            # Carrega documento de políticas
-            with open('data/politicas.md', 'r', encoding='utf-8') as f:
-                conteudo_politicas = f.read()
-            
-            # Divide em chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                separators=["\n\n", "\n", ". ", " "]
+            documentos, vetores = self._vetores_produtos(
+                [catalogo.obter(produto_id) for produto_id in ids if produto_id in catalogo]
             )
+            if self.mapear_indices:
+                materializar_store(vector_store)
+            self._trocar_vetores(vector_store, ids, documentos, vetores)
+        except Exception as e:
+            logger.warning(f"Não foi possível reaplicar o log do catálogo no índice publicado: {e}")
+            return None
+        # Só é publicado de novo ao compactar ou vencido o intervalo de publicação
+        logger.info(f"Índice de produtos publicado reaproveitado com {len(ids)} produtos alterados desde então")
+        return vector_store
+    
+    def _carregar_politicas(self, forcar_reindexacao: bool = False, somente_reutilizar: bool = False) -> bool:
+        """
+        Carrega e indexa políticas
+        
+        Args:
+            forcar_reindexacao: Ignora o índice salvo e gera todos os embeddings novamente
+            somente_reutilizar: Não reindexa se o índice salvo não servir
             
-            chunks = text_splitter.split_text(conteudo_politicas)
+        Returns:
+            False se a indexação falhou (o erro é registrado no log)
+        """
+        try:
+            documents, assinatura = self._documentos_politicas()
             
-            # Cria documentos
-            documents = []
-            for i, chunk in enumerate(chunks):
-                doc = Document(
-                    page_content=chunk,
-                    metadata={
-                        "id": f"politica_{i}",
-                        "tipo": "politica",
-                        "chunk_index": i
-                    }
-                )
-                documents.append(doc)
+            # Reaproveita o índice salvo se as políticas não mudaram
+            if not forcar_reindexacao:
+                vector_store = self._carregar_indice_salvo("politicas", assinatura, namespace="politicas")
+                if vector_store is not None:
+                    self.vector_store_politicas = vector_store
+                    self._hash_politicas = assinatura["hash_fonte"]
+                    logger.info("Índice de políticas reutilizado sem reindexar")
+                    return True
+                if somente_reutilizar:
+                    logger.warning("Índice de políticas publicado não corresponde a politicas.md; mantendo o atual")
+                    return True
             
             # Cria vector store
             if documents:
@@ -219,16 +935,80 @@ class RAGSystem:
                     # Usa FAISS local
                     self.vector_store_politicas = FAISS.from_documents(
                         documents, 
-                        self.embeddings
+                        self.embeddings,
+                        **PARAMETROS_FAISS
                     )
-                    # Salva índice local
-                    self.vector_store_politicas.save_local("data/faiss_politicas")
+                    # Salva e publica o índice local
+                    self._publicar_indice("politicas", self.vector_store_politicas)
                     logger.info(f"Indexados {len(documents)} chunks de políticas no FAISS local")
                 
+                self._registrar_manifesto("politicas", assinatura)
+                self._hash_politicas = assinatura["hash_fonte"]
+            return True
+                
         except FileNotFoundError:
             logger.warning("Arquivo politicas.md não encontrado")
+            return True
         except Exception as e:
             logger.error(f"Erro ao carregar políticas: {e}")
+            return False
+    
+    def _documentos_politicas(self) -> Tuple[List[Document], Dict[str, Any]]:
+        """
+        Divide politicas.md em chunks
+        
+        Returns:
+            (documentos a indexar, assinatura do índice de políticas)
+        """
+        caminho_politicas = self._caminho_dados("politicas.md")
+        with open(caminho_politicas, 'r', encoding='utf-8') as f:
+            conteudo_politicas = f.read()
+        
+        chunk_size = 1000
+        chunk_overlap = 200
+        assinatura = self._assinatura_indice(
+            self._calcular_hash_arquivo(caminho_politicas),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        
+        # Divide em chunks
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ". ", " "]
+        )
+        
+        chunks = text_splitter.split_text(conteudo_politicas)
+        
+        # Cria documentos
+        documents = []
+        for i, chunk in enumerate(chunks):
+            doc = Document(
+                page_content=chunk,
+                metadata={
+                    "id": f"politica_{i}",
+                    "tipo": "politica",
+                    "chunk_index": i
+                }
+            )
+            documents.append(doc)
+        
+        return documents, assinatura
+    
+    def _documento_produto(self, produto: Dict[str, Any]) -> Document:
+        """Cria o documento indexado de um produto"""
+        return Document(
+            page_content=self._produto_para_texto(produto),
+            metadata={
+                "id": produto.get("id"),
+                "nome": produto.get("nome"),
+                "categoria": produto.get("categoria"),
+                "preco": produto.get("preco"),
+                "disponivel": produto.get("disponivel", True),
+                "tipo": "produto"
+            }
+        )
     
     def _produto_para_texto(self, produto: Dict[str, Any]) -> str:
         """Converte produto em texto para embedding"""
@@ -270,52 +1050,333 @@ class RAGSystem:
         
         return " | ".join(texto_parts)
     
-    def buscar_produtos(self, consulta: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def buscar_produtos(self, consulta: str, top_k: int = 5, modo: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Busca produtos usando similaridade vetorial
+        Busca produtos por similaridade vetorial e/ou BM25
         
         Args:
             consulta: Texto da consulta
             top_k: Número máximo de resultados
+            modo: "vetorial", "hibrido" ou "lexical" (padrão: modo_busca do sistema)
             
         Returns:
             Lista de produtos ordenados por relevância
         """
+        try:
+            with self.metricas.cronometrar("latencia_busca_produtos_segundos", modo or self.modo_busca):
+                produtos_encontrados = self._buscar_produtos_candidatos(consulta, top_k, None, modo)
+            logger.info(f"Encontrados {len(produtos_encontrados)} produtos para: {consulta}")
+            return produtos_encontrados
+            
+        except Exception as e:
+            logger.error(f"Erro na busca de produtos: {e}")
+            return []
+    
+    async def abuscar_produtos(self, consulta: str, top_k: int = 5,
+                               modo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Versão assíncrona de buscar_produtos"""
+        try:
+            with self.metricas.cronometrar("latencia_busca_produtos_segundos", modo or self.modo_busca):
+                produtos_encontrados = await self._abuscar_produtos_candidatos(consulta, top_k, None, modo)
+            logger.info(f"Encontrados {len(produtos_encontrados)} produtos para: {consulta}")
+            return produtos_encontrados
+            
+        except Exception as e:
+            logger.error(f"Erro na busca de produtos: {e}")
+            return []
+    
+    @staticmethod
+    def _resolver_modo(modo: Optional[str]) -> Optional[str]:
+        """Valida o modo de busca (None = usar o padrão do sistema)"""
+        if modo is not None and modo not in MODOS_BUSCA:
+            raise ValueError(f"Modo de busca inválido: {modo} (use {', '.join(MODOS_BUSCA)})")
+        return modo
+    
+    def _buscar_produtos_candidatos(self, consulta: str, top_k: int, candidatos: Optional[Set[str]],
+                                    modo: Optional[str]) -> List[Dict[str, Any]]:
+        """Núcleo da busca de produtos restrita aos candidatos (None = catálogo inteiro)"""
+        modo = self._resolver_modo(modo) or self.modo_busca
+        if candidatos is not None and not candidatos:
+            return []
+        
+        locais = self._buscar_sem_rede(consulta, top_k, candidatos, modo)
+        if locais is not None:
+            return locais
+        
         if not self.vector_store_produtos:
             logger.warning("Vector store de produtos não inicializado")
             return []
         
-        try:
-            # Busca documentos similares
-            docs_e_scores = self.vector_store_produtos.similarity_search_with_score(
-                consulta, k=top_k
+        k = top_k if modo == "vetorial" else max(top_k, PROFUNDIDADE_FUSAO)
+        docs_e_scores = self._buscar_documentos_filtrados(
+            self.vector_store_produtos, self.embed_consulta(consulta), k, candidatos
+        )
+        return self._combinar_resultados(consulta, docs_e_scores, top_k, candidatos, modo)
+    
+    async def _abuscar_produtos_candidatos(self, consulta: str, top_k: int, candidatos: Optional[Set[str]],
+                                           modo: Optional[str]) -> List[Dict[str, Any]]:
+        """Versão assíncrona de _buscar_produtos_candidatos"""
+        modo = self._resolver_modo(modo) or self.modo_busca
+        if candidatos is not None and not candidatos:
+            return []
+        
+        locais = self._buscar_sem_rede(consulta, top_k, candidatos, modo)
+        if locais is not None:
+            return locais
+        
+        if not self.vector_store_produtos:
+            logger.warning("Vector store de produtos não inicializado")
+            return []
+        
+        k = top_k if modo == "vetorial" else max(top_k, PROFUNDIDADE_FUSAO)
+        docs_e_scores = await self._abuscar_documentos(
+            self.vector_store_produtos, consulta, k, candidatos=candidatos
+        )
+        return self._combinar_resultados(consulta, docs_e_scores, top_k, candidatos, modo)
+    
+    def _buscar_sem_rede(self, consulta: str, top_k: int, candidatos: Optional[Set[str]],
+                         modo: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Resolve a busca só com o índice lexical, quando possível
+        
+        Acontece no modo "lexical" e quando a consulta cita o modelo/ID de um
+        único produto (ex: "Galaxy A54"), caso em que o embedding é dispensável.
+        
+        Returns:
+            Produtos encontrados ou None se a busca vetorial for necessária
+        """
+        if modo == "vetorial":
+            return None
+        
+        with self.metricas.cronometrar("latencia_etapa_segundos", "busca_lexical"), self._trava_buscas.leitura():
+            exato = self.indice_lexical.buscar_exato(consulta, candidatos)
+            if exato is None and modo != "lexical":
+                return None
+            lexicais = self.indice_lexical.buscar(consulta, top_k, candidatos)
+        
+        ranking = [produto_id for produto_id, _ in lexicais if produto_id != exato]
+        if exato is not None:
+            logger.info(f"Consulta resolvida pelo índice lexical (modelo exato {exato}): {consulta}")
+            ranking.insert(0, exato)
+        
+        return self._hidratar_ranking(ranking[:top_k], lexicais=dict(lexicais))
+    
+    def _combinar_resultados(self, consulta: str, docs_e_scores: List[Tuple[Document, float]], top_k: int,
+                             candidatos: Optional[Set[str]], modo: str) -> List[Dict[str, Any]]:
+        """Hidrata o resultado vetorial ou o funde com o BM25 (Reciprocal Rank Fusion)"""
+        if modo == "vetorial":
+            return self._hidratar_produtos(docs_e_scores)[:top_k]
+        
+        with self.metricas.cronometrar("latencia_etapa_segundos", "busca_lexical"), self._trava_buscas.leitura():
+            lexicais = self.indice_lexical.buscar(consulta, max(top_k, PROFUNDIDADE_FUSAO), candidatos)
+        vetoriais = {doc.metadata.get("id"): float(score) for doc, score in docs_e_scores}
+        fusao = fundir_rrf([produto_id for produto_id, _ in lexicais], list(vetoriais))
+        
+        return self._hidratar_ranking(
+            [produto_id for produto_id, _ in fusao[:top_k]],
+            vetoriais=vetoriais,
+            lexicais=dict(lexicais),
+            fusao=dict(fusao)
+        )
+    
+    def _hidratar_ranking(self, ids: List[str], vetoriais: Optional[Dict[str, float]] = None,
+                          lexicais: Optional[Dict[str, float]] = None,
+                          fusao: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Converte um ranking de IDs em produtos completos, na ordem recebida
+        
+        Cada produto leva os scores disponíveis: relevancia_score (similaridade
+        de cosseno), score_lexical (BM25) e score_hibrido (RRF).
+        """
+        with self.metricas.cronometrar("latencia_etapa_segundos", "hidratacao"):
+            produtos_encontrados = []
+            for produto_id in ids:
+                produto_completo = self.catalogo.obter(produto_id)
+                if not produto_completo:
+                    continue
+                
+                produto_com_score = produto_completo.copy()
+                if vetoriais and produto_id in vetoriais:
+                    produto_com_score["relevancia_score"] = vetoriais[produto_id]
+                if lexicais and produto_id in lexicais:
+                    produto_com_score["score_lexical"] = float(lexicais[produto_id])
+                if fusao and produto_id in fusao:
+                    produto_com_score["score_hibrido"] = float(fusao[produto_id])
+                produtos_encontrados.append(produto_com_score)
+        
+        return produtos_encontrados
+    
+    def _buscar_documentos_por_vetor(self, vector_store, vetor: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Busca documentos por vetor de consulta, independente do backend"""
+        if self.use_pinecone:
+            return vector_store.similarity_search_by_vector_with_score(vetor, k=k)
+        return vector_store.similarity_search_with_score_by_vector(vetor, k=k)
+    
+    def embed_consulta(self, consulta: str) -> List[float]:
+        """Gera o embedding de uma consulta (reutilizável entre buscas de produtos e políticas)"""
+        with self.metricas.cronometrar("latencia_etapa_segundos", "embedding_consulta"):
+            return self.embeddings.embed_query(consulta)
+    
+    async def aembed_consulta(self, consulta: str) -> List[float]:
+        """Versão assíncrona de embed_consulta"""
+        with self.metricas.cronometrar("latencia_etapa_segundos", "embedding_consulta"):
+            return await self.embeddings.aembed_query(consulta)
+    
+    async def _abuscar_documentos(self, vector_store, consulta: str, k: int,
+                                  vetor: Optional[List[float]] = None,
+                                  candidatos: Optional[Set[str]] = None) -> List[Tuple[Document, float]]:
+        """
+        Gera o embedding da consulta de forma assíncrona e busca no vector store
+        
+        A busca em si roda em uma thread para não bloquear o event loop
+        (no Pinecone ela é uma chamada de rede síncrona).
+        
+        Args:
+            vetor: Embedding já calculado da consulta, se disponível
+            candidatos: Restringe a busca a estes IDs de produto (None = sem restrição)
+        """
+        if candidatos is not None and not candidatos:
+            return []
+        if vetor is None:
+            vetor = await self.aembed_consulta(consulta)
+        return await asyncio.to_thread(
+            self._buscar_documentos_filtrados, vector_store, vetor, k, candidatos
+        )
+    
+    def _candidatos_por_filtros(self, filtros: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+        """
+        IDs dos produtos que atendem aos filtros, calculados pelos índices do catálogo
+        
+        Returns:
+            Conjunto de IDs ou None se nenhum filtro foi informado
+        """
+        if not filtros:
+            return None
+        
+        def _numero(chave: str) -> Optional[float]:
+            try:
+                return float(filtros[chave]) if filtros.get(chave) else None
+            except (TypeError, ValueError):
+                return None
+        
+        with self._trava_buscas.leitura():
+            return self.catalogo.filtrar(
+                categoria=filtros.get("categoria"),
+                marca=filtros.get("marca"),
+                preco_min=_numero("preco_min"),
+                preco_max=_numero("preco_max"),
+                apenas_disponiveis=bool(filtros.get("apenas_disponiveis"))
             )
+    
+    def _buscar_documentos_filtrados(self, vector_store, vetor: List[float], k: int,
+                                     candidatos: Optional[Set[str]]) -> List[Tuple[Document, float]]:
+        """Busca por vetor considerando apenas os produtos candidatos"""
+        if candidatos is not None and not candidatos:
+            return []
+        
+        with self.metricas.cronometrar("latencia_etapa_segundos", "busca_vetorial"):
+            if self.use_pinecone:
+                # Chamada de rede: o índice remoto não é alterado por este processo em memória
+                if candidatos is None:
+                    return self._buscar_documentos_por_vetor(vector_store, vetor, k)
+                if len(candidatos) <= LIMITE_FILTRO_IDS_PINECONE:
+                    return vector_store.similarity_search_by_vector_with_score(
+                        vetor, k=k, filter={"id": {"$in": sorted(candidatos)}}
+                    )
+                # Filtro pouco seletivo: amplia a busca e confere os candidatos localmente
+                docs_e_scores = vector_store.similarity_search_by_vector_with_score(vetor, k=k * 4)
+                return [(doc, score) for doc, score in docs_e_scores if doc.metadata.get("id") in candidatos][:k]
             
-            # Converte para produtos
+            # O FAISS local é alterado no lugar (inclusões e remoções): lê sob a trava
+            with self._trava_buscas.leitura():
+                if candidatos is None:
+                    return self._buscar_documentos_por_vetor(vector_store, vetor, k)
+                return self._buscar_faiss_filtrado(vector_store, vetor, k, candidatos)
+    
+    def _posicoes_faiss(self, vector_store) -> Dict[str, List[int]]:
+        """Mapa id do produto -> posições no índice FAISS (refeito quando o índice muda)"""
+        mapa = self._mapa_posicoes
+        if mapa is None or mapa[0] is not vector_store or mapa[1] != vector_store.index.ntotal:
+            posicoes = defaultdict(list)
+            for posicao, doc_id in vector_store.index_to_docstore_id.items():
+                doc = vector_store.docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    posicoes[doc.metadata.get("id")].append(posicao)
+            mapa = (vector_store, vector_store.index.ntotal, dict(posicoes))
+            self._mapa_posicoes = mapa
+        return mapa[2]
+    
+    def _buscar_faiss_filtrado(self, vector_store, vetor: List[float], k: int,
+                               candidatos: Set[str]) -> List[Tuple[Document, float]]:
+        """
+        Busca no FAISS restrita às posições dos candidatos
+        
+        Com poucos candidatos calcula o score exato só sobre os vetores deles;
+        caso contrário usa um IDSelector para que o índice ignore os demais
+        (no índice comprimido, até LIMITE_SCORE_EXATO candidatos são pontuados
+        pelos vetores exatos; acima disso ver FAISSQuantizado.buscar_posicoes).
+        """
+        mapa = self._posicoes_faiss(vector_store)
+        posicoes = np.asarray(
+            [posicao for produto_id in candidatos for posicao in mapa.get(produto_id, ())],
+            dtype=np.int64
+        )
+        if not len(posicoes):
+            return []
+        
+        consulta = np.asarray([vetor], dtype=np.float32)
+        faiss.normalize_L2(consulta)
+        
+        indice = vector_store.index
+        k = min(k, len(posicoes))
+        resultados = None
+        
+        if isinstance(vector_store, FAISSQuantizado):
+            # Índice comprimido: score exato vem dos vetores completos mapeados em disco
+            resultados = vector_store.buscar_posicoes(consulta, k, posicoes)
+        elif len(posicoes) <= LIMITE_FORCA_BRUTA:
+            try:
+                vetores = indice.reconstruct_batch(posicoes)
+                if indice.metric_type == faiss.METRIC_INNER_PRODUCT:
+                    scores = vetores @ consulta[0]
+                    ordem = np.argsort(-scores)[:k]
+                else:
+                    # Mesma métrica do IndexFlatL2 (distância euclidiana ao quadrado)
+                    scores = ((vetores - consulta) ** 2).sum(axis=1)
+                    ordem = np.argsort(scores)[:k]
+                resultados = list(zip(posicoes[ordem], scores[ordem]))
+            except RuntimeError:
+                # Índice sem reconstrução de vetores: usa o seletor
+                resultados = None
+        
+        if resultados is None:
+            parametros = faiss.SearchParameters(sel=faiss.IDSelectorBatch(posicoes))
+            scores, indices = indice.search(consulta, k, params=parametros)
+            resultados = [(i, d) for i, d in zip(indices[0], scores[0]) if i != -1]
+        
+        return [
+            (vector_store.docstore.search(vector_store.index_to_docstore_id[int(posicao)]), float(score))
+            for posicao, score in resultados
+        ]
+    
+    def _hidratar_produtos(self, docs_e_scores: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """Converte resultados da busca vetorial em produtos completos com score de similaridade"""
+        with self.metricas.cronometrar("latencia_etapa_segundos", "hidratacao"):
             produtos_encontrados = []
             for doc, score in docs_e_scores:
                 produto_id = doc.metadata.get("id")
                 
-                # Encontra produto completo nos dados
-                produto_completo = next(
-                    (p for p in self.produtos_dados if p.get("id") == produto_id),
-                    None
-                )
+                # Encontra produto completo no catálogo
+                produto_completo = self.catalogo.obter(produto_id)
                 
                 if produto_completo:
                     produto_com_score = produto_completo.copy()
                     produto_com_score["relevancia_score"] = float(score)
                     produtos_encontrados.append(produto_com_score)
             
-            # Ordena por score (menor = mais similar)
-            produtos_encontrados.sort(key=lambda x: x["relevancia_score"])
-            
-            logger.info(f"Encontrados {len(produtos_encontrados)} produtos para: {consulta}")
-            return produtos_encontrados
-            
-        except Exception as e:
-            logger.error(f"Erro na busca de produtos: {e}")
-            return []
+            # Ordena por similaridade de cosseno (maior = mais similar)
+            produtos_encontrados.sort(key=lambda x: x["relevancia_score"], reverse=True)
+        return produtos_encontrados
     
     def buscar_politicas(self, consulta: str, top_k: int = 3) -> str:
         """
@@ -333,10 +1394,12 @@ class RAGSystem:
             return "Políticas não disponíveis no momento."
         
         try:
-            # Busca documentos similares
-            docs_similares = self.vector_store_politicas.similarity_search(
-                consulta, k=top_k
-            )
+            # Busca documentos similares (embedding pelo cache, como nas buscas de produtos)
+            docs_similares = [
+                doc for doc, _ in self._buscar_documentos_filtrados(
+                    self.vector_store_politicas, self.embed_consulta(consulta), top_k, None
+                )
+            ]
             
             # Combina conteúdo dos chunks
             conteudo_relevante = []
@@ -352,147 +1415,566 @@ class RAGSystem:
             logger.error(f"Erro na busca de políticas: {e}")
             return "Erro ao consultar políticas."
     
-    def adicionar_produto(self, produto: Dict[str, Any]):
-        """Adiciona novo produto ao índice E persiste no arquivo JSON"""
+    async def abuscar_politicas(self, consulta: str, top_k: int = 3,
+                                vetor: Optional[List[float]] = None) -> str:
+        """Versão assíncrona de buscar_politicas (aceita o embedding já calculado da consulta)"""
+        if not self.vector_store_politicas:
+            logger.warning("Vector store de políticas não inicializado")
+            return "Políticas não disponíveis no momento."
+        
         try:
-            # Adiciona aos dados em memória
-            self.produtos_dados.append(produto)
+            docs_e_scores = await self._abuscar_documentos(
+                self.vector_store_politicas, consulta, top_k, vetor=vetor
+            )
             
-            # Persiste no arquivo JSON
-            self._salvar_produtos_json()
+            resultado = "\n\n".join(doc.page_content for doc, _ in docs_e_scores)
             
-            # Cria documento com embedding
-            texto_produto = self._produto_para_texto(produto)
-            doc = Document(
-                page_content=texto_produto,
-                metadata={
-                    "id": produto.get("id"),
-                    "nome": produto.get("nome"),
-                    "categoria": produto.get("categoria"),
-                    "preco": produto.get("preco"),
-                    "disponivel": produto.get("disponivel", True),
-                    "tipo": "produto"
-                }
-            )
+            logger.info(f"Encontrados {len(docs_e_scores)} chunks de políticas para: {consulta}")
+            return resultado
+            
+        except Exception as e:
+            logger.error(f"Erro na busca de políticas: {e}")
+            return "Erro ao consultar políticas."
+    
+    def _reindexar_produto(self, produto_id: Optional[str], produto: Optional[Dict[str, Any]]):
+        """
+        Troca um único produto no catálogo, no BM25 e no índice vetorial
+        
+        Remove `produto_id` (se informado) e adiciona `produto` (se informado);
+        apenas esse produto tem o embedding gerado, antes de qualquer alteração,
+        e a alteração vai para o log do catálogo. As estruturas em memória mudam
+        juntas sob a trava de escrita das buscas, que nunca veem o produto pela
+        metade.
+        """
+        vector_store = self.vector_store_produtos
+        documento = vetor = None
+        if produto is not None and vector_store is not None:
+            documento = self._documento_produto(produto)
+            vetor = self.embeddings.embed_documents([documento.page_content])[0]
+        
+        if produto_id is not None and (produto is None or produto["id"] != produto_id):
+            self._registrar_removido(produto_id)
+        if produto is not None:
+            self._registrar_salvos([produto])
+        
+        if vector_store is not None and self.use_pinecone:
+            # Chamadas de rede, fora da trava das buscas (o embedding já está no cache)
+            if produto_id is not None:
+                vector_store.delete(ids=[produto_id])
+            if documento is not None:
+                vector_store.add_texts([documento.page_content], metadatas=[documento.metadata], ids=[produto["id"]])
+        elif vector_store is not None:
+            self._garantir_indice_gravavel()
+        
+        with self._trava_buscas.escrita():
+            if produto_id is not None:
+                self.catalogo.remover(produto_id)
+                self.indice_lexical.remover(produto_id)
+            if produto is not None:
+                self.catalogo.adicionar(produto)
+                self.indice_lexical.adicionar(*self._documento_lexical(produto))
             
-            # Adiciona ao vector store
+            if vector_store is not None and not self.use_pinecone:
+                if produto_id is not None and isinstance(vector_store.docstore.search(produto_id), Document):
+                    vector_store.delete(ids=[produto_id])
+                if documento is not None:
+                    vector_store.add_embeddings(
+                        [(documento.page_content, vetor)], metadatas=[documento.metadata], ids=[produto["id"]]
+                    )
+            
+            # Posições no FAISS mudaram
+            self._mapa_posicoes = None
+        
+        if self.use_pinecone and vector_store is not None:
+            # O Pinecone já está atualizado: só o manifesto é registrado
+            self._salvar_indice_produtos()
+        # FAISS local: a nova geração é publicada ao compactar o catálogo ou, vencido
+        # o intervalo de publicação, em sincronizar_indices; até lá os demais
+        # workers aplicam a alteração lendo o log do catálogo
+    
+    def _salvar_indice_produtos(self, destino: Optional[str] = None):
+        """
+        Publica o índice FAISS de produtos em uma nova geração e registra o manifesto
+        
+        Índices comprimidos com muitas remoções pendentes (tombstones) são
+        reconstruídos antes a partir dos vetores exatos, e um índice flat que
+        cresceu o bastante vira o tipo configurado; nenhum dos dois gera
+        embeddings. O Pinecone salva automaticamente na nuvem; só o manifesto
+        é registrado.
+        
+        Args:
+            destino: Diretório de geração já criado (onde o índice foi construído)
+        """
+        if not self.use_pinecone:
+            destino = destino or self._geracoes["produtos"].nova_geracao()
+            vector_store = self.vector_store_produtos
+            if isinstance(vector_store, FAISSQuantizado) and vector_store.precisa_compactar():
+                vector_store = vector_store.compactar(destino)
+            else:
+                vector_store = promover_store(
+                    vector_store, destino, self.tipo_indice, self.parametros_indice, **PARAMETROS_FAISS
+                )
+            if vector_store is not self.vector_store_produtos:
+                with self._trava_buscas.escrita():
+                    self.vector_store_produtos = vector_store
+                    self._mapa_posicoes = None
+            
+            self._publicar_indice("produtos", vector_store, destino)
+        
+        self._registrar_manifesto_produtos()
+    
+    @_alteracao_de_indice
+    def adicionar_produto(self, produto: Dict[str, Any]):
+        """Adiciona novo produto ao índice E persiste no arquivo JSON"""
+        try:
+            if produto.get("id") is None:
+                raise ValueError("Produto sem ID")
+            
+            # Log do catálogo, catálogo, BM25 e vector store (substitui o vetor se o ID já existir)
             if self.vector_store_produtos:
-                self.vector_store_produtos.add_documents([doc])
-                
-                if self.use_pinecone:
-                    # Pinecone salva automaticamente na nuvem
-                    logger.info(f"Produto adicionado ao Pinecone: {produto.get('nome')}")
-                else:
-                    # Salva índice FAISS local
-                    self.vector_store_produtos.save_local("data/faiss_produtos")
-                    logger.info(f"Produto adicionado ao FAISS local: {produto.get('nome')}")
+                self._reindexar_produto(produto["id"], produto)
+                backend = "Pinecone" if self.use_pinecone else "FAISS local"
+                logger.info(f"Produto adicionado ao {backend}: {produto.get('nome')}")
             else:
-                # Se não existe vector store, recria
+                # Se não existe vector store, recria a partir do catálogo persistido
+                self._registrar_salvos([produto])
                 self._carregar_produtos()
             
             logger.info(f"Produto adicionado e persistido: {produto.get('nome')}")
+            self._compactar_catalogo()
             
         except Exception as e:
             logger.error(f"Erro ao adicionar produto: {e}")
     
+    @_alteracao_de_indice
     def atualizar_produto(self, produto_id: str, produto_atualizado: Dict[str, Any]):
         """Atualiza produto existente E persiste no arquivo JSON"""
         try:
-            # Atualiza nos dados em memória
-            produto_encontrado = False
-            for i, produto in enumerate(self.produtos_dados):
-                if produto.get("id") == produto_id:
-                    self.produtos_dados[i] = produto_atualizado
-                    produto_encontrado = True
-                    break
+            if produto_atualizado.get("id") is None:
+                produto_atualizado = {**produto_atualizado, "id": produto_id}
             
-            if not produto_encontrado:
+            if produto_id not in self.catalogo:
                 raise ValueError(f"Produto com ID {produto_id} não encontrado")
             
-            # Persiste no arquivo JSON
-            self._salvar_produtos_json()
-            
-            # Recriar o índice vetorial com os dados atualizados
-            self._carregar_produtos()
+            # Troca apenas este produto no log, no catálogo e nos índices
+            if self.vector_store_produtos:
+                self._reindexar_produto(produto_id, produto_atualizado)
+            else:
+                if produto_atualizado["id"] != produto_id:
+                    self._registrar_removido(produto_id)
+                self._registrar_salvos([produto_atualizado])
+                self._carregar_produtos()
             
             logger.info(f"Produto atualizado e persistido: {produto_id}")
+            self._compactar_catalogo()
             
         except Exception as e:
             logger.error(f"Erro ao atualizar produto: {e}")
     
+    @_alteracao_de_indice
     def remover_produto(self, produto_id: str):
         """Remove produto do índice E persiste no arquivo JSON"""
         try:
-            # Verifica se produto existe
-            produto_original = len(self.produtos_dados)
+            if produto_id not in self.catalogo:
+                raise ValueError(f"Produto com ID {produto_id} não encontrado")
             
-            # Remove dos dados em memória
-            self.produtos_dados = [
-                p for p in self.produtos_dados 
-                if p.get("id") != produto_id
-            ]
+            # Remove o produto do log, do catálogo e dos índices (só o vetor dele)
+            self._reindexar_produto(produto_id, None)
+            if self.vector_store_produtos:
+                backend = "Pinecone" if self.use_pinecone else "FAISS local"
+                logger.info(f"Produto removido do {backend}: {produto_id}")
             
-            if len(self.produtos_dados) == produto_original:
-                raise ValueError(f"Produto com ID {produto_id} não encontrado")
+            logger.info(f"Produto removido e persistido: {produto_id}")
+            self._compactar_catalogo()
             
-            # Persiste no arquivo JSON
-            self._salvar_produtos_json()
+        except Exception as e:
+            logger.error(f"Erro ao remover produto: {e}")
+    
+    async def aimportar_produtos(self, produtos: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+                                 tamanho_lote: int = 500, max_concorrencia: int = 4) -> Dict[str, Any]:
+        """
+        Importa muitos produtos de uma vez
+        
+        Os embeddings são gerados em lotes (com no máximo `max_concorrencia`
+        chamadas simultâneas), os vetores entram no índice em uma única inserção
+        e o log do catálogo e o índice são gravados uma só vez no final. Produtos com
+        ID já existente são substituídos. Com um iterável assíncrono (ex: o corpo
+        da requisição), cada lote vai para os embeddings assim que fica completo,
+        enquanto o restante ainda está sendo lido.
+        
+        Args:
+            produtos: Produtos a importar (o último vence em IDs repetidos)
+            tamanho_lote: Textos por chamada de embeddings
+            max_concorrencia: Chamadas de embeddings em paralelo
             
-            # Remove do vector store e recria índice
+        Returns:
+            Dict com "importados" e "erros" (lista de {"id", "erro"})
+            
+        Raises:
+            ValueError: Se tamanho_lote ou max_concorrencia for menor que 1
+        """
+        if tamanho_lote < 1:
+            raise ValueError(f"tamanho_lote deve ser ao menos 1 (recebido {tamanho_lote})")
+        if max_concorrencia < 1:
+            raise ValueError(f"max_concorrencia deve ser ao menos 1 (recebido {max_concorrencia})")
+        
+        erros = []
+        semaforo = asyncio.Semaphore(max_concorrencia)
+        
+        async def _embed_lote(lote: List[Tuple[Dict[str, Any], Document]]) -> Optional[List[List[float]]]:
+            async with semaforo:
+                try:
+                    return await self.embeddings.aembed_documents([doc.page_content for _, doc in lote])
+                except Exception as e:
+                    logger.error(f"Erro ao gerar embeddings na importação: {e}")
+                    erros.extend(
+                        {"id": produto["id"], "erro": f"Falha ao gerar embedding: {e}"} for produto, _ in lote
+                    )
+                    return None
+        
+        async def _iterar():
+            if hasattr(produtos, "__aiter__"):
+                async for produto in produtos:
+                    yield produto
+            else:
+                for produto in produtos:
+                    yield produto
+        
+        lotes: List[List[Tuple[Dict[str, Any], Document]]] = []
+        tarefas: List[asyncio.Task] = []
+        # Lote com a última ocorrência de cada ID: só ela é importada
+        ultimo_lote: Dict[str, int] = {}
+        lote = []
+        try:
+            async for produto in _iterar():
+                if produto.get("id") is None:
+                    erros.append({"id": None, "erro": "Produto sem ID"})
+                    continue
+                ultimo_lote[produto["id"]] = len(lotes)
+                lote.append((produto, self._documento_produto(produto)))
+                if len(lote) >= tamanho_lote:
+                    lotes.append(lote)
+                    tarefas.append(asyncio.create_task(_embed_lote(lote)))
+                    lote = []
+            if lote:
+                lotes.append(lote)
+                tarefas.append(asyncio.create_task(_embed_lote(lote)))
+            resultados = await asyncio.gather(*tarefas)
+        except BaseException:
+            for tarefa in tarefas:
+                tarefa.cancel()
+            raise
+        
+        por_id: Dict[str, Tuple[Dict[str, Any], Document, List[float]]] = {}
+        for indice, (lote, vetores) in enumerate(zip(lotes, resultados)):
+            if vetores is None:
+                continue
+            for (produto, doc), vetor in zip(lote, vetores):
+                if ultimo_lote[produto["id"]] == indice:
+                    por_id[produto["id"]] = (produto, doc, vetor)
+        indexados = list(por_id.values())
+        
+        if indexados:
+            await asyncio.to_thread(self._inserir_produtos_em_lote, indexados)
+            # Importação grande: o log já cresceu, vale gravar o snapshot logo
+            await asyncio.to_thread(self._compactar_catalogo)
+        
+        logger.info(f"Importação concluída: {len(indexados)} produtos, {len(erros)} erros")
+        return {"importados": len(indexados), "erros": erros}
+    
+    @_alteracao_de_indice
+    def _inserir_produtos_em_lote(self, indexados: List[Tuple[Dict[str, Any], Document, List[float]]]):
+        """Insere produtos já com embedding no catálogo e no índice, persistindo uma única vez"""
+        ids = [produto["id"] for produto, _, _ in indexados]
+        textos = [doc.page_content for _, doc, _ in indexados]
+        metadados = [doc.metadata for _, doc, _ in indexados]
+        vetores = [vetor for _, _, vetor in indexados]
+        
+        self._garantir_indice_gravavel()
+        destino = None
+        self._registrar_salvos([produto for produto, _, _ in indexados])
+        
+        vector_store = self.vector_store_produtos
+        if vector_store is None:
             if self.use_pinecone:
-                # Para Pinecone, precisamos recriar o índice pois não há delete específico no LangChain
-                self._carregar_produtos()
-                logger.info(f"Produto removido do Pinecone: {produto_id}")
+                from langchain_pinecone import PineconeVectorStore
+                vector_store = PineconeVectorStore(
+                    index_name=self.pinecone_index_name,
+                    embedding=self.embeddings
+                )
             else:
-                # Para FAISS, recria o índice
-                self._carregar_produtos()
-                logger.info(f"Produto removido do FAISS local: {produto_id}")
+                destino = self._geracoes["produtos"].nova_geracao()
+                vector_store = criar_store_vetorial(
+                    textos, vetores, metadados, ids, self.embeddings,
+                    destino, self.tipo_indice, self.parametros_indice,
+                    **PARAMETROS_FAISS
+                )
+                ids = []
+        
+        if ids and self.use_pinecone:
+            # O Pinecone sobrescreve IDs existentes; os embeddings já estão no cache
+            vector_store.add_texts(textos, metadatas=metadados, ids=ids)
+        
+        with self._trava_buscas.escrita():
+            for produto, _, _ in indexados:
+                self.catalogo.adicionar(produto)
+                self.indice_lexical.adicionar(*self._documento_lexical(produto))
             
-            logger.info(f"Produto removido e persistido: {produto_id}")
+            if ids and not self.use_pinecone:
+                # Remove as versões anteriores e insere todos os vetores de uma vez
+                existentes = [
+                    produto_id for produto_id in ids
+                    if isinstance(vector_store.docstore.search(produto_id), Document)
+                ]
+                if existentes:
+                    vector_store.delete(ids=existentes)
+                vector_store.add_embeddings(list(zip(textos, vetores)), metadatas=metadados, ids=ids)
             
-        except Exception as e:
-            logger.error(f"Erro ao remover produto: {e}")
+            self.vector_store_produtos = vector_store
+            self._mapa_posicoes = None
+        
+        self._salvar_indice_produtos(destino)
     
     def recriar_indices(self):
         """Recria todos os índices vetoriais"""
         try:
             logger.info("Recriando índices...")
-            self._carregar_produtos()
-            self._carregar_politicas()
+            self.reindexar()
             logger.info("Índices recriados com sucesso")
         except Exception as e:
             logger.error(f"Erro ao recriar índices: {e}")
     
+    def reindexar(self, progresso: Optional[Callable[[str, float], None]] = None,
+                  verificar_cancelamento: Optional[Callable[[], None]] = None,
+                  tamanho_lote: int = 500) -> Dict[str, Any]:
+        """
+        Reconstrói os índices de produtos e políticas sem interromper as buscas
+        
+        Os índices novos são montados à sombra, fora da trava de escrita e sem
+        tocar nos atuais, que seguem atendendo buscas e alterações. Depois de
+        validados eles substituem os atuais de uma vez, sob a trava; alterações
+        de catálogo feitas durante a construção são reaplicadas antes da troca.
+        Cancelamento ou falha na validação deixam os índices em uso intactos.
+        
+        No Pinecone os vetores são sobrescritos no próprio índice (mesmos IDs),
+        então não há índice sombra; só as alterações esperam pelo fim.
+        
+        Args:
+            progresso: Recebe (etapa, fração concluída de 0 a 1)
+            verificar_cancelamento: Chamado entre as etapas; lança exceção para interromper
+            tamanho_lote: Textos por chamada de embeddings
+            
+        Returns:
+            Dict com "produtos", "chunks_politicas" e "alterados_durante_reindexacao"
+        """
+        progresso = progresso or (lambda etapa, fracao: None)
+        verificar_cancelamento = verificar_cancelamento or (lambda: None)
+        
+        if self.use_pinecone:
+            return self._reindexar_pinecone(progresso, verificar_cancelamento)
+        
+        # Parte do estado mais recente publicado por qualquer worker
+        self.sincronizar_indices()
+        base = {produto["id"]: produto for produto in self.catalogo.listar()}
+        
+        os.makedirs(self._caminho_dados("geracoes"), exist_ok=True)
+        pasta_sombra = tempfile.mkdtemp(prefix="reindexacao-", dir=self._caminho_dados("geracoes"))
+        try:
+            documents = [self._documento_produto(produto) for produto in base.values()]
+            textos = [doc.page_content for doc in documents]
+            vetores: List[List[float]] = []
+            progresso("embeddings_produtos", 0.0)
+            for inicio in range(0, len(textos), tamanho_lote):
+                verificar_cancelamento()
+                vetores.extend(self.embeddings.embed_documents(textos[inicio:inicio + tamanho_lote]))
+                progresso("embeddings_produtos", 0.7 * len(vetores) / len(textos))
+            
+            sombra_produtos = None
+            if documents:
+                verificar_cancelamento()
+                progresso("construcao_indice_produtos", 0.7)
+                sombra_produtos = criar_store_vetorial(
+                    textos, vetores, [doc.metadata for doc in documents], list(base),
+                    self.embeddings, pasta_sombra, self.tipo_indice, self.parametros_indice,
+                    **PARAMETROS_FAISS
+                )
+                progresso("validacao_indice_produtos", 0.8)
+                self._validar_indice_sombra(sombra_produtos, list(base), vetores)
+            
+            verificar_cancelamento()
+            progresso("indice_politicas", 0.85)
+            try:
+                documentos_politicas, assinatura_politicas = self._documentos_politicas()
+            except FileNotFoundError:
+                logger.warning("Arquivo politicas.md não encontrado")
+                documentos_politicas, assinatura_politicas = [], None
+            sombra_politicas = None
+            if documentos_politicas:
+                sombra_politicas = FAISS.from_documents(documentos_politicas, self.embeddings, **PARAMETROS_FAISS)
+                if sombra_politicas.index.ntotal != len(documentos_politicas):
+                    raise ValueError(
+                        f"Índice de políticas com {sombra_politicas.index.ntotal} vetores "
+                        f"para {len(documentos_politicas)} chunks"
+                    )
+            
+            verificar_cancelamento()
+            progresso("troca_indices", 0.95)
+            with self._trava_escrita():
+                sombra_produtos, alterados = self._aplicar_alteracoes_na_sombra(
+                    sombra_produtos, base, pasta_sombra
+                )
+                
+                with self._trava_buscas.escrita():
+                    self.vector_store_produtos = sombra_produtos
+                    self._indice_produtos_mapeado = False
+                    self._mapa_posicoes = None
+                if sombra_produtos is not None:
+                    self._salvar_indice_produtos()
+                
+                if sombra_politicas is not None:
+                    self.vector_store_politicas = sombra_politicas
+                    self._publicar_indice("politicas", sombra_politicas)
+                    self._registrar_manifesto("politicas", assinatura_politicas)
+                    self._hash_politicas = assinatura_politicas["hash_fonte"]
+        finally:
+            # Os vetores exatos já ganharam hard link na geração publicada
+            shutil.rmtree(pasta_sombra, ignore_errors=True)
+        
+        logger.info(
+            f"Reindexação concluída: {len(self.catalogo)} produtos, {len(documentos_politicas)} chunks "
+            f"de políticas, {alterados} produtos alterados durante a construção"
+        )
+        return {
+            "produtos": len(self.catalogo),
+            "chunks_politicas": len(documentos_politicas),
+            "alterados_durante_reindexacao": alterados,
+        }
+    
+    def _reindexar_pinecone(self, progresso: Callable[[str, float], None],
+                            verificar_cancelamento: Callable[[], None]) -> Dict[str, Any]:
+        """Reindexação no Pinecone: sobrescreve os vetores no próprio índice (ver reindexar)"""
+        with self._trava_escrita():
+            verificar_cancelamento()
+            progresso("indice_produtos", 0.0)
+            if not self._carregar_produtos(forcar_reindexacao=True):
+                raise RuntimeError("Falha ao reindexar produtos no Pinecone (ver log)")
+            verificar_cancelamento()
+            progresso("indice_politicas", 0.8)
+            if not self._carregar_politicas(forcar_reindexacao=True):
+                raise RuntimeError("Falha ao reindexar políticas no Pinecone (ver log)")
+        return {
+            "produtos": len(self.catalogo),
+            "chunks_politicas": None,
+            "alterados_durante_reindexacao": 0,
+        }
+    
+    def _validar_indice_sombra(self, vector_store, ids: List[str], vetores: List[List[float]]):
+        """
+        Confere um índice de produtos recém-construído antes de colocá-lo em uso
+        
+        Exige um vetor por produto, todos os IDs no docstore e que cada produto
+        de uma amostra seja encontrado entre os 10 primeiros buscando pelo
+        próprio vetor.
+        
+        Raises:
+            ValueError: Se o índice não passar na validação
+        """
+        total = len(vector_store.index_to_docstore_id)
+        if total != len(ids) or vector_store.index.ntotal != len(ids):
+            raise ValueError(f"Índice de produtos com {vector_store.index.ntotal} vetores para {len(ids)} produtos")
+        
+        faltando = set(ids) - set(vector_store.index_to_docstore_id.values())
+        if faltando:
+            raise ValueError(f"{len(faltando)} produtos ausentes do índice novo")
+        
+        amostra = random.Random(0).sample(range(len(ids)), min(AMOSTRA_VALIDACAO_INDICE, len(ids)))
+        encontrados = sum(
+            any(doc.metadata.get("id") == ids[i]
+                for doc, _ in vector_store.similarity_search_with_score_by_vector(vetores[i], k=10))
+            for i in amostra
+        )
+        recall = encontrados / len(amostra)
+        if recall < RECALL_MINIMO_VALIDACAO:
+            raise ValueError(f"Recall do índice novo abaixo do mínimo: {recall:.2f} < {RECALL_MINIMO_VALIDACAO}")
+    
+    def _aplicar_alteracoes_na_sombra(self, vector_store, base: Dict[str, Dict[str, Any]],
+                                      pasta: str) -> Tuple[Any, int]:
+        """
+        Leva ao índice sombra as alterações de catálogo feitas depois de `base`
+        
+        Chamar com a trava de escrita adquirida; só os produtos alterados têm
+        embeddings gerados.
+        
+        Returns:
+            (índice atualizado, número de produtos incluídos, alterados ou removidos)
+        """
+        atuais = {produto["id"]: produto for produto in self.catalogo.listar()}
+        remover = [produto_id for produto_id, produto in base.items() if atuais.get(produto_id) != produto]
+        incluir = [produto for produto_id, produto in atuais.items() if base.get(produto_id) != produto]
+        if not remover and not incluir:
+            return vector_store, 0
+        
+        documents = [self._documento_produto(produto) for produto in incluir]
+        if vector_store is None:
+            textos = [doc.page_content for doc in documents]
+            vector_store = criar_store_vetorial(
+                textos, self.embeddings.embed_documents(textos), [doc.metadata for doc in documents],
+                [produto["id"] for produto in incluir], self.embeddings, pasta,
+                self.tipo_indice, self.parametros_indice, **PARAMETROS_FAISS
+            )
+        else:
+            if remover:
+                vector_store.delete(ids=remover)
+            if documents:
+                vector_store.add_documents(documents, ids=[produto["id"] for produto in incluir])
+        
+        return vector_store, len(set(remover) | {produto["id"] for produto in incluir})
+    
     def obter_estatisticas(self) -> Dict[str, Any]:
         """Retorna estatísticas do sistema RAG"""
         stats = {
-            "produtos_indexados": len(self.produtos_dados),
+            "produtos_indexados": len(self.catalogo),
             "vector_store_produtos_ativo": self.vector_store_produtos is not None,
             "vector_store_politicas_ativo": self.vector_store_politicas is not None,
             "usando_pinecone": self.use_pinecone,
             "pinecone_disponivel": PINECONE_AVAILABLE,
         }
         
+        stats["conversas_indexadas"] = self.conversas.indexadas
+        stats["conversas_pendentes"] = self.conversas.total_pendentes()
+        
+        if self._cache_embeddings is not None:
+            stats["cache_embeddings"] = self._cache_embeddings.obter_estatisticas()
+        if self._lote_consultas is not None:
+            stats["lote_consultas_embeddings"] = self._lote_consultas.obter_estatisticas()
+        
         if self.use_pinecone:
             # Estatísticas do Pinecone
             stats["pinecone_index_name"] = self.pinecone_index_name
             stats["pinecone_environment"] = self.pinecone_env
             stats["tipo_vector_store"] = "Pinecone (nuvem)"
-            if self.pinecone_index:
-                try:
-                    index_stats = self.pinecone_index.describe_index_stats()
+            # Última leitura feita em segundo plano; a requisição nunca espera o Pinecone
+            if self._estatisticas_pinecone is not None:
+                index_stats = self._estatisticas_pinecone.obter()
+                if index_stats is not None:
                     stats["total_vetores_pinecone"] = index_stats.get("total_vector_count", 0)
-                except:
-                    pass
+                    stats["estatisticas_pinecone_atualizadas_em"] = datetime.fromtimestamp(
+                        self._estatisticas_pinecone.atualizado_em
+                    ).isoformat()
         else:
             # Estatísticas do FAISS local
             stats["tipo_vector_store"] = "FAISS (local)"
             if self.vector_store_produtos:
                 try:
                     stats["dimensao_embeddings"] = self.vector_store_produtos.index.d
-                    stats["total_vetores_produtos"] = self.vector_store_produtos.index.ntotal
-                except:
-                    pass
+                    stats["total_vetores_produtos"] = len(self.vector_store_produtos.index_to_docstore_id)
+                    if isinstance(self.vector_store_produtos, FAISSQuantizado):
+                        stats["tipo_indice_produtos"] = self.vector_store_produtos.tipo
+                        stats["vetores_removidos_pendentes"] = self.vector_store_produtos.total_removidos
+                    else:
+                        stats["tipo_indice_produtos"] = "flat"
+                except AttributeError as e:
+                    logger.warning(f"Estatísticas do índice de produtos indisponíveis: {e}")
         
         return stats
     
@@ -500,59 +1982,49 @@ class RAGSystem:
         self, 
         consulta: str, 
         filtros: Dict[str, Any] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        modo: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
-        Busca avançada com filtros pós-busca
+        Busca avançada com filtros aplicados antes da busca
+        
+        Os candidatos saem dos índices do catálogo e só eles são comparados com
+        a consulta, então filtros seletivos não zeram o resultado.
         
         Args:
             consulta: Texto da consulta
-            filtros: Filtros a aplicar (categoria, preco_min, preco_max, etc.)
+            filtros: Filtros a aplicar (categoria, marca, preco_min, preco_max, apenas_disponiveis)
             top_k: Número máximo de resultados
+            modo: "vetorial", "hibrido" ou "lexical" (padrão: modo_busca do sistema)
         """
-        # Busca inicial mais ampla
-        produtos_iniciais = self.buscar_produtos(consulta, top_k * 3)
-        
-        if not filtros:
-            return produtos_iniciais[:top_k]
-        
-        # Aplica filtros
-        produtos_filtrados = produtos_iniciais
-        
-        # Filtro de categoria
-        if filtros.get("categoria"):
-            categoria = filtros["categoria"].lower()
-            produtos_filtrados = [
-                p for p in produtos_filtrados
-                if categoria in p.get("categoria", "").lower()
-            ]
-        
-        # Filtro de preço mínimo
-        if filtros.get("preco_min"):
-            preco_min = float(filtros["preco_min"])
-            produtos_filtrados = [
-                p for p in produtos_filtrados
-                if p.get("preco", 0) >= preco_min
-            ]
-        
-        # Filtro de preço máximo
-        if filtros.get("preco_max"):
-            preco_max = float(filtros["preco_max"])
-            produtos_filtrados = [
-                p for p in produtos_filtrados
-                if p.get("preco", 0) <= preco_max
-            ]
-        
-        # Filtro de disponibilidade
-        if filtros.get("apenas_disponiveis"):
-            produtos_filtrados = [
-                p for p in produtos_filtrados
-                if p.get("disponivel", True)
-            ]
-        
-        return produtos_filtrados[:top_k]
+        try:
+            return self._buscar_produtos_candidatos(
+                consulta, top_k, self._candidatos_por_filtros(filtros), modo
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro na busca avançada de produtos: {e}")
+            return []
+    
+    async def abuscar_produtos_avancada(
+        self, 
+        consulta: str, 
+        filtros: Dict[str, Any] = None,
+        top_k: int = 5,
+        modo: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Versão assíncrona de buscar_produtos_avancada"""
+        try:
+            return await self._abuscar_produtos_candidatos(
+                consulta, top_k, self._candidatos_por_filtros(filtros), modo
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro na busca avançada de produtos: {e}")
+            return []
     
-    def buscar_por_embedding(self, consulta: str, top_k: int = 5, threshold: float = 0.7) -> List[Dict[str, Any]]:
+    def buscar_por_embedding(self, consulta: str, top_k: int = 5, threshold: float = 0.7,
+                             filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Busca avançada usando embeddings com threshold de similaridade
         
@@ -560,6 +2032,7 @@ class RAGSystem:
             consulta: Texto da consulta
             top_k: Número máximo de resultados
             threshold: Threshold de similaridade (0-1, onde 1 é idêntico)
+            filtros: Filtros estruturados aplicados antes da busca (ver buscar_produtos_avancada)
             
         Returns:
             Lista de produtos com scores de similaridade
@@ -569,39 +2042,70 @@ class RAGSystem:
             return []
         
         try:
-            # Busca com score
-            docs_com_score = self.vector_store_produtos.similarity_search_with_score(
-                consulta, k=top_k * 2  # Busca mais para filtrar por threshold
-            )
+            candidatos = self._candidatos_por_filtros(filtros)
+            if candidatos is not None and not candidatos:
+                return []
             
-            produtos_encontrados = []
-            for doc, score in docs_com_score:
-                # Converte distância para similaridade (FAISS usa distância euclidiana)
-                similaridade = 1.0 / (1.0 + score)
-                
-                if similaridade >= threshold:
-                    produto_id = doc.metadata.get("id")
-                    produto_completo = next(
-                        (p for p in self.produtos_dados if p.get("id") == produto_id),
-                        None
-                    )
-                    
-                    if produto_completo:
-                        produto_com_score = produto_completo.copy()
-                        produto_com_score["similaridade_score"] = float(similaridade)
-                        produto_com_score["distancia_euclidiana"] = float(score)
-                        produtos_encontrados.append(produto_com_score)
+            # Resultados já vêm do mais para o menos similar: top_k basta
+            docs_com_score = self._buscar_documentos_filtrados(
+                self.vector_store_produtos,
+                self.embed_consulta(consulta),
+                top_k,
+                candidatos
+            )
             
-            # Ordena por similaridade (maior = mais similar)
-            produtos_encontrados.sort(key=lambda x: x["similaridade_score"], reverse=True)
+            return self._hidratar_por_similaridade(docs_com_score, top_k, threshold)
             
-            logger.info(f"Encontrados {len(produtos_encontrados)} produtos com similaridade >= {threshold}")
-            return produtos_encontrados[:top_k]
+        except Exception as e:
+            logger.error(f"Erro na busca por embedding: {e}")
+            return []
+    
+    async def abuscar_por_embedding(self, consulta: str, top_k: int = 5, threshold: float = 0.7,
+                                    vetor: Optional[List[float]] = None,
+                                    filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Versão assíncrona de buscar_por_embedding (aceita o embedding já calculado da consulta)"""
+        if not self.vector_store_produtos:
+            logger.warning("Vector store de produtos não inicializado")
+            return []
+        
+        try:
+            docs_com_score = await self._abuscar_documentos(
+                self.vector_store_produtos, consulta, top_k, vetor=vetor,
+                candidatos=self._candidatos_por_filtros(filtros)
+            )
+            return self._hidratar_por_similaridade(docs_com_score, top_k, threshold)
             
         except Exception as e:
             logger.error(f"Erro na busca por embedding: {e}")
             return []
     
+    def _hidratar_por_similaridade(self, docs_com_score: List[Tuple[Document, float]],
+                                   top_k: int, threshold: float) -> List[Dict[str, Any]]:
+        """
+        Converte resultados da busca em produtos acima do threshold de similaridade
+        
+        O score é a similaridade de cosseno tanto no FAISS quanto no Pinecone;
+        como os resultados chegam ordenados, a leitura para no primeiro abaixo
+        do threshold.
+        """
+        with self.metricas.cronometrar("latencia_etapa_segundos", "hidratacao"):
+            produtos_encontrados = []
+            for doc, score in docs_com_score:
+                similaridade = float(score)
+                if similaridade < threshold or len(produtos_encontrados) >= top_k:
+                    break
+                
+                produto_completo = self.catalogo.obter(doc.metadata.get("id"))
+                if produto_completo:
+                    produto_com_score = produto_completo.copy()
+                    produto_com_score["similaridade_score"] = similaridade
+                    # Vetores normalizados: distância euclidiana derivada do cosseno
+                    produto_com_score["distancia_euclidiana"] = math.sqrt(max(0.0, 2.0 - 2.0 * similaridade))
+                    produtos_encontrados.append(produto_com_score)
+        
+        logger.info(f"Encontrados {len(produtos_encontrados)} produtos com similaridade >= {threshold}")
+        return produtos_encontrados
+    
     def adicionar_conversa_ao_contexto(self, mensagem_usuario: str, resposta_assistente: str, 
                                        produtos_mencionados: List[str] = None):
         """
@@ -613,35 +2117,69 @@ class RAGSystem:
             produtos_mencionados: Lista de IDs de produtos mencionados
         """
         try:
-            conversa_texto = f"Usuário: {mensagem_usuario}\nAssistente: {resposta_assistente}"
-            
-            # Cria documento de contexto
-            doc_contexto = Document(
-                page_content=conversa_texto,
-                metadata={
-                    "tipo": "conversa",
-                    "timestamp": datetime.now().isoformat(),
-                    "produtos_mencionados": produtos_mencionados or [],
-                    "categoria_conversa": self._classificar_conversa(mensagem_usuario)
-                }
-            )
-            
-            # Adiciona ao vector store de produtos (pode criar um separado para conversas no futuro)
-            if self.vector_store_produtos:
-                self.vector_store_produtos.add_documents([doc_contexto])
+            with self.metricas.cronometrar("latencia_etapa_segundos", "contexto_conversa"):
+                conversa_texto = f"Usuário: {mensagem_usuario}\nAssistente: {resposta_assistente}"
                 
-                if not self.use_pinecone:
-                    # Salva apenas se for FAISS (Pinecone salva automaticamente)
-                    self.vector_store_produtos.save_local("data/faiss_produtos")
-            
-            if self.use_pinecone:
-                logger.info("Conversa adicionada ao contexto RAG (Pinecone)")
-            else:
-                logger.info("Conversa adicionada ao contexto RAG (FAISS local)")
+                # Cria documento de contexto
+                doc_contexto = Document(
+                    page_content=conversa_texto,
+                    metadata={
+                        "tipo": "conversa",
+                        "timestamp": datetime.now().isoformat(),
+                        "produtos_mencionados": produtos_mencionados or [],
+                        "categoria_conversa": self._classificar_conversa(mensagem_usuario)
+                    }
+                )
+                
+                # Apenas enfileira: embedding e gravação acontecem fora da requisição
+                self.conversas.registrar(doc_contexto)
             
         except Exception as e:
             logger.error(f"Erro ao adicionar conversa ao contexto: {e}")
     
+    def produtos_de_conversas_similares(self, consulta: str, top_k: int = 5,
+                                        vetor: Optional[List[float]] = None) -> List[str]:
+        """
+        IDs de produtos citados em conversas anteriores parecidas com a consulta
+        
+        Returns:
+            IDs ainda presentes no catálogo, dos mais citados para os menos citados
+        """
+        try:
+            if vetor is None:
+                vetor = self.embed_consulta(consulta)
+            with self.metricas.cronometrar("latencia_etapa_segundos", "busca_conversas"):
+                conversas = self.conversas.buscar_por_vetor(vetor, top_k)
+        except Exception as e:
+            logger.error(f"Erro ao buscar conversas anteriores: {e}")
+            return []
+        
+        citacoes = Counter(
+            produto_id
+            for conversa in conversas
+            for produto_id in conversa.metadata.get("produtos_mencionados") or []
+            if produto_id in self.catalogo
+        )
+        return [produto_id for produto_id, _ in citacoes.most_common()]
+    
+    async def aprodutos_de_conversas_similares(self, consulta: str, top_k: int = 5,
+                                               vetor: Optional[List[float]] = None) -> List[str]:
+        """Versão assíncrona de produtos_de_conversas_similares (a busca roda em uma thread)"""
+        if vetor is None:
+            vetor = await self.aembed_consulta(consulta)
+        return await asyncio.to_thread(self.produtos_de_conversas_similares, consulta, top_k, vetor)
+    
+    def fechar(self):
+        """Grava conversas pendentes, compacta o catálogo e encerra tarefas em segundo plano"""
+        self.conversas.fechar()
+        self._compactar_catalogo(forcar=True)
+        if self._lote_consultas is not None:
+            self._lote_consultas.fechar()
+        if self._estatisticas_pinecone is not None:
+            self._estatisticas_pinecone.fechar()
+        if self._cache_embeddings is not None:
+            self._cache_embeddings.fechar()
+    
     def _classificar_conversa(self, mensagem: str) -> str:
         """Classifica o tipo de conversa baseado na mensagem"""
         mensagem_lower = mensagem.lower()
@@ -670,10 +2208,7 @@ class RAGSystem:
         """
         try:
             # Encontra o produto de referência
-            produto_ref = next(
-                (p for p in self.produtos_dados if p.get("id") == produto_id),
-                None
-            )
+            produto_ref = self.catalogo.obter(produto_id)
             
             if not produto_ref:
                 logger.warning(f"Produto {produto_id} não encontrado")
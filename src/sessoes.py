@@ -0,0 +1,293 @@
+"""
+Armazenamento do histórico de sessões
+Backends em memória (LRU + TTL), SQLite e Redis com a mesma interface
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .metricas import ValorAtualizado
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class ArmazenamentoSessoes(ABC):
+    """
+    Interface comum dos backends de sessões
+
+    Cada sessão guarda as últimas `max_historico` interações (dicts
+    serializáveis em JSON) e expira `timeout` segundos depois da última
+    interação registrada.
+    """
+
+    def __init__(self, timeout: float = 3600, max_historico: int = 10):
+        """
+        Args:
+            timeout: Segundos de inatividade até a sessão expirar
+            max_historico: Interações mantidas por sessão
+        """
+        self.timeout = timeout
+        self.max_historico = max_historico
+
+    @abstractmethod
+    def registrar(self, id_sessao: str, interacao: Dict[str, Any]):
+        """Acrescenta uma interação à sessão e renova sua validade"""
+
+    @abstractmethod
+    def historico(self, id_sessao: str) -> List[Dict[str, Any]]:
+        """Interações da sessão, da mais antiga para a mais recente ([] se expirou)"""
+
+    @abstractmethod
+    def total_sessoes(self) -> int:
+        """Número de sessões ativas (nos backends compartilhados, contado em segundo plano)"""
+
+    def fechar(self):
+        """Libera conexões do backend"""
+
+
+class SessoesMemoria(ArmazenamentoSessoes):
+    """
+    Sessões em memória com expiração por inatividade e limite de sessões
+
+    As sessões ficam ordenadas pelo último acesso: as expiradas saem do início
+    da fila a cada gravação e, acima de `max_sessoes`, as menos recentes são
+    descartadas. Válido apenas dentro de um processo.
+    """
+
+    def __init__(self, timeout: float = 3600, max_historico: int = 10, max_sessoes: int = 10_000):
+        """
+        Args:
+            max_sessoes: Sessões mantidas em memória
+        """
+        super().__init__(timeout, max_historico)
+        self.max_sessoes = max_sessoes
+        self._sessoes: "OrderedDict[str, Tuple[float, Deque[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def registrar(self, id_sessao: str, interacao: Dict[str, Any]):
+        agora = time.monotonic()
+        with self._lock:
+            _, interacoes = self._sessoes.pop(id_sessao, (None, None))
+            if interacoes is None:
+                interacoes = deque(maxlen=self.max_historico)
+            interacoes.append(interacao)
+            self._sessoes[id_sessao] = (agora, interacoes)
+            self._expirar(agora)
+            while len(self._sessoes) > self.max_sessoes:
+                self._sessoes.popitem(last=False)
+
+    def _expirar(self, agora: float):
+        """Remove as sessões expiradas (chamar com o lock adquirido)"""
+        while self._sessoes:
+            id_sessao, (ultimo_acesso, _) = next(iter(self._sessoes.items()))
+            if agora - ultimo_acesso <= self.timeout:
+                break
+            del self._sessoes[id_sessao]
+
+    def historico(self, id_sessao: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            ultimo_acesso, interacoes = self._sessoes.get(id_sessao, (None, None))
+            if interacoes is None or time.monotonic() - ultimo_acesso > self.timeout:
+                return []
+            return list(interacoes)
+
+    def total_sessoes(self) -> int:
+        with self._lock:
+            self._expirar(time.monotonic())
+            return len(self._sessoes)
+
+
+class SessoesSQLite(ArmazenamentoSessoes):
+    """
+    Sessões em SQLite, compartilhadas entre os processos que usam o mesmo arquivo
+
+    O histórico é aparado a cada gravação e as sessões expiradas são apagadas
+    no máximo uma vez a cada `intervalo_limpeza` segundos. Nada fica em memória;
+    o total de sessões ativas é recontado em segundo plano no mesmo intervalo.
+    """
+
+    def __init__(self, caminho: str = "data/sessoes.sqlite", timeout: float = 3600,
+                 max_historico: int = 10, intervalo_limpeza: float = 60.0):
+        """
+        Args:
+            caminho: Arquivo SQLite das sessões
+            intervalo_limpeza: Segundos entre remoções das sessões expiradas
+        """
+        super().__init__(timeout, max_historico)
+        self.caminho = caminho
+        self.intervalo_limpeza = intervalo_limpeza
+        self._ultima_limpeza = 0.0
+        self._lock = threading.Lock()
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS sessoes ("
+            " id_sessao TEXT PRIMARY KEY,"
+            " ultimo_acesso REAL NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_acesso ON sessoes (ultimo_acesso)")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS interacoes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id_sessao TEXT NOT NULL,"
+            " dados TEXT NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_interacoes_sessao ON interacoes (id_sessao, id)")
+        self._conexao.commit()
+
+        self._total_sessoes = ValorAtualizado(self._contar_sessoes, intervalo_limpeza, nome="sessoes-sqlite")
+
+    def registrar(self, id_sessao: str, interacao: Dict[str, Any]):
+        agora = time.time()
+        dados = json.dumps(interacao, ensure_ascii=False, default=str)
+        with self._lock, self._conexao:
+            self._conexao.execute(
+                "INSERT INTO sessoes (id_sessao, ultimo_acesso) VALUES (?, ?)"
+                " ON CONFLICT (id_sessao) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso",
+                (id_sessao, agora)
+            )
+            self._conexao.execute(
+                "INSERT INTO interacoes (id_sessao, dados) VALUES (?, ?)",
+                (id_sessao, dados)
+            )
+            self._conexao.execute(
+                "DELETE FROM interacoes WHERE id_sessao = ? AND id NOT IN ("
+                " SELECT id FROM interacoes WHERE id_sessao = ? ORDER BY id DESC LIMIT ?)",
+                (id_sessao, id_sessao, self.max_historico)
+            )
+            if agora - self._ultima_limpeza >= self.intervalo_limpeza:
+                self._expirar(agora)
+                self._ultima_limpeza = agora
+
+    def _expirar(self, agora: float):
+        """Apaga as sessões expiradas (chamar dentro da transação)"""
+        limite = agora - self.timeout
+        self._conexao.execute(
+            "DELETE FROM interacoes WHERE id_sessao IN (SELECT id_sessao FROM sessoes WHERE ultimo_acesso < ?)",
+            (limite,)
+        )
+        cursor = self._conexao.execute("DELETE FROM sessoes WHERE ultimo_acesso < ?", (limite,))
+        if cursor.rowcount:
+            logger.info(f"Sessões expiradas removidas: {cursor.rowcount}")
+
+    def historico(self, id_sessao: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT i.dados FROM interacoes i JOIN sessoes s ON s.id_sessao = i.id_sessao"
+                " WHERE i.id_sessao = ? AND s.ultimo_acesso >= ? ORDER BY i.id",
+                (id_sessao, time.time() - self.timeout)
+            ).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+
+    def _contar_sessoes(self) -> int:
+        with self._lock:
+            return self._conexao.execute(
+                "SELECT COUNT(*) FROM sessoes WHERE ultimo_acesso >= ?", (time.time() - self.timeout,)
+            ).fetchone()[0]
+
+    def total_sessoes(self) -> int:
+        return self._total_sessoes.obter(0)
+
+    def fechar(self):
+        self._total_sessoes.fechar()
+        with self._lock:
+            self._conexao.close()
+
+
+class SessoesRedis(ArmazenamentoSessoes):
+    """
+    Sessões no Redis, compartilhadas entre workers e máquinas
+
+    Cada sessão é uma lista `<prefixo><id>` de interações em JSON, aparada com
+    LTRIM e com EXPIRE renovado a cada gravação; a expiração fica a cargo do
+    próprio Redis. Aceita qualquer cliente com a API do redis-py. O total de
+    sessões ativas é recontado (SCAN) em segundo plano.
+    """
+
+    def __init__(self, cliente=None, url: str = "redis://localhost:6379/0", timeout: float = 3600,
+                 max_historico: int = 10, prefixo: str = "sessao:", intervalo_contagem: float = 30.0):
+        """
+        Args:
+            cliente: Cliente Redis já configurado (se omitido, conecta em `url`)
+            url: URL de conexão usada quando nenhum cliente é informado
+            prefixo: Prefixo das chaves das sessões
+            intervalo_contagem: Segundos entre recontagens das sessões ativas
+        """
+        super().__init__(timeout, max_historico)
+        if cliente is None:
+            if not REDIS_AVAILABLE:
+                raise ImportError("Pacote redis não instalado (pip install redis)")
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self._total_sessoes = ValorAtualizado(self._contar_sessoes, intervalo_contagem, nome="sessoes-redis")
+
+    def registrar(self, id_sessao: str, interacao: Dict[str, Any]):
+        chave = f"{self.prefixo}{id_sessao}"
+        pipeline = self.cliente.pipeline()
+        pipeline.rpush(chave, json.dumps(interacao, ensure_ascii=False, default=str))
+        pipeline.ltrim(chave, -self.max_historico, -1)
+        pipeline.expire(chave, max(int(self.timeout), 1))
+        pipeline.execute()
+
+    def historico(self, id_sessao: str) -> List[Dict[str, Any]]:
+        return [json.loads(dados) for dados in self.cliente.lrange(f"{self.prefixo}{id_sessao}", 0, -1)]
+
+    def _contar_sessoes(self) -> int:
+        return sum(1 for _ in self.cliente.scan_iter(match=f"{self.prefixo}*", count=1_000))
+
+    def total_sessoes(self) -> int:
+        return self._total_sessoes.obter(0)
+
+    def fechar(self):
+        self._total_sessoes.fechar()
+        fechar = getattr(self.cliente, "close", None)
+        if fechar is not None:
+            fechar()
+
+
+def criar_armazenamento_sessoes(backend: str = "memoria", diretorio_dados: str = "data",
+                                timeout: float = 3600, max_historico: int = 10,
+                                max_sessoes: int = 10_000,
+                                redis_url: Optional[str] = None) -> ArmazenamentoSessoes:
+    """
+    Cria o armazenamento de sessões configurado
+
+    Args:
+        backend: "memoria" (por processo), "sqlite" (data/sessoes.sqlite, compartilhado
+            entre os workers do nó) ou "redis" (compartilhado entre máquinas)
+        diretorio_dados: Diretório do arquivo SQLite
+        timeout: Segundos de inatividade até a sessão expirar
+        max_historico: Interações mantidas por sessão
+        max_sessoes: Sessões mantidas em memória (backend "memoria")
+        redis_url: URL do Redis (backend "redis")
+    """
+    if backend == "memoria":
+        return SessoesMemoria(timeout=timeout, max_historico=max_historico, max_sessoes=max_sessoes)
+    if backend == "sqlite":
+        return SessoesSQLite(
+            os.path.join(diretorio_dados, "sessoes.sqlite"), timeout=timeout, max_historico=max_historico
+        )
+    if backend == "redis":
+        return SessoesRedis(
+            url=redis_url or "redis://localhost:6379/0", timeout=timeout, max_historico=max_historico
+        )
+    raise ValueError(f"Backend de sessões desconhecido: {backend}")
@@ -0,0 +1,315 @@
+"""
+Tarefas administrativas em segundo plano
+Execução fora do caminho da requisição com progresso consultável e cancelamento
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .geracoes import TravaProcessos
+
+logger = logging.getLogger(__name__)
+
+STATUS_ATIVOS = ("pendente", "executando")
+
+
+class TarefaCancelada(Exception):
+    """Interrompe uma tarefa cujo cancelamento foi solicitado"""
+
+
+@dataclass
+class Tarefa:
+    """Estado de uma tarefa em segundo plano"""
+    id: str
+    tipo: str
+    status: str = "pendente"
+    etapa: str = ""
+    progresso: float = 0.0
+    resultado: Optional[Dict[str, Any]] = None
+    erro: Optional[str] = None
+    criada_em: str = field(default_factory=lambda: datetime.now().isoformat())
+    iniciada_em: Optional[str] = None
+    finalizada_em: Optional[str] = None
+    _cancelamento: threading.Event = field(default_factory=threading.Event, repr=False)
+    _gerenciador: Optional["GerenciadorTarefas"] = field(default=None, repr=False)
+
+    @property
+    def ativa(self) -> bool:
+        return self.status in STATUS_ATIVOS
+
+    @property
+    def cancelamento_solicitado(self) -> bool:
+        return self._cancelamento.is_set()
+
+    def reportar(self, etapa: str, progresso: float):
+        """Atualiza a etapa atual e o progresso (0 a 1)"""
+        self.etapa = etapa
+        self.progresso = round(min(max(progresso, 0.0), 1.0), 4)
+        if self._gerenciador is not None:
+            self._gerenciador._salvar(self)
+
+    def verificar_cancelamento(self):
+        """Lança TarefaCancelada se o cancelamento foi solicitado (por qualquer worker)"""
+        if not self._cancelamento.is_set() and self._gerenciador is not None:
+            if self._gerenciador._cancelamento_registrado(self.id):
+                self._cancelamento.set()
+        if self._cancelamento.is_set():
+            raise TarefaCancelada(f"Tarefa {self.id} cancelada")
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Representação serializável para a API"""
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "status": self.status,
+            "etapa": self.etapa,
+            "progresso": self.progresso,
+            "cancelamento_solicitado": self.cancelamento_solicitado,
+            "resultado": self.resultado,
+            "erro": self.erro,
+            "criada_em": self.criada_em,
+            "iniciada_em": self.iniciada_em,
+            "finalizada_em": self.finalizada_em,
+        }
+
+
+class GerenciadorTarefas:
+    """
+    Executa tarefas em threads próprias e guarda o histórico recente
+
+    O estado das tarefas fica em SQLite, no diretório de dados compartilhado:
+    qualquer worker consulta ou cancela uma tarefa iniciada por outro. Só uma
+    tarefa de cada tipo fica ativa por vez entre todos os processos (trava de
+    arquivo por tipo, mantida durante a execução). A função executada recebe a
+    `Tarefa` e deve chamar `reportar` e `verificar_cancelamento` entre as
+    etapas; o cancelamento é cooperativo.
+    """
+
+    _COLUNAS = (
+        "id, tipo, status, etapa, progresso, resultado, erro,"
+        " cancelamento_solicitado, criada_em, iniciada_em, finalizada_em"
+    )
+
+    def __init__(self, caminho: str = "data/tarefas.sqlite", max_historico: int = 50):
+        """
+        Args:
+            caminho: Arquivo SQLite das tarefas (as travas ficam ao lado dele)
+            max_historico: Tarefas finalizadas mantidas para consulta
+        """
+        self.caminho = caminho
+        self.max_historico = max_historico
+        # Tarefas executadas por este processo (o objeto vivo, atualizado pela thread)
+        self._locais: Dict[str, Tarefa] = {}
+        self._travas: Dict[str, TravaProcessos] = {}
+        self._lock = threading.Lock()
+        self._fechado = False
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS tarefas ("
+            " id TEXT PRIMARY KEY,"
+            " tipo TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " etapa TEXT NOT NULL,"
+            " progresso REAL NOT NULL,"
+            " resultado TEXT,"
+            " erro TEXT,"
+            " cancelamento_solicitado INTEGER NOT NULL DEFAULT 0,"
+            " criada_em TEXT NOT NULL,"
+            " iniciada_em TEXT,"
+            " finalizada_em TEXT)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_tipo ON tarefas (tipo, status)")
+        self._conexao.commit()
+
+    def _trava(self, tipo: str) -> TravaProcessos:
+        """Trava entre processos que limita a uma tarefa ativa por tipo"""
+        with self._lock:
+            if tipo not in self._travas:
+                self._travas[tipo] = TravaProcessos(f"{os.path.splitext(self.caminho)[0]}-{tipo}.lock")
+            return self._travas[tipo]
+
+    def _salvar(self, tarefa: Tarefa):
+        """Grava o estado da tarefa (sem desfazer um cancelamento pedido por outro worker)"""
+        with self._lock:
+            if self._fechado:
+                # Encerramento com a tarefa em andamento: a próxima do tipo a marca como órfã
+                return
+            with self._conexao:
+                self._conexao.execute(
+                    "INSERT INTO tarefas (id, tipo, status, etapa, progresso, resultado, erro,"
+                    " cancelamento_solicitado, criada_em, iniciada_em, finalizada_em)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (id) DO UPDATE SET status = excluded.status, etapa = excluded.etapa,"
+                    " progresso = excluded.progresso, resultado = excluded.resultado, erro = excluded.erro,"
+                    " cancelamento_solicitado = MAX(cancelamento_solicitado, excluded.cancelamento_solicitado),"
+                    " iniciada_em = excluded.iniciada_em, finalizada_em = excluded.finalizada_em",
+                    (
+                        tarefa.id, tarefa.tipo, tarefa.status, tarefa.etapa, tarefa.progresso,
+                        json.dumps(tarefa.resultado, ensure_ascii=False, default=str) if tarefa.resultado is not None else None,
+                        tarefa.erro, int(tarefa.cancelamento_solicitado), tarefa.criada_em,
+                        tarefa.iniciada_em, tarefa.finalizada_em
+                    )
+                )
+
+    def _cancelamento_registrado(self, tarefa_id: str) -> bool:
+        with self._lock:
+            if self._fechado:
+                return False
+            linha = self._conexao.execute(
+                "SELECT cancelamento_solicitado FROM tarefas WHERE id = ?", (tarefa_id,)
+            ).fetchone()
+        return bool(linha and linha[0])
+
+    def iniciar(self, tipo: str, funcao: Callable[[Tarefa], Optional[Dict[str, Any]]]) -> Optional[Tarefa]:
+        """
+        Inicia uma tarefa em segundo plano
+
+        Returns:
+            A tarefa criada ou None se já houver uma do mesmo tipo em andamento
+            (neste ou em outro processo)
+        """
+        tarefa = Tarefa(id=uuid.uuid4().hex, tipo=tipo, _gerenciador=self)
+        admissao: Dict[str, bool] = {}
+        decidida = threading.Event()
+
+        thread = threading.Thread(
+            target=self._executar, args=(tarefa, funcao, admissao, decidida),
+            name=f"tarefa-{tipo}", daemon=True
+        )
+        thread.start()
+        decidida.wait()
+        return tarefa if admissao.get("aceita") else None
+
+    def _executar(self, tarefa: Tarefa, funcao: Callable[[Tarefa], Optional[Dict[str, Any]]],
+                  admissao: Dict[str, bool], decidida: threading.Event):
+        """Corpo da thread: obtém a trava do tipo, executa a função e registra o desfecho"""
+        with self._trava(tarefa.tipo).tentar_adquirir() as obtida:
+            admissao["aceita"] = obtida
+            if obtida:
+                self._encerrar_orfas(tarefa.tipo)
+                self._salvar(tarefa)
+                with self._lock:
+                    self._locais[tarefa.id] = tarefa
+            decidida.set()
+            if not obtida:
+                return
+
+            tarefa.status = "executando"
+            tarefa.iniciada_em = datetime.now().isoformat()
+            self._salvar(tarefa)
+            try:
+                tarefa.verificar_cancelamento()
+                tarefa.resultado = funcao(tarefa)
+                tarefa.status = "concluida"
+                tarefa.progresso = 1.0
+            except TarefaCancelada:
+                tarefa.status = "cancelada"
+                logger.info(f"Tarefa {tarefa.tipo} {tarefa.id} cancelada ({tarefa.etapa or 'antes de iniciar'})")
+            except Exception as e:
+                tarefa.status = "falhou"
+                tarefa.erro = str(e)
+                logger.error(f"Erro na tarefa {tarefa.tipo} {tarefa.id}: {e}")
+            finally:
+                tarefa.finalizada_em = datetime.now().isoformat()
+                self._limpar()
+                self._salvar(tarefa)
+                with self._lock:
+                    self._locais.pop(tarefa.id, None)
+
+    def _encerrar_orfas(self, tipo: str):
+        """
+        Marca como falhas as tarefas do tipo que constam ativas sem ninguém executando
+
+        Chamar com a trava do tipo adquirida: se ela estava livre, o processo
+        que as executava terminou sem registrar o desfecho.
+        """
+        with self._lock, self._conexao:
+            cursor = self._conexao.execute(
+                "UPDATE tarefas SET status = 'falhou', erro = 'Processo encerrado durante a execução',"
+                " finalizada_em = ? WHERE tipo = ? AND status IN (?, ?)",
+                (datetime.now().isoformat(), tipo, *STATUS_ATIVOS)
+            )
+        if cursor.rowcount:
+            logger.warning(f"Tarefas {tipo} interrompidas por outro processo marcadas como falhas: {cursor.rowcount}")
+
+    def _limpar(self):
+        """Descarta as tarefas finalizadas mais antigas"""
+        with self._lock:
+            if self._fechado:
+                return
+            with self._conexao:
+                self._conexao.execute(
+                    "DELETE FROM tarefas WHERE status NOT IN (?, ?) AND rowid NOT IN ("
+                    " SELECT rowid FROM tarefas WHERE status NOT IN (?, ?) ORDER BY rowid DESC LIMIT ?)",
+                    (*STATUS_ATIVOS, *STATUS_ATIVOS, self.max_historico)
+                )
+
+    def _tarefa_da_linha(self, linha) -> Tarefa:
+        """Tarefa de outro processo (ou já finalizada) reconstruída do SQLite"""
+        (tarefa_id, tipo, status, etapa, progresso, resultado, erro,
+         cancelamento_solicitado, criada_em, iniciada_em, finalizada_em) = linha
+        tarefa = Tarefa(
+            id=tarefa_id, tipo=tipo, status=status, etapa=etapa, progresso=progresso,
+            resultado=json.loads(resultado) if resultado is not None else None, erro=erro,
+            criada_em=criada_em, iniciada_em=iniciada_em, finalizada_em=finalizada_em
+        )
+        if cancelamento_solicitado:
+            tarefa._cancelamento.set()
+        return tarefa
+
+    def obter(self, tarefa_id: str) -> Optional[Tarefa]:
+        """Tarefa pelo ID (None se não existir ou já tiver saído do histórico)"""
+        with self._lock:
+            local = self._locais.get(tarefa_id)
+            if local is not None:
+                return local
+            linha = self._conexao.execute(
+                f"SELECT {self._COLUNAS} FROM tarefas WHERE id = ?", (tarefa_id,)
+            ).fetchone()
+        return self._tarefa_da_linha(linha) if linha else None
+
+    def listar(self, tipo: Optional[str] = None) -> List[Tarefa]:
+        """Tarefas conhecidas, da mais recente para a mais antiga"""
+        with self._lock:
+            linhas = self._conexao.execute(
+                f"SELECT {self._COLUNAS} FROM tarefas WHERE ? IS NULL OR tipo = ? ORDER BY rowid DESC",
+                (tipo, tipo)
+            ).fetchall()
+            locais = dict(self._locais)
+        return [locais.get(linha[0]) or self._tarefa_da_linha(linha) for linha in linhas]
+
+    def cancelar(self, tarefa_id: str) -> Optional[Tarefa]:
+        """
+        Solicita o cancelamento de uma tarefa, em qualquer worker
+
+        Returns:
+            A tarefa (o status muda para "cancelada" quando ela parar) ou None se não existir
+        """
+        with self._lock, self._conexao:
+            self._conexao.execute(
+                "UPDATE tarefas SET cancelamento_solicitado = 1 WHERE id = ? AND status IN (?, ?)",
+                (tarefa_id, *STATUS_ATIVOS)
+            )
+            local = self._locais.get(tarefa_id)
+        if local is not None:
+            local._cancelamento.set()
+        return self.obter(tarefa_id)
+
+    def fechar(self):
+        """Fecha a conexão com o SQLite (tarefas em andamento deixam de registrar o estado)"""
+        with self._lock:
+            self._fechado = True
+            self._conexao.close()
@@ -0,0 +1,69 @@
+"""
+Utilitários de normalização de texto em português
+Compartilhados entre classificação de intenção e busca lexical
+"""
+
+import re
+import unicodedata
+
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9#]+")
+
+
+def remover_acentos(texto: str) -> str:
+    """Remove acentos mantendo as letras base (ex: "devolução" -> "devolucao")"""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sem acentos e com pontuação trocada por espaço simples"""
+    texto = remover_acentos(texto.lower())
+    return " ".join(_NAO_ALFANUMERICO.sub(" ", texto).split())
+
+
+# Palavras muito frequentes que não ajudam a diferenciar produtos
+PALAVRAS_VAZIAS = frozenset(
+    "a as o os um uma uns umas de da das do dos e em no na nos nas para pra por com sem "
+    "que se ou ao aos eu me meu minha quero queria gostaria tem ter algum alguma".split()
+)
+
+# Plurais irregulares mais comuns (aplicados antes da regra geral do "s")
+_PLURAIS = (("coes", "cao"), ("soes", "sao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"),
+            ("eis", "el"), ("ois", "ol"), ("ns", "m"), ("res", "r"), ("zes", "z"))
+
+
+def reduzir_radical(palavra: str) -> str:
+    """
+    Stemming leve para português (espera texto já normalizado)
+
+    Remove plural, o sufixo "mente" e a vogal temática final, o suficiente para
+    que "camisetas"/"camiseta" ou "eletronicos"/"eletronico" caiam no mesmo
+    radical. Palavras com dígitos (modelos, SKUs) ficam intactas.
+    """
+    if len(palavra) <= 3 or any(c.isdigit() for c in palavra):
+        return palavra
+
+    for sufixo, troca in _PLURAIS:
+        if palavra.endswith(sufixo) and len(palavra) > len(sufixo) + 2:
+            palavra = palavra[:-len(sufixo)] + troca
+            break
+    else:
+        if palavra.endswith("s") and not palavra.endswith("ss"):
+            palavra = palavra[:-1]
+
+    if palavra.endswith("mente") and len(palavra) > 7:
+        palavra = palavra[:-5]
+
+    if len(palavra) > 4 and palavra[-1] in "aeo":
+        palavra = palavra[:-1]
+
+    return palavra
+
+
+def tokenizar(texto: str) -> list:
+    """Normaliza, remove palavras vazias e reduz cada termo ao radical"""
+    return [
+        reduzir_radical(token)
+        for token in normalizar_texto(texto).replace("#", " ").split()
+        if token not in PALAVRAS_VAZIAS
+    ]
@@ -0,0 +1,56 @@
+"""
+Fixtures dos testes
+Tudo roda offline: dados sintéticos em diretório temporário e modelos determinísticos
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalogo_sintetico import CATEGORIAS, preparar_diretorio  # noqa: E402
+from benchmarks.modelos_falsos import ChatDeterministico, EmbeddingsDeterministicos  # noqa: E402
+from src.rag_system import RAGSystem  # noqa: E402
+
+DIMENSAO = 64
+
+
+@pytest.fixture
+def embeddings():
+    return EmbeddingsDeterministicos(dimensao=DIMENSAO, semente=7)
+
+
+@pytest.fixture
+def llm():
+    return ChatDeterministico(palavras_resposta=20, categorias=CATEGORIAS)
+
+
+@pytest.fixture
+def diretorio_dados(tmp_path):
+    """Diretório com 300 produtos, 50 pedidos e as políticas do projeto"""
+    destino = str(tmp_path / "dados")
+    preparar_diretorio(destino, produtos=300, pedidos=50)
+    return destino
+
+
+@pytest.fixture
+def criar_rag(diretorio_dados, embeddings):
+    """Cria sistemas RAG sobre o mesmo diretório (um por "worker") e fecha todos no fim"""
+    criados = []
+
+    def _criar(**opcoes):
+        opcoes = {
+            "diretorio_dados": diretorio_dados,
+            "embeddings": embeddings,
+            "janela_lote_consultas_ms": 0,
+            **opcoes,
+        }
+        rag = RAGSystem(openai_api_key="offline", **opcoes)
+        criados.append(rag)
+        return rag
+
+    yield _criar
+    for rag in criados:
+        rag.fechar()
@@ -0,0 +1,99 @@
+"""
+Testes da persistência do catálogo (snapshot + log com compactação)
+"""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from src.armazenamento import ArmazenamentoCatalogo
+
+
+@pytest.fixture
+def caminhos(tmp_path):
+    snapshot = tmp_path / "produtos.json"
+    snapshot.write_text(json.dumps([{"id": "A", "preco": 1}, {"id": "B", "preco": 2}]), encoding="utf-8")
+    return str(snapshot), str(tmp_path / "produtos.log.jsonl")
+
+
+def _armazenamento(caminhos, **opcoes):
+    snapshot, log = caminhos
+    return ArmazenamentoCatalogo(snapshot, log, sincronizar=False, **opcoes)
+
+
+def test_log_reaplicado_sobre_o_snapshot(caminhos):
+    armazenamento = _armazenamento(caminhos)
+    armazenamento.carregar()
+    armazenamento.registrar_salvos([{"id": "A", "preco": 10}, {"id": "C", "preco": 3}])
+    armazenamento.registrar_removido("B")
+
+    produtos = _armazenamento(caminhos).carregar()
+
+    assert {produto["id"]: produto["preco"] for produto in produtos} == {"A": 10, "C": 3}
+
+
+def test_linha_incompleta_descartada(caminhos):
+    armazenamento = _armazenamento(caminhos)
+    armazenamento.carregar()
+    armazenamento.registrar_salvos([{"id": "C", "preco": 3}])
+    with open(caminhos[1], "ab") as f:
+        f.write(b'{"op": "salvar", "produto": {"id": "D"')
+    tamanho_valido = len(json.dumps({"op": "salvar", "produto": {"id": "C", "preco": 3}}).encode()) + 1
+
+    produtos = _armazenamento(caminhos).carregar()
+
+    assert [produto["id"] for produto in produtos] == ["A", "B", "C"]
+    assert os.path.getsize(caminhos[1]) == tamanho_valido
+
+
+def test_compactacao_grava_snapshot_e_zera_log(caminhos):
+    armazenamento = _armazenamento(caminhos, max_operacoes_log=2)
+    produtos = armazenamento.carregar()
+    armazenamento.registrar_salvos([{"id": "C", "preco": 3}])
+    assert not armazenamento.precisa_compactar()
+    armazenamento.registrar_removido("A")
+    assert armazenamento.precisa_compactar()
+
+    produtos = [produto for produto in produtos if produto["id"] != "A"] + [{"id": "C", "preco": 3}]
+    armazenamento.compactar(produtos)
+
+    assert os.path.getsize(caminhos[1]) == 0
+    assert not os.path.exists(f"{caminhos[0]}.tmp")
+    assert armazenamento.operacoes_pendentes == 0 and armazenamento.posicao_log == 0
+    with open(caminhos[0], "rb") as f:
+        assert armazenamento.hash_estado() == hashlib.sha256(f.read()).hexdigest()
+    assert _armazenamento(caminhos).carregar() == produtos
+
+
+def test_hash_estado_acompanha_o_log(caminhos):
+    armazenamento = _armazenamento(caminhos)
+    armazenamento.carregar()
+    inicial = armazenamento.hash_estado()
+
+    armazenamento.registrar_salvos([{"id": "C", "preco": 3}])
+    depois = armazenamento.hash_estado()
+    outro = _armazenamento(caminhos)
+    outro.carregar()
+
+    assert depois != inicial
+    assert outro.hash_estado() == depois
+    assert armazenamento.operacoes_desde(0)[0] == inicial
+    assert armazenamento.operacoes_desde(armazenamento.posicao_log) == (depois, [])
+
+
+def test_novas_operacoes_de_outro_processo(caminhos):
+    leitor = _armazenamento(caminhos)
+    escritor = _armazenamento(caminhos)
+    leitor.carregar()
+    escritor.carregar()
+
+    assert leitor.ler_novas_operacoes() == []
+    escritor.registrar_removido("B")
+    assert leitor.ler_novas_operacoes() == [{"op": "remover", "id": "B"}]
+    assert leitor.hash_estado() == escritor.hash_estado()
+    assert leitor.ler_novas_operacoes() == []
+
+    escritor.compactar([{"id": "A", "preco": 1}])
+    assert leitor.ler_novas_operacoes() is None
@@ -0,0 +1,87 @@
+"""
+Testes do índice BM25, da fusão RRF e da busca híbrida de produtos
+"""
+
+import pytest
+
+from src.busca_lexical import IndiceBM25, fundir_rrf
+
+
+@pytest.fixture
+def indice():
+    indice = IndiceBM25()
+    indice.reconstruir([
+        ("P1", "Notebook Dell Inspiron 15 3000 | Eletrônicos | notebook leve para trabalho", "Notebook Dell Inspiron 15 3000"),
+        ("P2", "Smartphone Samsung Galaxy A54 | Eletrônicos | câmera de alta resolução", "Smartphone Samsung Galaxy A54"),
+        ("P3", "Notebook Lenovo IdeaPad 3 | Eletrônicos | notebook para estudos", "Notebook Lenovo IdeaPad 3"),
+        ("P4", "Panela de pressão Tramontina | Casa e Cozinha | panela de alumínio", "Panela de pressão Tramontina"),
+    ])
+    return indice
+
+
+def test_bm25_ranqueia_pelos_termos(indice):
+    resultados = indice.buscar("notebook dell")
+
+    assert [doc_id for doc_id, _ in resultados][:2] == ["P1", "P3"]
+    assert resultados[0][1] > resultados[1][1] > 0
+    assert indice.buscar("notebooks", top_k=5) == indice.buscar("notebook", top_k=5)
+    assert indice.buscar("geladeira") == []
+
+
+def test_bm25_respeita_candidatos(indice):
+    assert [doc_id for doc_id, _ in indice.buscar("notebook", candidatos={"P3", "P4"})] == ["P3"]
+
+
+def test_bm25_remover_e_reindexar(indice):
+    indice.remover("P1")
+    assert "P1" not in dict(indice.buscar("notebook dell"))
+    assert indice.buscar_exato("inspiron 15 3000") is None
+
+    indice.adicionar("P1", "Cadeira gamer | Móveis", "Cadeira gamer X200")
+    assert "P1" not in dict(indice.buscar("notebook"))
+    assert indice.buscar_exato("cadeira x200") == "P1"
+    assert len(indice) == 4
+
+
+def test_modelo_exato_sem_ambiguidade(indice):
+    assert indice.buscar_exato("quero o galaxy a54") == "P2"
+    assert indice.buscar_exato("Inspiron 15 3000") == "P1"
+    # Cita dois modelos diferentes: nenhum vence
+    assert indice.buscar_exato("inspiron 15 ou galaxy a54") is None
+    # Números isolados (preços) não identificam modelos
+    assert indice.buscar_exato("até 3000 reais") is None
+
+
+def test_fundir_rrf():
+    fusao = fundir_rrf(["A", "B", "C"], ["B", "D"], k=60)
+
+    assert [doc_id for doc_id, _ in fusao] == ["B", "A", "D", "C"]
+    assert fusao[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fundir_rrf() == []
+
+
+def test_documento_lexical_indexa_so_valores(criar_rag):
+    rag = criar_rag()
+
+    # Rótulos, preço e disponibilidade não entram no texto do BM25
+    for termo in ("preco", "nome", "categoria", "disponivel"):
+        assert rag.indice_lexical.buscar(termo) == []
+
+
+def test_busca_hibrida_e_modelo_exato(criar_rag, embeddings):
+    rag = criar_rag(modo_busca="hibrido")
+    produto = rag.catalogo.listar()[0]
+    chamadas = embeddings.chamadas
+
+    exato = rag.buscar_produtos(produto["nome"], top_k=3)
+    assert exato[0]["id"] == produto["id"]
+    assert embeddings.chamadas == chamadas
+
+    hibridos = rag.buscar_produtos(f"{produto['categoria']} {produto['marca']}", top_k=5)
+    assert len(hibridos) == 5
+    assert all("score_hibrido" in item for item in hibridos)
+    scores = [item["score_hibrido"] for item in hibridos]
+    assert scores == sorted(scores, reverse=True)
+
+    lexicais = rag.buscar_produtos(produto["marca"], top_k=5, modo="lexical")
+    assert lexicais and all(item["marca"] == produto["marca"] for item in lexicais)
@@ -0,0 +1,36 @@
+"""
+Testes do cache de embeddings em disco
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache_embeddings import CacheEmbeddings
+
+
+def test_vetores_reaproveitados_entre_instancias(tmp_path, embeddings):
+    caminho = str(tmp_path / "cache.sqlite")
+    cache = CacheEmbeddings(embeddings, caminho=caminho)
+    esperado = cache.embed_documents(["notebook dell", "mouse sem fio"])
+    cache.fechar()
+
+    chamadas = embeddings.chamadas
+    reaberto = CacheEmbeddings(embeddings, caminho=caminho)
+    assert reaberto.embed_documents(["notebook  dell", "mouse sem fio"]) == esperado
+    assert asyncio.run(reaberto.aembed_query("notebook dell")) == esperado[0]
+    assert embeddings.chamadas == chamadas
+    reaberto.fechar()
+
+
+def test_contadores_consistentes_entre_threads(tmp_path, embeddings):
+    cache = CacheEmbeddings(embeddings, caminho=str(tmp_path / "cache.sqlite"))
+    textos = [f"consulta {indice % 10}" for indice in range(400)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(cache.embed_query, textos))
+    asyncio.run(cache.aembed_documents(textos[:20]))
+
+    estatisticas = cache.obter_estatisticas()
+    assert estatisticas["acertos"] + estatisticas["falhas"] == 420
+    assert estatisticas["entradas_disco"] == 10
+    cache.fechar()
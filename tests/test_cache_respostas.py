@@ -0,0 +1,35 @@
+"""
+Testes do cache semântico de respostas
+"""
+
+from src.cache_respostas import CacheRespostas
+
+
+def test_versao_invalida_so_a_propria_intencao():
+    cache = CacheRespostas(intencoes=("politicas", "busca_produtos"))
+    vetor = [1.0, 0.0, 0.0]
+    cache.guardar("politicas", vetor, "Trocas em até 30 dias", {"tipo": "politicas"}, "politicas-v1")
+    cache.guardar("busca_produtos", vetor, "Notebook Dell", {"tipo": "busca_produtos"}, "catalogo-v1")
+
+    # Catálogo mudou: respostas sobre políticas continuam valendo
+    assert cache.buscar("busca_produtos", vetor, "catalogo-v2") is None
+    assert cache.buscar("politicas", vetor, "politicas-v1")["resposta"] == "Trocas em até 30 dias"
+
+    assert cache.buscar("politicas", vetor, "politicas-v2") is None
+    assert cache.obter_estatisticas()["entradas"] == {}
+
+
+def test_versao_por_intencao_do_rag(criar_rag):
+    rag = criar_rag()
+    politicas = rag.versao_dados_intencao("politicas")
+    catalogo = rag.versao_dados_intencao("busca_produtos")
+
+    rag.adicionar_produto({
+        "id": "NOVO1", "nome": "Cafeteira Expresso Zeta Z900", "categoria": "Casa e Cozinha",
+        "marca": "Zeta", "preco": 899.0, "descricao": "Cafeteira expresso com moedor", "disponivel": True,
+    })
+
+    assert politicas is not None
+    assert rag.versao_dados_intencao("politicas") == politicas
+    assert rag.versao_dados_intencao("busca_produtos") != catalogo
+    assert rag.versao_dados_intencao("saudacao") is None
@@ -0,0 +1,77 @@
+"""
+Testes do catálogo em memória (índices secundários e faixa de preço)
+"""
+
+import random
+
+from src.catalogo import CatalogoProdutos
+
+
+def _produto(produto_id, preco, categoria="Eletrônicos", marca="Dell", disponivel=True):
+    return {
+        "id": produto_id, "nome": f"Produto {produto_id}", "preco": preco,
+        "categoria": categoria, "marca": marca, "disponivel": disponivel,
+    }
+
+
+def _por_varredura(produtos, minimo=None, maximo=None):
+    return {
+        produto["id"] for produto in produtos
+        if (minimo is None or produto["preco"] >= minimo) and (maximo is None or produto["preco"] <= maximo)
+    }
+
+
+def test_faixa_preco_inclui_limites():
+    catalogo = CatalogoProdutos([_produto("A", 10.0), _produto("B", 20.0), _produto("C", 20.0), _produto("D", 30.0)])
+
+    assert catalogo.ids_por_faixa_preco(20.0, 20.0) == {"B", "C"}
+    assert catalogo.ids_por_faixa_preco(10.0, 30.0) == {"A", "B", "C", "D"}
+    assert catalogo.ids_por_faixa_preco(minimo=20.0) == {"B", "C", "D"}
+    assert catalogo.ids_por_faixa_preco(maximo=19.99) == {"A"}
+    assert catalogo.ids_por_faixa_preco(31.0, 40.0) == set()
+
+
+def test_faixa_preco_igual_a_varredura():
+    aleatorio = random.Random(3)
+    produtos = [_produto(f"P{i}", round(aleatorio.uniform(1, 500), 2)) for i in range(500)]
+    catalogo = CatalogoProdutos(produtos)
+
+    for _ in range(50):
+        minimo, maximo = sorted(aleatorio.uniform(0, 520) for _ in range(2))
+        assert catalogo.ids_por_faixa_preco(minimo, maximo) == _por_varredura(produtos, minimo, maximo)
+
+
+def test_faixa_preco_acompanha_alteracoes():
+    catalogo = CatalogoProdutos([_produto("A", 10.0), _produto("B", 20.0)])
+
+    catalogo.atualizar("A", _produto("A", 50.0))
+    catalogo.adicionar(_produto("C", 15.0))
+    catalogo.adicionar(_produto("B", 5.0))
+    catalogo.remover("C")
+
+    assert catalogo.ids_por_faixa_preco(0, 12) == {"B"}
+    assert catalogo.ids_por_faixa_preco(12, 100) == {"A"}
+    assert len(catalogo._precos) == len(catalogo) == 2
+
+
+def test_id_repetido_na_carga_mantem_o_ultimo():
+    catalogo = CatalogoProdutos([_produto("A", 10.0), _produto("B", 20.0), _produto("A", 99.0)])
+
+    assert [produto["id"] for produto in catalogo.listar()] == ["A", "B"]
+    assert catalogo.obter("A")["preco"] == 99.0
+    assert catalogo.ids_por_faixa_preco(0, 50) == {"B"}
+
+
+def test_filtrar_intersecta_indices():
+    catalogo = CatalogoProdutos([
+        _produto("A", 100.0, marca="Dell"),
+        _produto("B", 200.0, marca="Dell", disponivel=False),
+        _produto("C", 150.0, categoria="Casa e Cozinha", marca="Dell"),
+        _produto("D", 120.0, marca="LG"),
+    ])
+
+    assert catalogo.filtrar() is None
+    assert catalogo.filtrar(categoria="eletr", marca="DELL") == {"A", "B"}
+    assert catalogo.filtrar(categoria="eletr", marca="dell", apenas_disponiveis=True) == {"A"}
+    assert catalogo.filtrar(preco_min=110, preco_max=160) == {"C", "D"}
+    assert catalogo.filtrar(marca="Samsung") == set()
@@ -0,0 +1,93 @@
+"""
+Testes do store de conversas (índice local, gerações e Pinecone indisponível)
+"""
+
+import os
+
+import faiss
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from src.conversas import ConversaStore
+from src.embeddings_normalizados import EmbeddingsNormalizados
+
+
+@pytest.fixture
+def normalizados(embeddings):
+    return EmbeddingsNormalizados(embeddings)
+
+
+def _conversa(indice):
+    return Document(
+        page_content=f"Usuário: quero um fone de ouvido modelo {indice}\nAssistente: temos o fone {indice}",
+        metadata={"tipo": "conversa", "indice": indice},
+    )
+
+
+def _criar(tmp_path, embeddings, **opcoes):
+    # intervalo_flush alto: só o teste decide quando gravar
+    return ConversaStore(embeddings, caminho_indice=str(tmp_path / "faiss_conversas"),
+                         intervalo_flush=3_600, **opcoes)
+
+
+def test_indice_local_usa_cosseno(tmp_path, normalizados):
+    store = _criar(tmp_path, normalizados)
+    for indice in range(3):
+        store.registrar(_conversa(indice))
+    store.fechar()
+
+    reaberto = _criar(tmp_path, normalizados)
+    assert reaberto.vector_store.index.metric_type == faiss.METRIC_INNER_PRODUCT
+    vetor = normalizados.embed_query(_conversa(1).page_content)
+    documento, score = reaberto.vector_store.similarity_search_with_score_by_vector(vetor, k=1)[0]
+    assert documento.metadata["indice"] == 1
+    assert score == pytest.approx(1.0, abs=1e-5)
+    reaberto.fechar()
+
+
+def test_indice_l2_antigo_convertido(tmp_path, embeddings, normalizados):
+    caminho = tmp_path / "faiss_conversas"
+    textos = [_conversa(indice).page_content for indice in range(3)]
+    escalados = [[3 * valor for valor in vetor] for vetor in embeddings.embed_documents(textos)]
+    FAISS.from_embeddings(list(zip(textos, escalados)), embeddings).save_local(str(caminho))
+
+    store = _criar(tmp_path, normalizados)
+    assert store.vector_store.index.metric_type == faiss.METRIC_INNER_PRODUCT
+    _, score = store.vector_store.similarity_search_with_score_by_vector(normalizados.embed_query(textos[2]), k=1)[0]
+    assert score == pytest.approx(1.0, abs=1e-5)
+    store.fechar()
+
+
+def test_geracoes_antigas_apagadas_e_gravacao_com_minimo(tmp_path, normalizados):
+    store = _criar(tmp_path, normalizados, manter_geracoes=2, min_novas_flush=2)
+    raiz = store._geracoes.raiz
+
+    for indice in range(4):
+        store.registrar(_conversa(indice))
+        store.flush()
+    assert len(os.listdir(raiz)) == 2
+
+    # Gravação periódica: com menos conversas novas que o mínimo, nada é publicado
+    atual = store._geracoes.geracao_atual()
+    store._indexar([_conversa(10)])
+    store._salvar(store.min_novas_flush)
+    assert store._geracoes.geracao_atual() == atual
+    store._indexar([_conversa(11)])
+    store._salvar(store.min_novas_flush)
+    assert store._geracoes.geracao_atual() != atual
+    store.fechar()
+
+
+def test_pinecone_indisponivel_usa_faiss_local(tmp_path, normalizados):
+    store = _criar(tmp_path, normalizados, pinecone_index_name="indice-inexistente")
+    assert store.vector_store is None
+
+    store.registrar(_conversa(1))
+    store.fechar()
+
+    assert store.pinecone_index_name is None
+    assert store.indexadas == 1
+    vetor = normalizados.embed_query(_conversa(1).page_content)
+    assert store.buscar_por_vetor(vetor, top_k=1)[0].metadata["indice"] == 1
+    assert os.path.exists(tmp_path / "faiss_conversas" / "index.faiss")
@@ -0,0 +1,46 @@
+"""
+Testes da normalização dos embeddings (produto interno = cosseno)
+"""
+
+import asyncio
+import warnings
+
+import numpy as np
+import pytest
+
+from benchmarks.modelos_falsos import EmbeddingsDeterministicos
+from src.embeddings_normalizados import EmbeddingsNormalizados
+
+
+class EmbeddingsEscalados(EmbeddingsDeterministicos):
+    """Mesmas direções dos determinísticos, mas com norma 5 (como um modelo sem normalização)"""
+
+    def embed_documents(self, texts):
+        return [[5 * valor for valor in vetor] for vetor in super().embed_documents(texts)]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_vetores_com_norma_unitaria():
+    base = EmbeddingsEscalados(dimensao=16)
+    normalizados = EmbeddingsNormalizados(base)
+
+    vetores = normalizados.embed_documents(["notebook dell", "mouse sem fio"])
+    consulta = asyncio.run(normalizados.aembed_query("notebook dell"))
+
+    assert np.linalg.norm(vetores, axis=1) == pytest.approx([1.0, 1.0], abs=1e-6)
+    assert consulta == pytest.approx(vetores[0], abs=1e-6)
+    assert normalizados.model == base.model
+    assert EmbeddingsNormalizados.normalizar([[0.0, 0.0]]) == [[0.0, 0.0]]
+
+
+def test_scores_de_cosseno_sem_aviso_do_langchain(criar_rag):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        rag = criar_rag(embeddings=EmbeddingsEscalados(dimensao=64, semente=7))
+        produto = next(iter(rag.catalogo))
+        documentos = rag.vector_store_produtos.similarity_search_with_score(produto["nome"], k=3)
+
+    assert documentos
+    assert all(-1.0 - 1e-5 <= score <= 1.0 + 1e-5 for _, score in documentos)
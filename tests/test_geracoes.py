@@ -0,0 +1,98 @@
+"""
+Testes da publicação de gerações de índices e das travas entre workers
+"""
+
+import os
+import threading
+
+from src.geracoes import DiretorioGeracoes, TravaProcessos
+
+
+def _gravar_geracao(geracoes, conteudo):
+    caminho = geracoes.nova_geracao()
+    with open(os.path.join(caminho, "index.faiss"), "w") as f:
+        f.write(conteudo)
+    return caminho
+
+
+def test_publicacao_troca_o_symlink(tmp_path):
+    geracoes = DiretorioGeracoes(str(tmp_path / "faiss_produtos"))
+    assert geracoes.geracao_atual() is None
+
+    primeira = _gravar_geracao(geracoes, "v1")
+    geracoes.publicar(primeira)
+    leitor = open(os.path.join(geracoes.caminho_publicado, "index.faiss"))
+
+    segunda = _gravar_geracao(geracoes, "v2")
+    geracoes.publicar(segunda)
+
+    assert os.path.islink(geracoes.caminho_publicado)
+    assert geracoes.geracao_atual() == os.path.realpath(segunda)
+    with open(os.path.join(geracoes.caminho_publicado, "index.faiss")) as f:
+        assert f.read() == "v2"
+    # Quem abriu a geração anterior continua lendo a versão dela
+    assert leitor.read() == "v1"
+    leitor.close()
+    assert not any(nome.endswith(".tmp") for nome in os.listdir(tmp_path))
+
+
+def test_limpeza_preserva_as_recentes(tmp_path):
+    geracoes = DiretorioGeracoes(str(tmp_path / "faiss_produtos"), manter=2)
+    caminhos = []
+    for versao in range(5):
+        caminhos.append(_gravar_geracao(geracoes, f"v{versao}"))
+        geracoes.publicar(caminhos[-1])
+
+    assert sorted(os.listdir(geracoes.raiz)) == [os.path.basename(caminho) for caminho in caminhos[-2:]]
+
+
+def test_diretorio_legado_vira_geracao(tmp_path):
+    legado = tmp_path / "faiss_produtos"
+    legado.mkdir()
+    (legado / "index.faiss").write_text("legado")
+    geracoes = DiretorioGeracoes(str(legado))
+
+    geracoes.publicar(_gravar_geracao(geracoes, "nova"))
+
+    assert os.path.islink(legado)
+    assert (tmp_path / "geracoes" / "faiss_produtos" / f"{0:020d}-legado" / "index.faiss").read_text() == "legado"
+
+
+def test_trava_reentrante_e_tentativa(tmp_path):
+    trava = TravaProcessos(str(tmp_path / "indices.lock"))
+    outra = TravaProcessos(str(tmp_path / "indices.lock"))
+    resultados = []
+
+    def tentar():
+        with outra.tentar_adquirir() as adquirida:
+            resultados.append(adquirida)
+
+    with trava.adquirir() as externa:
+        with trava.adquirir() as interna:
+            assert externa and not interna
+        thread = threading.Thread(target=tentar)
+        thread.start()
+        thread.join()
+    tentar()
+
+    assert resultados == [False, True]
+
+
+def test_worker_adota_geracao_publicada_por_outro(criar_rag):
+    escritor = criar_rag(intervalo_publicacao_indice=0)
+    leitor = criar_rag(intervalo_publicacao_indice=0)
+    antes = leitor._geracoes["produtos"].geracao_atual()
+    produto = {
+        "id": "NOVO1", "nome": "Cafeteira Expresso Zeta Z900", "categoria": "Casa e Cozinha",
+        "marca": "Zeta", "preco": 899.0, "descricao": "Cafeteira expresso com moedor", "disponivel": True,
+    }
+
+    escritor.adicionar_produto(produto)
+    escritor.sincronizar_indices()
+    assert escritor._geracoes["produtos"].geracao_atual() != antes
+
+    assert leitor.sincronizar_indices()
+    assert leitor._geracoes_carregadas["produtos"] == escritor._geracoes["produtos"].geracao_atual()
+    assert leitor.catalogo.obter("NOVO1") == produto
+    assert leitor.buscar_produtos("cafeteira expresso zeta", top_k=1, modo="vetorial")[0]["id"] == "NOVO1"
+    assert leitor.versao_dados() == escritor.versao_dados()
@@ -0,0 +1,73 @@
+"""
+Testes da importação em massa de produtos
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+
+
+def _produto(indice, nome=None):
+    return {
+        "id": f"IMP{indice:05d}", "nome": nome or f"Luminária Orbe {indice}", "categoria": "Casa e Cozinha",
+        "marca": "Orbe", "preco": 50.0 + indice, "descricao": "Luminária de mesa", "disponivel": True,
+    }
+
+
+def test_lotes_seguem_para_embeddings_durante_a_leitura(criar_rag, embeddings):
+    rag = criar_rag()
+    total_inicial = len(rag.catalogo)
+    chamadas_durante_leitura = []
+
+    async def ler():
+        for indice in range(10):
+            yield _produto(indice)
+            await asyncio.sleep(0.01)
+        chamadas_durante_leitura.append(embeddings.chamadas - chamadas_iniciais)
+        yield _produto(3, nome="Luminária Orbe edição final")
+
+    chamadas_iniciais = embeddings.chamadas
+    resultado = asyncio.run(rag.aimportar_produtos(ler(), tamanho_lote=4, max_concorrencia=2))
+
+    assert resultado == {"importados": 10, "erros": []}
+    assert chamadas_durante_leitura[0] >= 2
+    assert len(rag.catalogo) == total_inicial + 10
+    # ID repetido em lotes diferentes: vale a última ocorrência
+    assert rag.catalogo.obter("IMP00003")["nome"] == "Luminária Orbe edição final"
+    encontrados = rag.buscar_produtos("Luminária Orbe edição final", top_k=1, modo="vetorial")
+    assert encontrados[0]["id"] == "IMP00003"
+
+
+def test_produtos_sem_id_reportados(criar_rag):
+    rag = criar_rag()
+
+    resultado = asyncio.run(rag.aimportar_produtos([_produto(1), {"nome": "Sem ID"}], tamanho_lote=10))
+
+    assert resultado["importados"] == 1
+    assert resultado["erros"] == [{"id": None, "erro": "Produto sem ID"}]
+
+
+def test_parametros_invalidos_rejeitados(criar_rag):
+    rag = criar_rag()
+
+    for tamanho_lote, max_concorrencia in ((0, 1), (1, 0), (-1, 1)):
+        with pytest.raises(ValueError):
+            asyncio.run(rag.aimportar_produtos(
+                [_produto(1)], tamanho_lote=tamanho_lote, max_concorrencia=max_concorrencia
+            ))
+
+
+@pytest.mark.parametrize("parametros", [
+    {"max_concorrencia": 0}, {"max_concorrencia": -2}, {"tamanho_lote": 0}, {"tamanho_lote": 100_000},
+])
+def test_rota_de_importacao_valida_parametros(parametros):
+    api.app.dependency_overrides[api.get_assistente] = lambda: None
+    try:
+        resposta = TestClient(api.app).post("/admin/produtos/importar", params=parametros, content=b"")
+    finally:
+        api.app.dependency_overrides.clear()
+
+    assert resposta.status_code == 422
@@ -0,0 +1,103 @@
+"""
+Testes do índice comprimido (IVF-PQ / HNSW-SQ8) com re-ranqueamento exato
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.catalogo_sintetico import gerar_produtos
+from src.indice_vetorial import FAISSQuantizado, carregar_store, criar_store_vetorial
+
+TOTAL = 600
+PARAMETROS = {"nlist": 16, "m": 8, "nbits": 4, "nprobe": 2, "ef_search": 16}
+
+
+@pytest.fixture(params=["ivfpq", "hnsw_sq"])
+def store(request, tmp_path, embeddings):
+    produtos = list(gerar_produtos(TOTAL))
+    textos = [f"{produto['nome']} {produto['descricao']}" for produto in produtos]
+    store = criar_store_vetorial(
+        textos, embeddings.embed_documents(textos),
+        [{"id": produto["id"], "categoria": produto["categoria"]} for produto in produtos],
+        [produto["id"] for produto in produtos], embeddings, str(tmp_path / "indice"),
+        tipo=request.param, parametros=PARAMETROS
+    )
+    assert isinstance(store, FAISSQuantizado)
+    return store
+
+
+def _ids(resultados):
+    return [doc.metadata["id"] for doc, _ in resultados]
+
+
+def test_remocao_vira_tombstone(store, embeddings):
+    consulta = embeddings.embed_query(store.docstore.search("PROD0000010").page_content)
+    assert _ids(store.similarity_search_with_score_by_vector(consulta, k=1)) == ["PROD0000010"]
+    posicao_vizinho = store._posicao_por_id["PROD0000011"]
+
+    store.delete(["PROD0000010"])
+
+    resultados = store.similarity_search_with_score_by_vector(consulta, k=10)
+    assert "PROD0000010" not in _ids(resultados) and len(resultados) == 10
+    assert store.index.ntotal == TOTAL and store.total_removidos == 1
+    assert store._posicao_por_id["PROD0000011"] == posicao_vizinho
+    with pytest.raises(ValueError):
+        store.delete(["PROD0000010"])
+
+
+def test_reinsercao_apos_remocao(store, embeddings):
+    texto = store.docstore.search("PROD0000020").page_content
+    store.delete(["PROD0000020"])
+    store.add_texts([texto + " edição nova"], metadatas=[{"id": "PROD0000020"}], ids=["PROD0000020"])
+
+    consulta = embeddings.embed_query(texto + " edição nova")
+    assert _ids(store.similarity_search_with_score_by_vector(consulta, k=1)) == ["PROD0000020"]
+    assert store.index.ntotal == TOTAL + 1
+    with pytest.raises(ValueError):
+        store.add_texts(["duplicado"], ids=["PROD0000020"])
+
+
+def test_compactacao_descarta_tombstones(store, embeddings):
+    removidos = [f"PROD{i:07d}" for i in range(1, 151)]
+    store.delete(removidos)
+    assert store.precisa_compactar()
+
+    novo = store.compactar()
+    assert novo.index.ntotal == TOTAL - len(removidos)
+    assert not isinstance(novo, FAISSQuantizado) or novo.total_removidos == 0
+
+    consulta = embeddings.embed_query(store.docstore.search("PROD0000200").page_content)
+    assert _ids(novo.similarity_search_with_score_by_vector(consulta, k=1)) == ["PROD0000200"]
+    assert not set(_ids(novo.similarity_search_with_score_by_vector(consulta, k=50))) & set(removidos)
+
+
+def test_tombstones_persistem_ao_salvar(store, embeddings, tmp_path):
+    store.delete(["PROD0000030"])
+    store.add_texts(["Produto novo"], metadatas=[{"id": "NOVO"}], ids=["NOVO"])
+    store.save_local(str(tmp_path / "salvo"))
+
+    carregado = carregar_store(str(tmp_path / "salvo"), embeddings)
+    assert carregado.total_removidos == 1 and "PROD0000030" not in carregado._posicao_por_id
+    consulta = embeddings.embed_query("Produto novo")
+    assert _ids(carregado.similarity_search_with_score_by_vector(consulta, k=1)) == ["NOVO"]
+
+
+def test_filtro_preenche_k_resultados(store, embeddings):
+    consulta = embeddings.embed_query("notebook leve")
+
+    # O filtro é aplicado sobre os fetch_k candidatos re-ranqueados
+    filtrados = store.similarity_search_with_score_by_vector(
+        consulta, k=10, filter={"categoria": "Livros"}, fetch_k=TOTAL
+    )
+    assert len(filtrados) == 10
+    assert all(doc.metadata["categoria"] == "Livros" for doc, _ in filtrados)
+
+    posicoes = np.asarray(sorted(
+        posicao for posicao, id_ in store.index_to_docstore_id.items()
+        if store.docstore.search(id_).metadata["categoria"] == "Livros"
+    ), dtype=np.int64)
+    matriz = np.asarray([consulta], dtype=np.float32)
+    restritos = store.buscar_posicoes(matriz, 10, posicoes, limite_forca_bruta=0)
+    assert len(restritos) == 10 and set(posicao for posicao, _ in restritos) <= set(posicoes.tolist())
+    scores = [score for _, score in restritos]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,46 @@
+"""
+Testes do agrupamento de embeddings de consultas
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.lote_embeddings import LoteEmbeddings
+
+
+def test_consultas_simultaneas_em_uma_chamada(embeddings):
+    lote = LoteEmbeddings(embeddings, janela_ms=200, max_lote=8)
+    textos = [f"notebook {indice % 4}" for indice in range(8)]
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            vetores = list(executor.map(lote.embed_query, textos))
+    finally:
+        lote.fechar()
+
+    assert vetores == [embeddings.embed_query(texto) for texto in textos]
+    estatisticas = lote.obter_estatisticas()
+    assert estatisticas["consultas"] == 8
+    assert estatisticas["chamadas"] < 8
+
+
+def test_consulta_enfileirada_durante_o_fechamento_e_respondida(embeddings):
+    lote = LoteEmbeddings(embeddings, janela_ms=1)
+    colocar = lote._fila.put
+    fechamento = threading.Thread(target=lote.fechar)
+
+    def colocar_com_fechamento_concorrente(item, *args, **kwargs):
+        # fechar() roda entre a verificação de "ativo" e a entrada na fila
+        if item is not None and fechamento.ident is None:
+            fechamento.start()
+            fechamento.join(0.2)
+        colocar(item, *args, **kwargs)
+
+    lote._fila.put = colocar_com_fechamento_concorrente
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        vetor = executor.submit(lote.embed_query, "notebook gamer").result(timeout=10)
+    fechamento.join(10)
+
+    assert vetor == embeddings.embed_query("notebook gamer")
+    assert not fechamento.is_alive()
+    # Depois de fechado, as consultas vão direto para a base
+    assert lote.embed_query("mouse sem fio") == embeddings.embed_query("mouse sem fio")
@@ -0,0 +1,131 @@
+"""
+Testes das métricas e da exportação no formato de texto do Prometheus
+"""
+
+import asyncio
+import re
+from collections import defaultdict
+
+import pytest
+
+from src.assistente import AssistenteVirtual
+from src.metricas import Histograma, Metricas
+
+_LINHA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+_ROTULO = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def _amostras(texto):
+    """
+    Amostras de uma exportação: {métrica: {rótulos ordenados: valor}}
+
+    Falha se alguma linha fugir do formato de texto (HELP/TYPE ou amostra).
+    """
+    assert texto.endswith("\n")
+    amostras = defaultdict(dict)
+    for linha in texto.splitlines():
+        if linha.startswith("# HELP ") or linha.startswith("# TYPE "):
+            continue
+        encontrada = _LINHA.match(linha)
+        assert encontrada, f"Linha fora do formato: {linha!r}"
+        nome, rotulos, valor = encontrada.groups()
+        amostras[nome][tuple(sorted(_ROTULO.findall(rotulos or "")))] = float(valor)
+    return amostras
+
+
+def test_exportacao_de_contadores_histogramas_e_medidores():
+    metricas = Metricas(limites_latencia=(0.1, 1.0))
+    metricas.incrementar("intencoes", "busca_produto")
+    metricas.incrementar("intencoes", "busca_produto")
+    metricas.incrementar("intencoes", 'rótulo "com" aspas')
+    metricas.observar("latencia_etapa_segundos", 0.05, "deteccao_intencao")
+    metricas.observar("latencia_etapa_segundos", 0.5, "deteccao_intencao")
+    metricas.observar("latencia_etapa_segundos", 3.0, "deteccao_intencao")
+    metricas.registrar_medidor("produtos_indexados", lambda: 42, "Produtos no índice")
+    metricas.registrar_medidor("acertos_cache", lambda: {"respostas": 3, "embeddings": 7},
+                               rotulo="cache", tipo="counter")
+
+    texto = metricas.exportar_prometheus()
+    amostras = _amostras(texto)
+
+    assert "# TYPE assistente_intencoes_total counter" in texto
+    assert amostras["assistente_intencoes_total"][(("intencao", "busca_produto"),)] == 2
+    assert amostras["assistente_intencoes_total"][(("intencao", 'rótulo \\"com\\" aspas'),)] == 1
+
+    assert "# TYPE assistente_latencia_etapa_segundos histogram" in texto
+    buckets = {
+        dict(rotulos)["le"]: valor
+        for rotulos, valor in amostras["assistente_latencia_etapa_segundos_bucket"].items()
+    }
+    assert buckets == {"0.1": 1, "1": 2, "+Inf": 3}
+    etapa = (("etapa", "deteccao_intencao"),)
+    assert amostras["assistente_latencia_etapa_segundos_count"][etapa] == 3
+    assert amostras["assistente_latencia_etapa_segundos_sum"][etapa] == pytest.approx(3.55)
+
+    assert amostras["assistente_produtos_indexados"][()] == 42
+    assert amostras["assistente_acertos_cache_total"] == {(("cache", "embeddings"),): 7, (("cache", "respostas"),): 3}
+
+
+def test_medidor_com_erro_nao_interrompe_exportacao():
+    metricas = Metricas()
+    metricas.registrar_medidor("quebrado", lambda: 1 / 0)
+    metricas.registrar_medidor("sem_valor", lambda: None)
+    metricas.registrar_medidor("ok", lambda: 1.5)
+
+    amostras = _amostras(metricas.exportar_prometheus(prefixo=""))
+
+    assert set(amostras) == {"ok"} and amostras["ok"][()] == 1.5
+
+
+def test_exportacao_valida_para_o_parser_oficial():
+    parser = pytest.importorskip("prometheus_client.parser")
+    metricas = Metricas()
+    metricas.incrementar("chamadas_llm", "resposta")
+    metricas.observar("latencia_llm_segundos", 0.2, "resposta")
+    metricas.registrar_medidor("sessoes_ativas", lambda: 2)
+
+    familias = {
+        familia.name: familia
+        for familia in parser.text_string_to_metric_families(metricas.exportar_prometheus())
+    }
+
+    assert familias["assistente_chamadas_llm"].type == "counter"
+    assert familias["assistente_latencia_llm_segundos"].type == "histogram"
+    assert familias["assistente_sessoes_ativas"].samples[0].value == 2
+
+
+def test_percentis_do_histograma():
+    histograma = Histograma(limites=(1, 2, 4))
+    assert histograma.percentil(0.5) is None
+    for valor in (0.5, 1.5, 1.5, 3, 10):
+        histograma.observar(valor)
+
+    assert histograma.buckets() == [(1, 1), (2, 3), (4, 4), (float("inf"), 5)]
+    assert histograma.percentil(0.5) == pytest.approx(1.75)
+    assert histograma.percentil(0.99) == 4
+
+
+def test_mensagem_registra_etapas_e_tokens(diretorio_dados, embeddings, llm):
+    assistente = AssistenteVirtual(
+        openai_api_key="offline", llm=llm, diretorio_dados=diretorio_dados,
+        opcoes_rag={"embeddings": embeddings, "janela_lote_consultas_ms": 0}
+    )
+    try:
+        resposta = asyncio.run(assistente.aprocessar_mensagem("Quero um notebook Dell até 3000 reais", "s1"))
+        historico = asyncio.run(assistente.aobter_historico_sessao("s1"))
+        amostras = _amostras(assistente.metricas.exportar_prometheus())
+    finally:
+        assistente.rag_system.fechar()
+        assistente.sessoes.fechar()
+        assistente.pedidos.fechar()
+
+    assert resposta["resposta"]
+    assert len(historico) == 1
+    assert amostras["assistente_interacoes_total"][()] == 1
+    etapas = {dict(rotulos)["etapa"] for rotulos in amostras["assistente_latencia_etapa_segundos_count"]}
+    assert {"deteccao_intencao", "geracao_resposta", "historico_sessao"} <= etapas
+    chamadas = sum(amostras["assistente_chamadas_llm_total"].values())
+    assert chamadas >= 1
+    assert sum(amostras["assistente_tokens_entrada_llm_total"].values()) > 0
+    assert sum(amostras["assistente_tokens_saida_llm_total"].values()) > 0
+    assert sum(amostras["assistente_tokens_por_chamada_llm_count"].values()) == chamadas
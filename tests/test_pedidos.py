@@ -0,0 +1,80 @@
+"""
+Testes dos repositórios de pedidos e da consulta de pedidos pelo chat
+"""
+
+import asyncio
+
+import pytest
+
+from src.assistente import AssistenteVirtual
+from src.pedidos import RepositorioPedidosMemoria, RepositorioPedidosSQLite
+
+
+def _pedido(pedido_id, data_compra, email="cliente@email.com"):
+    return {
+        "pedido_id": pedido_id, "status": "Entregue", "data_compra": data_compra,
+        "codigo_rastreamento": f"BR{int(pedido_id):09d}SP",
+        "endereco_entrega": {"rua": "Rua das Flores, 123", "cidade": "São Paulo"},
+        "cliente": {"nome": "Cliente", "email": email},
+    }
+
+
+PEDIDOS = [
+    _pedido("100", "2024-01-10"),
+    _pedido("101", "2024-03-05"),
+    _pedido("102", "2024-02-20"),
+    _pedido("200", "2024-04-01", email="outra@email.com"),
+]
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def repositorio(request, tmp_path):
+    if request.param == "memoria":
+        repositorio = RepositorioPedidosMemoria(PEDIDOS)
+    else:
+        repositorio = RepositorioPedidosSQLite(str(tmp_path / "pedidos.sqlite"))
+        repositorio.importar(PEDIDOS)
+    yield repositorio
+    repositorio.fechar()
+
+
+def test_busca_por_email_mais_recentes_primeiro(repositorio):
+    ids = [pedido["pedido_id"] for pedido in repositorio.buscar_por_email(" Cliente@Email.com ")]
+    assert ids == ["101", "102", "100"]
+
+    assert [pedido["pedido_id"] for pedido in repositorio.buscar_por_email("cliente@email.com", limite=2)] == [
+        "101", "102"
+    ]
+    assert repositorio.buscar_por_email("ninguem@email.com") == []
+
+
+@pytest.fixture
+def assistente(diretorio_dados, embeddings, llm):
+    assistente = AssistenteVirtual(
+        openai_api_key="offline", llm=llm, diretorio_dados=diretorio_dados,
+        repositorio_pedidos=RepositorioPedidosMemoria(PEDIDOS),
+        opcoes_rag={"embeddings": embeddings, "janela_lote_consultas_ms": 0}
+    )
+    yield assistente
+    assistente.rag_system.fechar()
+    assistente.sessoes.fechar()
+
+
+def test_chat_nao_lista_pedidos_so_pelo_email(assistente):
+    resultado = assistente._consultar_pedido("Quais são os pedidos de cliente@email.com?")
+
+    assert "pedidos" not in resultado and "pedido" not in resultado
+    assert resultado["erro"] == "Número do pedido não encontrado"
+
+
+def test_chat_exige_email_do_proprio_pedido(assistente):
+    resultado = assistente._consultar_pedido("Pedido #101, meu e-mail é CLIENTE@email.com")
+    assert resultado["pedido"]["pedido_id"] == "101"
+
+    resultado = assistente._consultar_pedido("Pedido #200, meu e-mail é cliente@email.com")
+    assert "pedido" not in resultado and resultado["erro"] == "Pedido não encontrado"
+
+def test_consulta_assincrona_fora_do_event_loop(assistente):
+    resultado = asyncio.run(assistente._aprocessar_por_intencao("Status do pedido #102", "consulta_pedido", "s1"))
+
+    assert resultado["pedido"]["pedido_id"] == "102"
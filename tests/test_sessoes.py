@@ -0,0 +1,201 @@
+"""
+Testes dos backends de sessões (histórico limitado e expiração por inatividade)
+"""
+
+import fnmatch
+import types
+
+import pytest
+
+import src.sessoes as sessoes
+from src.sessoes import SessoesMemoria, SessoesRedis, SessoesSQLite, criar_armazenamento_sessoes
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Substitui o relógio do módulo de sessões por um controlado pelo teste"""
+    relogio = types.SimpleNamespace(agora=1_000.0)
+    monkeypatch.setattr(sessoes, "time", types.SimpleNamespace(
+        monotonic=lambda: relogio.agora, time=lambda: relogio.agora
+    ))
+    return relogio
+
+
+class RedisFalso:
+    """
+    Subconjunto do redis-py usado por SessoesRedis (listas, EXPIRE, SCAN e pipeline)
+
+    A expiração segue o relógio do teste, como o Redis faria com o dele.
+    """
+
+    def __init__(self, relogio):
+        self.relogio = relogio
+        self.listas = {}
+        self.expiracoes = {}
+        self.fechado = False
+
+    def _lista(self, chave):
+        if chave in self.expiracoes and self.expiracoes[chave] <= self.relogio.agora:
+            self.listas.pop(chave, None)
+            self.expiracoes.pop(chave, None)
+        return self.listas.get(chave)
+
+    @staticmethod
+    def _intervalo(lista, inicio, fim):
+        inicio = inicio + len(lista) if inicio < 0 else inicio
+        fim = fim + len(lista) if fim < 0 else fim
+        return lista[max(inicio, 0):fim + 1]
+
+    def rpush(self, chave, valor):
+        lista = self._lista(chave)
+        if lista is None:
+            lista = self.listas[chave] = []
+        lista.append(valor.encode("utf-8"))
+        return len(lista)
+
+    def ltrim(self, chave, inicio, fim):
+        lista = self._lista(chave)
+        if lista is not None:
+            self.listas[chave] = self._intervalo(lista, inicio, fim)
+        return True
+
+    def expire(self, chave, segundos):
+        if self._lista(chave) is None:
+            return False
+        self.expiracoes[chave] = self.relogio.agora + segundos
+        return True
+
+    def lrange(self, chave, inicio, fim):
+        return self._intervalo(self._lista(chave) or [], inicio, fim)
+
+    def delete(self, *chaves):
+        return sum(self.listas.pop(chave, None) is not None for chave in chaves)
+
+    def scan_iter(self, match="*", count=None):
+        for chave in list(self.listas):
+            if self._lista(chave) is not None and fnmatch.fnmatchcase(chave, match):
+                yield chave.encode("utf-8")
+
+    def pipeline(self):
+        return PipelineFalso(self)
+
+    def close(self):
+        self.fechado = True
+
+
+class PipelineFalso:
+    """Enfileira os comandos e só os aplica no execute()"""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.comandos = []
+
+    def __getattr__(self, nome):
+        def enfileirar(*args, **kwargs):
+            self.comandos.append((getattr(self.cliente, nome), args, kwargs))
+            return self
+        return enfileirar
+
+    def execute(self):
+        comandos, self.comandos = self.comandos, []
+        return [comando(*args, **kwargs) for comando, args, kwargs in comandos]
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def armazenamento(request, tmp_path, relogio):
+    if request.param == "memoria":
+        armazenamento = SessoesMemoria(timeout=60, max_historico=3)
+    elif request.param == "sqlite":
+        armazenamento = SessoesSQLite(str(tmp_path / "sessoes.sqlite"), timeout=60, max_historico=3,
+                                      intervalo_limpeza=0)
+    else:
+        armazenamento = SessoesRedis(cliente=RedisFalso(relogio), timeout=60, max_historico=3)
+    yield armazenamento
+    armazenamento.fechar()
+
+
+def _total(armazenamento):
+    if isinstance(armazenamento, (SessoesSQLite, SessoesRedis)):
+        armazenamento._total_sessoes.atualizar()
+    return armazenamento.total_sessoes()
+
+
+def test_historico_limitado(armazenamento):
+    for i in range(5):
+        armazenamento.registrar("s1", {"mensagem": i})
+
+    assert armazenamento.historico("s1") == [{"mensagem": 2}, {"mensagem": 3}, {"mensagem": 4}]
+    assert armazenamento.historico("outra") == []
+
+
+def test_sessao_expira_por_inatividade(armazenamento, relogio):
+    armazenamento.registrar("s1", {"mensagem": "oi"})
+    armazenamento.registrar("s2", {"mensagem": "olá"})
+
+    relogio.agora += 45
+    armazenamento.registrar("s2", {"mensagem": "ainda aqui"})
+    relogio.agora += 30
+
+    assert armazenamento.historico("s1") == []
+    assert len(armazenamento.historico("s2")) == 2
+    assert _total(armazenamento) == 1
+
+    relogio.agora += 61
+    assert armazenamento.historico("s2") == []
+    assert _total(armazenamento) == 0
+
+
+def test_sqlite_remove_expiradas_do_arquivo(tmp_path, relogio):
+    armazenamento = SessoesSQLite(str(tmp_path / "sessoes.sqlite"), timeout=60, intervalo_limpeza=30)
+    armazenamento.registrar("s1", {"mensagem": "oi"})
+    relogio.agora += 120
+    armazenamento.registrar("s2", {"mensagem": "olá"})
+
+    linhas = armazenamento._conexao.execute("SELECT DISTINCT id_sessao FROM interacoes").fetchall()
+    assert linhas == [("s2",)]
+    armazenamento.fechar()
+
+
+def test_memoria_descarta_as_menos_recentes(relogio):
+    armazenamento = SessoesMemoria(timeout=60, max_sessoes=2)
+    for id_sessao in ("s1", "s2", "s3"):
+        armazenamento.registrar(id_sessao, {"mensagem": id_sessao})
+        relogio.agora += 1
+
+    assert armazenamento.historico("s1") == []
+    assert armazenamento.total_sessoes() == 2
+
+
+def test_sqlite_compartilhado_entre_workers(tmp_path, relogio):
+    caminho = str(tmp_path / "sessoes.sqlite")
+    primeiro, segundo = SessoesSQLite(caminho, timeout=60), SessoesSQLite(caminho, timeout=60)
+
+    primeiro.registrar("s1", {"mensagem": "oi"})
+    assert segundo.historico("s1") == [{"mensagem": "oi"}]
+
+    primeiro.fechar()
+    segundo.fechar()
+
+
+def test_redis_compartilhado_e_isolado_por_prefixo(relogio):
+    cliente = RedisFalso(relogio)
+    primeiro = SessoesRedis(cliente=cliente, timeout=60)
+    segundo = SessoesRedis(cliente=cliente, timeout=60)
+    outra_aplicacao = SessoesRedis(cliente=cliente, timeout=60, prefixo="outra:")
+
+    primeiro.registrar("s1", {"mensagem": "olá", "acentos": "ção"})
+    outra_aplicacao.registrar("s1", {"mensagem": "de outra aplicação"})
+
+    assert segundo.historico("s1") == [{"mensagem": "olá", "acentos": "ção"}]
+    assert outra_aplicacao.historico("s1") == [{"mensagem": "de outra aplicação"}]
+    assert _total(primeiro) == 1
+    assert cliente.expiracoes["sessao:s1"] == relogio.agora + 60
+
+    for armazenamento in (primeiro, segundo, outra_aplicacao):
+        armazenamento.fechar()
+    assert cliente.fechado
+
+
+def test_backend_desconhecido():
+    with pytest.raises(ValueError):
+        criar_armazenamento_sessoes("arquivo")
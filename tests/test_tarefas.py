@@ -0,0 +1,135 @@
+"""
+Testes da reindexação à sombra e das tarefas em segundo plano
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from src.tarefas import GerenciadorTarefas, TarefaCancelada
+
+
+def _aguardar(gerenciador, tarefa_id, limite=30.0):
+    prazo = time.monotonic() + limite
+    while time.monotonic() < prazo:
+        tarefa = gerenciador.obter(tarefa_id)
+        if not tarefa.ativa:
+            return tarefa
+        time.sleep(0.01)
+    raise TimeoutError(tarefa_id)
+
+
+def _aguardar_threads():
+    """Espera as threads de tarefas registrarem o desfecho e liberarem a trava do tipo"""
+    for thread in threading.enumerate():
+        if thread.name.startswith("tarefa-"):
+            thread.join(30)
+
+
+@pytest.fixture
+def gerenciadores(tmp_path):
+    """Dois "workers" com o mesmo arquivo de tarefas"""
+    caminho = str(tmp_path / "tarefas.sqlite")
+    primeiro, segundo = GerenciadorTarefas(caminho), GerenciadorTarefas(caminho)
+    yield primeiro, segundo
+    _aguardar_threads()
+    primeiro.fechar()
+    segundo.fechar()
+
+
+def test_reindexacao_troca_indice_e_reaplica_alteracoes(criar_rag):
+    rag = criar_rag()
+    anterior = rag.vector_store_produtos
+    geracao_anterior = rag._geracoes["produtos"].geracao_atual()
+    produto = {
+        "id": "NOVO1", "nome": "Cafeteira Expresso Zeta Z900", "categoria": "Casa e Cozinha",
+        "marca": "Zeta", "preco": 899.0, "descricao": "Cafeteira expresso com moedor", "disponivel": True,
+    }
+    verificacoes = []
+
+    def verificar():
+        # Alteração feita enquanto o índice sombra é construído
+        if not verificacoes:
+            rag.adicionar_produto(produto)
+        verificacoes.append(True)
+
+    resultado = rag.reindexar(verificar_cancelamento=verificar, tamanho_lote=100)
+
+    assert resultado["alterados_durante_reindexacao"] == 1
+    assert resultado["produtos"] == 301
+    assert rag.vector_store_produtos is not anterior
+    assert rag._geracoes["produtos"].geracao_atual() != geracao_anterior
+    assert rag.buscar_produtos("cafeteira expresso zeta", top_k=1, modo="vetorial")[0]["id"] == "NOVO1"
+    assert not any(nome.startswith("reindexacao-") for nome in os.listdir(rag._caminho_dados("geracoes")))
+
+
+def test_reindexacao_cancelada_mantem_indice(criar_rag):
+    rag = criar_rag()
+    anterior = rag.vector_store_produtos
+    geracao_anterior = rag._geracoes["produtos"].geracao_atual()
+    verificacoes = []
+
+    def verificar():
+        verificacoes.append(True)
+        if len(verificacoes) == 2:
+            raise TarefaCancelada("cancelada no teste")
+
+    with pytest.raises(TarefaCancelada):
+        rag.reindexar(verificar_cancelamento=verificar, tamanho_lote=100)
+
+    assert rag.vector_store_produtos is anterior
+    assert rag._geracoes["produtos"].geracao_atual() == geracao_anterior
+    assert not any(nome.startswith("reindexacao-") for nome in os.listdir(rag._caminho_dados("geracoes")))
+
+
+def test_tarefa_concluida_visivel_em_outro_worker(gerenciadores):
+    primeiro, segundo = gerenciadores
+
+    def executar(tarefa):
+        tarefa.reportar("etapa_unica", 0.5)
+        return {"produtos": 3}
+
+    tarefa = primeiro.iniciar("reindexacao", executar)
+    concluida = _aguardar(segundo, tarefa.id)
+
+    assert concluida.status == "concluida"
+    assert concluida.progresso == 1.0 and concluida.etapa == "etapa_unica"
+    assert concluida.resultado == {"produtos": 3}
+    assert [item.id for item in segundo.listar("reindexacao")] == [tarefa.id]
+
+
+def test_uma_tarefa_ativa_por_tipo_e_cancelamento_entre_workers(gerenciadores):
+    primeiro, segundo = gerenciadores
+    iniciada = threading.Event()
+
+    def executar(tarefa):
+        iniciada.set()
+        while True:
+            tarefa.verificar_cancelamento()
+            time.sleep(0.01)
+
+    tarefa = primeiro.iniciar("reindexacao", executar)
+    assert iniciada.wait(10)
+    assert segundo.iniciar("reindexacao", executar) is None
+    assert segundo.obter(tarefa.id).status == "executando"
+
+    segundo.cancelar(tarefa.id)
+
+    assert _aguardar(primeiro, tarefa.id).status == "cancelada"
+    _aguardar_threads()
+    assert segundo.obter(tarefa.id).status == "cancelada"
+    nova = segundo.iniciar("reindexacao", lambda tarefa: None)
+    assert nova is not None and _aguardar(segundo, nova.id).status == "concluida"
+
+
+def test_falha_registrada(gerenciadores):
+    primeiro, _ = gerenciadores
+
+    def executar(tarefa):
+        raise RuntimeError("índice inválido")
+
+    tarefa = _aguardar(primeiro, primeiro.iniciar("reindexacao", executar).id)
+
+    assert tarefa.status == "falhou" and tarefa.erro == "índice inválido"